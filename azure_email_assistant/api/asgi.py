@@ -0,0 +1,544 @@
+"""
+ASGI server for the Azure Email Assistant.
+
+Exposes the same routes as the Flask ``APIServer`` on an asyncio event
+loop, so waiting on Azure holds a coroutine instead of a thread. Run it
+with any ASGI server, for example::
+
+    uvicorn --factory azure_email_assistant.api.asgi:create_azure_app
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from azure_email_assistant.api.server import parse_email_payload
+from azure_email_assistant.core.assistant import AssistantResponse, EmailContent, MockAssistant
+from azure_email_assistant.core.async_assistant import (
+    AsyncAzureAssistant, AsyncBaseAssistant, ThreadedAssistant
+)
+from azure_email_assistant.core.cache import AsyncCachingAssistant, CachingAssistant
+from azure_email_assistant.core.config import api_config, cache_config, filter_config, router_config
+from azure_email_assistant.core.filters import (
+    AsyncFilteringAssistant, EmailSkipped, FilteringAssistant
+)
+from azure_email_assistant.core.idempotency import (
+    AsyncRequestCoalescer, email_fingerprint, reusable_result
+)
+from azure_email_assistant.core.jobs import AsyncJobQueue, QueueFullError, job_persistence
+from azure_email_assistant.core.metrics import (
+    CONTENT_TYPE, ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, registry
+)
+from azure_email_assistant.core.router import AsyncTieredAssistant, fast_config
+from azure_email_assistant.core.streaming import format_sse_event
+from azure_email_assistant.core.tracing import current_request_id, tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class Request:
+    """The parts of an ASGI HTTP request the routes need."""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        """
+        Initialize from an ASGI scope and the full request body.
+
+        Args:
+            scope: ASGI connection scope
+            body: Request body
+        """
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = {
+            name: values[-1]
+            for name, values in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()
+        }
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        self.body = body
+
+    def get_json(self) -> Any:
+        """Decode the body as JSON.
+
+        Raises:
+            ValueError: If the body is not valid JSON
+        """
+        if not self.body:
+            return None
+        return json.loads(self.body)
+
+
+class Response:
+    """A complete or streamed HTTP response."""
+
+    def __init__(
+        self,
+        body: Any = None,
+        status: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        stream: Optional[AsyncIterator[str]] = None,
+        media_type: str = "application/json"
+    ):
+        """
+        Initialize the response.
+
+        Args:
+            body: JSON-serializable body
+            status: HTTP status code
+            headers: Extra response headers
+            stream: Async iterator of text chunks sent instead of ``body``
+            media_type: Content type of the response
+        """
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+        self.stream = stream
+        self.media_type = media_type
+
+    async def send(self, send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """Write the response to an ASGI ``send`` channel."""
+        headers: Headers = [(b"content-type", self.media_type.encode("latin-1"))]
+        headers.extend(
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in self.headers.items()
+        )
+
+        if self.stream is None:
+            # Text bodies are sent as they are, anything else as JSON
+            with tracer.span("serialize"):
+                text = self.body if isinstance(self.body, str) else json.dumps(self.body)
+                body = text.encode("utf-8")
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({"type": "http.response.start", "status": self.status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        async for chunk in self.stream:
+            await send({
+                "type": "http.response.body",
+                "body": chunk.encode("utf-8"),
+                "more_body": True
+            })
+        await send({"type": "http.response.body", "body": b""})
+
+
+class ASGIServer:
+    """ASGI application for the Azure Email Assistant."""
+
+    def __init__(
+        self,
+        assistant: AsyncBaseAssistant,
+        async_mode: bool = api_config.async_mode,
+        job_queue: Optional[AsyncJobQueue] = None
+    ):
+        """
+        Initialize the application.
+
+        Args:
+            assistant: Asyncio assistant implementation to use
+            async_mode: Queue every webhook email instead of only those
+                that ask for it with ``Prefer: respond-async``
+            job_queue: Queue for asynchronous processing; a default one
+                backed by ``assistant`` is created when omitted
+        """
+        self.assistant = assistant
+        self.async_mode = async_mode
+        self.job_queue = job_queue or AsyncJobQueue(
+            assistant,
+            workers=api_config.job_workers,
+            max_queue_size=api_config.job_queue_size,
+            result_ttl=api_config.job_result_ttl,
+            **job_persistence()
+        )
+
+        # Duplicate webhook deliveries share one assistant call
+        self.coalescer = AsyncRequestCoalescer(
+            ttl=api_config.idempotency_ttl,
+            is_reusable=reusable_result
+        )
+
+        # Shared by all batch requests so concurrent batches stay bounded
+        self.batch_semaphore = asyncio.Semaphore(api_config.batch_concurrency)
+
+        self.routes: Dict[Tuple[str, str], Callable[[Request], Awaitable[Response]]] = {
+            ('POST', '/webhook/email'): self._process_email,
+            ('POST', '/webhook/email/stream'): self._stream_email,
+            ('POST', '/webhook/emails'): self._process_emails,
+            ('GET', '/health'): self._health_check,
+            ('GET', '/metrics'): self._metrics,
+            ('GET', '/test'): self._test_endpoint
+        }
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        """ASGI entry point."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        request = Request(scope, await self._read_body(receive))
+        route = self._route_name(request)
+        started = time.monotonic()
+
+        # Webhooks are traced until the last byte of the response, streamed or not
+        if route.startswith('/webhook/'):
+            trace = tracer.request(f"{request.method} {route}")
+        else:
+            trace = contextlib.nullcontext()
+
+        with trace:
+            HTTP_IN_FLIGHT.inc()
+            try:
+                response = await self._dispatch(request)
+            finally:
+                HTTP_IN_FLIGHT.dec()
+            HTTP_REQUESTS.inc(route, request.method, str(response.status))
+            HTTP_LATENCY.observe(time.monotonic() - started, route)
+            await response.send(send)
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        """Handle server startup and shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Start job workers on this loop, picking up spooled jobs
+                self.job_queue.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # The ASGI server has already drained in-flight requests
+                await self.job_queue.flush(api_config.drain_timeout)
+                await self.assistant.aclose()
+                await asyncio.to_thread(tracer.flush)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive: Callable) -> bytes:
+        """Read the complete request body."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _dispatch(self, request: Request) -> Response:
+        """Route a request to its handler."""
+        handler = self.routes.get((request.method, request.path))
+        if handler is not None:
+            return await handler(request)
+
+        if request.method == 'GET' and request.path.startswith('/jobs/'):
+            return await self._get_job(request.path[len('/jobs/'):])
+
+        if any(path == request.path for _, path in self.routes):
+            return Response(self._error_response("Method not allowed"), 405)
+        return Response(self._error_response("Not found"), 404)
+
+    def _route_name(self, request: Request) -> str:
+        """Name a request's route for the metrics without per-job paths."""
+        if any(path == request.path for _, path in self.routes):
+            return request.path
+        if request.path.startswith('/jobs/'):
+            return '/jobs/<request_id>'
+        return 'unmatched'
+
+    async def _process_email(self, request: Request) -> Response:
+        """Handle incoming email webhook."""
+        try:
+            data = request.get_json()
+        except ValueError as e:
+            return Response(self._error_response(f"Invalid JSON: {str(e)}"), 400)
+
+        try:
+            email, error = parse_email_payload(data)
+
+            if error:
+                return Response(self._error_response(error), 400)
+
+            key = self._idempotency_key(request, data, email)
+
+            if self._wants_async(request):
+                return await self._enqueue_email(email, key)
+
+            # Process the email, sharing the call with duplicate deliveries
+            if key is None:
+                result, replayed = await self.assistant.process_email(email), False
+            else:
+                result, replayed = await self.coalescer.run(
+                    f"sync:{key}", lambda: self.assistant.process_email(email)
+                )
+
+            headers = {'Idempotent-Replayed': 'true'} if replayed else {}
+            return Response(result.to_dict(), 200, headers)
+
+        except Exception as e:
+            logger.error(f"Error processing email: {str(e)}")
+            ERRORS.inc("webhook", type(e).__name__)
+            return Response(self._error_response(f"Server error: {str(e)}"), 500)
+
+    async def _stream_email(self, request: Request) -> Response:
+        """Handle an email webhook, streaming the reply as it is generated."""
+        try:
+            data = request.get_json()
+        except ValueError as e:
+            return Response(self._error_response(f"Invalid JSON: {str(e)}"), 400)
+
+        email, error = parse_email_payload(data)
+        if error:
+            return Response(self._error_response(error), 400)
+
+        request_id = current_request_id() or str(uuid.uuid4())
+
+        if request.args.get('format') == 'text':
+            # A plain text body has no way to say the email was skipped
+            try:
+                fragments = self.assistant.stream_email(email)
+            except EmailSkipped as e:
+                return Response(AssistantResponse(status="skipped", reason=e.rule).to_dict(), 200)
+
+            return Response(
+                stream=self._stream_text(fragments, request_id),
+                media_type='text/plain; charset=utf-8',
+                headers={'X-Request-ID': request_id}
+            )
+
+        return Response(
+            stream=self._stream_events(email, request_id),
+            media_type='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'X-Request-ID': request_id
+            }
+        )
+
+    async def _stream_events(self, email: EmailContent, request_id: str) -> AsyncIterator[str]:
+        """Yield the assistant reply as server-sent events."""
+        yield format_sse_event("start", {"request_id": request_id})
+
+        try:
+            async for text in self.assistant.stream_email(email):
+                yield format_sse_event("delta", {"text": text})
+        except EmailSkipped as e:
+            yield format_sse_event("done", {
+                "status": "skipped",
+                "request_id": request_id,
+                "reason": e.rule,
+                "timestamp": datetime.now().isoformat()
+            })
+            return
+        except Exception as e:
+            logger.error(f"Error streaming email: {str(e)}")
+            ERRORS.inc("stream", type(e).__name__)
+            yield format_sse_event("error", {
+                "status": "error",
+                "request_id": request_id,
+                "error": str(e)
+            })
+            return
+
+        yield format_sse_event("done", {
+            "status": "success",
+            "request_id": request_id,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    async def _stream_text(self, fragments: AsyncIterator[str], request_id: str) -> AsyncIterator[str]:
+        """Yield the fragments of a started reply stream as plain text chunks."""
+        try:
+            async for text in fragments:
+                yield text
+        except EmailSkipped:
+            return
+        except Exception as e:
+            # The status line is already sent, so the failure can only be logged
+            logger.error(f"Error streaming email {request_id}: {str(e)}")
+            ERRORS.inc("stream", type(e).__name__)
+
+    async def _process_emails(self, request: Request) -> Response:
+        """Handle a batch of emails, processing them concurrently."""
+        try:
+            data = request.get_json()
+        except ValueError as e:
+            return Response(self._error_response(f"Invalid JSON: {str(e)}"), 400)
+
+        try:
+            # Accept a bare array or an object wrapping it under "emails"
+            if isinstance(data, dict):
+                data = data.get('emails')
+
+            if not data or not isinstance(data, list):
+                return Response(self._error_response("A non-empty list of emails is required"), 400)
+
+            if len(data) > api_config.batch_max_size:
+                return Response(self._error_response(
+                    f"Batch too large: {len(data)} emails (maximum {api_config.batch_max_size})"
+                ), 413)
+
+            results = await asyncio.gather(*(
+                self._batch_item_result(index, item) for index, item in enumerate(data)
+            ))
+
+            for index, result in enumerate(results):
+                result["index"] = index
+
+            failed = sum(1 for result in results if result["status"] == "error")
+
+            return Response({
+                "status": "success" if not failed else "partial",
+                "count": len(results),
+                "failed": failed,
+                "results": results
+            }, 200)
+
+        except Exception as e:
+            logger.error(f"Error processing email batch: {str(e)}")
+            ERRORS.inc("batch", type(e).__name__)
+            return Response(self._error_response(f"Server error: {str(e)}"), 500)
+
+    async def _batch_item_result(self, index: int, item: Any) -> Dict[str, Any]:
+        """Process one batch item without failing the batch."""
+        email, error = parse_email_payload(item if isinstance(item, dict) else None)
+        if error:
+            return self._error_response(error)
+
+        try:
+            async with self.batch_semaphore:
+                # Each email is its own request, linked to the batch by the context
+                with tracer.request("batch item", str(uuid.uuid4()), index=index):
+                    result = await self.assistant.process_email(email)
+            return result.to_dict()
+        except Exception as e:
+            logger.error(f"Error processing batch item {index}: {str(e)}")
+            ERRORS.inc("batch", type(e).__name__)
+            return self._error_response(f"Server error: {str(e)}")
+
+    def _idempotency_key(
+        self, request: Request, data: Dict[str, Any], email: EmailContent
+    ) -> Optional[str]:
+        """Return the idempotency key of a webhook request, if enabled."""
+        if not api_config.idempotency_enabled:
+            return None
+
+        key = request.headers.get('idempotency-key') or data.get('message_id')
+        return str(key) if key else email_fingerprint(email)
+
+    def _wants_async(self, request: Request) -> bool:
+        """Check whether a request should be processed in the background."""
+        if self.async_mode:
+            return True
+        if 'respond-async' in request.headers.get('prefer', ''):
+            return True
+        return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+    async def _enqueue_email(self, email: EmailContent, key: Optional[str] = None) -> Response:
+        """Queue an email and answer with 202 Accepted."""
+
+        async def submit():
+            return await self.job_queue.submit(email)
+
+        try:
+            if key is None:
+                job, replayed = await self.job_queue.submit(email), False
+            else:
+                job, replayed = await self.coalescer.run(f"async:{key}", submit)
+        except QueueFullError as e:
+            return Response(self._error_response(str(e)), 503, {'Retry-After': '30'})
+
+        headers = {'Location': f"/jobs/{job.request_id}"}
+        if replayed:
+            headers['Idempotent-Replayed'] = 'true'
+        return Response(job.to_dict(), 200 if job.done else 202, headers)
+
+    async def _get_job(self, request_id: str) -> Response:
+        """Return the result of an asynchronous job."""
+        job = self.job_queue.get(request_id)
+
+        if job is None:
+            return Response(self._error_response(f"Unknown job: {request_id}"), 404)
+
+        return Response(job.to_dict(), 200 if job.done else 202)
+
+    async def _health_check(self, request: Request) -> Response:
+        """Health check endpoint."""
+        assistant_stats = self.assistant.stats()
+        breaker = assistant_stats.get("circuit_breaker", {})
+
+        return Response({
+            "status": "degraded" if breaker.get("state") == "open" else "ok",
+            "timestamp": datetime.now().isoformat(),
+            "assistant": assistant_stats,
+            "jobs": self.job_queue.stats(),
+            "idempotency": self.coalescer.stats(),
+            "tracing": tracer.stats()
+        }, 200)
+
+    async def _metrics(self, request: Request) -> Response:
+        """Prometheus metrics endpoint."""
+        return Response(registry.render(), 200, media_type=CONTENT_TYPE)
+
+    async def _test_endpoint(self, request: Request) -> Response:
+        """Test endpoint."""
+        return Response({
+            "status": "success",
+            "message": "API server is running correctly",
+            "timestamp": datetime.now().isoformat()
+        }, 200)
+
+    def _error_response(self, message: str) -> Dict[str, str]:
+        """Create an error response."""
+        return {
+            "status": "error",
+            "error": message
+        }
+
+
+def create_azure_app() -> ASGIServer:
+    """Create an ASGI app with the asyncio Azure OpenAI assistant."""
+    assistant = AsyncAzureAssistant()
+    if router_config.enabled:
+        fast = None
+        if router_config.fast_deployment:
+            fast = AsyncAzureAssistant(fast_config(assistant.config))
+        assistant = AsyncTieredAssistant(assistant, fast)
+    if cache_config.enabled:
+        assistant = AsyncCachingAssistant(assistant)
+    if filter_config.enabled:
+        assistant = AsyncFilteringAssistant(assistant)
+    return ASGIServer(assistant=assistant)
+
+
+def create_mock_app() -> ASGIServer:
+    """Create an ASGI app with mock assistant for testing."""
+    assistant = MockAssistant()
+    if cache_config.enabled:
+        assistant = CachingAssistant(assistant)
+    if filter_config.enabled:
+        assistant = FilteringAssistant(assistant)
+    return ASGIServer(assistant=ThreadedAssistant(assistant))
+
+
+def run(app: ASGIServer, host: str = api_config.host, port: int = api_config.port) -> None:
+    """Serve an ASGI app with uvicorn."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("Serving the ASGI app requires uvicorn (pip install uvicorn)")
+
+    uvicorn.run(app, host=host, port=port)
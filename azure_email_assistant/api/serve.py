@@ -0,0 +1,193 @@
+"""
+Production process model for the API server.
+
+Runs the Flask app on gunicorn's threaded workers, or the ASGI app on
+uvicorn workers, instead of the single-process development server.
+"""
+import glob
+import logging
+import os
+import tempfile
+from typing import Any, Callable, Dict, Optional
+
+from gunicorn.app.base import BaseApplication
+
+from azure_email_assistant.core.config import api_config, azure_config
+from azure_email_assistant.core.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+THREADED_WORKER = "gthread"
+ASGI_WORKER = "uvicorn.workers.UvicornWorker"
+
+
+class GunicornApplication(BaseApplication):
+    """Embeds gunicorn so the server can be started from ``main.py``."""
+
+    def __init__(self, factory: Callable[[], Any], options: Dict[str, Any]):
+        """
+        Initialize the application.
+
+        Args:
+            factory: Builds the WSGI or ASGI app; called once in the master
+                when the app is preloaded, otherwise once per worker
+            options: Gunicorn settings
+        """
+        self.factory = factory
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        """Apply the settings to gunicorn."""
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        """Build the app."""
+        return self.factory()
+
+
+def server_options(
+    host: str = api_config.host,
+    port: int = api_config.port,
+    asgi: bool = False,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+    config=api_config
+) -> Dict[str, Any]:
+    """
+    Build the gunicorn settings for the API server.
+
+    Args:
+        host: Host to bind the server to
+        port: Port to bind the server to
+        asgi: Run the ASGI app on uvicorn workers
+        workers: Worker processes; defaults to ``server_workers``
+        threads: Threads per worker for the Flask app; defaults to
+            ``server_threads``
+        config: APIConfig with the process model settings
+
+    Returns:
+        Gunicorn settings
+    """
+    return {
+        "bind": f"{host}:{port}",
+        "workers": workers or config.server_workers,
+        "worker_class": ASGI_WORKER if asgi else THREADED_WORKER,
+        # Each thread holds one request, including the whole wait on Azure
+        "threads": 1 if asgi else threads or config.server_threads,
+        "preload_app": config.server_preload,
+        # Recycle workers now and then; jitter keeps them from restarting together
+        "max_requests": config.server_max_requests,
+        "max_requests_jitter": config.server_max_requests_jitter,
+        # A worker must outlive the slowest email, retries included
+        "timeout": max(config.server_timeout, int(azure_config.request_deadline) + 30),
+        "graceful_timeout": config.server_graceful_timeout,
+        "keepalive": config.server_keepalive,
+        "post_fork": _post_fork,
+        "worker_exit": _worker_exit,
+        # Not a gunicorn setting; read by the hooks
+        "metrics_dir": config.server_metrics_dir
+    }
+
+
+def metrics_directory(path: str = "") -> str:
+    """
+    Prepare the directory the workers share their metrics through.
+
+    Args:
+        path: Directory to use; a temporary one is created when empty
+
+    Returns:
+        The directory, without the files of an earlier run
+    """
+    if not path:
+        return tempfile.mkdtemp(prefix="email-assistant-metrics-")
+    os.makedirs(path, exist_ok=True)
+    for name in glob.glob(os.path.join(path, "*.json")):
+        os.remove(name)
+    return path
+
+
+def _post_fork(arbiter: Any, worker: Any) -> None:
+    """Gunicorn hook: report the metrics of all workers from each of them."""
+    directory = arbiter.app.options.get("metrics_dir")
+    if directory:
+        registry.share(directory)
+
+
+def _worker_exit(arbiter: Any, worker: Any) -> None:
+    """Gunicorn hook: drain the Flask server of an exiting worker.
+
+    Gunicorn has already let in-flight requests finish; this waits for
+    running async jobs and spools the ones that cannot finish in time.
+    ASGI apps do the same from their lifespan shutdown. The worker's
+    counters are then handed to the workers that remain.
+    """
+    extensions = getattr(getattr(worker, "wsgi", None), "extensions", None) or {}
+    api_server = extensions.get("api_server")
+    if api_server is not None:
+        api_server.shutdown()
+    registry.retire()
+
+
+def describe_capacity(options: Dict[str, Any]) -> str:
+    """Summarize how many emails the configured process model can hold at once."""
+    workers = options["workers"]
+    if options["worker_class"] == ASGI_WORKER:
+        connections = azure_config.async_max_connections
+        return (
+            f"{workers} worker(s) x {connections} Azure connections = "
+            f"{workers * connections} concurrent emails"
+        )
+
+    threads = options["threads"]
+    return (
+        f"{workers} worker(s) x {threads} thread(s) = "
+        f"{workers * threads} concurrent requests"
+    )
+
+
+def serve(
+    factory: Callable[[], Any],
+    host: str = api_config.host,
+    port: int = api_config.port,
+    asgi: bool = False,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None
+) -> None:
+    """
+    Run the API server under gunicorn.
+
+    Send SIGHUP to the master to reload workers gracefully and SIGTERM to
+    stop after in-flight requests finish (up to ``server_graceful_timeout``).
+
+    Args:
+        factory: Builds the WSGI or ASGI app
+        host: Host to bind the server to
+        port: Port to bind the server to
+        asgi: Run the ASGI app on uvicorn workers
+        workers: Worker processes; defaults to ``server_workers``
+        threads: Threads per worker; defaults to ``server_threads``
+    """
+    options = server_options(host, port, asgi=asgi, workers=workers, threads=threads)
+    options["metrics_dir"] = metrics_directory(options["metrics_dir"])
+
+    logger.info(f"Serving on http://{options['bind']} with {options['worker_class']} workers")
+    logger.info(f"Capacity: {describe_capacity(options)}")
+    logger.info(
+        f"Preload: {options['preload_app']}, recycle after {options['max_requests']} "
+        f"(+{options['max_requests_jitter']}) requests, worker timeout {options['timeout']}s, "
+        f"graceful timeout {options['graceful_timeout']}s"
+    )
+    logger.info(f"Workers share their metrics through {options['metrics_dir']}")
+    if options["workers"] > 1 and (azure_config.rate_limit_rpm or azure_config.rate_limit_tpm):
+        logger.warning(
+            f"Rate limits are enforced per worker; {options['workers']} workers "
+            f"may together use up to {options['workers']}x the configured quota"
+        )
+
+    GunicornApplication(factory, options).run()
@@ -1,16 +1,37 @@
 """
 API server for the Azure Email Assistant.
 """
+import contextvars
+import functools
 import logging
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple, Union
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, g, request, jsonify, Response
+from werkzeug.serving import BaseWSGIServer, make_server
 
 from azure_email_assistant.core.assistant import (
-    BaseAssistant, AzureAssistant, MockAssistant, EmailContent
+    AssistantResponse, BaseAssistant, AzureAssistant, MockAssistant, EmailContent
 )
-from azure_email_assistant.core.config import api_config
+from azure_email_assistant.core.cache import CachingAssistant
+from azure_email_assistant.core.config import api_config, cache_config, filter_config, router_config
+from azure_email_assistant.core.filters import EmailSkipped, FilteringAssistant
+from azure_email_assistant.core.idempotency import (
+    RequestCoalescer, email_fingerprint, reusable_result
+)
+from azure_email_assistant.core.jobs import JobQueue, QueueFullError, job_persistence
+from azure_email_assistant.core.metrics import (
+    CONTENT_TYPE, ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, registry
+)
+from azure_email_assistant.core.router import TieredAssistant, fast_config
+from azure_email_assistant.core.shutdown import DrainController
+from azure_email_assistant.core.streaming import format_sse_event
+from azure_email_assistant.core.tracing import tracer
 
 
 # Configure logging
@@ -29,7 +50,9 @@ class APIServer:
         assistant: BaseAssistant,
         host: str = api_config.host,
         port: int = api_config.port,
-        secret_key: str = api_config.secret_key
+        secret_key: str = api_config.secret_key,
+        async_mode: bool = api_config.async_mode,
+        job_queue: Optional[JobQueue] = None
     ):
         """
         Initialize the API server.
@@ -39,14 +62,53 @@ class APIServer:
             host: Host to bind the server to
             port: Port to bind the server to
             secret_key: Secret key for Flask
+            async_mode: Queue every webhook email instead of only those
+                that ask for it with ``Prefer: respond-async``
+            job_queue: Queue for asynchronous processing; a default one
+                backed by ``assistant`` is created when omitted
         """
         self.assistant = assistant
         self.host = host
         self.port = port
+        self.async_mode = async_mode
+        self.job_queue = job_queue or JobQueue(
+            assistant,
+            workers=api_config.job_workers,
+            max_queue_size=api_config.job_queue_size,
+            result_ttl=api_config.job_result_ttl,
+            **job_persistence()
+        )
+        
+        # Tracks in-flight webhooks so shutdown can let them finish
+        self.drain = DrainController(timeout=api_config.drain_timeout)
+        
+        # Duplicate webhook deliveries share one assistant call
+        self.coalescer = RequestCoalescer(
+            ttl=api_config.idempotency_ttl,
+            is_reusable=reusable_result
+        )
+        
+        # Shared by all batch requests so concurrent batches stay bounded
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=api_config.batch_concurrency,
+            thread_name_prefix="email-batch"
+        )
+        
+        # Development server started by run()
+        self.http_server: Optional[BaseWSGIServer] = None
         
         # Initialize Flask app
         self.app = Flask(__name__)
         self.app.config['SECRET_KEY'] = secret_key
+        self.app.extensions['api_server'] = self
+        
+        # Start job workers in the serving process, picking up spooled jobs
+        self.app.before_request(self.job_queue.start)
+        
+        # Count and time every request for /metrics
+        self.app.before_request(self._start_request)
+        self.app.after_request(self._finish_request)
+        self.app.teardown_request(self._end_request)
         
         # Register routes
         self._register_routes()
@@ -55,53 +117,361 @@ class APIServer:
         """Register API routes."""
         self.app.add_url_rule(
             '/webhook/email',
-            view_func=self._process_email,
+            view_func=self._admitted(self._process_email),
+            methods=['POST']
+        )
+        self.app.add_url_rule(
+            '/webhook/email/stream',
+            view_func=self._admitted(self._stream_email),
             methods=['POST']
         )
+        self.app.add_url_rule(
+            '/webhook/emails',
+            view_func=self._admitted(self._process_emails),
+            methods=['POST']
+        )
+        self.app.add_url_rule(
+            '/jobs/<request_id>',
+            view_func=self._get_job,
+            methods=['GET']
+        )
         self.app.add_url_rule(
             '/health',
             view_func=self._health_check,
             methods=['GET']
         )
+        self.app.add_url_rule(
+            '/metrics',
+            view_func=self._metrics,
+            methods=['GET']
+        )
         self.app.add_url_rule(
             '/test',
             view_func=self._test_endpoint,
             methods=['GET']
         )
     
+    def _start_request(self) -> None:
+        """Start timing a request."""
+        g.request_started = time.monotonic()
+        HTTP_IN_FLIGHT.inc()
+    
+    def _finish_request(self, response: Response) -> Response:
+        """Count a request by status and record the time to its headers."""
+        started = g.get('request_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+            HTTP_LATENCY.observe(time.monotonic() - started, route)
+        return response
+    
+    def _end_request(self, error: Optional[BaseException] = None) -> None:
+        """Stop counting a request as in flight."""
+        if g.pop('request_started', None) is not None:
+            HTTP_IN_FLIGHT.dec()
+    
+    def _admitted(self, view: Callable[..., Any]) -> Callable[..., Any]:
+        """Refuse a webhook while draining and count it as in flight otherwise."""
+        
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.drain.try_enter():
+                response = jsonify(self._error_response("Server is shutting down"))
+                response.headers['Retry-After'] = str(api_config.drain_retry_after)
+                return response, 503
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.drain.exit()
+        
+        return wrapper
+    
     def _process_email(self) -> Tuple[Response, int]:
         """Handle incoming email webhook."""
+        with tracer.request("POST /webhook/email"):
+            try:
+                data = request.get_json()
+                email, error = self._parse_email(data)
+                
+                if error:
+                    return self._error_response(error), 400
+                
+                key = self._idempotency_key(data, email)
+                
+                if self._wants_async():
+                    return self._enqueue_email(email, key)
+                
+                # Process the email, sharing the call with duplicate deliveries
+                if key is None:
+                    result, replayed = self.assistant.process_email(email), False
+                else:
+                    result, replayed = self.coalescer.run(
+                        f"sync:{key}", lambda: self.assistant.process_email(email)
+                    )
+                
+                with tracer.span("serialize"):
+                    response = jsonify(result.to_dict())
+                if replayed:
+                    response.headers['Idempotent-Replayed'] = 'true'
+                return response, 200
+                
+            except Exception as e:
+                logger.error(f"Error processing email: {str(e)}")
+                ERRORS.inc("webhook", type(e).__name__)
+                return self._error_response(f"Server error: {str(e)}"), 500
+    
+    def _stream_email(self) -> Union[Response, Tuple[Response, int]]:
+        """Handle an email webhook, streaming the reply as it is generated.
+        
+        Replies are sent as server-sent events (``start``, ``delta``,
+        ``done`` or ``error``), or as a plain chunked text body when the
+        request has ``?format=text``.
+        """
+        try:
+            email, error = self._parse_email(request.get_json())
+            
+            if error:
+                return self._error_response(error), 400
+            
+        except Exception as e:
+            logger.error(f"Error processing email: {str(e)}")
+            ERRORS.inc("webhook", type(e).__name__)
+            return self._error_response(f"Server error: {str(e)}"), 500
+        
+        request_id = str(uuid.uuid4())
+        
+        if request.args.get('format') == 'text':
+            # A plain text body has no way to say the email was skipped
+            try:
+                fragments = self.assistant.stream_email(email)
+            except EmailSkipped as e:
+                return jsonify(AssistantResponse(status="skipped", reason=e.rule).to_dict()), 200
+            
+            return Response(
+                self._stream_text(fragments, request_id),
+                mimetype='text/plain',
+                headers={'X-Request-ID': request_id}
+            )
+        
+        return Response(
+            self._stream_events(email, request_id),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'X-Request-ID': request_id
+            }
+        )
+    
+    def _stream_events(self, email: EmailContent, request_id: str) -> Iterator[str]:
+        """Yield the assistant reply as server-sent events."""
+        # The body is generated after the view returned, so it is traced on its own
+        with tracer.request("POST /webhook/email/stream", request_id):
+            yield from self._stream_event_body(email, request_id)
+    
+    def _stream_event_body(self, email: EmailContent, request_id: str) -> Iterator[str]:
+        """Yield the events of a streamed reply."""
+        yield format_sse_event("start", {"request_id": request_id})
+        
+        # The body outlives the view, so the stream is tracked on its own
+        self.drain.enter()
+        try:
+            for text in self.assistant.stream_email(email):
+                yield format_sse_event("delta", {"text": text})
+        except EmailSkipped as e:
+            yield format_sse_event("done", {
+                "status": "skipped",
+                "request_id": request_id,
+                "reason": e.rule,
+                "timestamp": datetime.now().isoformat()
+            })
+            return
+        except Exception as e:
+            logger.error(f"Error streaming email: {str(e)}")
+            ERRORS.inc("stream", type(e).__name__)
+            yield format_sse_event("error", {
+                "status": "error",
+                "request_id": request_id,
+                "error": str(e)
+            })
+            return
+        finally:
+            self.drain.exit()
+        
+        yield format_sse_event("done", {
+            "status": "success",
+            "request_id": request_id,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    def _stream_text(self, fragments: Iterator[str], request_id: str) -> Iterator[str]:
+        """Yield the fragments of a started reply stream as plain text chunks."""
+        self.drain.enter()
+        try:
+            with tracer.request("POST /webhook/email/stream", request_id):
+                for text in fragments:
+                    yield text
+        except EmailSkipped:
+            pass
+        except Exception as e:
+            # The status line is already sent, so the failure can only be logged
+            logger.error(f"Error streaming email {request_id}: {str(e)}")
+            ERRORS.inc("stream", type(e).__name__)
+        finally:
+            self.drain.exit()
+    
+    def _process_emails(self) -> Tuple[Response, int]:
+        """Handle a batch of emails, processing them concurrently."""
+        with tracer.request("POST /webhook/emails"):
+            return self._process_batch()
+    
+    def _process_batch(self) -> Tuple[Response, int]:
+        """Process the emails of a batch request."""
         try:
             data = request.get_json()
             
-            if not data:
-                return self._error_response("No data provided"), 400
+            # Accept a bare array or an object wrapping it under "emails"
+            if isinstance(data, dict):
+                data = data.get('emails')
             
-            from_email = data.get('from_email')
-            subject = data.get('subject')
-            body = data.get('body')
+            if not data or not isinstance(data, list):
+                return self._error_response("A non-empty list of emails is required"), 400
             
-            if not from_email or not subject or not body:
+            if len(data) > api_config.batch_max_size:
                 return self._error_response(
-                    "From email, subject, and body are required"
-                ), 400
+                    f"Batch too large: {len(data)} emails (maximum {api_config.batch_max_size})"
+                ), 413
+            
+            results: List[Dict[str, Any]] = [{} for _ in data]
+            futures = {}
+            for index, item in enumerate(data):
+                email, error = self._parse_email(item if isinstance(item, dict) else None)
+                if error:
+                    results[index] = self._error_response(error)
+                else:
+                    # Each email is its own request, linked to the batch by the context
+                    futures[index] = self.batch_executor.submit(
+                        contextvars.copy_context().run, self._process_batch_item, index, email
+                    )
+            
+            for index, future in futures.items():
+                results[index] = self._batch_item_result(index, future)
+            
+            for index, result in enumerate(results):
+                result["index"] = index
             
-            # Process the email
-            email = EmailContent(from_email=from_email, subject=subject, body=body)
-            result = self.assistant.process_email(email)
+            failed = sum(1 for result in results if result["status"] == "error")
             
-            return jsonify(result.to_dict()), 200
+            with tracer.span("serialize"):
+                return jsonify({
+                    "status": "success" if not failed else "partial",
+                    "count": len(results),
+                    "failed": failed,
+                    "results": results
+                }), 200
             
         except Exception as e:
-            logger.error(f"Error processing email: {str(e)}")
+            logger.error(f"Error processing email batch: {str(e)}")
+            ERRORS.inc("batch", type(e).__name__)
             return self._error_response(f"Server error: {str(e)}"), 500
     
+    def _process_batch_item(self, index: int, email: EmailContent) -> AssistantResponse:
+        """Process one email of a batch under a request id of its own."""
+        with tracer.request("batch item", str(uuid.uuid4()), index=index):
+            return self.assistant.process_email(email)
+    
+    def _batch_item_result(self, index: int, future: Future) -> Dict[str, Any]:
+        """Collect the outcome of one batch item without failing the batch."""
+        try:
+            return future.result().to_dict()
+        except Exception as e:
+            logger.error(f"Error processing batch item {index}: {str(e)}")
+            ERRORS.inc("batch", type(e).__name__)
+            return self._error_response(f"Server error: {str(e)}")
+    
+    def _parse_email(
+        self, data: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[EmailContent], Optional[str]]:
+        """Validate a webhook payload and build the email content."""
+        return parse_email_payload(data)
+    
+    def _idempotency_key(self, data: Dict[str, Any], email: EmailContent) -> Optional[str]:
+        """Return the idempotency key of a webhook request, if enabled.
+        
+        An explicit ``Idempotency-Key`` header wins, then a ``message_id``
+        in the payload, then a fingerprint of the email content.
+        """
+        if not api_config.idempotency_enabled:
+            return None
+        
+        key = request.headers.get('Idempotency-Key') or data.get('message_id')
+        return str(key) if key else email_fingerprint(email)
+    
+    def _wants_async(self) -> bool:
+        """Check whether the current request should be processed in the background."""
+        if self.async_mode:
+            return True
+        if 'respond-async' in request.headers.get('Prefer', ''):
+            return True
+        return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+    
+    def _enqueue_email(self, email: EmailContent, key: Optional[str] = None) -> Tuple[Response, int]:
+        """Queue an email and answer with 202 Accepted."""
+        try:
+            if key is None:
+                job, replayed = self.job_queue.submit(email), False
+            else:
+                job, replayed = self.coalescer.run(
+                    f"async:{key}", lambda: self.job_queue.submit(email)
+                )
+        except QueueFullError as e:
+            response = jsonify(self._error_response(str(e)))
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        response = jsonify(job.to_dict())
+        response.headers['Location'] = f"/jobs/{job.request_id}"
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response, 200 if job.done else 202
+    
+    def _get_job(self, request_id: str) -> Tuple[Response, int]:
+        """Return the result of an asynchronous job."""
+        job = self.job_queue.get(request_id)
+        
+        if job is None:
+            return self._error_response(f"Unknown job: {request_id}"), 404
+        
+        if not job.done:
+            return jsonify(job.to_dict()), 202
+        
+        return jsonify(job.to_dict()), 200
+    
     def _health_check(self) -> Tuple[Response, int]:
         """Health check endpoint."""
+        assistant_stats = self.assistant.stats()
+        breaker = assistant_stats.get("circuit_breaker", {})
+        
+        if self.drain.draining:
+            status = "draining"
+        elif breaker.get("state") == "open":
+            status = "degraded"
+        else:
+            status = "ok"
+        
         return jsonify({
-            "status": "ok",
-            "timestamp": datetime.now().isoformat()
-        }), 200
+            "status": status,
+            "timestamp": datetime.now().isoformat(),
+            "assistant": assistant_stats,
+            "jobs": self.job_queue.stats(),
+            "idempotency": self.coalescer.stats(),
+            "drain": self.drain.stats(),
+            "tracing": tracer.stats()
+        }), 503 if self.drain.draining else 200
+    
+    def _metrics(self) -> Response:
+        """Prometheus metrics endpoint."""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
     
     def _test_endpoint(self) -> Tuple[Response, int]:
         """Test endpoint."""
@@ -118,16 +488,119 @@ class APIServer:
             "error": message
         }
     
+    def shutdown(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Drain the server before exiting.
+        
+        New webhooks are refused with 503, in-flight ones get up to
+        ``timeout`` seconds to finish, and async jobs that did not finish
+        in that time are written to the job spool.
+        
+        Args:
+            timeout: Seconds to wait; defaults to ``drain_timeout``
+            
+        Returns:
+            Summary of what was left unfinished
+        """
+        timeout = self.drain.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        
+        self.drain.start()
+        drained = self.drain.wait(timeout)
+        if not drained:
+            logger.warning(
+                f"Drain timeout of {timeout:.0f}s reached with "
+                f"{self.drain.stats()['in_flight']} request(s) in flight"
+            )
+        
+        spooled = self.job_queue.flush(max(deadline - time.monotonic(), 0.0))
+        self.batch_executor.shutdown(wait=False)
+        tracer.flush(max(deadline - time.monotonic(), 0.0))
+        
+        logger.info(f"Shutdown complete: {spooled} job(s) spooled")
+        return {"drained": drained, "spooled_jobs": spooled}
+    
+    def install_signal_handlers(self) -> None:
+        """Drain on SIGTERM, then stop the development server."""
+        
+        def handle_sigterm(signum, frame):
+            # Refuse new webhooks at once; wait for in-flight ones off the signal path
+            if self.drain.start():
+                threading.Thread(
+                    target=self._shutdown_and_stop, name="api-server-drain", daemon=True
+                ).start()
+        
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    def _shutdown_and_stop(self) -> None:
+        """Drain, then stop the development server."""
+        self.shutdown()
+        if self.http_server is not None:
+            self.http_server.shutdown()
+    
     def run(self) -> None:
         """Run the API server."""
-        self.app.run(host=self.host, port=self.port)
+        self.http_server = make_server(self.host, self.port, self.app, threaded=True)
+        self.install_signal_handlers()
+        logger.info(f"Development server listening on http://{self.host}:{self.port}")
+        try:
+            self.http_server.serve_forever()
+        finally:
+            self.http_server.server_close()
+
+
+def parse_email_payload(
+    data: Optional[Dict[str, Any]]
+) -> Tuple[Optional[EmailContent], Optional[str]]:
+    """
+    Validate a webhook payload and build the email content.
+    
+    Args:
+        data: Decoded JSON body of the request
+        
+    Returns:
+        Tuple of the email, or None, and an error message, or None
+    """
+    if not data:
+        return None, "No data provided"
+    
+    from_email = data.get('from_email')
+    subject = data.get('subject')
+    body = data.get('body')
+    
+    if not from_email or not subject or not body:
+        return None, "From email, subject, and body are required"
+    
+    return EmailContent(from_email=from_email, subject=subject, body=body), None
 
 
 def create_azure_server() -> APIServer:
     """Create an API server with Azure OpenAI assistant."""
-    return APIServer(assistant=AzureAssistant())
+    return APIServer(assistant=_with_filter(_with_cache(_with_router(AzureAssistant()))))
 
 
 def create_mock_server() -> APIServer:
     """Create an API server with mock assistant for testing."""
-    return APIServer(assistant=MockAssistant())
+    return APIServer(assistant=_with_filter(_with_cache(MockAssistant())))
+
+
+def _with_cache(assistant: BaseAssistant) -> BaseAssistant:
+    """Wrap an assistant in the response cache if it is enabled."""
+    if cache_config.enabled:
+        return CachingAssistant(assistant)
+    return assistant
+
+
+def _with_router(assistant: AzureAssistant) -> BaseAssistant:
+    """Put the tier router in front of the reasoning assistant if it is enabled."""
+    if not router_config.enabled:
+        return assistant
+    fast = AzureAssistant(fast_config(assistant.config)) if router_config.fast_deployment else None
+    return TieredAssistant(assistant, fast)
+
+
+def _with_filter(assistant: BaseAssistant) -> BaseAssistant:
+    """Put the pre-send filter in front of an assistant if it is enabled."""
+    if filter_config.enabled:
+        return FilteringAssistant(assistant)
+    return assistant
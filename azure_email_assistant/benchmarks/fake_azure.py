@@ -0,0 +1,524 @@
+"""
+Local stand-in for the Azure OpenAI chat completions API.
+
+Serves ``POST /openai/deployments/<deployment>/chat/completions`` with
+replies that have a ``<think>`` section, as DeepSeek-R1 sends them, after
+a configurable delay. Replies can be streamed, and throttling (429 with
+Retry-After) and server errors can be injected. Point
+``AzureConfig.endpoint`` at it to run the real client code under load::
+
+    python -m azure_email_assistant.benchmarks.fake_azure --port 8081 \\
+        --latency lognormal:1.5:0.5 --token-interval 0.01 --throttle-rate 0.05
+
+``GET /stats`` returns request counts by status code and the peak number
+of requests in flight.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from azure_email_assistant.core.tokens import estimate_prompt_tokens, estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+COMPLETIONS_PATH = re.compile(r'^/openai/deployments/([^/]+)/chat/completions$')
+
+THINK_WORDS = (
+    "the customer asks about their order so I should check what the documents say about "
+    "delivery times and answer politely in the language of the email then sign it"
+).split()
+REPLY_WORDS = (
+    "thank you for your message we have checked your order and it will be shipped within "
+    "two working days please let us know if you have any further questions"
+).split()
+
+
+class Distribution:
+    """Random distribution of a duration or size, parsed from ``kind:arg[:arg]``.
+
+    Supported kinds are ``fixed:value``, ``uniform:low:high``,
+    ``normal:mean:stddev``, ``lognormal:median:sigma`` and
+    ``exponential:mean``. Samples are never negative.
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, spec: str):
+        """
+        Parse a distribution.
+
+        Args:
+            spec: Distribution spec, for example ``lognormal:1.5:0.5``
+
+        Raises:
+            ValueError: If the spec is malformed
+        """
+        kind, *args = spec.split(":")
+        if kind not in self.KINDS:
+            raise ValueError(
+                f"Unknown distribution {kind!r}, expected one of {sorted(self.KINDS)}"
+            )
+        if len(args) != self.KINDS[kind]:
+            raise ValueError(f"{kind} takes {self.KINDS[kind]} argument(s), got {spec!r}")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+
+    def sample(self, generator: random.Random) -> float:
+        """Draw one value."""
+        if self.kind == "fixed":
+            value = self.args[0]
+        elif self.kind == "uniform":
+            value = generator.uniform(*self.args)
+        elif self.kind == "normal":
+            value = generator.gauss(*self.args)
+        elif self.kind == "lognormal":
+            median, sigma = self.args
+            value = generator.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        else:
+            value = generator.expovariate(1 / self.args[0]) if self.args[0] > 0 else 0.0
+        return max(value, 0.0)
+
+    def __repr__(self) -> str:
+        return f"Distribution({self.spec!r})"
+
+
+@dataclass
+class FakeAzureScenario:
+    """Behaviour of the fake server.
+
+    Every completion waits ``latency`` seconds (prompt processing), then
+    generates ``think_words`` words of reasoning and ``reply_words`` words
+    of reply at ``token_interval`` seconds per word. Durations are
+    multiplied by ``time_scale``.
+    """
+    latency: str = "lognormal:1.0:0.5"
+    token_interval: float = 0.01
+    think_words: str = "uniform:100:400"
+    reply_words: str = "uniform:40:120"
+    chunk_words: int = 1
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [500, 503])
+    time_scale: float = 1.0
+    api_key: str = ""
+    seed: Optional[int] = None
+
+
+class FakeAzureServer:
+    """Threaded HTTP server answering like Azure OpenAI chat completions."""
+
+    def __init__(
+        self,
+        scenario: Optional[FakeAzureScenario] = None,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            scenario: Behaviour of the server; the defaults when omitted
+            host: Address to bind to
+            port: Port to bind to; 0 picks a free one
+        """
+        self.scenario = scenario or FakeAzureScenario()
+        self.latency = Distribution(self.scenario.latency)
+        self.think_words = Distribution(self.scenario.think_words)
+        self.reply_words = Distribution(self.scenario.reply_words)
+        self.random = random.Random(self.scenario.seed)
+
+        self._lock = threading.Lock()
+        self._statuses: Dict[int, int] = {}
+        self._streams = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+
+        self.http_server = _HTTPServer((host, port), _Handler)
+        self.http_server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        """Base URL to use as ``AzureConfig.endpoint``."""
+        host, port = self.http_server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeAzureServer":
+        """Serve requests in a background thread."""
+        # A short poll interval lets benchmarks stop the server without a pause
+        self._thread = threading.Thread(
+            target=self.http_server.serve_forever, kwargs={"poll_interval": 0.05},
+            name="fake-azure", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        if self._thread is not None:
+            self.http_server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.http_server.server_close()
+
+    def __enter__(self) -> "FakeAzureServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request counts by status code and the peak concurrency."""
+        with self._lock:
+            return {
+                "requests": sum(self._statuses.values()),
+                "statuses": {str(status): count for status, count in sorted(self._statuses.items())},
+                "streams": self._streams,
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight
+            }
+
+    def draw(self) -> Tuple[str, float, int, int]:
+        """
+        Decide the outcome of one completion.
+
+        Returns:
+            Tuple of the outcome (``ok``, ``throttled`` or ``error``), the
+            latency in seconds, and the think and reply word counts
+        """
+        scenario = self.scenario
+        with self._lock:
+            roll = self.random.random()
+            latency = self.latency.sample(self.random) * scenario.time_scale
+            think = int(round(self.think_words.sample(self.random)))
+            reply = max(int(round(self.reply_words.sample(self.random))), 1)
+        if roll < scenario.throttle_rate:
+            return "throttled", 0.0, 0, 0
+        if roll < scenario.throttle_rate + scenario.error_rate:
+            return "error", latency, 0, 0
+        return "ok", latency, think, reply
+
+    def error_status(self) -> int:
+        """Pick the status code of an injected server error."""
+        with self._lock:
+            return self.random.choice(self.scenario.error_statuses)
+
+    def enter(self) -> None:
+        """Count a request as in flight."""
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def exit(self, status: int, stream: bool) -> None:
+        """Record the status of a finished request."""
+        with self._lock:
+            self._in_flight -= 1
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            if stream:
+                self._streams += 1
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """HTTP server with a listen backlog sized for load tests."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+    fake: FakeAzureServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of the fake server."""
+
+    # Keep-alive, so the client's connection pool behaves as against Azure
+    protocol_version = "HTTP/1.1"
+    server: _HTTPServer
+
+    def do_GET(self) -> None:
+        """Serve the request statistics."""
+        if urlsplit(self.path).path != "/stats":
+            self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+            return
+        self._send_json(200, self.server.fake.stats())
+
+    def do_POST(self) -> None:
+        """Serve a chat completion."""
+        fake = self.server.fake
+        url = urlsplit(self.path)
+        match = COMPLETIONS_PATH.match(url.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if match is None:
+            self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+            return
+        if "api-version" not in parse_qs(url.query):
+            self._send_json(400, {"error": {"code": "BadRequest", "message": "api-version is required"}})
+            return
+        if fake.scenario.api_key and self.headers.get("api-key") != fake.scenario.api_key:
+            self._send_json(401, {"error": {
+                "code": "401", "message": "Access denied due to invalid subscription key"
+            }})
+            return
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": {"code": "BadRequest", "message": "Invalid request body"}})
+            return
+
+        stream = bool(request.get("stream"))
+        status = 200
+        fake.enter()
+        try:
+            status = self._complete(match.group(1), request, messages, stream)
+        finally:
+            fake.exit(status, stream)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Log requests at debug level only; load tests send thousands."""
+        logger.debug(format % args)
+
+    def _complete(
+        self,
+        deployment: str,
+        request: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        stream: bool
+    ) -> int:
+        """Answer a valid completion request; returns the status code sent."""
+        fake = self.server.fake
+        scenario = fake.scenario
+        outcome, latency, think, reply = fake.draw()
+
+        if outcome == "throttled":
+            retry_after = scenario.retry_after * scenario.time_scale
+            self._send_json(429, {"error": {
+                "code": "429",
+                "message": f"Requests to the ChatCompletions_Create Operation have exceeded "
+                           f"the rate limit. Please retry after {math.ceil(retry_after)} seconds."
+            }}, headers={
+                "Retry-After": str(math.ceil(retry_after)),
+                "retry-after-ms": str(int(retry_after * 1000))
+            })
+            return 429
+
+        time.sleep(latency)
+        if outcome == "error":
+            status = fake.error_status()
+            self._send_json(status, {"error": {"code": str(status), "message": "The server had an error"}})
+            return status
+
+        # Words stand in for tokens; the completion stops at max_tokens like the real API
+        words = _words(THINK_WORDS, think) + _words(REPLY_WORDS, reply)
+        finish_reason = "stop"
+        limit = request.get("max_tokens")
+        if limit and len(words) > limit:
+            words = words[:limit]
+            finish_reason = "length"
+        pieces = _reply_pieces(think, words)
+
+        content = "".join(pieces)
+        usage = {"prompt_tokens": estimate_prompt_tokens(messages)}
+        usage.update(_completion_usage(content))
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        if stream:
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(
+                completion_id, deployment, pieces, finish_reason,
+                usage if include_usage else None
+            )
+            return 200
+
+        time.sleep(len(pieces) * scenario.token_interval * scenario.time_scale)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+        return 200
+
+    def _stream(
+        self,
+        completion_id: str,
+        deployment: str,
+        pieces: List[str],
+        finish_reason: str,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Send the completion as server-sent events, one chunk per group of words.
+
+        With ``usage`` given, as for ``stream_options.include_usage``, every
+        chunk carries ``"usage": null`` and one more chunk without choices
+        reports the token usage before ``[DONE]``.
+        """
+        scenario = self.server.fake.scenario
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices: List[Dict[str, Any]], chunk_usage: Optional[Dict[str, Any]] = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": choices
+            }
+            if usage is not None:
+                data["usage"] = chunk_usage
+            return "data: " + json.dumps(data) + "\n\n"
+
+        def chunk(delta: Dict[str, Any], reason: Optional[str] = None) -> str:
+            return event([{"index": 0, "delta": delta, "finish_reason": reason}])
+
+        size = max(scenario.chunk_words, 1)
+        delay = scenario.token_interval * size * scenario.time_scale
+        try:
+            self._write_chunk(chunk({"role": "assistant", "content": ""}))
+            for start in range(0, len(pieces), size):
+                time.sleep(delay)
+                self._write_chunk(chunk({"content": "".join(pieces[start:start + size])}))
+            tail = chunk({}, finish_reason)
+            if usage is not None:
+                tail += event([], usage)
+            self._write_chunk(tail + "data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the stream
+            self.close_connection = True
+
+    def _write_chunk(self, text: str) -> None:
+        """Write one HTTP chunk."""
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(
+        self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Send a complete JSON response."""
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _words(vocabulary: List[str], count: int) -> List[str]:
+    """Repeat a vocabulary to ``count`` words."""
+    return [vocabulary[index % len(vocabulary)] for index in range(count)]
+
+
+def _reply_pieces(think: int, words: List[str]) -> List[str]:
+    """Lay words out as a DeepSeek-R1 reply, one piece per generated word."""
+    pieces = []
+    for index, word in enumerate(words):
+        if index == 0 and think:
+            pieces.append("<think>\n" + word)
+        elif index == think and think:
+            pieces.append("\n</think>\n\nDear Customer,<br><br>" + word.capitalize())
+        elif index == 0:
+            pieces.append("Dear Customer,<br><br>" + word.capitalize())
+        else:
+            pieces.append(" " + word)
+    if len(words) > think:
+        pieces.append(".<br><br>Best regards,<br>Gergő Krucsai<br>SMP Solution")
+    return pieces
+
+
+def _completion_usage(content: str) -> Dict[str, Any]:
+    """Estimate the completion and reasoning tokens of a reply."""
+    # A reply cut off at max_tokens may end inside the thinking section
+    thinking = content.split("</think>", 1)[0] if content.startswith("<think>") else ""
+    return {
+        "completion_tokens": estimate_tokens(content),
+        "completion_tokens_details": {"reasoning_tokens": estimate_tokens(thinking)}
+    }
+
+
+def main() -> None:
+    """Run the fake server until interrupted."""
+    defaults = FakeAzureScenario()
+    parser = argparse.ArgumentParser(description="Local Azure OpenAI chat completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind to")
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on")
+    parser.add_argument("--latency", default=defaults.latency,
+                        help="Seconds before the first token, e.g. fixed:0.5 or lognormal:1.0:0.5")
+    parser.add_argument("--token-interval", type=float, default=defaults.token_interval,
+                        help="Seconds per generated word")
+    parser.add_argument("--think-words", default=defaults.think_words,
+                        help="Words in the <think> section, e.g. uniform:100:400 or fixed:0")
+    parser.add_argument("--reply-words", default=defaults.reply_words, help="Words in the reply")
+    parser.add_argument("--chunk-words", type=int, default=defaults.chunk_words,
+                        help="Words per streamed chunk")
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate,
+                        help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after,
+                        help="Retry-After of throttled requests in seconds")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate,
+                        help="Share of requests answered with a 5xx error")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=defaults.error_statuses,
+                        help="Status codes of injected errors")
+    parser.add_argument("--time-scale", type=float, default=defaults.time_scale,
+                        help="Multiplier of every delay")
+    parser.add_argument("--api-key", default="", help="Require this api-key header")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    scenario = FakeAzureScenario(
+        latency=args.latency,
+        token_interval=args.token_interval,
+        think_words=args.think_words,
+        reply_words=args.reply_words,
+        chunk_words=args.chunk_words,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        time_scale=args.time_scale,
+        api_key=args.api_key,
+        seed=args.seed
+    )
+    server = FakeAzureServer(scenario, args.host, args.port)
+    logger.info(f"Fake Azure OpenAI listening on {server.endpoint}")
+    try:
+        server.http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.http_server.server_close()
+
+
+if __name__ == "__main__":
+    main()
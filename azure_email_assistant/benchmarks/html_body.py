@@ -0,0 +1,145 @@
+"""
+Benchmark of HTML body normalization against sending the raw body.
+
+Run with ``python -m azure_email_assistant.benchmarks.html_body``.
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.config import PreprocessConfig, PromptConfig
+from azure_email_assistant.core.html_text import html_to_text
+from azure_email_assistant.core.preprocess import EmailPreprocessor
+from azure_email_assistant.core.tokens import PromptBudget, estimate_prompt_tokens
+
+
+OUTLOOK_HEAD = """<html xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office">
+<head><meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<style><!--
+@font-face {font-family:"Cambria Math"; panose-1:2 4 5 3 5 4 6 3 2 4;}
+p.MsoNormal, li.MsoNormal, div.MsoNormal {margin:0cm; font-size:11.0pt; font-family:"Calibri",sans-serif;}
+a:link, span.MsoHyperlink {mso-style-priority:99; color:#0563C1; text-decoration:underline;}
+--></style>
+<!--[if gte mso 9]><xml><o:shapedefaults v:ext="edit" spidmax="1026" /></xml><![endif]-->
+</head><body lang="EN-US" link="#0563C1" vlink="#954F72"><div class="WordSection1">
+"""
+OUTLOOK_PARAGRAPH = (
+    '<p class="MsoNormal"><span style="font-size:11.0pt;font-family:&quot;Calibri&quot;,'
+    'sans-serif;color:#1F497D;mso-fareast-language:EN-US">{text}<o:p></o:p></span></p>\n'
+)
+OUTLOOK_SIGNATURE = (
+    '<table class="MsoNormalTable" border="0" cellspacing="0" cellpadding="0"><tr>'
+    '<td style="padding:0cm 5.4pt 0cm 5.4pt"><p class="MsoNormal"><b><span style="color:#002060">'
+    'Jane Smith</span></b><o:p></o:p></p><p class="MsoNormal"><a href="https://example.com">'
+    '<span style="color:#0563C1">www.example.com</span></a><o:p></o:p></p>'
+    '<!--[if gte vml 1]><v:shape id="Picture_x0020_1" style="width:60pt;height:20pt">'
+    '<v:imagedata src="image001.png" o:title=""/></v:shape><![endif]--></td></tr></table>\n'
+)
+OUTLOOK_TAIL = "</div></body></html>"
+
+
+def outlook_email(target_bytes: int) -> str:
+    """Build an Outlook-style HTML body of roughly the given size."""
+    parts = [OUTLOOK_HEAD]
+    size = len(OUTLOOK_HEAD)
+    paragraph = 0
+    while size < target_bytes:
+        paragraph += 1
+        part = OUTLOOK_PARAGRAPH.format(
+            text=f"Paragraph {paragraph}: please check the delivery status of order {1000 + paragraph}."
+        )
+        if paragraph % 10 == 0:
+            part += OUTLOOK_SIGNATURE
+        parts.append(part)
+        size += len(part)
+    parts.append(OUTLOOK_TAIL)
+    return "".join(parts)
+
+
+PATHOLOGICAL: Dict[str, Callable[[int], str]] = {
+    "unclosed_tags": lambda size: "<a" * (size // 2),
+    "unclosed_quotes": lambda size: '<a "' * (size // 4),
+    "unclosed_comment": lambda size: "<!--" + "x" * size,
+    "deep_nesting": lambda size: "<blockquote><ul><li>x" * (size // 21),
+    "open_styles": lambda size: "<style>" * (size // 7)
+}
+
+
+def median_ms(function: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of a call in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def compare(size: int, repeat: int) -> Dict[str, Any]:
+    """Compare formatting the raw and the normalized body of one email."""
+    email = EmailContent(from_email="jane@example.com", subject="Order status", body=outlook_email(size))
+
+    raw = MockAssistant()
+    raw.preprocessor = EmailPreprocessor(PreprocessConfig(enabled=False))
+    # Measure the whole raw body, not the part the prompt budget would keep
+    raw.prompt_budget = PromptBudget(PromptConfig(context_window=10 ** 9, max_input_tokens=10 ** 9))
+    normalized = MockAssistant()
+    normalized.preprocessor = EmailPreprocessor(PreprocessConfig(), cache_size=0)
+
+    raw_messages = raw._format_messages(email)
+    normalized_messages = normalized._format_messages(email)
+    return {
+        "body_bytes": len(email.body.encode("utf-8")),
+        "raw_prompt_tokens": estimate_prompt_tokens(raw_messages),
+        "normalized_prompt_tokens": estimate_prompt_tokens(normalized_messages),
+        "raw_format_ms": round(median_ms(lambda: raw._format_messages(email), repeat), 3),
+        "normalized_format_ms": round(
+            median_ms(lambda: normalized._format_messages(email), repeat), 3
+        )
+    }
+
+
+def scaling(size: int, repeat: int) -> Dict[str, List[float]]:
+    """Conversion time of pathological inputs at one, two and four times the size."""
+    return {
+        name: [round(median_ms(lambda: html_to_text(build(size * factor)), repeat), 1)
+               for factor in (1, 2, 4)]
+        for name, build in PATHOLOGICAL.items()
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="HTML body normalization benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000],
+                        help="Outlook body sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per measurement")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "emails": [compare(size, args.repeat) for size in args.sizes],
+        "pathological_ms": scaling(max(args.sizes), args.repeat)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'body bytes':>12} {'raw tokens':>11} {'text tokens':>12} {'raw ms':>8} {'text ms':>8}")
+    for row in results["emails"]:
+        print(
+            f"{row['body_bytes']:>12} {row['raw_prompt_tokens']:>11} "
+            f"{row['normalized_prompt_tokens']:>12} {row['raw_format_ms']:>8} "
+            f"{row['normalized_format_ms']:>8}"
+        )
+    print("\nPathological input, ms at 1x / 2x / 4x size (linear if it doubles):")
+    for name, timings in results["pathological_ms"].items():
+        print(f"  {name:<18} {' / '.join(str(timing) for timing in timings)}")
+
+
+if __name__ == "__main__":
+    main()
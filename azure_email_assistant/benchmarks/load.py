@@ -0,0 +1,533 @@
+"""
+Load test of the webhook and the assistants, with baseline regression checks.
+
+Run with ``python -m azure_email_assistant.benchmarks.load``. Each
+scenario sends distinct emails at every concurrency level and records
+requests per second, latency percentiles, CPU time per email and memory
+per in-flight request; microbenchmarks time the response cleaning and
+prompt formatting on large bodies. Scenarios ending in ``-fake`` talk to
+the local Azure stand-in, started in a subprocess so that its CPU time
+and memory are not counted.
+
+With ``--cassette``, the ``-replay`` scenarios serve the emails and
+Azure responses recorded in a cassette, at the recorded timing scaled
+by ``--time-scale``.
+
+Results can be written with ``--output`` or ``--save-baseline``, and
+``--baseline`` exits with status 1 when a metric is worse than the
+stored one by more than ``--max-regression``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from werkzeug.serving import make_server
+
+from azure_email_assistant.api.server import APIServer
+from azure_email_assistant.benchmarks.html_body import outlook_email
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent, MockAssistant
+from azure_email_assistant.core.cassette import Cassette
+from azure_email_assistant.core.config import AzureConfig, PreprocessConfig
+from azure_email_assistant.core.preprocess import EmailPreprocessor
+from azure_email_assistant.core.replay import ReplayAssistant
+
+
+# Metrics where a higher value is better; all others are better lower
+HIGHER_IS_BETTER = {"rps"}
+# Error rates are compared in absolute terms, as the baseline is usually 0
+ERROR_RATE_SLACK = 0.01
+
+SYNC_SCENARIOS = ("webhook-mock", "webhook-fake", "assistant-mock", "assistant-fake")
+ASYNC_SCENARIOS = ("async-fake",)
+REPLAY_SCENARIOS = ("webhook-replay", "assistant-replay")
+
+FAKE_API_KEY = "load-test"
+
+
+def make_email(index: int) -> Dict[str, str]:
+    """Build a distinct email, so that replies are neither cached nor coalesced."""
+    return {
+        "from_email": f"customer{index}@example.com",
+        "subject": f"Order {10000 + index}",
+        "body": (
+            f"Hello,\n\nI ordered item {index} last week and it has not arrived yet. "
+            "Could you please check the delivery status and let me know when to expect it?\n\n"
+            "Thank you,\nJane"
+        )
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of unsorted values."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: List[float], failures: int, elapsed: float, cpu: float) -> Dict[str, float]:
+    """Turn the timings of one run into metrics."""
+    count = len(latencies)
+    return {
+        "rps": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "error_rate": round(failures / count, 4),
+        "cpu_ms_per_email": round(cpu * 1000 / count, 3)
+    }
+
+
+def run_sync(send: Callable[[int], bool], concurrency: int, total: int) -> Dict[str, float]:
+    """
+    Send ``total`` emails from ``concurrency`` threads.
+
+    Args:
+        send: Sends the email with the given index; returns whether it succeeded
+        concurrency: Number of emails in flight
+        total: Number of emails to send
+
+    Returns:
+        Metrics of the run
+    """
+    latencies: List[float] = []
+    failures: List[int] = []
+    indexes = itertools.count()
+
+    def worker() -> None:
+        for index in iter(lambda: next(indexes), None):
+            if index >= total:
+                return
+            started = time.perf_counter()
+            try:
+                succeeded = send(index)
+            except Exception:
+                succeeded = False
+            latencies.append(time.perf_counter() - started)
+            if not succeeded:
+                failures.append(index)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    cpu_started, started = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return summarize(latencies, len(failures), elapsed, cpu)
+
+
+@contextmanager
+def traced_memory() -> Iterator[List[int]]:
+    """
+    Trace allocations in the block.
+
+    Kept apart from the timed runs, as tracemalloc slows everything down.
+
+    Returns:
+        Context manager yielding a list that receives the peak number of
+        bytes allocated above the starting point
+    """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        peak: List[int] = []
+        yield peak
+        peak.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+
+def free_port() -> int:
+    """Return a port nobody is listening on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@contextmanager
+def fake_azure(args: argparse.Namespace) -> Iterator[str]:
+    """
+    Run the Azure stand-in in a subprocess.
+
+    Returns:
+        Context manager yielding its endpoint
+    """
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "azure_email_assistant.benchmarks.fake_azure",
+            "--port", str(port), "--api-key", FAKE_API_KEY,
+            "--latency", args.latency, "--token-interval", str(args.token_interval),
+            "--think-words", args.think_words, "--reply-words", args.reply_words
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    endpoint = f"http://127.0.0.1:{port}/"
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                requests.get(f"{endpoint}stats", timeout=1)
+                break
+            except requests.exceptions.ConnectionError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The Azure stand-in did not start")
+                time.sleep(0.05)
+        yield endpoint
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def fake_config(endpoint: str, concurrency: int) -> AzureConfig:
+    """Azure settings for the stand-in, with a pool large enough for the load."""
+    return AzureConfig(
+        endpoint=endpoint, api_key=FAKE_API_KEY,
+        pool_maxsize=max(concurrency, 20), async_max_connections=max(concurrency, 200)
+    )
+
+
+@contextmanager
+def webhook(
+    assistant, emails: Callable[[int], Dict[str, str]]
+) -> Iterator[Tuple[Callable[[int], bool], Callable[[int], bool]]]:
+    """
+    Serve the Flask app in a background thread.
+
+    The development server reads each request with a 10 MB buffer, so
+    memory is measured by calling the app in-process instead, which
+    leaves only the app's own allocations.
+
+    Args:
+        assistant: Assistant behind the app
+        emails: Builds the webhook payload of the email with an index
+
+    Returns:
+        Context manager yielding a function that posts one email over
+        HTTP and one that posts it through the Flask test client
+    """
+    api = APIServer(assistant=assistant)
+    server = make_server("127.0.0.1", 0, api.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.port}/webhook/email"
+    # Sessions outlive the worker threads, so connections are reused across runs
+    sessions: "queue.SimpleQueue[requests.Session]" = queue.SimpleQueue()
+
+    def send(index: int) -> bool:
+        try:
+            session = sessions.get_nowait()
+        except queue.Empty:
+            session = requests.Session()
+        try:
+            response = session.post(url, json=emails(index), timeout=60)
+            return response.status_code == 200 and response.json()["status"] == "success"
+        finally:
+            sessions.put(session)
+
+    def call(index: int) -> bool:
+        response = api.app.test_client().post("/webhook/email", json=emails(index))
+        return response.status_code == 200 and response.get_json()["status"] == "success"
+
+    try:
+        yield send, call
+    finally:
+        server.shutdown()
+        thread.join()
+        api.job_queue.shutdown()
+
+
+@contextmanager
+def sync_target(
+    scenario: str,
+    concurrency: int,
+    endpoint: Optional[str],
+    cassette: Optional[Cassette] = None,
+    time_scale: float = 1.0
+) -> Iterator[Tuple[Callable[[int], bool], Callable[[int], bool]]]:
+    """
+    Set up a synchronous scenario.
+
+    Returns:
+        Context manager yielding a function that sends one email for
+        timing and one for measuring memory
+    """
+    emails = make_email
+    if scenario.endswith("-replay"):
+        assistant = ReplayAssistant(cassette, time_scale)
+        recorded = cassette.emails()
+
+        def emails(index: int) -> Dict[str, str]:
+            return recorded[index % len(recorded)]
+    elif scenario.endswith("-fake"):
+        assistant = AzureAssistant(fake_config(endpoint, concurrency))
+    else:
+        assistant = MockAssistant()
+
+    if scenario.startswith("webhook-"):
+        with webhook(assistant, emails) as functions:
+            yield functions
+        return
+
+    def process(index: int) -> bool:
+        return assistant.process_email(EmailContent(**emails(index))).status == "success"
+
+    yield process, process
+
+
+def run_sync_scenario(
+    scenario: str,
+    concurrency: int,
+    total: int,
+    endpoint: Optional[str],
+    cassette: Optional[Cassette] = None,
+    time_scale: float = 1.0
+) -> Dict[str, float]:
+    """Measure a synchronous scenario at one concurrency level."""
+    with sync_target(scenario, concurrency, endpoint, cassette, time_scale) as (send, call):
+        # Peak memory of one wave of emails, all in flight at once; measured
+        # first, while no server connection threads are winding down
+        run_sync(call, concurrency, concurrency)
+        with traced_memory() as peak:
+            run_sync(call, concurrency, concurrency)
+        # Warm up connections and caches before timing
+        run_sync(send, concurrency, concurrency)
+        metrics = run_sync(send, concurrency, total)
+        metrics["memory_kb_per_request"] = round(peak[0] / concurrency / 1024, 1)
+    return metrics
+
+
+async def run_async(send: Callable[[int], Any], concurrency: int, total: int) -> Dict[str, float]:
+    """Send ``total`` emails from ``concurrency`` asyncio tasks."""
+    latencies: List[float] = []
+    failures: List[int] = []
+    indexes = itertools.count()
+
+    async def worker() -> None:
+        for index in iter(lambda: next(indexes), None):
+            if index >= total:
+                return
+            started = time.perf_counter()
+            try:
+                succeeded = await send(index)
+            except Exception:
+                succeeded = False
+            latencies.append(time.perf_counter() - started)
+            if not succeeded:
+                failures.append(index)
+
+    cpu_started, started = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return summarize(latencies, len(failures), elapsed, cpu)
+
+
+def run_async_scenario(
+    scenario: str, concurrency: int, total: int, endpoint: Optional[str]
+) -> Dict[str, float]:
+    """Measure ``AsyncAzureAssistant`` on one event loop at one concurrency level."""
+    from azure_email_assistant.core.async_assistant import AsyncAzureAssistant
+
+    async def measure() -> Dict[str, float]:
+        assistant = AsyncAzureAssistant(fake_config(endpoint, concurrency))
+
+        async def send(index: int) -> bool:
+            result = await assistant.process_email(EmailContent(**make_email(index)))
+            return result.status == "success"
+
+        try:
+            await run_async(send, concurrency, concurrency)
+            metrics = await run_async(send, concurrency, total)
+            with traced_memory() as peak:
+                await run_async(send, concurrency, concurrency)
+            metrics["memory_kb_per_request"] = round(peak[0] / concurrency / 1024, 1)
+            return metrics
+        finally:
+            await assistant.aclose()
+
+    return asyncio.run(measure())
+
+
+def words(count: int) -> str:
+    """Filler text of the given number of words."""
+    vocabulary = "the customer asks about order delivery status refund warranty shipping".split()
+    return " ".join(vocabulary[index % len(vocabulary)] for index in range(count))
+
+
+def median_us(function: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of a call in microseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(timings), 1)
+
+
+def microbenchmarks(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time response cleaning and prompt formatting on large inputs.
+
+    Args:
+        sizes: Input sizes in words (cleaning) and bytes (formatting)
+        repeat: Calls per measurement
+
+    Returns:
+        Microseconds per call by benchmark name
+    """
+    cleaner = AzureAssistant(AzureConfig())
+    formatter = MockAssistant()
+    formatter.preprocessor = EmailPreprocessor(PreprocessConfig(), cache_size=0)
+
+    results = {}
+    for size in sizes:
+        reply = f"Dear Customer,\n\n{words(size // 10)}\n\nBest regards,\nSMP Solution"
+        thinking = f"<think>\n{words(size)}\n</think>\n\n{reply}"
+        # Without markers the reply is found by scanning the paragraphs
+        unmarked = "\n\n".join(words(50) for _ in range(size // 50)) + "\n\n" + reply
+        text = EmailContent(
+            from_email="jane@example.com", subject="Order status", body=words(size)
+        )
+        html = EmailContent(
+            from_email="jane@example.com", subject="Order status", body=outlook_email(size * 6)
+        )
+        cases = {
+            f"clean_response/think/{size}": lambda: cleaner._clean_response(thinking),
+            f"clean_response/unmarked/{size}": lambda: cleaner._clean_response(unmarked),
+            f"format_messages/text/{size}": lambda: formatter._format_messages(text),
+            f"format_messages/html/{size}": lambda: formatter._format_messages(html)
+        }
+        for name, function in cases.items():
+            results[name] = {"us_per_call": median_us(function, repeat)}
+    return results
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    max_regression: float
+) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    Benchmarks or metrics missing from either side are skipped, so a
+    baseline recorded with other scenarios can still be used.
+
+    Args:
+        results: Metrics by benchmark name
+        baseline: Stored metrics by benchmark name
+        max_regression: Allowed relative change for the worse, e.g. 0.2
+
+    Returns:
+        One description per metric that got worse by more than allowed
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None:
+                continue
+            if metric == "error_rate":
+                worse = value > expected + ERROR_RATE_SLACK
+            elif metric in HIGHER_IS_BETTER:
+                worse = value < expected * (1 - max_regression)
+            else:
+                worse = value > expected * (1 + max_regression)
+            if worse:
+                regressions.append(f"{name} {metric}: {value} (baseline {expected})")
+    return regressions
+
+
+def main() -> None:
+    """Run the load test and print the results."""
+    parser = argparse.ArgumentParser(description="Load test of the webhook and the assistants")
+    parser.add_argument("--scenarios", nargs="+",
+                        choices=SYNC_SCENARIOS + ASYNC_SCENARIOS + REPLAY_SCENARIOS,
+                        help="Scenarios to run; all that apply by default")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32],
+                        help="Emails in flight")
+    parser.add_argument("--requests", type=int, default=200, help="Emails per scenario and level")
+    parser.add_argument("--latency", default="lognormal:0.05:0.3",
+                        help="Stand-in time to first token, as a distribution")
+    parser.add_argument("--token-interval", type=float, default=0.0005,
+                        help="Stand-in seconds between generated tokens")
+    parser.add_argument("--think-words", default="uniform:100:300",
+                        help="Stand-in words in the thinking section")
+    parser.add_argument("--reply-words", default="uniform:40:120", help="Stand-in words in the reply")
+    parser.add_argument("--cassette", help="Cassette recorded with AzureConfig.cassette_path")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Factor for recorded delays in replay scenarios; 0 for full speed")
+    parser.add_argument("--micro-sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Microbenchmark input sizes in words")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per microbenchmark")
+    parser.add_argument("--no-micro", action="store_true", help="Skip the microbenchmarks")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="Write the results as the baseline to this file")
+    parser.add_argument("--baseline", help="Compare with the baseline in this JSON file")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative regression before failing")
+    args = parser.parse_args()
+    if args.scenarios is None:
+        args.scenarios = list(SYNC_SCENARIOS + ASYNC_SCENARIOS)
+        if args.cassette:
+            args.scenarios += REPLAY_SCENARIOS
+    replaying = any(scenario in REPLAY_SCENARIOS for scenario in args.scenarios)
+    if replaying and not args.cassette:
+        parser.error("replay scenarios need --cassette")
+
+    # Request logs would dominate the CPU time being measured
+    logging.disable(logging.INFO)
+
+    results: Dict[str, Dict[str, float]] = {}
+    cassette = Cassette(args.cassette) if replaying else None
+    needs_fake = any(scenario.endswith("-fake") for scenario in args.scenarios)
+    with (fake_azure(args) if needs_fake else nullcontext()) as endpoint:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                name = f"{scenario}/c{concurrency}"
+                if scenario in ASYNC_SCENARIOS:
+                    results[name] = run_async_scenario(scenario, concurrency, args.requests, endpoint)
+                else:
+                    results[name] = run_sync_scenario(
+                        scenario, concurrency, args.requests, endpoint, cassette, args.time_scale
+                    )
+                print(f"{name:<24} " + " ".join(
+                    f"{metric}={value}" for metric, value in results[name].items()
+                ), flush=True)
+
+    if not args.no_micro:
+        for name, metrics in microbenchmarks(args.micro_sizes, args.repeat).items():
+            results[name] = metrics
+            print(f"{name:<36} {metrics['us_per_call']:>12} us")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = find_regressions(results, json.load(file), args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.max_regression:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of knowledge index building and search on a synthetic corpus.
+
+Run with ``python -m azure_email_assistant.benchmarks.retrieval``.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from azure_email_assistant.core.retrieval import KnowledgeIndex
+
+
+def write_corpus(path: str, passages: int, passages_per_document: int, seed: int) -> List[str]:
+    """
+    Write documents of random paragraphs with a Zipf-like word distribution.
+
+    Returns:
+        The vocabulary, most frequent word first
+    """
+    generator = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyzáéíóöőúüű"
+    vocabulary = [
+        "".join(generator.choice(letters) for _ in range(generator.randint(3, 10)))
+        for _ in range(20_000)
+    ]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for document in range(max(1, passages // passages_per_document)):
+        paragraphs = [
+            " ".join(generator.choices(vocabulary, weights, k=generator.randint(30, 110)))
+            for _ in range(passages_per_document)
+        ]
+        with open(os.path.join(path, f"document{document}.md"), "w", encoding="utf-8") as file:
+            file.write("\n\n".join(paragraphs))
+    return vocabulary
+
+
+def run(passages: int, queries: int, seed: int) -> Dict[str, Any]:
+    """Build, refresh and search an index of about ``passages`` passages."""
+    root = tempfile.mkdtemp()
+    try:
+        documents = os.path.join(root, "knowledge")
+        os.makedirs(documents)
+        vocabulary = write_corpus(documents, passages, 100, seed)
+
+        index = KnowledgeIndex(documents, os.path.join(root, "index"))
+        started = time.perf_counter()
+        index.refresh()
+        build_s = time.perf_counter() - started
+
+        os.utime(os.path.join(documents, "document0.md"))
+        started = time.perf_counter()
+        index.refresh()
+        refresh_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        KnowledgeIndex(documents, os.path.join(root, "index"))
+        open_ms = (time.perf_counter() - started) * 1000
+
+        # Email-like queries: a mix of common and rare words
+        generator = random.Random(seed + 1)
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        timings = []
+        for _ in range(queries):
+            query = " ".join(generator.choices(vocabulary, weights, k=generator.randint(20, 300)))
+            started = time.perf_counter()
+            index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        # Worst case: only the most common words
+        common = " ".join(vocabulary[:60])
+        started = time.perf_counter()
+        index.search(common)
+        common_ms = (time.perf_counter() - started) * 1000
+
+        return {
+            "passages": len(index),
+            "terms": index.stats()["terms"],
+            "build_s": round(build_s, 2),
+            "refresh_one_document_s": round(refresh_s, 2),
+            "open_ms": round(open_ms, 1),
+            "search_p50_ms": round(statistics.median(timings), 3),
+            "search_p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+            "search_common_words_ms": round(common_ms, 3)
+        }
+    finally:
+        shutil.rmtree(root)
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Knowledge retrieval benchmark")
+    parser.add_argument("--passages", type=int, nargs="+", default=[5_000, 25_000],
+                        help="Corpus sizes in passages")
+    parser.add_argument("--queries", type=int, default=200, help="Timed searches per corpus")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the corpus")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [run(passages, args.queries, args.seed) for passages in args.passages]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'passages':>9} {'build s':>8} {'refresh s':>10} {'open ms':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'common ms':>10}")
+    for row in results:
+        print(
+            f"{row['passages']:>9} {row['build_s']:>8} {row['refresh_one_document_s']:>10} "
+            f"{row['open_ms']:>8} {row['search_p50_ms']:>7} {row['search_p95_ms']:>7} "
+            f"{row['search_common_words_ms']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
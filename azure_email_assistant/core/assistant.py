@@ -3,20 +3,53 @@ Assistant implementations for the Azure Email Assistant.
 """
 import json
 import logging
+import time
 import uuid
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 
 import requests
 
+from azure_email_assistant.core.balancer import Backend, BackendPool
+from azure_email_assistant.core.cassette import CassetteRecorder
+from azure_email_assistant.core.circuit_breaker import CircuitBreaker, CircuitOpenError
 from azure_email_assistant.core.config import azure_config
+from azure_email_assistant.core.metrics import (
+    AZURE_IN_FLIGHT, AZURE_LATENCY, AZURE_RESPONSES, CLEAN_LATENCY, ERRORS, TOKENS
+)
+from azure_email_assistant.core.preprocess import EmailPreprocessor
+from azure_email_assistant.core.ratelimit import RateLimitExceeded, Reservation
+from azure_email_assistant.core.retrieval import KnowledgeBase
+from azure_email_assistant.core.retry import RetryPolicy, RetryStats, call_with_retry
+from azure_email_assistant.core.streaming import (
+    GREETING_MARKERS, THINK_CLOSE, THINK_OPEN, TRANSITION_MARKERS,
+    ReasoningStripper, StreamError, iter_content_deltas
+)
+from azure_email_assistant.core.tokens import PromptBudget, estimate_prompt_tokens
+from azure_email_assistant.core.tracing import SPAN_KIND_CLIENT, current_request_id, tracer
 
 
 logger = logging.getLogger(__name__)
 
 
+# Canned reply sent while the Azure backend is unavailable
+FALLBACK_REPLY = (
+    "Thank you for your email regarding '{subject}'.<br><br>"
+    "We have received your message and an agent will get back to you soon.<br><br>"
+    "Best regards,<br>Gergő Krucsai<br>SMP Solution"
+)
+
+
+class FallbackReply(str):
+    """Canned fallback text yielded by a stream in place of a generated reply.
+    
+    Wrappers pass it on like any fragment but must not cache it, just as
+    a ``fallback`` status is not cached for non-streamed replies.
+    """
+
+
 @dataclass
 class EmailContent:
     """Email content to process."""
@@ -33,13 +66,15 @@ class AssistantResponse:
     error: Optional[str] = None
     request_id: str = ""
     timestamp: str = ""
+    reason: Optional[str] = None
     
     def __post_init__(self):
         """Set timestamp if not provided."""
         if not self.timestamp:
             self.timestamp = datetime.now().isoformat()
         if not self.request_id:
-            self.request_id = str(uuid.uuid4())
+            # Responses built while handling a request carry that request's id
+            self.request_id = current_request_id() or str(uuid.uuid4())
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
@@ -54,6 +89,9 @@ class AssistantResponse:
         
         if self.error:
             result["error"] = self.error
+        
+        if self.reason:
+            result["reason"] = self.reason
             
         return result
 
@@ -61,23 +99,70 @@ class AssistantResponse:
 class BaseAssistant(ABC):
     """Base assistant interface."""
     
+    # Shared by all assistants so savings are reported once per process
+    preprocessor = EmailPreprocessor()
+    prompt_budget = PromptBudget()
+    knowledge = KnowledgeBase()
+    
     @abstractmethod
     def process_email(self, email: EmailContent) -> AssistantResponse:
         """Process an email and generate a response."""
         pass
     
+    def stream_email(self, email: EmailContent) -> Iterator[str]:
+        """
+        Process an email and yield the reply as it is generated.
+        
+        Assistants without native streaming yield the whole reply at once.
+        
+        Args:
+            email: Email content to process
+            
+        Returns:
+            Iterator over reply text fragments
+            
+        Raises:
+            StreamError: If no reply could be generated
+        """
+        result = self.process_email(email)
+        if result.status == "error":
+            raise StreamError(result.error)
+        if result.response_text:
+            yield result.response_text
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return runtime counters for monitoring."""
+        return {
+            "preprocess": self.preprocessor.stats(),
+            "tokens": self.prompt_budget.stats(),
+            "retrieval": self.knowledge.stats()
+        }
+    
     def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
         """Format email content into messages for the API."""
         system_message = (
             "You will receive an email subject and a body. As an assistant, you can reply using only what you have in the documents. Write a professional and precise reply based on the subject and body of the email. Begin by greeting the sender appropriately, considering the tone and context of their original message. Do not refer to the document where you found the answer. If the information is unavailable in the documents, reply that you cannot help with that, and an agent will get back to the user soon; again, do not say that the information is not available in the documents. Add the <br> tag when a line breaks; it will help me to format the output. Conclude the email with a standard signature that includes the following information: Name: Gergő Krucsai and Company: SMP Solution."
         )
         
-        user_message = (
-            f"From: {email.from_email}\n"
-            f"Subject: {email.subject}\n"
-            f"Body: {email.body}\n\n"
-            "Please draft a response to this email."
-        )
+        with tracer.span("format_messages", body_chars=len(email.body)) as span:
+            text = self.preprocessor.clean(email.body)
+            header = f"From: {email.from_email}\nSubject: {email.subject}\nBody: "
+            footer = "\n\nPlease draft a response to this email."
+            
+            # Passages from the knowledge documents the system message refers to
+            documents = self.knowledge.context(f"{email.subject}\n{text}")
+            if documents:
+                header = f"{documents}\n\n{header}"
+            
+            # Long bodies are cut in the middle so the prompt fits the input budget
+            body = self.prompt_budget.fit_body(
+                text,
+                overhead=estimate_prompt_tokens([
+                    {"content": system_message}, {"content": header + footer}
+                ])
+            )
+            user_message = header + body + footer
+            span.set(cleaned_chars=len(text), prompt_chars=len(user_message), documents=bool(documents))
         
         return [
             {"role": "system", "content": system_message},
@@ -85,12 +170,190 @@ class BaseAssistant(ABC):
         ]
 
 
-class AzureAssistant(BaseAssistant):
-    """Azure OpenAI assistant implementation."""
+class AzureClientMixin:
+    """Transport-independent parts of the Azure OpenAI assistants.
+    
+    Holds the backend pool, retry policy and circuit breaker, and builds
+    requests and cleans replies; subclasses supply the HTTP transport.
+    """
     
     def __init__(self, config=azure_config):
         """Initialize with configuration."""
         self.config = config
+        
+        # Request targets, headers and pooled sessions are built once per backend
+        self.backends = BackendPool.from_config(config)
+        self.timeout = (config.connect_timeout, config.read_timeout)
+        self.retry_policy = RetryPolicy(
+            max_attempts=config.retry_max_attempts,
+            base_delay=config.retry_base_delay,
+            max_delay=config.retry_max_delay,
+            deadline=config.request_deadline
+        )
+        self.retry_stats = RetryStats()
+        self.circuit_breaker = CircuitBreaker(
+            name=config.deployment,
+            failure_rate_threshold=config.circuit_failure_rate,
+            slow_call_seconds=config.circuit_slow_call_seconds,
+            slow_call_rate_threshold=config.circuit_slow_call_rate,
+            window_size=config.circuit_window,
+            min_calls=config.circuit_min_calls,
+            open_seconds=config.circuit_open_seconds,
+            half_open_max_calls=config.circuit_half_open_calls
+        )
+    
+    def _fallback_response(self, email: EmailContent) -> AssistantResponse:
+        """Build the canned reply used while the circuit is open."""
+        return AssistantResponse(
+            status="fallback",
+            response_text=FALLBACK_REPLY.format(subject=email.subject)
+        )
+    
+    def _settle_quota(
+        self,
+        backend: Backend,
+        reservation: Optional[Reservation],
+        usage: Optional[Dict[str, Any]]
+    ) -> None:
+        """Correct a quota reservation with the token usage Azure reported."""
+        if reservation is None or not usage or "total_tokens" not in usage:
+            return
+        backend.rate_limiter.settle(reservation, usage["total_tokens"])
+    
+    def _record_usage(self, payload: Dict[str, Any], usage: Optional[Dict[str, Any]]) -> None:
+        """Log the estimated prompt tokens against the usage Azure reported, and count tokens."""
+        self.prompt_budget.record_usage(estimate_prompt_tokens(payload["messages"]), usage)
+        if not usage:
+            return
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens"):
+                TOKENS.inc(self.config.deployment, kind, amount=usage[f"{kind}_tokens"])
+        reasoning = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+        if reasoning:
+            TOKENS.inc(self.config.deployment, "reasoning", amount=reasoning)
+    
+    def _record_attempt(self, backend: Backend, status_code: int, first_byte: float) -> None:
+        """Count an Azure response by status code and record the time to its headers."""
+        AZURE_RESPONSES.inc(backend.spec.deployment, str(status_code))
+        AZURE_LATENCY.observe(first_byte, backend.spec.deployment, "first_byte")
+    
+    def _record_latency(self, phase: str, started: float) -> None:
+        """Record the time since the start of an email's Azure call."""
+        AZURE_LATENCY.observe(time.monotonic() - started, self.config.deployment, phase)
+    
+    def _parse_response(self, response: Any) -> Dict[str, Any]:
+        """Decode a completion body, tracing the reported token usage."""
+        with tracer.span("parse_response") as span:
+            response_data = response.json()
+            usage = response_data.get("usage") or {}
+            span.set(
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                reasoning_tokens=(usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+            )
+        return response_data
+    
+    def _record_error(self, error: BaseException) -> None:
+        """Count a failed Azure call by exception class."""
+        ERRORS.inc("azure", type(error).__name__)
+    
+    def _build_payload(self, email: EmailContent, stream: bool = False) -> Dict[str, Any]:
+        """Build the chat completions request body for an email."""
+        messages = self._format_messages(email)
+        payload = {
+            "messages": messages,
+            "model": self.config.deployment,
+            "temperature": self.config.temperature,
+            # Completions get the context the prompt leaves, up to the configured cap
+            "max_tokens": self.prompt_budget.completion_tokens(
+                estimate_prompt_tokens(messages), self.config.max_tokens
+            ),
+            "top_p": self.config.top_p,
+            "frequency_penalty": self.config.frequency_penalty,
+            "presence_penalty": self.config.presence_penalty,
+            # Lets Azure-side logs be matched with ours
+            "user": current_request_id() or str(uuid.uuid4())
+        }
+        if stream:
+            payload["stream"] = True
+            # Azure reports the token usage of a stream in one last chunk
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return runtime counters for monitoring."""
+        stats = super().stats()
+        stats.update({
+            "retry": self.retry_stats.snapshot(),
+            "circuit_breaker": self.circuit_breaker.snapshot(),
+            "backends": self.backends.stats()
+        })
+        return stats
+    
+    def _clean_response(self, response: str) -> str:
+        """Remove thinking section from response.
+        
+        Args:
+            response: Raw response from Azure OpenAI
+            
+        Returns:
+            Cleaned response with thinking section removed
+        """
+        started = time.perf_counter()
+        try:
+            with tracer.span("clean_response", response_chars=len(response)):
+                return self._strip_thinking(response)
+        finally:
+            CLEAN_LATENCY.observe(time.perf_counter() - started)
+    
+    def _strip_thinking(self, response: str) -> str:
+        """Return the reply after the thinking section."""
+        # Check if the response has a clear thinking section followed by actual content
+        if THINK_OPEN in response and THINK_CLOSE in response:
+            # Extract content after the closing think tag
+            think_end = response.find(THINK_CLOSE) + len(THINK_CLOSE)
+            # Return everything after the closing think tag, removing any leading whitespace or newlines
+            return response[think_end:].lstrip()
+        
+        # Find the earliest occurrence of any transition marker
+        earliest_pos = len(response)
+        earliest_marker = None
+        
+        for marker in TRANSITION_MARKERS:
+            pos = response.find(marker)
+            if pos != -1 and pos < earliest_pos:
+                earliest_pos = pos
+                earliest_marker = marker
+        
+        # If we found a marker, extract everything from that point
+        if earliest_marker:
+            # For greetings and subject lines, include the marker
+            if earliest_marker in GREETING_MARKERS:
+                return response[earliest_pos:].strip()
+            # For newlines, skip the marker
+            else:
+                return response[earliest_pos + len(earliest_marker):].strip()
+        
+        # If no clear transition is found, try to find the last paragraph
+        # This is a fallback for cases where the thinking isn't clearly separated
+        paragraphs = response.split('\n\n')
+        if len(paragraphs) > 1:
+            # Return the last few paragraphs (likely the actual response)
+            return '\n\n'.join(paragraphs[-2:]).strip()
+        
+        # If all else fails, return the original response
+        return response
+
+
+class AzureAssistant(AzureClientMixin, BaseAssistant):
+    """Azure OpenAI assistant implementation."""
+    
+    def __init__(self, config=azure_config):
+        """Initialize with configuration."""
+        super().__init__(config)
+        
+        # Exchanges are recorded for offline replay when a cassette is configured
+        self.recorder = CassetteRecorder(config.cassette_path) if config.cassette_path else None
     
     def process_email(self, email: EmailContent) -> AssistantResponse:
         """
@@ -102,45 +365,30 @@ class AzureAssistant(BaseAssistant):
         Returns:
             AssistantResponse with the generated response or error
         """
+        with tracer.request("process_email", deployment=self.config.deployment):
+            return self._process_email(email)
+    
+    def _process_email(self, email: EmailContent) -> AssistantResponse:
+        """Call Azure OpenAI for an email within the current request."""
+        started = time.monotonic()
         try:
-            # Format messages for Azure OpenAI API
-            formatted_messages = self._format_messages(email)
-            
-            # Prepare request to Azure OpenAI
-            request_url = (
-                f"{self.config.endpoint}openai/deployments/{self.config.deployment}"
-                f"/chat/completions?api-version={self.config.api_version}"
-            )
-            
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": self.config.api_key
-            }
-            
-            payload = {
-                "messages": formatted_messages,
-                "model": self.config.deployment,
-                "temperature": self.config.temperature,
-                "max_tokens": self.config.max_tokens,
-                "top_p": self.config.top_p,
-                "frequency_penalty": self.config.frequency_penalty,
-                "presence_penalty": self.config.presence_penalty,
-                "user": str(uuid.uuid4())
-            }
-            
-            # Make request to Azure OpenAI
-            response = requests.post(
-                request_url,
-                headers=headers,
-                json=payload,
-                timeout=180
-            )
+            payload = self._build_payload(email)
             
-            # Check for successful response
-            response.raise_for_status()
+            # Fail fast while the backend is known to be down
+            with self.circuit_breaker.guard(self._classify_failure):
+                # Make request to Azure OpenAI, retrying throttling and transient errors
+                response, backend, reservation = self._exchange(email, payload)
+                
+                # Check for successful response
+                response.raise_for_status()
             
             # Parse response
-            response_data = response.json()
+            response_data = self._parse_response(response)
+            self._record_latency("total", started)
+            
+            # Correct the quota estimate with the reported usage
+            self._settle_quota(backend, reservation, response_data.get("usage"))
+            self._record_usage(payload, response_data.get("usage"))
             
             # Extract assistant message
             assistant_message = response_data["choices"][0]["message"]["content"]
@@ -153,80 +401,215 @@ class AzureAssistant(BaseAssistant):
                 response_text=cleaned_response
             )
             
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Azure call: {str(e)}")
+            self._record_error(e)
+            if self.config.circuit_fallback:
+                return self._fallback_response(email)
+            return AssistantResponse(status="error", error=f"Service unavailable: {str(e)}")
+            
+        except RateLimitExceeded as e:
+            error_message = f"Rate limit exceeded: {str(e)}"
+            logger.error(error_message)
+            self._record_error(e)
+            return AssistantResponse(status="error", error=error_message)
+            
         except requests.exceptions.RequestException as e:
             error_message = f"API request failed: {str(e)}"
             logger.error(error_message)
+            self._record_error(e)
             return AssistantResponse(status="error", error=error_message)
             
         except (KeyError, IndexError, json.JSONDecodeError) as e:
             error_message = f"Error parsing API response: {str(e)}"
             logger.error(error_message)
+            self._record_error(e)
             return AssistantResponse(status="error", error=error_message)
             
         except Exception as e:
             error_message = f"Unexpected error: {str(e)}"
             logger.error(error_message)
+            self._record_error(e)
             return AssistantResponse(status="error", error=error_message)
-
-    def _clean_response(self, response: str) -> str:
-        """Remove thinking section from response.
+    
+    def stream_email(self, email: EmailContent) -> Iterator[str]:
+        """
+        Stream a reply from Azure OpenAI, dropping the thinking section.
+        
+        Reply text is yielded as soon as the end of the thinking section
+        (or a greeting) has been seen in the server-sent event stream.
         
         Args:
-            response: Raw response from Azure OpenAI
+            email: Email content to process
             
         Returns:
-            Cleaned response with thinking section removed
+            Iterator over reply text fragments
+            
+        Raises:
+            CircuitOpenError: If the circuit is open and fallback is disabled
+            RateLimitExceeded: If no quota frees up in time
+            requests.exceptions.RequestException: If the API request fails
+            StreamError: If the stream reports an error
         """
-        # Check if the response has a clear thinking section followed by actual content
-        if '<think>' in response and '</think>' in response:
-            # Extract content after the closing think tag
-            think_end = response.find('</think>') + len('</think>')
-            # Return everything after the closing think tag, removing any leading whitespace or newlines
-            return response[think_end:].lstrip()
+        payload = self._build_payload(email, stream=True)
+        stripper = ReasoningStripper(fallback=self._clean_response)
+        started = time.monotonic()
+        first_token = True
+        usage: Dict[str, Any] = {}
+        backend, reservation = None, None
         
-        # Look for common patterns that indicate the transition from thinking to response
-        transition_markers = [
-            # Hungarian greetings
-            'Kedves ',
-            'Tisztelt ',
-            # English greetings
-            'Dear ',
-            'Hello ',
-            'Hi ',
-            # Email formatting
-            'Subject:',
-            # Multiple newlines often separate thinking from response
-            '\n\n\n'
-        ]
+        try:
+            with self.circuit_breaker.guard(self._classify_failure):
+                response, backend, reservation = self._exchange(email, payload, stream=True)
+                with response:
+                    response.raise_for_status()
+                    
+                    for delta in iter_content_deltas(response.iter_lines(), usage):
+                        text = stripper.feed(delta)
+                        if text:
+                            if first_token:
+                                # Reply text starts once the model has finished thinking
+                                self._record_latency("first_token", started)
+                                tracer.event("first_token")
+                                first_token = False
+                            yield text
+                self._record_latency("total", started)
+        except CircuitOpenError:
+            if not self.config.circuit_fallback:
+                raise
+            yield FallbackReply(self._fallback_response(email).response_text)
+            return
+        except Exception:
+            # A failed stream must not keep its completion budget reserved
+            if reservation is not None:
+                backend.rate_limiter.release(reservation)
+            raise
         
-        # Find the earliest occurrence of any transition marker
-        earliest_pos = len(response)
-        earliest_marker = None
+        # Correct the quota estimate with the usage of the final chunk
+        self._settle_quota(backend, reservation, usage)
+        self._record_usage(payload, usage)
         
-        for marker in transition_markers:
-            pos = response.find(marker)
-            if pos != -1 and pos < earliest_pos:
-                earliest_pos = pos
-                earliest_marker = marker
+        text = stripper.finish()
+        if text:
+            yield text
+    
+    def _classify_failure(self, error: BaseException) -> Optional[bool]:
+        """Decide how an exception counts towards the circuit breaker.
         
-        # If we found a marker, extract everything from that point
-        if earliest_marker:
-            # For greetings and subject lines, include the marker
-            if earliest_marker in ['Kedves ', 'Tisztelt ', 'Dear ', 'Hello ', 'Hi ', 'Subject:']:
-                return response[earliest_pos:].strip()
-            # For newlines, skip the marker
-            else:
-                return response[earliest_pos + len(earliest_marker):].strip()
+        Returns True for backend failures, False for errors that prove the
+        backend is up (client errors) and None for calls that never reached it.
+        """
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        if isinstance(error, requests.exceptions.RequestException):
+            return True
+        return None
+    
+    def _acquire_quota(self, backend: Backend, payload: Dict[str, Any]) -> Optional[Reservation]:
+        """Reserve rate limiter quota for the prompt plus the completion budget."""
+        if backend.rate_limiter is None:
+            return None
+        estimated = estimate_prompt_tokens(payload["messages"]) + payload["max_tokens"]
+        with tracer.span("azure.quota", deployment=backend.spec.deployment, tokens=estimated):
+            return backend.rate_limiter.acquire(estimated)
+    
+    def _exchange(
+        self, email: EmailContent, payload: Dict[str, Any], stream: bool = False
+    ) -> Tuple[requests.Response, Backend, Optional[Reservation]]:
+        """Send a completion request, recording the exchange when a cassette is configured."""
+        if self.recorder is None:
+            return self._post(payload, stream)
         
-        # If no clear transition is found, try to find the last paragraph
-        # This is a fallback for cases where the thinking isn't clearly separated
-        paragraphs = response.split('\n\n')
-        if len(paragraphs) > 1:
-            # Return the last few paragraphs (likely the actual response)
-            return '\n\n'.join(paragraphs[-2:]).strip()
+        started = time.monotonic()
+        try:
+            response, backend, reservation = self._post(payload, stream)
+        except requests.exceptions.RequestException as e:
+            self.recorder.record_error(email, payload, e, started)
+            raise
+        return self.recorder.record(email, payload, response, started), backend, reservation
+    
+    def _post(
+        self, payload: Dict[str, Any], stream: bool = False
+    ) -> Tuple[requests.Response, Backend, Optional[Reservation]]:
+        """Send a completion request with retries, spreading attempts over backends.
         
-        # If all else fails, return the original response
-        return response
+        Each attempt picks a backend, preferring ones that have not failed
+        for this email yet, and waits for that backend's quota.
+        
+        Returns:
+            The final response, the backend that sent it and its quota reservation
+        """
+        connect_timeout, read_timeout = self.timeout
+        tried: List[Backend] = []
+        last: Dict[str, Any] = {}
+        
+        def send(remaining: float) -> requests.Response:
+            backend = self.backends.acquire(exclude=tried)
+            tried.append(backend)
+            started = time.monotonic()
+            try:
+                # Wait for quota before sending so bursts don't trigger throttling
+                reservation = self._acquire_quota(backend, payload)
+                sent = time.monotonic()
+                AZURE_IN_FLIGHT.inc(backend.spec.deployment)
+                try:
+                    with tracer.span(
+                        "azure.request", SPAN_KIND_CLIENT,
+                        deployment=backend.spec.deployment, attempt=len(tried), stream=stream
+                    ) as span:
+                        # Never wait for a response past the per-email deadline
+                        response = backend.session.post(
+                            backend.request_url,
+                            json=dict(payload, model=backend.spec.deployment),
+                            timeout=(connect_timeout, max(min(read_timeout, remaining), 0.001)),
+                            stream=stream
+                        )
+                        
+                        # requests times the headers as elapsed; the body may have been read since
+                        elapsed = getattr(response, "elapsed", None)
+                        if isinstance(elapsed, timedelta):
+                            first_byte = elapsed.total_seconds()
+                        else:
+                            first_byte = time.monotonic() - sent
+                        span.set(status_code=response.status_code, first_byte_s=round(first_byte, 6))
+                finally:
+                    AZURE_IN_FLIGHT.dec(backend.spec.deployment)
+            except RateLimitExceeded:
+                self.backends.release(backend, True, time.monotonic() - started)
+                raise
+            except requests.exceptions.RequestException:
+                self.backends.release(backend, False, time.monotonic() - started)
+                raise
+            
+            self._record_attempt(backend, response.status_code, first_byte)
+            failed = response.status_code == 429 or response.status_code >= 500
+            self.backends.release(backend, not failed, time.monotonic() - started)
+            if failed and reservation is not None:
+                backend.rate_limiter.release(reservation)
+            
+            last["backend"] = backend
+            last["reservation"] = None if failed else reservation
+            return response
+        
+        response = call_with_retry(send, self.retry_policy, self.retry_stats)
+        return response, last["backend"], last["reservation"]
+    
+    def pool_stats(self) -> Dict[str, int]:
+        """Return connection pool hit/miss counters summed over backends."""
+        totals = {"requests": 0, "hits": 0, "misses": 0, "max_connections": 0}
+        for backend in self.backends.backends:
+            for name, value in backend.session.stats().items():
+                totals[name] += value
+        return totals
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return runtime counters for monitoring."""
+        stats = super().stats()
+        stats["pool"] = self.pool_stats()
+        if self.recorder is not None:
+            stats["cassette"] = self.recorder.stats()
+        return stats
 
 
 class MockAssistant(BaseAssistant):
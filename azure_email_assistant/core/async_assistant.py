@@ -0,0 +1,383 @@
+"""
+Asyncio assistant implementations for the Azure Email Assistant.
+"""
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+from azure_email_assistant.core.assistant import (
+    AssistantResponse, AzureClientMixin, BaseAssistant, EmailContent, FallbackReply
+)
+from azure_email_assistant.core.balancer import Backend
+from azure_email_assistant.core.circuit_breaker import CircuitOpenError
+from azure_email_assistant.core.config import azure_config
+from azure_email_assistant.core.metrics import AZURE_IN_FLIGHT
+from azure_email_assistant.core.ratelimit import RateLimitExceeded, Reservation
+from azure_email_assistant.core.retry import async_call_with_retry
+from azure_email_assistant.core.streaming import (
+    ReasoningStripper, StreamError, aiter_content_deltas
+)
+from azure_email_assistant.core.tokens import estimate_prompt_tokens
+from azure_email_assistant.core.tracing import SPAN_KIND_CLIENT, tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBaseAssistant(ABC):
+    """Base interface of assistants running on an asyncio event loop."""
+
+    preprocessor = BaseAssistant.preprocessor
+    prompt_budget = BaseAssistant.prompt_budget
+    knowledge = BaseAssistant.knowledge
+
+    @abstractmethod
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """Process an email and generate a response."""
+        pass
+
+    async def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """
+        Process an email and yield the reply as it is generated.
+
+        Assistants without native streaming yield the whole reply at once.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            Async iterator over reply text fragments
+
+        Raises:
+            StreamError: If no reply could be generated
+        """
+        result = await self.process_email(email)
+        if result.status == "error":
+            raise StreamError(result.error)
+        if result.response_text:
+            yield result.response_text
+
+    def stats(self) -> Dict[str, Any]:
+        """Return runtime counters for monitoring."""
+        return BaseAssistant.stats(self)
+
+    async def aclose(self) -> None:
+        """Release network resources held by the assistant."""
+        pass
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format email content into messages for the API."""
+        return BaseAssistant._format_messages(self, email)
+
+
+class ThreadedAssistant(AsyncBaseAssistant):
+    """Runs a synchronous assistant in worker threads.
+
+    Lets assistants without a native asyncio implementation, such as
+    ``MockAssistant`` or a ``CachingAssistant``, be served by the ASGI app.
+    """
+
+    def __init__(self, assistant: BaseAssistant):
+        """
+        Initialize the adapter.
+
+        Args:
+            assistant: Synchronous assistant to run
+        """
+        self.assistant = assistant
+
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """Process an email in a worker thread."""
+        return await asyncio.to_thread(self.assistant.process_email, email)
+
+    def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """Stream a reply, pulling each fragment in a worker thread."""
+        # Called here, so that a filter can skip the email on the call
+        return self._pull(iter(self.assistant.stream_email(email)))
+
+    async def _pull(self, fragments: Iterator[str]) -> AsyncIterator[str]:
+        """Yield the fragments of a synchronous stream."""
+        finished = object()
+        while True:
+            text = await asyncio.to_thread(next, fragments, finished)
+            if text is finished:
+                return
+            yield text
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the wrapped assistant's counters."""
+        return self.assistant.stats()
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format messages the way the wrapped assistant does."""
+        return self.assistant._format_messages(email)
+
+
+class AsyncAzureAssistant(AzureClientMixin, AsyncBaseAssistant):
+    """Azure OpenAI assistant on a shared ``httpx.AsyncClient``.
+
+    Waiting on Azure only holds a coroutine, not a thread, so a single
+    process can keep hundreds of completions in flight. Concurrency is
+    bounded by the client's connection pool, ``async_max_connections``.
+    """
+
+    def __init__(self, config=azure_config, client: Optional["httpx.AsyncClient"] = None):
+        """
+        Initialize with configuration.
+
+        Args:
+            config: AzureConfig to use
+            client: Client to send requests with; one sized from the
+                config is created on first use when omitted
+        """
+        if httpx is None:
+            raise ImportError("AsyncAzureAssistant requires httpx (pip install httpx)")
+
+        super().__init__(config)
+        self._client = client
+        self._retryable_exceptions = (httpx.TimeoutException, httpx.NetworkError)
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Client shared by every request of this assistant.
+
+        Created lazily so that its pool binds to the event loop that serves requests.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.config.async_max_connections,
+                    max_keepalive_connections=self.config.async_max_keepalive
+                ),
+                timeout=httpx.Timeout(
+                    self.config.read_timeout, connect=self.config.connect_timeout
+                )
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """
+        Process an email and generate a response using Azure OpenAI.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            AssistantResponse with the generated response or error
+        """
+        with tracer.request("process_email", deployment=self.config.deployment):
+            return await self._process_email(email)
+
+    async def _process_email(self, email: EmailContent) -> AssistantResponse:
+        """Call Azure OpenAI for an email within the current request."""
+        started = time.monotonic()
+        try:
+            # Preprocessing and the knowledge search are CPU-bound
+            payload = await asyncio.to_thread(self._build_payload, email)
+
+            # Fail fast while the backend is known to be down
+            with self.circuit_breaker.guard(self._classify_failure):
+                response, backend, reservation = await self._post(payload)
+                response.raise_for_status()
+
+            response_data = self._parse_response(response)
+            self._record_latency("total", started)
+
+            # Correct the quota estimate with the reported usage
+            self._settle_quota(backend, reservation, response_data.get("usage"))
+            self._record_usage(payload, response_data.get("usage"))
+
+            assistant_message = response_data["choices"][0]["message"]["content"]
+
+            return AssistantResponse(
+                status="success",
+                response_text=self._clean_response(assistant_message)
+            )
+
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Azure call: {str(e)}")
+            self._record_error(e)
+            if self.config.circuit_fallback:
+                return self._fallback_response(email)
+            return AssistantResponse(status="error", error=f"Service unavailable: {str(e)}")
+
+        except RateLimitExceeded as e:
+            error_message = f"Rate limit exceeded: {str(e)}"
+            logger.error(error_message)
+            self._record_error(e)
+            return AssistantResponse(status="error", error=error_message)
+
+        except httpx.HTTPError as e:
+            error_message = f"API request failed: {str(e)}"
+            logger.error(error_message)
+            self._record_error(e)
+            return AssistantResponse(status="error", error=error_message)
+
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            error_message = f"Error parsing API response: {str(e)}"
+            logger.error(error_message)
+            self._record_error(e)
+            return AssistantResponse(status="error", error=error_message)
+
+        except Exception as e:
+            error_message = f"Unexpected error: {str(e)}"
+            logger.error(error_message)
+            self._record_error(e)
+            return AssistantResponse(status="error", error=error_message)
+
+    async def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """
+        Stream a reply from Azure OpenAI, dropping the thinking section.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            Async iterator over reply text fragments
+
+        Raises:
+            CircuitOpenError: If the circuit is open and fallback is disabled
+            RateLimitExceeded: If no quota frees up in time
+            httpx.HTTPError: If the API request fails
+            StreamError: If the stream reports an error
+        """
+        payload = await asyncio.to_thread(self._build_payload, email, True)
+        stripper = ReasoningStripper(fallback=self._clean_response)
+        started = time.monotonic()
+        first_token = True
+        usage: Dict[str, Any] = {}
+        backend, reservation = None, None
+
+        try:
+            with self.circuit_breaker.guard(self._classify_failure):
+                response, backend, reservation = await self._post(payload, stream=True)
+                try:
+                    response.raise_for_status()
+
+                    async for delta in aiter_content_deltas(response.aiter_lines(), usage):
+                        text = stripper.feed(delta)
+                        if text:
+                            if first_token:
+                                self._record_latency("first_token", started)
+                                tracer.event("first_token")
+                                first_token = False
+                            yield text
+                finally:
+                    await response.aclose()
+                self._record_latency("total", started)
+        except CircuitOpenError:
+            if not self.config.circuit_fallback:
+                raise
+            yield FallbackReply(self._fallback_response(email).response_text)
+            return
+        except Exception:
+            if reservation is not None:
+                backend.rate_limiter.release(reservation)
+            raise
+
+        self._settle_quota(backend, reservation, usage)
+        self._record_usage(payload, usage)
+
+        text = stripper.finish()
+        if text:
+            yield text
+
+    def _classify_failure(self, error: BaseException) -> Optional[bool]:
+        """Decide how an exception counts towards the circuit breaker."""
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        if isinstance(error, httpx.HTTPError):
+            return True
+        return None
+
+    async def _acquire_quota(
+        self, backend: Backend, payload: Dict[str, Any]
+    ) -> Optional[Reservation]:
+        """Reserve rate limiter quota without blocking the event loop."""
+        if backend.rate_limiter is None:
+            return None
+        estimated = estimate_prompt_tokens(payload["messages"]) + payload["max_tokens"]
+        with tracer.span("azure.quota", deployment=backend.spec.deployment, tokens=estimated):
+            return await backend.rate_limiter.acquire_async(estimated)
+
+    async def _post(
+        self, payload: Dict[str, Any], stream: bool = False
+    ) -> Tuple["httpx.Response", Backend, Optional[Reservation]]:
+        """Send a completion request with retries, spreading attempts over backends.
+
+        Returns:
+            The final response, the backend that sent it and its quota reservation
+        """
+        tried: List[Backend] = []
+        last: Dict[str, Any] = {}
+
+        async def send(remaining: float) -> "httpx.Response":
+            backend = self.backends.acquire(exclude=tried)
+            tried.append(backend)
+            started = time.monotonic()
+            try:
+                reservation = await self._acquire_quota(backend, payload)
+                sent = time.monotonic()
+                request = self.client.build_request(
+                    "POST",
+                    backend.request_url,
+                    json=dict(payload, model=backend.spec.deployment),
+                    headers={"api-key": backend.spec.api_key},
+                    # Never wait for a response past the per-email deadline
+                    timeout=httpx.Timeout(
+                        max(min(self.config.read_timeout, remaining), 0.001),
+                        connect=self.config.connect_timeout
+                    )
+                )
+                AZURE_IN_FLIGHT.inc(backend.spec.deployment)
+                try:
+                    with tracer.span(
+                        "azure.request", SPAN_KIND_CLIENT,
+                        deployment=backend.spec.deployment, attempt=len(tried), stream=stream
+                    ) as span:
+                        response = await self.client.send(request, stream=stream)
+                        # Without streaming the body is read too, which Azure sends along with the headers
+                        first_byte = time.monotonic() - sent
+                        span.set(status_code=response.status_code, first_byte_s=round(first_byte, 6))
+                finally:
+                    AZURE_IN_FLIGHT.dec(backend.spec.deployment)
+            except RateLimitExceeded:
+                self.backends.release(backend, True, time.monotonic() - started)
+                raise
+            except httpx.HTTPError:
+                self.backends.release(backend, False, time.monotonic() - started)
+                raise
+            except BaseException:
+                # A cancelled email says nothing about the health of the backend
+                self.backends.release(backend, True, time.monotonic() - started)
+                raise
+
+            self._record_attempt(backend, response.status_code, first_byte)
+            failed = response.status_code == 429 or response.status_code >= 500
+            self.backends.release(backend, not failed, time.monotonic() - started)
+            if failed and reservation is not None:
+                backend.rate_limiter.release(reservation)
+
+            last["backend"] = backend
+            last["reservation"] = None if failed else reservation
+            return response
+
+        response = await async_call_with_retry(
+            send, self.retry_policy, self.retry_stats, self._retryable_exceptions
+        )
+        return response, last["backend"], last["reservation"]
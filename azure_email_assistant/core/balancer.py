@@ -0,0 +1,213 @@
+"""
+Load balancing across several Azure OpenAI endpoints and deployments.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from azure_email_assistant.core.config import AzureBackend
+from azure_email_assistant.core.http import PooledSession
+from azure_email_assistant.core.ratelimit import AzureRateLimiter, get_rate_limiter
+
+
+logger = logging.getLogger(__name__)
+
+
+LEAST_OUTSTANDING = "least_outstanding"
+LATENCY_WEIGHTED = "latency_weighted"
+
+# Smoothing factor of the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class Backend:
+    """Runtime state of one Azure backend."""
+
+    def __init__(self, spec: AzureBackend, config: Any):
+        """
+        Initialize the backend.
+
+        Args:
+            spec: Backend endpoint, deployment and credentials
+            config: AzureConfig with pool and rate limit settings
+        """
+        self.spec = spec
+        self.name = f"{spec.endpoint}#{spec.deployment}"
+        self.request_url = (
+            f"{spec.endpoint}openai/deployments/{spec.deployment}"
+            f"/chat/completions?api-version={spec.api_version}"
+        )
+        self.session = PooledSession(
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            pool_block=config.pool_block,
+            headers={
+                "Content-Type": "application/json",
+                "api-key": spec.api_key
+            }
+        )
+        self.rate_limiter: Optional[AzureRateLimiter] = get_rate_limiter(config, spec)
+
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.total_latency = 0.0
+        self.unhealthy_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        """Whether the backend is in rotation."""
+        return now >= self.unhealthy_until
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        """Return latency, error and load figures."""
+        stats = {
+            "deployment": self.spec.deployment,
+            "endpoint": self.spec.endpoint,
+            "healthy": self.is_healthy(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "latency_ewma_seconds": self.latency_ewma,
+            "avg_latency_seconds": self.total_latency / self.requests if self.requests else None,
+            "pool": self.session.stats()
+        }
+        if self.rate_limiter is not None:
+            stats["rate_limit"] = self.rate_limiter.stats()
+        return stats
+
+
+class BackendPool:
+    """Spreads requests over backends and takes failing ones out of rotation.
+
+    ``least_outstanding`` picks the backend with the fewest in-flight
+    requests relative to its weight. ``latency_weighted`` samples two
+    backends by weight and keeps the one with the lower expected latency
+    (moving average latency times queue length). A backend that fails
+    ``failure_threshold`` times in a row is skipped for ``cooldown``
+    seconds.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Backend],
+        strategy: str = LEAST_OUTSTANDING,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            backends: Backends to balance over
+            strategy: ``least_outstanding`` or ``latency_weighted``
+            failure_threshold: Consecutive failures that eject a backend
+            cooldown: Seconds an ejected backend stays out of rotation
+        """
+        if not backends:
+            raise ValueError("At least one backend is required")
+        if strategy not in (LEAST_OUTSTANDING, LATENCY_WEIGHTED):
+            raise ValueError(f"Unknown balancing strategy: {strategy}")
+
+        self.backends = list(backends)
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Any) -> "BackendPool":
+        """Build a pool from an AzureConfig."""
+        return cls(
+            [Backend(spec, config) for spec in config.get_backends()],
+            strategy=config.balancing_strategy,
+            failure_threshold=config.backend_failure_threshold,
+            cooldown=config.backend_cooldown_seconds
+        )
+
+    def acquire(self, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        Pick a backend and count a request as outstanding on it.
+
+        Args:
+            exclude: Backends to avoid if any other is available, such as
+                those that already failed for this email
+
+        Returns:
+            The chosen backend; must be handed back with ``release``
+        """
+        with self._lock:
+            now = time.monotonic()
+            healthy = [backend for backend in self.backends if backend.is_healthy(now)]
+            candidates = [backend for backend in healthy if backend not in exclude] or healthy
+
+            if not candidates:
+                # Everything is ejected: use whichever comes back soonest
+                candidates = [min(self.backends, key=lambda backend: backend.unhealthy_until)]
+
+            backend = self._choose(candidates)
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend: Backend, success: bool, latency: float) -> None:
+        """
+        Record the outcome of a request on a backend.
+
+        Args:
+            backend: Backend returned by ``acquire``
+            success: Whether the backend served the request
+            latency: Time until the response headers arrived, in seconds
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            backend.requests += 1
+            backend.total_latency += latency
+
+            if success:
+                backend.consecutive_failures = 0
+                if backend.latency_ewma is None:
+                    backend.latency_ewma = latency
+                else:
+                    backend.latency_ewma += LATENCY_EWMA_ALPHA * (latency - backend.latency_ewma)
+                return
+
+            backend.errors += 1
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failure_threshold:
+                backend.unhealthy_until = time.monotonic() + self.cooldown
+                backend.consecutive_failures = 0
+                logger.warning(
+                    f"Backend {backend.name} failed {self.failure_threshold} times in a row, "
+                    f"out of rotation for {self.cooldown:.0f}s"
+                )
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return per-backend figures."""
+        with self._lock:
+            now = time.monotonic()
+            return [backend.stats(now) for backend in self.backends]
+
+    def _choose(self, candidates: List[Backend]) -> Backend:
+        """Apply the balancing strategy to the candidate backends."""
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self.strategy == LATENCY_WEIGHTED:
+            weights = [backend.spec.weight for backend in candidates]
+            sampled = random.choices(candidates, weights=weights, k=2)
+            return min(sampled, key=self._expected_latency)
+
+        return min(
+            candidates,
+            key=lambda backend: (backend.outstanding / backend.spec.weight, random.random())
+        )
+
+    def _expected_latency(self, backend: Backend) -> float:
+        """Expected wait on a backend; unmeasured backends are tried first."""
+        if backend.latency_ewma is None:
+            return 0.0
+        return backend.latency_ewma * (backend.outstanding + 1) / backend.spec.weight
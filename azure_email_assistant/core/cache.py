@@ -0,0 +1,244 @@
+"""
+Response caching for repeated emails.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from azure_email_assistant.core.assistant import (
+    BaseAssistant, EmailContent, AssistantResponse, FallbackReply
+)
+from azure_email_assistant.core.async_assistant import AsyncBaseAssistant
+from azure_email_assistant.core.config import cache_config
+
+
+# Config fields that change the generated reply for the same email
+KEY_CONFIG_FIELDS = ("deployment", "temperature")
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry time to live."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached replies
+            ttl: Seconds a cached reply stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached reply for a key, if present and fresh."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a reply, evicting the least recently used entries if full."""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss and eviction counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_ratio": self._hits / lookups if lookups else 0.0
+            }
+
+
+class CachingAssistant(BaseAssistant):
+    """Assistant wrapper that answers repeated emails from a cache."""
+
+    def __init__(self, assistant: BaseAssistant, cache: Optional[ResponseCache] = None):
+        """
+        Initialize the caching wrapper.
+
+        Args:
+            assistant: Assistant that generates replies on a cache miss
+            cache: Cache to use; a default one is created when omitted
+        """
+        self.assistant = assistant
+        self.cache = cache or ResponseCache(
+            max_entries=cache_config.max_entries,
+            ttl=cache_config.ttl
+        )
+
+    def process_email(self, email: EmailContent) -> AssistantResponse:
+        """
+        Return a cached reply for the email or generate and cache a new one.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            AssistantResponse with the generated or cached response
+        """
+        key = self.cache_key(email)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return AssistantResponse(status="success", response_text=cached)
+
+        result = self.assistant.process_email(email)
+        if result.status == "success" and result.response_text:
+            self.cache.set(key, result.response_text)
+        return result
+
+    def stream_email(self, email: EmailContent) -> Iterator[str]:
+        """Stream a reply, serving it from the cache when possible."""
+        key = self.cache_key(email)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks: List[str] = []
+        fallback = False
+        for text in self.assistant.stream_email(email):
+            chunks.append(text)
+            fallback = fallback or isinstance(text, FallbackReply)
+            yield text
+
+        # The canned reply of an open circuit must not outlive the outage
+        if chunks and not fallback:
+            self.cache.set(key, ''.join(chunks))
+
+    def cache_key(self, email: EmailContent) -> str:
+        """
+        Compute the cache key for an email.
+
+        The key covers the sender, the subject and the preprocessed body,
+        whitespace-normalized, and the config fields of the wrapped
+        assistant that influence the reply. The prompt is not built: its
+        documents and ``max_tokens`` follow from these, and building it
+        would repeat the knowledge search on every lookup. The
+        preprocessor remembers recent bodies, so a miss cleans it once.
+        """
+        config = getattr(self.assistant, 'config', None)
+        settings = {
+            name: getattr(config, name, None) for name in KEY_CONFIG_FIELDS
+        }
+
+        material = json.dumps(
+            {
+                "from_email": _normalize(email.from_email),
+                "subject": _normalize(email.subject),
+                "body": _normalize(self.assistant.preprocessor.clean(email.body)),
+                "config": settings
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters along with those of the wrapped assistant."""
+        stats = dict(self.assistant.stats())
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+class AsyncCachingAssistant(AsyncBaseAssistant):
+    """Asyncio counterpart of ``CachingAssistant``."""
+
+    cache_key = CachingAssistant.cache_key
+    stats = CachingAssistant.stats
+
+    def __init__(self, assistant: AsyncBaseAssistant, cache: Optional[ResponseCache] = None):
+        """
+        Initialize the caching wrapper.
+
+        Args:
+            assistant: Assistant that generates replies on a cache miss
+            cache: Cache to use; a default one is created when omitted
+        """
+        self.assistant = assistant
+        self.cache = cache or ResponseCache(
+            max_entries=cache_config.max_entries,
+            ttl=cache_config.ttl
+        )
+
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """Return a cached reply for the email or generate and cache a new one."""
+        key = self.cache_key(email)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return AssistantResponse(status="success", response_text=cached)
+
+        result = await self.assistant.process_email(email)
+        if result.status == "success" and result.response_text:
+            self.cache.set(key, result.response_text)
+        return result
+
+    async def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """Stream a reply, serving it from the cache when possible."""
+        key = self.cache_key(email)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks: List[str] = []
+        fallback = False
+        async for text in self.assistant.stream_email(email):
+            chunks.append(text)
+            fallback = fallback or isinstance(text, FallbackReply)
+            yield text
+
+        if chunks and not fallback:
+            self.cache.set(key, ''.join(chunks))
+
+    async def aclose(self) -> None:
+        """Close the wrapped assistant."""
+        await self.assistant.aclose()
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace so formatting differences share a key."""
+    return _WHITESPACE.sub(' ', text).strip()
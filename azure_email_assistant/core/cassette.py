@@ -0,0 +1,340 @@
+"""
+Cassettes of recorded Azure OpenAI exchanges, for replaying traffic offline.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import timedelta
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from azure_email_assistant.core.tracing import current_request_id
+
+if TYPE_CHECKING:
+    from azure_email_assistant.core.assistant import EmailContent
+
+
+logger = logging.getLogger(__name__)
+
+
+# Response headers worth keeping; the rest is Azure bookkeeping
+RECORDED_HEADERS = ("content-type", "retry-after", "retry-after-ms")
+
+
+class CassetteMissError(LookupError):
+    """Raised when a cassette has no recording of a request."""
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Identify a completion request by the messages sent to Azure."""
+    messages = json.dumps(payload["messages"], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(messages.encode("utf-8")).hexdigest()[:32]
+
+
+def _to_text(chunk: bytes) -> str:
+    """Store body bytes as text; bytes of a split character survive the round trip."""
+    return chunk.decode("utf-8", "surrogateescape")
+
+
+def _to_bytes(text: str) -> bytes:
+    """Restore body bytes stored by ``_to_text``."""
+    return text.encode("utf-8", "surrogateescape")
+
+
+class CassetteRecorder:
+    """Appends Azure exchanges to a cassette file.
+
+    Each exchange is one JSON line holding the email, a hash of the
+    prompt (see ``request_key``), the final status and headers after
+    retries, and the body chunks with their offsets in seconds from the
+    start of the call. With a ``.gz`` path every line is its own gzip
+    member, so the cassette stays readable while it grows.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the recorder.
+
+        Args:
+            path: Cassette file; compressed when it ends in ``.gz``
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._recorded = 0
+        self._failed = 0
+
+    def record(
+        self,
+        email: "EmailContent",
+        payload: Dict[str, Any],
+        response: requests.Response,
+        started: float
+    ) -> requests.Response:
+        """
+        Record a response; a streamed one is recorded as its body is read.
+
+        Args:
+            email: Email the request was built from
+            payload: Request body sent to Azure
+            response: Final response after retries
+            started: ``time.monotonic()`` when the call started
+
+        Returns:
+            The response, to be used in place of the one passed in
+        """
+        entry = self._entry(email, payload, time.monotonic() - started)
+        entry["status"] = response.status_code
+        entry["headers"] = {
+            name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers
+        }
+
+        if not entry["stream"] or response.status_code >= 400:
+            # Error bodies are read now, as the caller may never read them
+            entry["chunks"] = [_to_text(response.content)]
+            entry["offsets"] = [round(time.monotonic() - started, 4)]
+            self._write(entry)
+        else:
+            response.raw = _RecordingBody(response.raw, entry, started, self._write)
+        return response
+
+    def record_error(
+        self,
+        email: "EmailContent",
+        payload: Dict[str, Any],
+        error: requests.exceptions.RequestException,
+        started: float
+    ) -> None:
+        """Record a call that failed without a response, such as a timeout."""
+        entry = self._entry(email, payload, time.monotonic() - started)
+        entry["error"] = type(error).__name__
+        entry["message"] = str(error)
+        self._write(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return recording counters."""
+        with self._lock:
+            return {"path": self.path, "recorded": self._recorded, "failed": self._failed}
+
+    def _entry(self, email: "EmailContent", payload: Dict[str, Any], latency: float) -> Dict[str, Any]:
+        """Start the cassette entry of a request."""
+        return {
+            "key": request_key(payload),
+            "stream": bool(payload.get("stream")),
+            "deployment": payload.get("model"),
+            "request_id": current_request_id(),
+            "recorded_at": round(time.time(), 3),
+            "email": {"from_email": email.from_email, "subject": email.subject, "body": email.body},
+            "latency": round(latency, 4)
+        }
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        """Append one entry to the cassette."""
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+        if self.path.endswith(".gz"):
+            line = gzip.compress(line)
+        try:
+            with self._lock:
+                with open(self.path, "ab") as file:
+                    file.write(line)
+                self._recorded += 1
+        except OSError as e:
+            logger.warning(f"Could not record Azure exchange: {str(e)}")
+            with self._lock:
+                self._failed += 1
+
+
+class _RecordingBody:
+    """Streamed response body that notes each chunk and when it arrived."""
+
+    def __init__(self, raw: Any, entry: Dict[str, Any], started: float, write):
+        self._raw = raw
+        self._entry = entry
+        self._started = started
+        self._write = write
+
+    def stream(self, amount: int = 2 ** 16, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        """Read the body like urllib3 does, recording it once it ends."""
+        chunks: List[str] = []
+        offsets: List[float] = []
+        try:
+            for chunk in self._raw.stream(amount, decode_content=decode_content):
+                chunks.append(_to_text(chunk))
+                offsets.append(round(time.monotonic() - self._started, 4))
+                yield chunk
+        except GeneratorExit:
+            # The reader stopped early; keep what it saw
+            self._entry["truncated"] = True
+            raise
+        finally:
+            self._entry["chunks"] = chunks
+            self._entry["offsets"] = offsets
+            self._write(self._entry)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+def read_cassette(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the entries of a cassette.
+
+    A line cut short by a crash while recording ends the cassette.
+
+    Args:
+        path: Cassette file; read as gzip when it ends in ``.gz``
+
+    Returns:
+        Iterator over entries in recorded order
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, zlib.error, json.JSONDecodeError) as e:
+            logger.warning(f"Cassette {path} ends in an incomplete entry: {str(e)}")
+
+
+class Cassette:
+    """Recorded exchanges, looked up by prompt.
+
+    An email recorded several times is served its recordings in order,
+    then from the first again, so a day of traffic can be replayed in
+    a loop.
+    """
+
+    def __init__(self, path: str):
+        """
+        Load a cassette.
+
+        Args:
+            path: Cassette file written by ``CassetteRecorder``
+        """
+        self.path = path
+        self.entries = list(read_cassette(path))
+        self._recordings: Dict[Tuple[str, bool], List[Dict[str, Any]]] = {}
+        for entry in self.entries:
+            self._recordings.setdefault((entry["key"], entry["stream"]), []).append(entry)
+        self._served: Dict[Tuple[str, bool], int] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def emails(self) -> List[Dict[str, str]]:
+        """Return the recorded emails in order, as ``EmailContent`` fields."""
+        return [entry["email"] for entry in self.entries]
+
+    def lookup(self, payload: Dict[str, Any], stream: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Find the next recording of a request.
+
+        Args:
+            payload: Request body that would be sent to Azure
+            stream: Whether a streamed response is wanted
+
+        Returns:
+            The cassette entry, or None if the request was not recorded
+        """
+        key = (request_key(payload), stream)
+        recordings = self._recordings.get(key)
+        with self._lock:
+            if not recordings:
+                self._misses += 1
+                return None
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            self._hits += 1
+        return recordings[served % len(recordings)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup counters."""
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self._hits, "misses": self._misses}
+
+
+def replay_response(
+    entry: Dict[str, Any], url: str, started: float, time_scale: float = 1.0
+) -> requests.Response:
+    """
+    Rebuild the response of a recorded exchange.
+
+    Waits until the response arrived in the recording, relative to
+    ``started`` and stretched by ``time_scale``; a streamed body then
+    yields its chunks at their recorded offsets.
+
+    Args:
+        entry: Cassette entry
+        url: URL to report on the response
+        started: ``time.monotonic()`` when the call started
+        time_scale: Factor applied to every recorded delay; 0 replays
+            at full speed
+
+    Returns:
+        The response
+
+    Raises:
+        requests.exceptions.RequestException: If the recorded call failed
+            without a response
+    """
+    _sleep_until(started + entry["latency"] * time_scale)
+    if "error" in entry:
+        error = getattr(requests.exceptions, entry["error"], requests.exceptions.RequestException)
+        raise error(entry["message"])
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    try:
+        response.reason = HTTPStatus(entry["status"]).phrase
+    except ValueError:
+        response.reason = ""
+    response.url = url
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = "utf-8"
+    response.elapsed = timedelta(seconds=entry["latency"])
+
+    if entry["stream"] and entry["status"] < 400:
+        response.raw = _ReplayBody(entry, started, time_scale)
+    else:
+        response._content = b"".join(_to_bytes(chunk) for chunk in entry["chunks"])
+        response._content_consumed = True
+    return response
+
+
+class _ReplayBody:
+    """Streamed response body that yields recorded chunks at their offsets."""
+
+    def __init__(self, entry: Dict[str, Any], started: float, time_scale: float):
+        self._entry = entry
+        self._started = started
+        self._time_scale = time_scale
+
+    def stream(self, amount: int = 2 ** 16, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        """Yield the body chunks as they were received."""
+        for chunk, offset in zip(self._entry["chunks"], self._entry["offsets"]):
+            _sleep_until(self._started + offset * self._time_scale)
+            yield _to_bytes(chunk)
+
+    def close(self) -> None:
+        pass
+
+
+def _sleep_until(deadline: float) -> None:
+    """Sleep until a ``time.monotonic()`` deadline, if it is still ahead."""
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
@@ -0,0 +1,206 @@
+"""
+Circuit breaker guarding calls to the Azure OpenAI backend.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+
+class CircuitBreaker:
+    """Failure-rate and slow-call circuit breaker.
+
+    The breaker keeps a sliding window of the last ``window_size`` call
+    outcomes. Once at least ``min_calls`` are recorded and the failure
+    rate or the slow-call rate reaches its threshold, the circuit opens
+    and calls are rejected for ``open_seconds``. It then lets up to
+    ``half_open_max_calls`` trial calls through: if they all succeed the
+    circuit closes, if any fails it opens again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str = "azure",
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 120.0,
+        slow_call_rate_threshold: float = 1.0,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Initialize the breaker in the closed state.
+
+        Args:
+            name: Name used in logs
+            failure_rate_threshold: Failure ratio that opens the circuit
+            slow_call_seconds: Duration above which a call counts as slow
+            slow_call_rate_threshold: Slow-call ratio that opens the circuit
+            window_size: Number of recent calls considered
+            min_calls: Calls needed in the window before it can open
+            open_seconds: Time the circuit stays open before probing
+            half_open_max_calls: Trial calls allowed while half-open
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self._rejected = 0
+        self._transitions: Deque[Dict[str, str]] = deque(maxlen=20)
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the wait is over."""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may proceed.
+
+        Every allowed call must be followed by ``record``.
+
+        Returns:
+            True if the call may go to the backend
+        """
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+
+            self._rejected += 1
+            return False
+
+    def record(self, success: Optional[bool], duration: float) -> None:
+        """
+        Record the outcome of an allowed call.
+
+        Args:
+            success: Whether the backend handled the call; None if the
+                call never reached the backend and should not count
+            duration: Call duration in seconds
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if success is None:
+                    self._trial_calls = max(self._trial_calls - 1, 0)
+                elif not success:
+                    self._transition(self.OPEN, "trial call failed")
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_max_calls:
+                        self._transition(self.CLOSED, "trial calls succeeded")
+                return
+
+            if success is None or self._state != self.CLOSED:
+                return
+
+            self._window.append((not success, duration >= self.slow_call_seconds))
+            if len(self._window) < self.min_calls:
+                return
+
+            calls = len(self._window)
+            failure_rate = sum(1 for failed, _ in self._window if failed) / calls
+            slow_rate = sum(1 for _, slow in self._window if slow) / calls
+            if failure_rate >= self.failure_rate_threshold:
+                self._transition(self.OPEN, f"failure rate {failure_rate:.0%}")
+            elif slow_rate >= self.slow_call_rate_threshold:
+                self._transition(self.OPEN, f"slow call rate {slow_rate:.0%}")
+
+    @contextmanager
+    def guard(self, classify: Callable[[BaseException], Optional[bool]]) -> Iterator[None]:
+        """
+        Run a block as a guarded call.
+
+        Args:
+            classify: Maps an exception raised by the block to True if it
+                is a backend failure, False if the backend still handled
+                the call, or None if the call should not count
+
+        Raises:
+            CircuitOpenError: If the circuit rejects the call
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            failed = classify(e)
+            self.record(None if failed is None else not failed, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the breaker state, window figures and recent transitions."""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            calls = len(self._window)
+            failures = sum(1 for failed, _ in self._window if failed)
+            slow = sum(1 for _, is_slow in self._window if is_slow)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "failure_rate": failures / calls if calls else 0.0,
+                "slow_call_rate": slow / calls if calls else 0.0,
+                "rejected": self._rejected,
+                "transitions": list(self._transitions)
+            }
+
+    def _maybe_half_open(self, now: float) -> None:
+        """Move from open to half-open once the open period has elapsed."""
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(self.HALF_OPEN, "open period elapsed")
+
+    def _transition(self, state: str, reason: str) -> None:
+        """Change state and record the transition. Caller holds the lock."""
+        previous = self._state
+        self._state = state
+        self._trial_calls = 0
+        self._trial_successes = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        if state == self.CLOSED:
+            self._window.clear()
+
+        self._transitions.append({
+            "from": previous,
+            "to": state,
+            "reason": reason,
+            "timestamp": datetime.now().isoformat()
+        })
+        log = logger.info if state == self.CLOSED else logger.warning
+        log(f"Circuit '{self.name}' {previous} -> {state}: {reason}")
@@ -1,7 +1,23 @@
 """
 Configuration settings for the Azure Email Assistant.
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class AzureBackend:
+    """One Azure OpenAI endpoint/deployment that can serve completions.
+    
+    Quotas left as None inherit the rate limit settings of AzureConfig.
+    """
+    endpoint: str
+    api_key: str
+    deployment: str
+    api_version: str = "2024-08-01-preview"
+    weight: float = 1.0
+    rate_limit_rpm: Optional[int] = None
+    rate_limit_tpm: Optional[int] = None
 
 
 @dataclass
@@ -16,6 +32,44 @@ class AzureConfig:
     top_p: float = 0.9
     frequency_penalty: float = 0
     presence_penalty: float = 0
+    connect_timeout: float = 10.0
+    read_timeout: float = 180.0
+    pool_connections: int = 4
+    pool_maxsize: int = 20
+    pool_block: bool = False
+    async_max_connections: int = 200
+    async_max_keepalive: int = 50
+    retry_max_attempts: int = 4
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 30.0
+    request_deadline: float = 240.0
+    rate_limit_rpm: int = 0
+    rate_limit_tpm: int = 0
+    rate_limit_max_wait: float = 30.0
+    circuit_failure_rate: float = 0.5
+    circuit_slow_call_seconds: float = 120.0
+    circuit_slow_call_rate: float = 1.0
+    circuit_window: int = 20
+    circuit_min_calls: int = 5
+    circuit_open_seconds: float = 30.0
+    circuit_half_open_calls: int = 1
+    circuit_fallback: bool = True
+    backends: List[AzureBackend] = field(default_factory=list)
+    balancing_strategy: str = "least_outstanding"
+    backend_failure_threshold: int = 3
+    backend_cooldown_seconds: float = 30.0
+    cassette_path: str = ""
+    
+    def get_backends(self) -> List[AzureBackend]:
+        """Return the configured backends, or the single default one."""
+        if self.backends:
+            return list(self.backends)
+        return [AzureBackend(
+            endpoint=self.endpoint,
+            api_key=self.api_key,
+            deployment=self.deployment,
+            api_version=self.api_version
+        )]
 
 
 @dataclass
@@ -24,6 +78,198 @@ class APIConfig:
     host: str = "0.0.0.0"
     port: int = 5000
     secret_key: str = "your-secret-key-here"
+    async_mode: bool = False
+    job_workers: int = 4
+    job_queue_size: int = 100
+    job_result_ttl: int = 3600
+    batch_concurrency: int = 8
+    batch_max_size: int = 100
+    idempotency_enabled: bool = True
+    idempotency_ttl: int = 600
+    drain_timeout: float = 25.0
+    drain_retry_after: int = 30
+    job_spool_path: str = "job_spool.jsonl"
+    job_store_path: str = ""
+    job_store_batch_size: int = 256
+    server_workers: int = 2
+    server_threads: int = 8
+    server_preload: bool = True
+    server_max_requests: int = 1000
+    server_max_requests_jitter: int = 100
+    server_timeout: int = 300
+    server_graceful_timeout: int = 30
+    server_keepalive: int = 5
+    server_metrics_dir: str = ""
+
+
+@dataclass
+class CacheConfig:
+    """Response cache configuration."""
+    enabled: bool = False
+    max_entries: int = 1024
+    ttl: int = 3600
+
+
+@dataclass
+class PromptConfig:
+    """Prompt size budget configuration."""
+    context_window: int = 128000
+    max_input_tokens: int = 16000
+    min_completion_tokens: int = 1024
+    safety_margin: float = 0.1
+    head_ratio: float = 0.7
+
+
+@dataclass
+class PreprocessConfig:
+    """Email body preprocessing configuration."""
+    enabled: bool = True
+    convert_html: bool = True
+    max_html_chars: int = 2_000_000
+    strip_quoted_history: bool = True
+    strip_quote_blocks: bool = True
+    strip_signatures: bool = True
+    strip_disclaimers: bool = True
+    disclaimer_patterns: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RetrievalConfig:
+    """Knowledge document retrieval configuration."""
+    enabled: bool = False
+    documents_path: str = "knowledge"
+    index_path: str = ".knowledge_index"
+    passage_words: int = 120
+    top_k: int = 4
+    max_context_tokens: int = 1500
+    max_query_terms: int = 32
+    max_postings: int = 12000
+    refresh_interval: float = 60.0
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+
+
+@dataclass
+class TracingConfig:
+    """Request tracing configuration.
+    
+    Spans are appended as OTLP/JSON lines to file_path, or posted to
+    collector_endpoint (an OTLP/HTTP traces URL such as
+    http://localhost:4318/v1/traces) when it is set.
+    """
+    enabled: bool = False
+    service_name: str = "azure-email-assistant"
+    file_path: str = "traces.jsonl"
+    collector_endpoint: str = ""
+    export_timeout: float = 5.0
+    batch_size: int = 256
+    flush_interval: float = 2.0
+    max_queue_size: int = 10000
+
+
+@dataclass
+class FilterRule:
+    """Pattern marking emails that must not get an automatic reply.
+    
+    Patterns are matched against the lower-cased field.
+    """
+    name: str
+    field: str  # "from_email", "subject" or "body"
+    pattern: str
+
+
+# Optional "RE:"/"FW:" prefixes in front of auto-reply and bounce subjects
+_SUBJECT_PREFIX = r'^\s*(?:(?:re|fw|fwd|vá|tov|aw|wg)\s*:\s*)*'
+
+
+def default_filter_rules() -> List[FilterRule]:
+    """Rules for auto-replies, bounces and unattended senders."""
+    return [
+        FilterRule(
+            name="noreply_sender",
+            field="from_email",
+            pattern=r'^(?:no-?reply|do-?not-?reply|mailer-daemon|postmaster|bounces?)'
+                    r'(?:[+._-][^@]*)?@'
+        ),
+        FilterRule(
+            name="auto_reply_subject",
+            field="subject",
+            pattern=_SUBJECT_PREFIX + r'(?:automatic reply|auto[- ]?reply|out of (?:the )?office|'
+                    r'automatikus válasz|házon kívül|abwesenheitsnotiz|automatische antwort)\b'
+        ),
+        FilterRule(
+            name="bounce_subject",
+            field="subject",
+            pattern=_SUBJECT_PREFIX + r'(?:undeliverable|undelivered mail|delivery status notification|'
+                    r'mail delivery (?:failed|failure|subsystem)|returned mail|failure notice|'
+                    r'kézbesíthetetlen|nem kézbesíthető|kézbesítési hiba)\b'
+        ),
+        FilterRule(
+            name="bounce_body",
+            field="body",
+            pattern=r'delivery has failed to these recipients|'
+                    r'could not be delivered to one or more recipients|'
+                    r'nem sikerült kézbesíteni|kézbesítése sikertelen'
+        )
+    ]
+
+
+@dataclass
+class FilterConfig:
+    """Pre-send filter configuration."""
+    enabled: bool = True
+    rules: List[FilterRule] = field(default_factory=default_filter_rules)
+    own_addresses: List[str] = field(default_factory=list)
+    loop_marker: str = "smp-assistant-reply"
+    mark_replies: bool = True
+    body_scan_chars: int = 2048
+
+
+def default_reply_templates() -> Dict[str, str]:
+    """Canned replies keyed by "<language>:<intent>"."""
+    hungarian_signature = "<br><br>Üdvözlettel,<br>Gergő Krucsai<br>SMP Solution"
+    english_signature = "<br><br>Best regards,<br>Gergő Krucsai<br>SMP Solution"
+    return {
+        "hu:acknowledgement": (
+            "Kedves Ügyfelünk!<br><br>Köszönjük visszajelzését, üzenetét megkaptuk."
+            + hungarian_signature
+        ),
+        "hu:test": (
+            "Kedves Ügyfelünk!<br><br>Köszönjük üzenetét, megkaptuk. Ha kérdése van, kérjük, "
+            "írja meg, és kollégánk hamarosan válaszol." + hungarian_signature
+        ),
+        "en:acknowledgement": (
+            "Dear Customer,<br><br>Thank you for your message, we have received it."
+            + english_signature
+        ),
+        "en:test": (
+            "Dear Customer,<br><br>Thank you for your message, we have received it. If you have "
+            "a question, please let us know and a colleague will get back to you soon."
+            + english_signature
+        )
+    }
+
+
+@dataclass
+class RouterConfig:
+    """Tiered routing configuration.
+    
+    Emails go to a template reply, the fast deployment or the reasoning
+    deployment of AzureConfig; the fast tier is used only when
+    fast_deployment is set.
+    """
+    enabled: bool = False
+    template_max_words: int = 30
+    fast_max_words: int = 150
+    fast_deployment: str = ""
+    fast_backends: List[AzureBackend] = field(default_factory=list)
+    fast_max_tokens: int = 1024
+    reasoning_keywords: List[str] = field(default_factory=lambda: [
+        "invoice", "contract", "complaint", "refund", "warranty", "legal", "price", "offer",
+        "számla", "szerződés", "panasz", "reklamáció", "garancia", "jogi", "ár", "ajánlat"
+    ])
+    templates: Dict[str, str] = field(default_factory=default_reply_templates)
+    latency_window: int = 1000
 
 
 @dataclass
@@ -38,4 +284,11 @@ class EmailConfig:
 # Create default configuration instances
 azure_config = AzureConfig()
 api_config = APIConfig()
+cache_config = CacheConfig()
+preprocess_config = PreprocessConfig()
+prompt_config = PromptConfig()
+retrieval_config = RetrievalConfig()
+tracing_config = TracingConfig()
+filter_config = FilterConfig()
+router_config = RouterConfig()
 email_config = EmailConfig()
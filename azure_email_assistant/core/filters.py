@@ -0,0 +1,250 @@
+"""
+Pre-send filtering of emails that must not get an automatic reply.
+"""
+import logging
+import re
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Pattern, Tuple
+
+from azure_email_assistant.core.assistant import AssistantResponse, BaseAssistant, EmailContent
+from azure_email_assistant.core.async_assistant import AsyncBaseAssistant
+from azure_email_assistant.core.config import filter_config
+
+
+logger = logging.getLogger(__name__)
+
+
+FIELDS = ("from_email", "subject", "body")
+LOOP_RULE = "loop_marker"
+OWN_ADDRESS_RULE = "own_address"
+
+# Hidden element carrying the loop marker in the HTML replies
+MARK_TEMPLATE = '<span style="display:none">{marker}</span>'
+
+# Start of quoted history; a marker after one is a person quoting our reply
+QUOTE_BOUNDARY = re.compile(
+    r'<blockquote|divRplyFwdMsg|gmail_quote|^\s*>|^-{2,}\s*original message|'
+    r'\bwrote:\s*$|\bírta:\s*$|^\s*\*?(?:from|feladó|von)\s*:',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+class EmailSkipped(Exception):
+    """Raised when streaming a reply to an email the filter skips."""
+
+    def __init__(self, rule: str):
+        super().__init__(f"Skipped by rule {rule}")
+        self.rule = rule
+
+
+class PreSendFilter:
+    """Classifies emails that need no reply before any Azure call.
+
+    Auto-replies, bounces, unattended senders, our own mailboxes and our
+    own replies coming back (detected by a marker added to every reply)
+    are matched by patterns compiled once, checking only the sender, the
+    subject and the start of the body. Patterns are matched against the
+    lower-cased text, which is several times faster than ``re.IGNORECASE``
+    on non-ASCII patterns.
+    """
+
+    def __init__(self, config=filter_config):
+        """
+        Compile the configured rules.
+
+        Args:
+            config: FilterConfig with the rules to apply
+
+        Raises:
+            ValueError: If a rule names an unknown field
+        """
+        self.config = config
+        self._rules: List[Tuple[str, str, Pattern]] = []
+        for rule in config.rules:
+            if rule.field not in FIELDS:
+                raise ValueError(f"Filter rule {rule.name} has unknown field {rule.field}")
+            self._rules.append((rule.name, rule.field, re.compile(rule.pattern)))
+        self._own_addresses = {address.strip().lower() for address in config.own_addresses}
+
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._skipped: Dict[str, int] = {}
+
+    def match(self, email: EmailContent) -> Optional[str]:
+        """
+        Find the rule that skips an email.
+
+        Args:
+            email: Email to classify
+
+        Returns:
+            Name of the first matching rule, or None to reply
+        """
+        rule = self._match(email)
+        with self._lock:
+            self._checked += 1
+            if rule is not None:
+                self._skipped[rule] = self._skipped.get(rule, 0) + 1
+        if rule is not None:
+            logger.info(f"Skipping email from {email.from_email}: matched rule {rule}")
+        return rule
+
+    def mark(self, text: str) -> str:
+        """Add the loop marker to a reply."""
+        if not self.config.mark_replies or not self.config.loop_marker:
+            return text
+        return text + MARK_TEMPLATE.format(marker=self.config.loop_marker)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of emails checked and skipped per rule."""
+        with self._lock:
+            return {
+                "checked": self._checked,
+                "skipped": sum(self._skipped.values()),
+                "rules": dict(self._skipped)
+            }
+
+    def _match(self, email: EmailContent) -> Optional[str]:
+        """Return the first matching rule without counting it."""
+        if email.from_email.strip().lower() in self._own_addresses:
+            return OWN_ADDRESS_RULE
+
+        values = {
+            "from_email": email.from_email.strip().lower(),
+            "subject": email.subject.lower(),
+            "body": email.body[:self.config.body_scan_chars].lower()
+        }
+        for name, field, pattern in self._rules:
+            if pattern.search(values[field]):
+                return name
+
+        marker = self.config.loop_marker
+        if marker:
+            position = email.body.find(marker)
+            if position != -1 and not QUOTE_BOUNDARY.search(email.body, 0, position):
+                return LOOP_RULE
+        return None
+
+
+class FilteringAssistant(BaseAssistant):
+    """Assistant wrapper that answers filtered emails with status ``skipped``."""
+
+    def __init__(self, assistant: BaseAssistant, email_filter: Optional[PreSendFilter] = None):
+        """
+        Initialize the filtering wrapper.
+
+        Args:
+            assistant: Assistant that replies to the emails that pass
+            email_filter: Filter to apply; one built from the config is
+                created when omitted
+        """
+        self.assistant = assistant
+        self.filter = email_filter or PreSendFilter()
+
+    def process_email(self, email: EmailContent) -> AssistantResponse:
+        """
+        Skip the email if a rule matches, otherwise process it.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            AssistantResponse with status ``skipped`` or the wrapped result
+        """
+        rule = self.filter.match(email)
+        if rule is not None:
+            return AssistantResponse(status="skipped", reason=rule)
+
+        result = self.assistant.process_email(email)
+        if result.response_text:
+            result.response_text = self.filter.mark(result.response_text)
+        return result
+
+    def stream_email(self, email: EmailContent) -> Iterator[str]:
+        """
+        Stream a reply unless a rule matches.
+
+        The rules are checked on the call rather than on the first
+        fragment, so a server can answer a skipped email before it
+        starts a streamed response.
+
+        Raises:
+            EmailSkipped: If the email is skipped
+        """
+        rule = self.filter.match(email)
+        if rule is not None:
+            raise EmailSkipped(rule)
+        return self._stream_marked(email)
+
+    def _stream_marked(self, email: EmailContent) -> Iterator[str]:
+        """Stream the wrapped reply followed by the loop marker."""
+        yield from self.assistant.stream_email(email)
+        marked = self.filter.mark("")
+        if marked:
+            yield marked
+
+    def stats(self) -> Dict[str, Any]:
+        """Return filter counters along with those of the wrapped assistant."""
+        stats = dict(self.assistant.stats())
+        stats["filter"] = self.filter.stats()
+        return stats
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format messages the way the wrapped assistant does."""
+        return self.assistant._format_messages(email)
+
+
+class AsyncFilteringAssistant(AsyncBaseAssistant):
+    """Asyncio counterpart of ``FilteringAssistant``."""
+
+    def __init__(self, assistant: AsyncBaseAssistant, email_filter: Optional[PreSendFilter] = None):
+        """
+        Initialize the filtering wrapper.
+
+        Args:
+            assistant: Assistant that replies to the emails that pass
+            email_filter: Filter to apply; one built from the config is
+                created when omitted
+        """
+        self.assistant = assistant
+        self.filter = email_filter or PreSendFilter()
+
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """Skip the email if a rule matches, otherwise process it."""
+        rule = self.filter.match(email)
+        if rule is not None:
+            return AssistantResponse(status="skipped", reason=rule)
+
+        result = await self.assistant.process_email(email)
+        if result.response_text:
+            result.response_text = self.filter.mark(result.response_text)
+        return result
+
+    def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """Stream a reply unless a rule matches, raising ``EmailSkipped`` on the call if one does."""
+        rule = self.filter.match(email)
+        if rule is not None:
+            raise EmailSkipped(rule)
+        return self._stream_marked(email)
+
+    async def _stream_marked(self, email: EmailContent) -> AsyncIterator[str]:
+        """Stream the wrapped reply followed by the loop marker."""
+        async for text in self.assistant.stream_email(email):
+            yield text
+        marked = self.filter.mark("")
+        if marked:
+            yield marked
+
+    def stats(self) -> Dict[str, Any]:
+        """Return filter counters along with those of the wrapped assistant."""
+        stats = dict(self.assistant.stats())
+        stats["filter"] = self.filter.stats()
+        return stats
+
+    async def aclose(self) -> None:
+        """Close the wrapped assistant."""
+        await self.assistant.aclose()
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format messages the way the wrapped assistant does."""
+        return self.assistant._format_messages(email)
@@ -0,0 +1,231 @@
+"""
+Single-pass HTML to text conversion for email bodies.
+"""
+import html
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# One alternative per token kind; each is anchored on its first character and
+# never backtracks into an earlier token, so tokenizing is linear in the input
+TOKEN = re.compile(
+    r'<!--.*?(?:-->|\Z)'                                # comment, incl. Outlook conditionals
+    r'|<![^>]*>?'                                       # doctype, <![if !vml]>
+    r'|<\?[^>]*>?'                                      # <?xml ...?>
+    r'|<(/?)([a-zA-Z][\w:.-]*)((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>?'  # start or end tag
+    r'|[^<]+'                                           # text
+    r'|<',                                              # stray "<"
+    re.DOTALL
+)
+HREF = re.compile(r'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+HTML_MARKER = re.compile(r'<(?:!doctype|html|head|body|div|p|br|table|span|font)\b', re.IGNORECASE)
+
+# Elements whose content is never shown as text
+SKIPPED = {
+    "head", "style", "script", "title", "noscript", "template", "svg", "xml", "object"
+}
+# Elements that end the current line
+LINE_BREAKS = {
+    "br", "div", "tr", "li", "dt", "dd", "center", "address", "form", "caption", "figure"
+}
+# Elements separated from their surroundings by a blank line
+PARAGRAPHS = {
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "dl", "blockquote", "hr",
+    "pre", "article", "aside", "footer", "header", "main", "nav", "section"
+}
+CELLS = {"td", "th"}
+LINK_SCHEMES = ("http://", "https://", "mailto:")
+# Deeper quotes and lists are shown at this depth, so prefixes stay short
+MAX_NESTING = 5
+
+
+def looks_like_html(text: str) -> bool:
+    """Whether a body is HTML rather than plain text."""
+    return HTML_MARKER.search(text) is not None
+
+
+def html_to_text(markup: str, max_chars: Optional[int] = None) -> str:
+    """
+    Convert an HTML email body to compact plain text.
+
+    Args:
+        markup: HTML body
+        max_chars: Characters of input to convert at most; the rest is dropped
+
+    Returns:
+        Text with paragraphs, list items, link targets and ``> `` quoting kept
+    """
+    if max_chars is not None and len(markup) > max_chars:
+        logger.warning(f"HTML body of {len(markup)} characters truncated to {max_chars}")
+        markup = markup[:max_chars]
+    return HTMLTextConverter().convert(markup)
+
+
+class HTMLTextConverter:
+    """Streams HTML tokens into lines of text.
+
+    Styles, scripts, comments, ``<head>`` and Office namespaced elements
+    (VML shapes, ``<o:p>``) are dropped and whitespace is collapsed. List
+    items keep a bullet or number, links keep their target in brackets and
+    ``<blockquote>`` content is prefixed with ``> ``.
+
+    Each token is handled once and the output only grows by appending, so
+    time and memory are linear in the input size.
+    """
+
+    def __init__(self):
+        """Initialize an empty converter."""
+        self._lines: List[str] = []
+        self._line: List[str] = []
+        self._skip: Dict[str, int] = {}
+        self._lists: List[List] = []
+        self._bullet: Optional[str] = None
+        self._quote_depth = 0
+        self._pre_depth = 0
+        self._link: Optional[Tuple[str, List[str]]] = None
+
+    def convert(self, markup: str) -> str:
+        """
+        Convert a whole document.
+
+        Args:
+            markup: HTML to convert
+
+        Returns:
+            The text content
+        """
+        for match in TOKEN.finditer(markup):
+            name = match.group(2)
+            if name is not None:
+                name = name.lower()
+                if match.group(1):
+                    self._end_tag(name)
+                else:
+                    self._start_tag(name, match.group(3))
+            elif match.group(0)[0] != "<" or match.group(0) == "<":
+                self._text(match.group(0))
+        self._break()
+        return "\n".join(self._lines).strip()
+
+    def _start_tag(self, name: str, attributes: str) -> None:
+        """Handle an opening tag."""
+        if name == "body":
+            # An unclosed <head> must not hide the message
+            self._skip.clear()
+        if name in SKIPPED or ":" in name:
+            if not attributes.rstrip().endswith("/"):
+                self._skip[name] = self._skip.get(name, 0) + 1
+            return
+        if self._skip:
+            return
+
+        if name in PARAGRAPHS and not (name in ("ul", "ol") and self._lists):
+            self._break(blank=True)
+        elif name in LINE_BREAKS or name in ("ul", "ol"):
+            self._break()
+        elif name in CELLS and self._line:
+            self._line.append(" ")
+
+        if name == "blockquote":
+            self._quote_depth += 1
+        elif name == "pre":
+            self._pre_depth += 1
+        elif name in ("ul", "ol"):
+            self._lists.append([name, 0])
+        elif name == "li":
+            if self._lists and self._lists[-1][0] == "ol":
+                self._lists[-1][1] += 1
+                self._bullet = f"{self._lists[-1][1]}. "
+            else:
+                self._bullet = "- "
+        elif name == "a":
+            # Links cannot nest; a new one closes the previous
+            self._end_link()
+            match = HREF.search(attributes)
+            href = ""
+            if match:
+                href = html.unescape(next(group for group in match.groups() if group is not None))
+            self._link = (href.strip(), [])
+
+    def _end_tag(self, name: str) -> None:
+        """Handle a closing tag."""
+        if self._skip:
+            if name == "head":
+                # Also close anything left open inside it
+                self._skip.clear()
+            elif self._skip.get(name):
+                self._skip[name] -= 1
+                if not self._skip[name]:
+                    del self._skip[name]
+            return
+
+        if name == "a":
+            self._end_link()
+            return
+
+        # Finish the last line inside the element before leaving it
+        self._break()
+        if name == "blockquote" and self._quote_depth:
+            self._quote_depth -= 1
+        elif name == "pre" and self._pre_depth:
+            self._pre_depth -= 1
+        elif name in ("ul", "ol") and self._lists:
+            self._lists.pop()
+            if self._lists:
+                return
+
+        if name in PARAGRAPHS:
+            self._break(blank=True)
+
+    def _text(self, data: str) -> None:
+        """Append character data to the current line."""
+        if self._skip:
+            return
+        text = html.unescape(data).replace("\xa0", " ")
+        if self._link is not None:
+            self._link[1].append(text)
+
+        if not self._pre_depth:
+            self._line.append(text)
+            return
+        lines = text.split("\n")
+        for position, line in enumerate(lines):
+            if position:
+                self._break(force=True)
+            self._line.append(line)
+
+    def _end_link(self) -> None:
+        """Append the target of the open link unless its text already shows it."""
+        if self._link is None:
+            return
+        href, text = self._link
+        self._link = None
+        shown = " ".join("".join(text).split())
+        target = href[len("mailto:"):] if href.lower().startswith("mailto:") else href
+        if href.lower().startswith(LINK_SCHEMES) and target != shown:
+            self._line.append(f" ({target})" if shown else target)
+
+    def _break(self, blank: bool = False, force: bool = False) -> None:
+        """End the current line, optionally followed by a blank line."""
+        text = "".join(self._line)
+        if not self._pre_depth:
+            text = " ".join(text.split())
+        self._line = []
+
+        if text or force:
+            self._lines.append(self._prefix() + text.rstrip())
+            self._bullet = None
+        if blank and self._lines and self._lines[-1].strip(" >"):
+            self._lines.append(">" * min(self._quote_depth, MAX_NESTING))
+
+    def _prefix(self) -> str:
+        """Quote markers, list indentation and bullet for a new line."""
+        prefix = "> " * min(self._quote_depth, MAX_NESTING)
+        if self._lists:
+            prefix += "  " * (min(len(self._lists), MAX_NESTING) - 1)
+            prefix += self._bullet or "  "
+        return prefix
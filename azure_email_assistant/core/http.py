@@ -0,0 +1,109 @@
+"""
+Pooled HTTP session for outbound calls to Azure OpenAI.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """Process-local, keep-alive HTTP session with a bounded connection pool.
+
+    The underlying ``requests.Session`` is created lazily and re-created when
+    the process id changes, so a session built before a worker fork is never
+    shared between processes.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 20,
+        pool_block: bool = False,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the pooled session.
+
+        Args:
+            pool_connections: Number of per-host connection pools to cache
+            pool_maxsize: Maximum number of keep-alive connections per host
+            pool_block: Block when the pool is exhausted instead of opening
+                a throwaway connection
+            headers: Default headers sent with every request
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.headers = dict(headers or {})
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._adapter: Optional[HTTPAdapter] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def session(self) -> requests.Session:
+        """Return the session for the current process, creating it if needed."""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session, self._adapter = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def _build_session(self):
+        """Create a new session with a mounted pooling adapter."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=0
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        return session, adapter
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a POST request through the pooled session."""
+        return self.session.post(url, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return connection pool counters.
+
+        A pool hit is a request served over an already open connection, a
+        miss is a request that had to open a new TCP/TLS connection.
+        """
+        requests_sent = 0
+        connections_opened = 0
+        adapter = self._adapter
+        if adapter is not None and self._pid == os.getpid():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+
+        return {
+            "requests": requests_sent,
+            "hits": max(requests_sent - connections_opened, 0),
+            "misses": connections_opened,
+            "max_connections": self.pool_maxsize
+        }
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._adapter = None
+            self._pid = None
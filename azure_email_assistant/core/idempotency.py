@@ -0,0 +1,210 @@
+"""
+Idempotency keys and coalescing of duplicate in-flight requests.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from azure_email_assistant.core.assistant import EmailContent
+
+
+def email_fingerprint(email: EmailContent) -> str:
+    """Derive an idempotency key from the content of an email."""
+    material = "\x1f".join([email.from_email, email.subject, email.body])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def reusable_result(result: Any) -> bool:
+    """Whether a webhook result may be replayed to a retry.
+
+    Failed replies (status "error") and failed async jobs (status
+    "failed") are not, so the retry gets another attempt.
+    """
+    return getattr(result, 'status', None) not in ("error", "failed")
+
+
+class _Call:
+    """A computation shared by every request with the same key."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """Runs each keyed computation once and shares its result.
+
+    Requests that arrive while a computation for the same key is running
+    wait for it instead of starting another one. Successful results are
+    remembered for ``ttl`` seconds so late retries are answered from memory.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        max_entries: int = 10000,
+        is_reusable: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Initialize the coalescer.
+
+        Args:
+            ttl: Seconds a completed result is replayed to retries
+            max_entries: Maximum number of completed results kept
+            is_reusable: Predicate deciding whether a result may be
+                replayed, checked when it completes and again on replay;
+                rejected results are only shared with requests that were
+                already waiting for them
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.is_reusable = is_reusable or (lambda value: True)
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, _Call] = {}
+        self._completed: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._executed = 0
+        self._coalesced = 0
+        self._replayed = 0
+
+    def run(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``func`` for a key unless an equivalent call exists.
+
+        Args:
+            key: Idempotency key of the request
+            func: Computation producing the result
+
+        Returns:
+            Tuple of the result and whether it was shared with another request
+        """
+        with self._lock:
+            found, value = self._replay(key)
+            if found:
+                return value, True
+
+            call = self._in_flight.get(key)
+            if call is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._in_flight[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and self.is_reusable(call.value):
+                    self._remember(key, call.value)
+            call.event.set()
+
+        return call.value, False
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of executed, coalesced and replayed requests."""
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "remembered": len(self._completed),
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "replayed": self._replayed
+            }
+
+    def _replay(self, key: str) -> Tuple[bool, Any]:
+        """Look up a remembered result. Caller holds the lock."""
+        completed = self._completed.get(key)
+        if completed is None:
+            return False, None
+        expires_at, value = completed
+        # Async jobs are remembered while pending; check again in case they failed since
+        if expires_at <= time.monotonic() or not self.is_reusable(value):
+            del self._completed[key]
+            return False, None
+        self._replayed += 1
+        return True, value
+
+    def _remember(self, key: str, value: Any) -> None:
+        """Store a completed result, dropping expired and oldest entries."""
+        now = time.monotonic()
+        self._completed[key] = (now + self.ttl, value)
+        self._completed.move_to_end(key)
+
+        while self._completed:
+            oldest_key, (expires_at, _) = next(iter(self._completed.items()))
+            if expires_at > now and len(self._completed) <= self.max_entries:
+                break
+            del self._completed[oldest_key]
+
+
+class AsyncRequestCoalescer(RequestCoalescer):
+    """Coalescer for coroutines running on a single event loop."""
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await ``func`` for a key unless an equivalent call exists.
+
+        Args:
+            key: Idempotency key of the request
+            func: Coroutine function producing the result
+
+        Returns:
+            Tuple of the result and whether it was shared with another request
+        """
+        with self._lock:
+            found, value = self._replay(key)
+            if found:
+                return value, True
+
+            task = self._in_flight.get(key)
+            if task is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                # The call runs as a task of its own, so no caller's cancellation stops it
+                task = asyncio.ensure_future(self._execute(key, func))
+                task.add_done_callback(_retrieve_exception)
+                self._in_flight[key] = task
+                self._executed += 1
+                leader = True
+
+        # Shield so a disconnecting request does not cancel the shared call
+        return await asyncio.shield(task), not leader
+
+    async def _execute(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run the shared call and remember its result if it may be replayed."""
+        try:
+            value = await func()
+        except BaseException:
+            with self._lock:
+                del self._in_flight[key]
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            if self.is_reusable(value):
+                self._remember(key, value)
+        return value
+
+
+def _retrieve_exception(task: "asyncio.Future[Any]") -> None:
+    """Mark the error of a shared call as retrieved when every caller left."""
+    if not task.cancelled():
+        task.exception()
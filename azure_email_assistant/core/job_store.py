@@ -0,0 +1,437 @@
+"""
+Durable SQLite storage for queued jobs.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure_email_assistant.core.assistant import AssistantResponse, EmailContent
+from azure_email_assistant.core.jobs import Job
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    request_id TEXT PRIMARY KEY,
+    from_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    owner INTEGER,
+    owner_instance TEXT,
+    owner_started INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, owner);
+"""
+
+# Columns added after the first release; older databases get them on open
+OWNER_COLUMNS = {"owner_instance": "TEXT", "owner_started": "INTEGER"}
+
+
+class _Write:
+    """A statement waiting for the writer thread."""
+
+    def __init__(self, sql: str, params: Tuple[Any, ...], durable: bool):
+        self.sql = sql
+        self.params = params
+        self.committed = threading.Event() if durable else None
+        self.error: Optional[BaseException] = None
+
+
+class SQLiteJobStore:
+    """Job store in a SQLite database in WAL mode.
+
+    All writes go through one writer thread that commits whatever has
+    accumulated while the previous commit ran (group commit), so many
+    concurrent enqueues share one fsync. ``add`` returns once its job is
+    committed; state changes are queued behind it without waiting.
+
+    Jobs are owned by the process that queued them, identified by its
+    PID, a random instance id and its start time, as PIDs are reused
+    (every container restart runs the server as PID 1 again). Pending or
+    running jobs whose owner process is gone are claimed by
+    ``claim_orphans``.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite database file
+            batch_size: Maximum statements per commit
+        """
+        self.path = path
+        self.batch_size = batch_size
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+        for name, kind in OWNER_COLUMNS.items():
+            if name not in columns:
+                connection.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        connection.commit()
+        connection.close()
+
+        self._writes: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._commits = 0
+        self._statements = 0
+        self._max_batch = 0
+        self._lost_writes = 0
+
+    def add(self, job: Job) -> None:
+        """
+        Store a newly queued job and wait until it is committed.
+
+        Args:
+            job: Job to store
+
+        Raises:
+            sqlite3.Error: If the job could not be written
+        """
+        self._write(
+            "INSERT INTO jobs (request_id, from_email, subject, body, status, owner, "
+            "owner_instance, owner_started, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.request_id, job.email.from_email, job.email.subject, job.email.body,
+                job.status, *_process_identity(), job.enqueued_at
+            ),
+            durable=True
+        )
+
+    def remove(self, job: Job) -> None:
+        """Delete a job that was stored but could not be queued."""
+        self._write("DELETE FROM jobs WHERE request_id = ?", (job.request_id,))
+
+    def mark_running(self, job: Job) -> None:
+        """Record that a worker picked a job up."""
+        self._write(
+            "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 "
+            "WHERE request_id = ?",
+            (job.status, job.started_at, job.request_id)
+        )
+
+    def finish(self, job: Job) -> None:
+        """Record the outcome of a job."""
+        self._write(
+            "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE request_id = ?",
+            (job.status, json.dumps(job.result.to_dict()), job.finished_at, job.request_id)
+        )
+
+    def get(self, request_id: str) -> Optional[Job]:
+        """Look up a job by request id."""
+        row = self._reader().execute(
+            "SELECT * FROM jobs WHERE request_id = ?", (request_id,)
+        ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def claim_orphans(self) -> List[Job]:
+        """
+        Take over the unfinished jobs of processes that no longer run.
+
+        Jobs that were running when their process died are pending again
+        and will be processed from scratch.
+
+        Returns:
+            The claimed jobs, oldest first
+        """
+        self.flush()
+        connection = self._connect()
+        try:
+            # Lock out other workers starting at the same time
+            connection.execute("BEGIN IMMEDIATE")
+            owners = connection.execute(
+                "SELECT DISTINCT owner, owner_instance, owner_started FROM jobs "
+                "WHERE status IN ('pending', 'running')"
+            ).fetchall()
+            dead = [tuple(owner) for owner in owners if not _owner_alive(*owner)]
+            if not dead:
+                connection.rollback()
+                return []
+
+            rows = []
+            for owner in dead:
+                # IS also matches the NULL instance of jobs stored by older versions
+                match = "owner IS ? AND owner_instance IS ? AND owner_started IS ?"
+                rows.extend(connection.execute(
+                    f"SELECT * FROM jobs WHERE status IN ('pending', 'running') AND {match}",
+                    owner
+                ).fetchall())
+                connection.execute(
+                    f"UPDATE jobs SET status = 'pending', owner = ?, owner_instance = ?, "
+                    f"owner_started = ?, started_at = NULL "
+                    f"WHERE status IN ('pending', 'running') AND {match}",
+                    _process_identity() + owner
+                )
+            connection.commit()
+        finally:
+            connection.close()
+
+        rows.sort(key=lambda row: row["enqueued_at"])
+        jobs = [self._to_job(row) for row in rows]
+        for job in jobs:
+            job.status = "pending"
+            job.started_at = None
+        return jobs
+
+    def prune(self, older_than: float) -> int:
+        """
+        Delete finished jobs.
+
+        Args:
+            older_than: Unix time before which finished jobs are deleted
+
+        Returns:
+            Number of jobs deleted
+        """
+        self.flush()
+        connection = self._connect()
+        try:
+            deleted = connection.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (older_than,)
+            ).rowcount
+            connection.commit()
+        finally:
+            connection.close()
+        return deleted
+
+    def flush(self) -> None:
+        """Wait until every queued write is committed."""
+        self._write("SELECT 1", (), durable=True)
+
+    def close(self) -> None:
+        """Commit queued writes and stop the writer thread."""
+        writer = self._writer
+        if writer is None or self._writer_pid != os.getpid():
+            return
+        self._writes.put(None)
+        writer.join()
+        self._writer = None
+        self._writer_pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return job counts by status and commit batching figures."""
+        counts = dict(self._reader().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall())
+        with self._lock:
+            return {
+                "path": self.path,
+                "jobs": counts,
+                "commits": self._commits,
+                "statements": self._statements,
+                "avg_batch": self._statements / self._commits if self._commits else 0.0,
+                "max_batch": self._max_batch,
+                "lost_writes": self._lost_writes
+            }
+
+    def _write(self, sql: str, params: Tuple[Any, ...], durable: bool = False) -> None:
+        """Queue a statement for the writer, waiting for its commit if durable."""
+        self._ensure_writer()
+        write = _Write(sql, params, durable)
+        self._writes.put(write)
+        if not durable:
+            return
+        write.committed.wait()
+        if write.error is not None:
+            raise write.error
+
+    def _ensure_writer(self) -> None:
+        """Start the writer thread in this process on first use."""
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self._lock:
+            if self._writer_pid == pid:
+                return
+            # Threads do not survive a fork; drop writes inherited from the parent
+            self._writes = queue.Queue()
+            self._writer = threading.Thread(
+                target=self._run_writer, name="job-store-writer", daemon=True
+            )
+            self._writer.start()
+            self._writer_pid = pid
+
+    def _run_writer(self) -> None:
+        """Commit queued statements in batches until stopped."""
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._writes.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                stopping = True
+            writes = [write for write in batch if write is not None]
+            if writes:
+                self._commit(connection, writes)
+        connection.close()
+
+    def _commit(self, connection: sqlite3.Connection, writes: List[_Write]) -> None:
+        """Run a batch of statements in one transaction.
+
+        If any statement fails, the batch is rolled back and each statement
+        runs again in a transaction of its own, so one bad write cannot take
+        the others down with it.
+        """
+        commits = 1
+        try:
+            with connection:
+                for write in writes:
+                    connection.execute(write.sql, write.params)
+        except sqlite3.Error as e:
+            logger.warning(
+                f"Job store commit of {len(writes)} statement(s) failed, retrying one by one: {str(e)}"
+            )
+            commits += len(writes)
+            for write in writes:
+                try:
+                    with connection:
+                        connection.execute(write.sql, write.params)
+                except sqlite3.Error as e:
+                    write.error = e
+                    if write.committed is None:
+                        # Nobody waits for this write; a lost state change must at least be visible
+                        logger.error(f"Job store write lost: {write.sql.split()[0]} failed: {str(e)}")
+                        with self._lock:
+                            self._lost_writes += 1
+
+        with self._lock:
+            self._commits += commits
+            self._statements += len(writes)
+            self._max_batch = max(self._max_batch, len(writes))
+
+        for write in writes:
+            if write.committed is not None:
+                write.committed.set()
+
+    def _reader(self) -> sqlite3.Connection:
+        """Return this thread's read connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection in WAL mode."""
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL survives process crashes; only power loss can drop the last commits
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _to_job(self, row: sqlite3.Row) -> Job:
+        """Rebuild a job from a database row."""
+        result = None
+        if row["result"]:
+            data = json.loads(row["result"])
+            result = AssistantResponse(
+                status=data["status"],
+                response_text=data.get("response"),
+                error=data.get("error"),
+                request_id=data["request_id"],
+                timestamp=data["timestamp"],
+                reason=data.get("reason")
+            )
+
+        return Job(
+            email=EmailContent(
+                from_email=row["from_email"],
+                subject=row["subject"],
+                body=row["body"]
+            ),
+            request_id=row["request_id"],
+            status=row["status"],
+            result=result,
+            enqueued_at=row["enqueued_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"]
+        )
+
+
+_identity: Optional[Tuple[int, str, Optional[int]]] = None
+
+
+def _process_identity() -> Tuple[int, str, Optional[int]]:
+    """Return the PID, instance id and start time of this process.
+
+    A forked child gets an instance id of its own on first use.
+    """
+    global _identity
+    pid = os.getpid()
+    if _identity is None or _identity[0] != pid:
+        _identity = (pid, uuid.uuid4().hex, _process_started(pid))
+    return _identity
+
+
+def _process_started(pid: int) -> Optional[int]:
+    """Start time of a process in clock ticks after boot, where ``/proc`` tells it."""
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            # The command name may contain spaces; fields after it are plain
+            fields = file.read().rsplit(")", 1)[1].split()
+        return int(fields[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _owner_alive(pid: Optional[int], instance: Optional[str], started: Optional[int]) -> bool:
+    """Whether the process that stored a job still runs.
+
+    Args:
+        pid: Process id of the owner
+        instance: Instance id of the owner; None for jobs of older versions
+        started: Start time of the owner, if it was known
+
+    Returns:
+        False if the owner is gone, even when its PID was reused since
+    """
+    if pid is None:
+        return False
+    own_pid, own_instance, _ = _process_identity()
+    if pid == own_pid:
+        return instance == own_instance
+    if not _process_alive(pid):
+        return False
+    if started is not None:
+        current = _process_started(pid)
+        return current is None or current == started
+    return True
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this id is running on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
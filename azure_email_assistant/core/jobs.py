@@ -0,0 +1,612 @@
+"""
+In-process job queue for asynchronous email processing.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional
+
+from azure_email_assistant.core.assistant import (
+    BaseAssistant, EmailContent, AssistantResponse
+)
+from azure_email_assistant.core.config import api_config
+from azure_email_assistant.core.tracing import SPAN_KIND_CONSUMER, current_request_id, tracer
+
+if TYPE_CHECKING:
+    from azure_email_assistant.core.job_store import SQLiteJobStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work."""
+
+
+@dataclass
+class Job:
+    """An email queued for background processing."""
+    email: EmailContent
+    # Jobs queued by a webhook keep the webhook's request id
+    request_id: str = field(default_factory=lambda: current_request_id() or str(uuid.uuid4()))
+    status: str = "pending"
+    result: Optional[AssistantResponse] = None
+    enqueued_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the job has finished, successfully or not."""
+        return self.status in ("done", "failed")
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds spent in the queue before a worker picked the job up."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.enqueued_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        if self.result is not None:
+            return self.result.to_dict()
+
+        return {
+            "status": self.status,
+            "request_id": self.request_id
+        }
+
+
+class JobSpool:
+    """JSON lines file that keeps unfinished jobs across restarts.
+
+    Jobs left when the server shuts down are appended to the file, and the
+    next process to start a job queue claims them and queues them again
+    under their original request ids.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the spool.
+
+        Args:
+            path: File the jobs are written to
+        """
+        self.path = path
+
+    def save(self, jobs: List[Job]) -> int:
+        """
+        Append jobs to the spool and sync it to disk.
+
+        Args:
+            jobs: Jobs to persist
+
+        Returns:
+            Number of jobs written
+        """
+        if not jobs:
+            return 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, 'a', encoding='utf-8') as spool:
+            for job in jobs:
+                spool.write(json.dumps({
+                    "request_id": job.request_id,
+                    "from_email": job.email.from_email,
+                    "subject": job.email.subject,
+                    "body": job.email.body,
+                    "enqueued_at": job.enqueued_at
+                }) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+
+        return len(jobs)
+
+    def claim(self) -> List[Job]:
+        """
+        Take every spooled job out of the spool.
+
+        The file is renamed before it is read, so when several worker
+        processes start at once only one of them gets each job.
+
+        Returns:
+            The spooled jobs, pending again
+        """
+        claimed_path = f"{self.path}.{os.getpid()}"
+        try:
+            os.replace(self.path, claimed_path)
+        except FileNotFoundError:
+            return []
+
+        jobs = []
+        with open(claimed_path, encoding='utf-8') as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    jobs.append(Job(
+                        email=EmailContent(
+                            from_email=record["from_email"],
+                            subject=record["subject"],
+                            body=record["body"]
+                        ),
+                        request_id=record["request_id"],
+                        enqueued_at=record["enqueued_at"]
+                    ))
+                except (ValueError, KeyError) as e:
+                    logger.error(f"Skipping unreadable spooled job: {str(e)}")
+
+        os.remove(claimed_path)
+        return jobs
+
+
+def job_persistence(config=api_config) -> Dict[str, Any]:
+    """
+    Build the configured persistence for a job queue.
+
+    Args:
+        config: APIConfig with the job store and spool settings
+
+    Returns:
+        ``store`` and ``spool`` keyword arguments for ``JobQueue``; the
+        SQLite store, when configured, replaces the spool
+    """
+    if config.job_store_path:
+        from azure_email_assistant.core.job_store import SQLiteJobStore
+        return {
+            "store": SQLiteJobStore(config.job_store_path, batch_size=config.job_store_batch_size),
+            "spool": None
+        }
+    return {
+        "store": None,
+        "spool": JobSpool(config.job_spool_path) if config.job_spool_path else None
+    }
+
+
+class JobQueue:
+    """Bounded queue drained by a fixed pool of worker threads."""
+
+    def __init__(
+        self,
+        assistant: BaseAssistant,
+        workers: int = 4,
+        max_queue_size: int = 100,
+        result_ttl: float = 3600,
+        spool: Optional[JobSpool] = None,
+        store: Optional["SQLiteJobStore"] = None
+    ):
+        """
+        Initialize the job queue.
+
+        Args:
+            assistant: Assistant used to process queued emails
+            workers: Number of worker threads
+            max_queue_size: Maximum number of jobs waiting for a worker
+            result_ttl: Seconds finished jobs are kept for polling
+            spool: Where unfinished jobs are kept across restarts
+            store: Durable store that records every job from receipt to
+                result; makes the spool unnecessary
+        """
+        self.assistant = assistant
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.result_ttl = result_ttl
+        self.spool = spool
+        self.store = store
+
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(self, email: EmailContent) -> Job:
+        """
+        Queue an email for processing.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        self.start()
+        self._prune()
+
+        job = Job(email=email)
+        if self.store is not None:
+            # Persist before acknowledging so a crash cannot lose the email
+            self.store.add(job)
+        return self._accept(job)
+
+    def get(self, request_id: str) -> Optional[Job]:
+        """Look up a job by request id."""
+        self._prune()
+        with self._lock:
+            job = self._jobs.get(request_id)
+        if job is None and self.store is not None:
+            # Jobs of earlier processes are only in the store
+            job = self.store.get(request_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, throughput and wait time figures."""
+        store = self.store.stats() if self.store is not None else None
+        with self._lock:
+            finished = self._completed + self._failed
+            stats = {
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_queue_size": self.max_queue_size,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_seconds": self._total_wait / finished if finished else 0.0,
+                "max_wait_seconds": self._max_wait
+            }
+        if store is not None:
+            stats["store"] = store
+        return stats
+
+    def start(self) -> None:
+        """Start the workers and queue any jobs spooled by a previous process."""
+        if self._ensure_workers():
+            self._restore()
+
+    def flush(self, timeout: float = 0.0) -> int:
+        """
+        Stop processing and persist every job that has not finished.
+
+        Queued jobs are taken off the queue at once; running jobs get up
+        to ``timeout`` seconds to finish. The rest go to the spool.
+
+        Args:
+            timeout: Seconds to wait for running jobs
+
+        Returns:
+            Number of unfinished jobs
+        """
+        pending = self._take_pending()
+        with self._idle:
+            self._idle.wait_for(lambda: self._running == 0, timeout)
+            unfinished = pending + self._running_jobs()
+        self.shutdown(wait=False)
+        return self._persist(unfinished)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads once the queue is drained."""
+        threads = self._threads
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+        self._threads = []
+
+    def _enqueue(self, job: Job) -> None:
+        """Hand a job to the workers without blocking."""
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise QueueFullError(
+                f"Job queue is full ({self.max_queue_size} pending jobs)"
+            )
+
+    def _ensure_workers(self) -> bool:
+        """Start worker threads on first use; returns whether they were started now."""
+        if self._threads:
+            return False
+        with self._lock:
+            if self._threads:
+                return False
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"email-job-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            return True
+
+    def _restore(self) -> None:
+        """Queue the jobs left in the spool or store by a previous process."""
+        if self.store is not None:
+            self.store.prune(time.time() - self.result_ttl)
+            self._requeue(self.store.claim_orphans(), spool=None)
+        if self.spool is not None:
+            self._requeue(self.spool.claim(), spool=self.spool)
+
+    def _requeue(self, jobs: List[Job], spool: Optional[JobSpool]) -> None:
+        """Queue recovered jobs, returning what does not fit to the spool."""
+        for index, job in enumerate(jobs):
+            with self._lock:
+                self._jobs[job.request_id] = job
+            try:
+                self._enqueue(job)
+            except QueueFullError:
+                # Leave what does not fit for the next process
+                with self._lock:
+                    for leftover in jobs[index:]:
+                        self._jobs.pop(leftover.request_id, None)
+                if spool is not None:
+                    spool.save(jobs[index:])
+                else:
+                    logger.warning(
+                        f"Job queue full, {len(jobs) - index} recovered job(s) "
+                        f"stay in the store until the next restart"
+                    )
+                jobs = jobs[:index]
+                break
+
+        if jobs:
+            logger.info(f"Restored {len(jobs)} unfinished job(s)")
+
+    def _take_pending(self) -> List[Job]:
+        """Remove and return the jobs still waiting for a worker."""
+        pending = []
+        while self._queue is not None:
+            try:
+                job = self._queue.get_nowait()
+            except (queue.Empty, asyncio.QueueEmpty):
+                break
+            self._queue.task_done()
+            if job is not None:
+                pending.append(job)
+        return pending
+
+    def _running_jobs(self) -> List[Job]:
+        """Return the jobs a worker is processing. Caller holds the lock."""
+        return [job for job in self._jobs.values() if job.status == "running"]
+
+    def _persist(self, jobs: List[Job]) -> int:
+        """Write unfinished jobs to the spool."""
+        if self.store is not None:
+            # Every job is already stored; make sure the last state changes are too
+            self.store.flush()
+            if jobs:
+                logger.info(f"Left {len(jobs)} unfinished job(s) in the job store for the next process")
+            return len(jobs)
+        if not jobs:
+            return 0
+        if self.spool is None:
+            logger.warning(f"Dropping {len(jobs)} unfinished job(s): no spool configured")
+            return len(jobs)
+
+        self.spool.save(jobs)
+        logger.info(f"Spooled {len(jobs)} unfinished job(s) to {self.spool.path}")
+        return len(jobs)
+
+    def _worker(self) -> None:
+        """Process jobs until a stop sentinel is received."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        """Process a single job and record its outcome."""
+        with self._trace(job):
+            try:
+                result = self.assistant.process_email(job.email)
+            except Exception as e:
+                logger.error(f"Job {job.request_id} failed: {str(e)}")
+                result = AssistantResponse(status="error", error=f"Unexpected error: {str(e)}")
+            self._finish(job, result)
+
+    @contextmanager
+    def _trace(self, job: Job) -> Iterator[None]:
+        """Start a job and trace it from the moment it was queued."""
+        enqueued_ns = int(job.enqueued_at * 1e9)
+        with tracer.request("job", job.request_id, SPAN_KIND_CONSUMER, start_ns=enqueued_ns):
+            self._start(job)
+            with tracer.span("job.queued", start_ns=enqueued_ns):
+                pass
+            yield
+
+    def _start(self, job: Job) -> None:
+        """Mark a job as picked up by a worker."""
+        job.started_at = time.time()
+        job.status = "running"
+        if self.store is not None:
+            self.store.mark_running(job)
+        with self._lock:
+            self._running += 1
+
+    def _finish(self, job: Job, result: AssistantResponse) -> None:
+        """Store the outcome of a job and update the counters."""
+        # Keep the id handed out by the webhook so clients can correlate results
+        result.request_id = job.request_id
+        job.result = result
+        job.finished_at = time.time()
+        job.status = "done" if result.status != "error" else "failed"
+        if self.store is not None:
+            self.store.finish(job)
+
+        with self._lock:
+            self._running -= 1
+            if job.status == "done":
+                self._completed += 1
+            else:
+                self._failed += 1
+            wait = job.wait_time or 0.0
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._idle.notify_all()
+
+    def _accept(self, job: Job) -> Job:
+        """Queue a job that was stored, removing it again if the queue is full."""
+        with self._lock:
+            self._jobs[job.request_id] = job
+        try:
+            self._enqueue(job)
+        except QueueFullError:
+            with self._lock:
+                del self._jobs[job.request_id]
+            if self.store is not None:
+                self.store.remove(job)
+            raise
+
+        return job
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                request_id for request_id, job in self._jobs.items()
+                if job.done and job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for request_id in expired:
+                del self._jobs[request_id]
+
+
+class AsyncJobQueue(JobQueue):
+    """Job queue drained by asyncio tasks instead of threads.
+
+    Must be used from within a running event loop; the queue and worker
+    tasks are created on the first submission.
+    """
+
+    def __init__(
+        self,
+        assistant: Any,
+        workers: int = 4,
+        max_queue_size: int = 100,
+        result_ttl: float = 3600,
+        spool: Optional[JobSpool] = None,
+        store: Optional["SQLiteJobStore"] = None
+    ):
+        """
+        Initialize the job queue.
+
+        Args:
+            assistant: AsyncBaseAssistant used to process queued emails
+            workers: Number of worker tasks
+            max_queue_size: Maximum number of jobs waiting for a worker
+            result_ttl: Seconds finished jobs are kept for polling
+            spool: Where unfinished jobs are kept across restarts
+            store: Durable store that records every job from receipt to result
+        """
+        super().__init__(assistant, workers, max_queue_size, result_ttl, spool, store)
+        self._queue: Optional["asyncio.Queue[Optional[Job]]"] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    async def submit(self, email: EmailContent) -> Job:
+        """
+        Queue an email for processing.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        self.start()
+        self._prune()
+
+        job = Job(email=email)
+        if self.store is not None:
+            # The durable commit blocks, so wait for it off the event loop
+            await asyncio.to_thread(self.store.add, job)
+        return self._accept(job)
+
+    async def flush(self, timeout: float = 0.0) -> int:
+        """
+        Stop processing and persist every job that has not finished.
+
+        Args:
+            timeout: Seconds to wait for running jobs
+
+        Returns:
+            Number of unfinished jobs
+        """
+        pending = self._take_pending()
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        with self._lock:
+            unfinished = pending + self._running_jobs()
+        await self.shutdown(wait=False)
+        return self._persist(unfinished)
+
+    async def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker tasks, once the queue is drained if ``wait`` is set."""
+        tasks = self._tasks
+        self._tasks = []
+        if not tasks:
+            return
+        if wait:
+            for _ in tasks:
+                await self._queue.put(None)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _enqueue(self, job: Job) -> None:
+        """Hand a job to the workers without blocking."""
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(
+                f"Job queue is full ({self.max_queue_size} pending jobs)"
+            )
+
+    def _ensure_workers(self) -> bool:
+        """Start worker tasks on first use; returns whether they were started now."""
+        if self._tasks:
+            return False
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [
+            asyncio.create_task(self._async_worker(), name=f"email-job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        return True
+
+    async def _async_worker(self) -> None:
+        """Process jobs until a stop sentinel is received."""
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            await self._run_async(job)
+
+    async def _run_async(self, job: Job) -> None:
+        """Process a single job and record its outcome."""
+        with self._trace(job):
+            try:
+                result = await self.assistant.process_email(job.email)
+            except Exception as e:
+                logger.error(f"Job {job.request_id} failed: {str(e)}")
+                result = AssistantResponse(status="error", error=f"Unexpected error: {str(e)}")
+            self._finish(job, result)
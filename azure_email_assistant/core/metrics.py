@@ -0,0 +1,464 @@
+"""
+Prometheus-style metrics with per-thread recording.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+# Request latencies run from milliseconds (templates, cache hits) to minutes (R1)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 180.0, 300.0
+)
+# Local processing steps such as reply cleaning
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Files in a directory shared by worker processes
+RETIRED_FILE = "retired.json"
+LOCK_FILE = "lock"
+_SHARED = fcntl.LOCK_SH if fcntl is not None else 0
+_EXCLUSIVE = fcntl.LOCK_EX if fcntl is not None else 0
+# Gauges of a process that stopped publishing, such as a crashed worker,
+# are dropped after this many publishing intervals
+STALE_INTERVALS = 3
+
+
+class Metric:
+    """Base of the metric types.
+
+    Each thread records into its own shard of values, so recording takes
+    no lock; the shards are summed when the metrics are collected. Shards
+    of threads that have exited are folded into a single retired shard.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labels: Label names; values are passed positionally when recording
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[Tuple[str, ...], Any]]] = []
+        self._retired: Dict[Tuple[str, ...], Any] = {}
+
+    def collect(self) -> Dict[Tuple[str, ...], Any]:
+        """Return the values summed over all threads, keyed by label values."""
+        with self._lock:
+            self._retire()
+            shards = [values for _, values in self._shards]
+            merged = {key: self._copy(value) for key, value in self._retired.items()}
+        for values in shards:
+            # Copying a dict is atomic, so the owning thread can keep recording
+            for key, value in list(values.items()):
+                self._merge(merged, key, self._copy(value))
+        return merged
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[str]:
+        """Return the exposition lines of the metric, of ``values`` if given."""
+        if values is None:
+            values = self.collect()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def reset(self) -> None:
+        """Drop every recorded value."""
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+
+    def _shard(self) -> Dict[Tuple[str, ...], Any]:
+        """Return the values of the calling thread."""
+        try:
+            return self._local.values
+        except AttributeError:
+            values: Dict[Tuple[str, ...], Any] = {}
+            self._local.values = values
+            with self._lock:
+                self._retire()
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Check the number of label values."""
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def _retire(self) -> None:
+        """Fold the shards of exited threads into the retired values; needs the lock."""
+        alive = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                alive.append((thread, values))
+            else:
+                for key, value in values.items():
+                    self._merge(self._retired, key, value)
+        self._shards = alive
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        """Format label pairs."""
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _copy(self, value: Any) -> Any:
+        return value
+
+    def _merge(self, merged: Dict[Tuple[str, ...], Any], key: Tuple[str, ...], value: Any) -> None:
+        merged[key] = merged.get(key, 0) + value
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {_number(value)}"]
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add to the count of a label combination."""
+        values = self._shard()
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down, such as requests in flight."""
+
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Raise the value of a label combination."""
+        values = self._shard()
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        """Lower the value of a label combination."""
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        """
+        Initialize the histogram.
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labels: Label names
+            buckets: Upper bounds of the buckets, ascending
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for a label combination."""
+        values = self._shard()
+        key = self._key(labels)
+        counts = values.get(key)
+        if counts is None:
+            # One count per bucket plus +Inf, then the sum
+            counts = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _copy(self, value: List[float]) -> List[float]:
+        return list(value)
+
+    def _merge(self, merged: Dict[Tuple[str, ...], Any], key: Tuple[str, ...], value: List[float]) -> None:
+        if key not in merged:
+            merged[key] = list(value)
+            return
+        target = merged[key]
+        for position, count in enumerate(value):
+            target[position] += count
+
+    def _render_value(self, key: Tuple[str, ...], value: List[float]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), value):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            labels = self._label_text(key, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_number(value[-1])}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Set of metrics exposed together on ``/metrics``.
+
+    Worker processes serving the same port can ``share`` a directory so
+    that a scrape of any worker reports the sum over all of them. Each
+    worker publishes its values to a file of its own, every few seconds
+    and on each scrape, and a scrape adds the files of the others;
+    counters of exited workers are kept in a retired file, so totals
+    never go backwards when workers are recycled.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Metric] = {}
+        self._directory: Optional[str] = None
+        self._path: Optional[str] = None
+        self._interval = 5.0
+        self._stopping = threading.Event()
+        self._publish_lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        if self._directory is not None and not self._stopping.is_set():
+            # Publish first, so no later scrape of another worker reports less of this one
+            values = self._publish()
+            with self._file_lock(_SHARED):
+                self._merge_shared(values)
+        else:
+            values = self._collect()
+
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(values[name]))
+        return "\n".join(lines) + "\n"
+
+    def share(self, directory: str, interval: float = 5.0) -> None:
+        """
+        Report the metrics of all processes sharing a directory.
+
+        Call in each worker process after it is forked; values recorded
+        before, such as those inherited from the parent, are dropped.
+
+        Args:
+            directory: Directory shared by the worker processes
+            interval: Seconds between publications of this process's values
+        """
+        for metric in self._metrics.values():
+            metric.reset()
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+        self._interval = interval
+        self._stopping = threading.Event()
+        self._publish()
+        threading.Thread(
+            target=self._run_publisher, args=(self._stopping,), name="metrics-publisher", daemon=True
+        ).start()
+
+    def retire(self) -> None:
+        """Keep the counters and histograms of this process after it exits.
+
+        Call when a worker sharing a directory stops; its gauges are dropped.
+        """
+        if self._directory is None:
+            return
+        self._stopping.set()
+        values = self._collect()
+        with self._file_lock(_EXCLUSIVE):
+            retired = self._read(os.path.join(self._directory, RETIRED_FILE))
+            merged = {name: {} for name in self._metrics}
+            if retired is not None:
+                self._merge_file(merged, retired, gauges=False)
+            self._merge_file(merged, self._snapshot(values), gauges=False)
+            self._write(os.path.join(self._directory, RETIRED_FILE), self._snapshot(merged))
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path)
+
+    def _collect(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Return the values of this process by metric name."""
+        return {name: metric.collect() for name, metric in self._metrics.items()}
+
+    def _run_publisher(self, stopping: threading.Event) -> None:
+        """Publish this process's values every interval until retired."""
+        while not stopping.wait(self._interval):
+            try:
+                self._publish()
+            except OSError:
+                # Another attempt follows; the scrape path publishes too
+                pass
+
+    def _publish(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Write this process's values to its file, unless it was retired.
+
+        Returns:
+            The values written
+        """
+        # Values are collected under the lock, so a file is never replaced by older values
+        with self._publish_lock, self._file_lock(_SHARED):
+            values = self._collect()
+            if not self._stopping.is_set():
+                self._write(self._path, self._snapshot(values))
+        return values
+
+    def _merge_shared(self, values: Dict[str, Dict[Tuple[str, ...], Any]]) -> None:
+        """Add the values published by the other processes; needs the shared lock."""
+        stale = time.time() - STALE_INTERVALS * self._interval
+        for name in os.listdir(self._directory):
+            path = os.path.join(self._directory, name)
+            if not name.endswith(".json") or path == self._path:
+                continue
+            snapshot = self._read(path)
+            if snapshot is not None:
+                gauges = name != RETIRED_FILE and snapshot["written_at"] >= stale
+                self._merge_file(values, snapshot, gauges)
+
+    def _merge_file(
+        self, values: Dict[str, Dict[Tuple[str, ...], Any]], snapshot: Dict[str, Any], gauges: bool
+    ) -> None:
+        """Add the values of a published snapshot, with or without its gauges."""
+        for name, entries in snapshot["metrics"].items():
+            metric = self._metrics.get(name)
+            if metric is None or (isinstance(metric, Gauge) and not gauges):
+                continue
+            for key, value in entries:
+                metric._merge(values[name], tuple(key), metric._copy(value))
+
+    def _snapshot(self, values: Dict[str, Dict[Tuple[str, ...], Any]]) -> Dict[str, Any]:
+        """Build the published form of metric values."""
+        return {
+            "written_at": time.time(),
+            "metrics": {
+                name: [[list(key), value] for key, value in metric_values.items()]
+                for name, metric_values in values.items()
+            }
+        }
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        """Read a published snapshot; None if it is gone."""
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, snapshot: Dict[str, Any]) -> None:
+        """Replace a snapshot file atomically."""
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    @contextlib.contextmanager
+    def _file_lock(self, mode: int) -> Iterator[None]:
+        """Hold the lock of the shared directory in a shared or exclusive mode."""
+        with open(os.path.join(self._directory, LOCK_FILE), "a") as file:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), mode)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _register(self, metric: Metric) -> Any:
+        """Add a metric, refusing duplicate names."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """Format a sample value."""
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+# Metrics of this process
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "email_assistant_http_requests_total", "HTTP requests by route, method and status code",
+    ("route", "method", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "email_assistant_http_request_duration_seconds",
+    "Time to the response headers by route; streamed bodies continue after it", ("route",)
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "email_assistant_http_requests_in_flight", "HTTP requests being handled"
+)
+AZURE_RESPONSES = registry.counter(
+    "email_assistant_azure_responses_total", "Azure completion attempts by status code",
+    ("deployment", "status")
+)
+AZURE_LATENCY = registry.histogram(
+    "email_assistant_azure_request_duration_seconds",
+    "Azure call latency: first_byte per attempt, first_token of streams, total per email",
+    ("deployment", "phase")
+)
+AZURE_IN_FLIGHT = registry.gauge(
+    "email_assistant_azure_requests_in_flight", "Azure completion requests awaiting headers",
+    ("deployment",)
+)
+CLEAN_LATENCY = registry.histogram(
+    "email_assistant_clean_response_duration_seconds", "Time to strip the reasoning from a reply",
+    buckets=FAST_BUCKETS
+)
+TOKENS = registry.counter(
+    "email_assistant_tokens_total", "Tokens reported in the Azure usage block",
+    ("deployment", "kind")
+)
+ERRORS = registry.counter(
+    "email_assistant_errors_total", "Errors by stage and exception class", ("stage", "exception")
+)
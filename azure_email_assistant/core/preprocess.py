@@ -0,0 +1,311 @@
+"""
+Email body preprocessing: HTML conversion and removal of quoted history,
+signatures and disclaimers.
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from azure_email_assistant.core.config import preprocess_config
+from azure_email_assistant.core.html_text import html_to_text, looks_like_html
+from azure_email_assistant.core.tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+# Reply headers that introduce the quoted previous message
+REPLY_HEADER_PATTERNS = [
+    # On Mon, 5 Feb 2024 at 10:00, John Doe <john@example.com> wrote:
+    re.compile(r'^\s*On\b.{0,300}\bwrote:\s*$', re.IGNORECASE),
+    # 2024. febr. 5., hétfő 10:00 időpontban Kovács János <janos@example.hu> ezt írta:
+    re.compile(r'^.{0,300}\bírta:\s*$', re.IGNORECASE),
+    # Am 05.02.2024 um 10:00 schrieb John Doe <john@example.com>:
+    re.compile(r'^\s*Am\b.{0,300}\bschrieb.{0,200}:\s*$', re.IGNORECASE)
+]
+
+# Separators Outlook and other clients put above a quoted or forwarded message
+QUOTE_SEPARATOR = re.compile(
+    r'^\s*(-{2,}\s*(original message|eredeti üzenet|forwarded message|továbbított üzenet|'
+    r'ursprüngliche nachricht)\s*-{2,}|_{10,})\s*$',
+    re.IGNORECASE
+)
+
+# First line of an Outlook "From: ... Sent: ..." header block, and its send
+# time field; "From:" and "Date:" alone also start ordinary lines of text
+OUTLOOK_HEADER_START = re.compile(r'^\s*\*?(from|feladó|von|de)\s*:\*?\s*\S', re.IGNORECASE)
+OUTLOOK_SENT_FIELD = re.compile(r'^\s*\*?(sent|küldve|elküldve|gesendet)\s*:', re.IGNORECASE)
+EMAIL_ADDRESS = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+
+QUOTE_LINE = re.compile(r'^\s*>')
+
+SIGNATURE_DELIMITER = re.compile(r'^-- ?$')
+MOBILE_SIGNATURE = re.compile(
+    r'^\s*(sent from my \w+|get outlook for \w+|küldve .*(iphone|android|outlook)|'
+    r'von meinem .* gesendet)',
+    re.IGNORECASE
+)
+CLOSING_LINE = re.compile(
+    r'^\s*(best regards|kind regards|warm regards|regards|best|thanks|thank you|many thanks|'
+    r'cheers|sincerely|yours sincerely|üdvözlettel|tisztelettel|köszönettel|'
+    r'üdv|mit freundlichen grüßen)[\s,.!]*$',
+    re.IGNORECASE
+)
+
+# Contact details that mark the block after a closing phrase as a signature:
+# a phone number, e-mail address, web address or company name
+SIGNATURE_CONTACT = re.compile(
+    r'(\+?\d[\d\s()/-]{6,}\d|[\w.+-]+@[\w-]+\.[\w.-]+|https?://|\bwww\.|'
+    r'\b(ltd|llc|inc|gmbh|kft|zrt|nyrt|bt|plc|ag)\b\.?|^\s*(tel|phone|mobile|mob|fax|telefon)\b)',
+    re.IGNORECASE
+)
+
+# Lines kept after a closing phrase so the model still knows who wrote
+SIGNATURE_NAME_LINES = 2
+# Longest block after a closing phrase still treated as a signature
+SIGNATURE_MAX_LINES = 12
+SIGNATURE_MAX_LINE_LENGTH = 80
+
+DISCLAIMER_PATTERNS = [
+    r'this (e-?mail|message|communication)\b.{0,120}\b(confidential|privileged)',
+    r'confidentiality notice',
+    r'if you (are not|have received this).{0,120}(intended recipient|in error)',
+    r'the information (contained )?in this (e-?mail|message)',
+    r'please consider the environment before printing',
+    r'(ez az|ezen|jelen) (e-?mail|levél|üzenet).{0,160}bizalmas',
+    r'ha (ön )?nem .{0,40}címzett',
+    r'tévedésből (kapta|jutott)',
+    r'gondoljon a környezetre'
+]
+# Paragraphs longer than this are never treated as disclaimers
+DISCLAIMER_MAX_LENGTH = 2000
+# Shorter paragraphs may legitimately repeat ("Thanks!")
+REPEATED_PARAGRAPH_MIN_LENGTH = 200
+
+
+@dataclass
+class PreprocessResult:
+    """Outcome of preprocessing one email body."""
+    text: str
+    original_bytes: int
+    cleaned_bytes: int
+    tokens_saved: int = 0
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Bytes removed from the body."""
+        return self.original_bytes - self.cleaned_bytes
+
+
+class EmailPreprocessor:
+    """Shrinks email bodies to the new content before they are sent to Azure.
+
+    Converts HTML bodies to text, then removes the quoted reply chain,
+    ``>`` quote blocks, signatures and legal disclaimers (pattern-matched or repeated). If a step would
+    leave nothing, as with a bare forward, it is skipped.
+    """
+
+    def __init__(self, config=preprocess_config, cache_size: int = 256):
+        """
+        Initialize the preprocessor.
+
+        Args:
+            config: PreprocessConfig selecting the steps to run
+            cache_size: Recent bodies whose result is reused, so an email
+                formatted twice (e.g. for the cache key) is counted once
+        """
+        self.config = config
+        self.cache_size = cache_size
+        self._disclaimers = [
+            re.compile(pattern, re.IGNORECASE)
+            for pattern in DISCLAIMER_PATTERNS + list(config.disclaimer_patterns)
+        ]
+
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, PreprocessResult]" = OrderedDict()
+        self._emails = 0
+        self._modified = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._tokens_saved = 0
+        self._removed: Dict[str, int] = {}
+
+    def clean(self, body: str) -> str:
+        """Return the preprocessed body."""
+        return self.process(body).text
+
+    def process(self, body: str) -> PreprocessResult:
+        """
+        Preprocess an email body.
+
+        Args:
+            body: Raw email body
+
+        Returns:
+            The cleaned body with the bytes and tokens saved
+        """
+        if not self.config.enabled or not body:
+            size = len(body.encode('utf-8')) if body else 0
+            return PreprocessResult(text=body, original_bytes=size, cleaned_bytes=size)
+
+        with self._lock:
+            cached = self._recent.get(body)
+            if cached is not None:
+                self._recent.move_to_end(body)
+                return cached
+
+        result = self._process(body)
+
+        with self._lock:
+            self._recent[body] = result
+            if len(self._recent) > self.cache_size:
+                self._recent.popitem(last=False)
+            self._emails += 1
+            self._bytes_in += result.original_bytes
+            self._bytes_out += result.cleaned_bytes
+            self._tokens_saved += result.tokens_saved
+            if result.removed:
+                self._modified += 1
+            for step in result.removed:
+                self._removed[step] = self._removed.get(step, 0) + 1
+
+        if result.removed:
+            logger.info(
+                f"Email body reduced from {result.original_bytes} to {result.cleaned_bytes} bytes "
+                f"(~{result.tokens_saved} tokens saved): {', '.join(result.removed)}"
+            )
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the bytes and estimated tokens saved so far."""
+        with self._lock:
+            return {
+                "emails": self._emails,
+                "modified": self._modified,
+                "bytes_in": self._bytes_in,
+                "bytes_out": self._bytes_out,
+                "bytes_saved": self._bytes_in - self._bytes_out,
+                "tokens_saved": self._tokens_saved,
+                "removed": dict(self._removed)
+            }
+
+    def _process(self, body: str) -> PreprocessResult:
+        """Run the configured steps on a body."""
+        removed: List[str] = []
+        text = body
+        if self.config.convert_html and looks_like_html(text):
+            text = html_to_text(text, self.config.max_html_chars)
+            removed.append("html")
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+        if self.config.strip_quoted_history:
+            cut = self._find_quoted_history(lines)
+            if cut is not None and _has_content(lines[:cut]):
+                lines = lines[:cut]
+                removed.append("quoted_history")
+
+        if self.config.strip_quote_blocks:
+            kept = [line for line in lines if not QUOTE_LINE.match(line)]
+            if len(kept) < len(lines) and _has_content(kept):
+                lines = kept
+                removed.append("quote_blocks")
+
+        if self.config.strip_signatures:
+            kept = self._strip_signature(lines)
+            if len(kept) < len(lines) and _has_content(kept):
+                lines = kept
+                removed.append("signature")
+
+        text = '\n'.join(line.rstrip() for line in lines)
+
+        if self.config.strip_disclaimers:
+            kept_text = self._strip_disclaimers(text)
+            if kept_text != text and kept_text.strip():
+                text = kept_text
+                removed.append("disclaimer")
+
+        text = re.sub(r'\n{3,}', '\n\n', text).strip()
+
+        return PreprocessResult(
+            text=text,
+            original_bytes=len(body.encode('utf-8')),
+            cleaned_bytes=len(text.encode('utf-8')),
+            tokens_saved=estimate_tokens(body) - estimate_tokens(text) if removed else 0,
+            removed=removed
+        )
+
+    def _find_quoted_history(self, lines: List[str]) -> Optional[int]:
+        """Return the index of the line where the quoted history starts."""
+        for index, line in enumerate(lines):
+            if QUOTE_SEPARATOR.match(line):
+                return index
+
+            # Clients wrap long reply headers, so also try the line joined with the next
+            candidates = [line]
+            if index + 1 < len(lines):
+                candidates.append(f"{line} {lines[index + 1].strip()}")
+            if any(pattern.match(candidate) for candidate in candidates
+                   for pattern in REPLY_HEADER_PATTERNS):
+                return index
+
+            # Blocks below a separator were caught above; a bare one needs a
+            # sender address and a send time to tell it from a line of text
+            if (OUTLOOK_HEADER_START.match(line) and EMAIL_ADDRESS.search(line) and any(
+                OUTLOOK_SENT_FIELD.match(following) for following in lines[index + 1:index + 5]
+            )):
+                return index
+        return None
+
+    def _strip_signature(self, lines: List[str]) -> List[str]:
+        """Remove the signature block, keeping the closing phrase and name."""
+        for index, line in enumerate(lines):
+            if SIGNATURE_DELIMITER.match(line):
+                return lines[:index]
+
+        lines = [line for line in lines if not MOBILE_SIGNATURE.match(line)]
+
+        # Only look for a closing phrase near the end of the message
+        for index in range(len(lines) - 1, max(len(lines) - SIGNATURE_MAX_LINES - 3, -1), -1):
+            if not CLOSING_LINE.match(lines[index]):
+                continue
+
+            tail = [
+                position for position in range(index + 1, len(lines)) if lines[position].strip()
+            ]
+            # Short lines alone may be instructions ("Thanks! Also: 1. ..."); keep them
+            is_signature = (
+                SIGNATURE_NAME_LINES < len(tail) <= SIGNATURE_MAX_LINES
+                and all(len(lines[position].strip()) <= SIGNATURE_MAX_LINE_LENGTH for position in tail)
+                and any(SIGNATURE_CONTACT.search(lines[position]) for position in tail)
+            )
+            if is_signature:
+                return lines[:tail[SIGNATURE_NAME_LINES - 1] + 1]
+            break
+
+        return lines
+
+    def _strip_disclaimers(self, text: str) -> str:
+        """Remove disclaimer paragraphs and repeats of long paragraphs."""
+        kept = []
+        seen = set()
+        for paragraph in re.split(r'\n\s*\n', text):
+            normalized = ' '.join(paragraph.split()).lower()
+            if len(normalized) <= DISCLAIMER_MAX_LENGTH and any(
+                pattern.search(normalized) for pattern in self._disclaimers
+            ):
+                continue
+            if len(normalized) >= REPEATED_PARAGRAPH_MIN_LENGTH:
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+            kept.append(paragraph)
+        return '\n\n'.join(kept)
+
+
+def _has_content(lines: List[str]) -> bool:
+    """Whether any line has non-whitespace text."""
+    return any(line.strip() for line in lines)
@@ -0,0 +1,292 @@
+"""
+Client-side rate limiting matched to Azure OpenAI quotas.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request would have to wait too long for quota."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate.
+
+    Not thread-safe on its own; callers hold the limiter's lock.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Initialize the bucket full.
+
+        Args:
+            capacity: Maximum number of tokens the bucket holds
+            refill_per_second: Tokens added per second
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add the tokens accrued since the last update."""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available."""
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        """Take tokens out of the bucket; the balance may go negative."""
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """Put tokens back, up to capacity."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class Reservation:
+    """Quota taken for one request."""
+    tokens: int
+    waited: float = 0.0
+
+
+class AzureRateLimiter:
+    """Shared limiter for requests-per-minute and tokens-per-minute quotas.
+
+    Requests wait for quota up to ``max_wait`` seconds and are shed with
+    ``RateLimitExceeded`` beyond that. Token reservations are estimates
+    that are corrected once the response reports actual usage.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_wait: float = 30.0
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            requests_per_minute: Request quota, 0 for unlimited
+            tokens_per_minute: Token quota, 0 for unlimited
+            max_wait: Longest a request may queue for quota, in seconds
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+
+        self._requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+            if requests_per_minute > 0 else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+            if tokens_per_minute > 0 else None
+        )
+        self._condition = threading.Condition()
+        self._waiting = 0
+        self._admitted = 0
+        self._shed = 0
+        self._total_wait = 0.0
+        self._corrections = 0
+        self._estimate_error = 0
+
+    def acquire(self, estimated_tokens: int, max_wait: Optional[float] = None) -> Reservation:
+        """
+        Wait until the request fits the quotas and reserve it.
+
+        Args:
+            estimated_tokens: Estimated prompt plus completion tokens
+            max_wait: Override of the maximum queueing time
+
+        Returns:
+            Reservation to settle once actual usage is known
+
+        Raises:
+            RateLimitExceeded: If the request cannot be admitted in time
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._time_until_admitted(now, estimated_tokens)
+                    if wait <= 0:
+                        break
+                    if now + wait > deadline:
+                        self._shed += 1
+                        raise RateLimitExceeded(
+                            f"Azure quota exhausted, request would wait {wait:.1f}s "
+                            f"(limit {max_wait:.1f}s)"
+                        )
+                    self._condition.wait(wait)
+
+                return self._admit(estimated_tokens, time.monotonic() - start)
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(
+        self, estimated_tokens: int, max_wait: Optional[float] = None
+    ) -> Reservation:
+        """
+        Asynchronous counterpart of ``acquire`` that never blocks the event loop.
+
+        Args:
+            estimated_tokens: Estimated prompt plus completion tokens
+            max_wait: Override of the maximum queueing time
+
+        Returns:
+            Reservation to settle once actual usage is known
+
+        Raises:
+            RateLimitExceeded: If the request cannot be admitted in time
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                wait = self._time_until_admitted(now, estimated_tokens)
+                if wait <= 0:
+                    return self._admit(estimated_tokens, now - start)
+                if now + wait > start + max_wait:
+                    self._shed += 1
+                    raise RateLimitExceeded(
+                        f"Azure quota exhausted, request would wait {wait:.1f}s "
+                        f"(limit {max_wait:.1f}s)"
+                    )
+            await asyncio.sleep(wait)
+
+    def settle(self, reservation: Reservation, actual_tokens: int) -> None:
+        """
+        Correct a reservation with the token usage reported by Azure.
+
+        Args:
+            reservation: Reservation returned by ``acquire``
+            actual_tokens: Total tokens from the response ``usage`` block
+        """
+        difference = reservation.tokens - actual_tokens
+        with self._condition:
+            self._corrections += 1
+            self._estimate_error += difference
+            if self._tokens is not None:
+                if difference > 0:
+                    self._tokens.refund(difference)
+                else:
+                    self._tokens.consume(-difference)
+            self._condition.notify_all()
+
+    def release(self, reservation: Reservation) -> None:
+        """
+        Return the tokens of a reservation whose request Azure rejected.
+
+        Args:
+            reservation: Reservation returned by ``acquire``
+        """
+        with self._condition:
+            if self._tokens is not None:
+                self._tokens.refund(reservation.tokens)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return admission, shedding and quota figures."""
+        with self._condition:
+            now = time.monotonic()
+            for bucket in (self._requests, self._tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available_requests": self._requests.tokens if self._requests else None,
+                "available_tokens": self._tokens.tokens if self._tokens else None,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "avg_wait_seconds": self._total_wait / self._admitted if self._admitted else 0.0,
+                "avg_estimate_error_tokens": (
+                    self._estimate_error / self._corrections if self._corrections else 0.0
+                )
+            }
+
+    def _admit(self, tokens: int, waited: float) -> Reservation:
+        """Take quota for an admitted request. Caller holds the lock."""
+        if self._requests is not None:
+            self._requests.consume(1)
+        if self._tokens is not None:
+            self._tokens.consume(tokens)
+
+        self._admitted += 1
+        self._total_wait += waited
+        return Reservation(tokens=tokens, waited=waited)
+
+    def _time_until_admitted(self, now: float, tokens: int) -> float:
+        """Seconds until both buckets can admit the request."""
+        wait = 0.0
+        if self._requests is not None:
+            self._requests.refill(now)
+            wait = max(wait, self._requests.time_until(1))
+        if self._tokens is not None:
+            self._tokens.refill(now)
+            wait = max(wait, self._tokens.time_until(tokens))
+        return wait
+
+
+_limiters: Dict[Tuple[str, str], AzureRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Any, backend: Any = None) -> Optional[AzureRateLimiter]:
+    """
+    Return the process-wide limiter for a deployment.
+
+    All assistants pointing at the same endpoint and deployment share one
+    limiter, since Azure enforces the quota per deployment.
+
+    Args:
+        config: AzureConfig with the rate limit settings
+        backend: AzureBackend to limit; defaults to the config's own
+            endpoint and deployment. Its quotas override the config's.
+
+    Returns:
+        The shared limiter, or None if no quota is configured
+    """
+    target = backend or config
+    requests_per_minute = getattr(target, 'rate_limit_rpm', None)
+    if requests_per_minute is None:
+        requests_per_minute = config.rate_limit_rpm
+    tokens_per_minute = getattr(target, 'rate_limit_tpm', None)
+    if tokens_per_minute is None:
+        tokens_per_minute = config.rate_limit_tpm
+
+    if requests_per_minute <= 0 and tokens_per_minute <= 0:
+        return None
+
+    key = (target.endpoint, target.deployment)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AzureRateLimiter(
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                max_wait=config.rate_limit_max_wait
+            )
+            _limiters[key] = limiter
+        return limiter
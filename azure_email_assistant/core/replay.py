@@ -0,0 +1,79 @@
+"""
+Assistant that replays recorded Azure OpenAI exchanges.
+"""
+import dataclasses
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+
+from azure_email_assistant.core.assistant import AzureAssistant
+from azure_email_assistant.core.balancer import Backend
+from azure_email_assistant.core.cassette import (
+    Cassette, CassetteMissError, replay_response, request_key
+)
+from azure_email_assistant.core.config import azure_config
+from azure_email_assistant.core.ratelimit import Reservation
+from azure_email_assistant.core.tracing import SPAN_KIND_CLIENT, tracer
+
+
+class ReplayAssistant(AzureAssistant):
+    """Answers emails from a cassette instead of calling Azure.
+
+    Prompts are built, and replies parsed and cleaned, by the same code
+    as ``AzureAssistant``; only the HTTP exchange comes from the
+    cassette, with its recorded timing stretched by ``time_scale``.
+    Prompts are matched exactly, so replay with the prompt settings the
+    cassette was recorded with.
+    """
+
+    def __init__(
+        self,
+        cassette: Union[str, Cassette],
+        time_scale: float = 1.0,
+        config=azure_config
+    ):
+        """
+        Initialize the assistant.
+
+        Args:
+            cassette: Cassette, or the path of one
+            time_scale: Factor applied to recorded delays; 0 replays at
+                full speed
+            config: AzureConfig the cassette was recorded with
+        """
+        # Recordings hold the outcome after retries, and are not recorded again
+        super().__init__(dataclasses.replace(config, cassette_path="", retry_max_attempts=1))
+        self.cassette = Cassette(cassette) if isinstance(cassette, str) else cassette
+        self.time_scale = time_scale
+
+    def _post(
+        self, payload: Dict[str, Any], stream: bool = False
+    ) -> Tuple[requests.Response, Backend, Optional[Reservation]]:
+        """Serve the recorded response to a completion request.
+
+        Raises:
+            CassetteMissError: If the request was not recorded
+        """
+        started = time.monotonic()
+        entry = self.cassette.lookup(payload, stream)
+        if entry is None:
+            raise CassetteMissError(f"No recording of prompt {request_key(payload)}")
+
+        backend = self.backends.acquire()
+        with tracer.span(
+            "azure.replay", SPAN_KIND_CLIENT, deployment=backend.spec.deployment, stream=stream
+        ) as span:
+            try:
+                response = replay_response(entry, backend.request_url, started, self.time_scale)
+            finally:
+                self.backends.release(backend, "error" not in entry, time.monotonic() - started)
+            span.set(status_code=response.status_code)
+        self._record_attempt(backend, response.status_code, response.elapsed.total_seconds())
+        return response, backend, None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return runtime counters for monitoring."""
+        stats = super().stats()
+        stats["cassette"] = self.cassette.stats()
+        return stats
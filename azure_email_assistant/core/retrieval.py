@@ -0,0 +1,587 @@
+"""
+BM25 retrieval over a local folder of knowledge documents.
+"""
+import contextlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from azure_email_assistant.core.config import retrieval_config
+from azure_email_assistant.core.html_text import html_to_text
+from azure_email_assistant.core.tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_VERSION = 1
+SUFFIXES = (".txt", ".md", ".html", ".htm")
+# Each build goes to a directory of its own, named in the pointer file once
+# complete, so a reader never sees files of two builds
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "lock"
+VERSION_PREFIX = "v-"
+# Index files of one build; meta.json names what the others contain
+META_FILE = "meta.json"
+LEXICON_FILE = "lexicon.json"
+POSTINGS_FILE = "postings.bin"
+PASSAGES_FILE = "passages.bin"
+TEXTS_FILE = "texts.bin"
+
+WORD = re.compile(r"[^\W_]+")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "your", "our", "with", "this", "that",
+    "from", "have", "has", "was", "were", "will", "would", "can", "could", "please", "thanks",
+    "thank", "what", "when", "which", "who", "how", "about", "there", "their", "into", "any",
+    "is", "it", "of", "to", "in", "on", "at", "be", "as", "by", "or", "an", "we", "do", "if",
+    "hogy", "nem", "van", "egy", "az", "és", "is", "meg", "már", "csak", "még", "de", "ha",
+    "ez", "azt", "kell", "lesz", "vagy", "mint", "sem", "volt", "kérem", "köszönöm", "szia",
+    "kedves", "üdvözlettel", "tisztelt", "illetve", "valamint", "mert", "amely", "ami"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lower-cased index terms, dropping stopwords."""
+    return [word for word in WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def split_passages(text: str, max_words: int) -> List[str]:
+    """
+    Split a document into passages of whole paragraphs.
+
+    Args:
+        text: Document text
+        max_words: Words per passage at most; longer paragraphs are split
+
+    Returns:
+        Passages in document order
+    """
+    passages: List[str] = []
+    current: List[str] = []
+    words = 0
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph_words = paragraph.split()
+        if not paragraph_words:
+            continue
+        if words and words + len(paragraph_words) > max_words:
+            passages.append("\n\n".join(current))
+            current, words = [], 0
+        if len(paragraph_words) > max_words:
+            for start in range(0, len(paragraph_words), max_words):
+                passages.append(" ".join(paragraph_words[start:start + max_words]))
+            continue
+        current.append(paragraph.strip())
+        words += len(paragraph_words)
+    if current:
+        passages.append("\n\n".join(current))
+    return passages
+
+
+def read_document(path: str) -> str:
+    """Read a knowledge document as text, converting HTML."""
+    with open(path, encoding="utf-8", errors="replace") as file:
+        text = file.read()
+    if path.lower().endswith((".html", ".htm")):
+        text = html_to_text(text)
+    return text
+
+
+@dataclass
+class Passage:
+    """A retrieved passage."""
+    source: str
+    text: str
+    score: float
+
+
+class _Snapshot:
+    """One loaded version of the index; searches keep a reference while it is replaced."""
+
+    def __init__(self, meta: Dict[str, Any], lexicon: Dict[str, List[int]], maps: List[mmap.mmap]):
+        self.meta = meta
+        self.files: Dict[str, List[int]] = meta["files"]
+        self.lexicon = lexicon
+        self.maps = maps
+        self.passage_count = meta["passages"]
+        self.version: Optional[str] = None
+
+        postings, passages, texts = (_view(m) for m in maps)
+        self.postings = postings.cast("I") if len(postings) else memoryview(array("I"))
+        self.passages = passages.cast("I") if len(passages) else memoryview(array("I"))
+        self.texts = texts
+        self.norms: List[float] = []
+
+        # Passage index ranges per file, to map a passage back to its source
+        ordered = sorted((first, path) for path, (_, _, first, _) in self.files.items())
+        self.starts = [first for first, _ in ordered]
+        self.sources = [path for _, path in ordered]
+
+    def text(self, passage: int) -> str:
+        """Return the text of a passage."""
+        offset, length = self.passages[3 * passage], self.passages[3 * passage + 1]
+        return bytes(self.texts[offset:offset + length]).decode("utf-8")
+
+    def source(self, passage: int) -> str:
+        """Return the document a passage comes from."""
+        return self.sources[bisect_right(self.starts, passage) - 1]
+
+
+EMPTY_META = {"version": INDEX_VERSION, "files": {}, "passages": 0, "avg_length": 0.0}
+
+
+class KnowledgeIndex:
+    """On-disk BM25 index of the passages in a folder of documents.
+
+    Postings are stored as packed ``(passage, term frequency)`` pairs and
+    read through ``mmap``, so opening the index only loads the lexicon and
+    the OS pages postings in as terms are searched. ``refresh`` re-reads
+    only documents whose size or modification time changed and writes a
+    new version of the index files; searches keep using the previous
+    version until the new one is loaded.
+
+    Worker processes may share the index folder: refreshes take a file
+    lock, and each version is written to its own directory before the
+    ``CURRENT`` pointer is switched to it.
+    """
+
+    def __init__(
+        self,
+        documents_path: str,
+        index_path: str,
+        passage_words: int = 120,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        """
+        Initialize the index and load it from disk if it exists.
+
+        Args:
+            documents_path: Folder of .txt, .md and .html documents
+            index_path: Folder holding the index files
+            passage_words: Words per passage at most
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.documents_path = documents_path
+        self.index_path = index_path
+        self.passage_words = passage_words
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._snapshot = self._load()
+
+    def __len__(self) -> int:
+        """Number of indexed passages."""
+        return self._snapshot.passage_count
+
+    def refresh(self) -> bool:
+        """
+        Re-index the documents that were added, changed or removed.
+
+        Returns:
+            True if the index changed
+        """
+        with self._lock, self._file_lock():
+            if self._pointer() != self._snapshot.version:
+                # Another process refreshed the index since it was loaded
+                self._snapshot = self._load()
+            current = self._snapshot
+            found = self._scan()
+            if found.keys() == current.files.keys() and all(
+                found[path] == current.files[path][:2] for path in found
+            ):
+                return False
+
+            started = time.monotonic()
+            passages: List[Tuple[str, List[str]]] = []
+            reread = 0
+            for path in sorted(found):
+                entry = current.files.get(path)
+                if entry is not None and entry[:2] == found[path]:
+                    texts = [current.text(passage) for passage in range(entry[2], entry[2] + entry[3])]
+                else:
+                    texts = split_passages(
+                        read_document(os.path.join(self.documents_path, path)), self.passage_words
+                    )
+                    reread += 1
+                passages.append((path, texts))
+
+            self._write(found, passages)
+            self._snapshot = self._load()
+            logger.info(
+                f"Knowledge index refreshed in {(time.monotonic() - started) * 1000:.0f} ms: "
+                f"{len(found)} documents ({reread} re-read), {len(self)} passages"
+            )
+            return True
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 4,
+        max_terms: int = 32,
+        max_postings: int = 12000
+    ) -> List[Passage]:
+        """
+        Find the passages that best match a query.
+
+        Terms are scored rarest first, and common terms are dropped once
+        ``max_postings`` postings have been scored; they add little to BM25
+        scores but most of the work.
+
+        Args:
+            query: Free text, such as an email subject and body
+            top_k: Passages to return at most
+            max_terms: Query terms used at most; the rarest ones are kept
+            max_postings: Postings scored at most
+
+        Returns:
+            Passages by descending BM25 score
+        """
+        snapshot = self._snapshot
+        norms = snapshot.norms
+        if not snapshot.passage_count:
+            return []
+
+        count = snapshot.passage_count
+        terms = []
+        for term in set(tokenize(query)):
+            entry = snapshot.lexicon.get(term)
+            if entry is not None:
+                offset, frequency = entry
+                idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+                terms.append((idf, offset, frequency))
+        terms = heapq.nlargest(max_terms, terms)
+
+        k1 = self.k1
+        scores: Dict[int, float] = {}
+        scanned = 0
+        for idf, offset, frequency in terms:
+            # Past the budget only terms in most passages are left, which barely change the ranking
+            if scanned + frequency > max_postings and (scanned or frequency > count // 2):
+                break
+            scanned += frequency
+            postings = snapshot.postings[2 * offset:2 * (offset + frequency)]
+            weight = idf * (k1 + 1)
+            for passage, tf in zip(postings[0::2], postings[1::2]):
+                scores[passage] = scores.get(passage, 0.0) + weight * tf / (tf + norms[passage])
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [
+            Passage(source=snapshot.source(passage), text=snapshot.text(passage), score=score)
+            for passage, score in best
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size of the index."""
+        snapshot = self._snapshot
+        return {
+            "documents": len(snapshot.files),
+            "passages": snapshot.passage_count,
+            "terms": len(snapshot.lexicon)
+        }
+
+    def _scan(self) -> Dict[str, List[int]]:
+        """Return ``[mtime_ns, size]`` of each document under the folder."""
+        found = {}
+        for root, _, names in os.walk(self.documents_path):
+            for name in names:
+                if not name.lower().endswith(SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                status = os.stat(path)
+                found[os.path.relpath(path, self.documents_path)] = [status.st_mtime_ns, status.st_size]
+        return found
+
+    def _write(self, found: Dict[str, List[int]], documents: List[Tuple[str, List[str]]]) -> None:
+        """Build the postings and write all index files."""
+        postings: Dict[str, List[int]] = {}
+        passages = array("I")
+        texts = bytearray()
+        files = {}
+        number = 0
+        total_length = 0
+        for path, texts_of_file in documents:
+            files[path] = found[path] + [number, len(texts_of_file)]
+            for text in texts_of_file:
+                terms = tokenize(text)
+                for term, frequency in Counter(terms).items():
+                    postings.setdefault(term, []).extend((number, frequency))
+                encoded = text.encode("utf-8")
+                passages.extend((len(texts), len(encoded), len(terms)))
+                texts += encoded
+                total_length += len(terms)
+                number += 1
+
+        lexicon = {}
+        packed = array("I")
+        for term in sorted(postings):
+            lexicon[term] = [len(packed) // 2, len(postings[term]) // 2]
+            packed.extend(postings[term])
+
+        meta = {
+            "version": INDEX_VERSION,
+            "files": files,
+            "passages": number,
+            "avg_length": total_length / number if number else 0.0
+        }
+        previous = self._pointer()
+        version = f"{VERSION_PREFIX}{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(self.index_path, version)
+        os.makedirs(directory)
+        contents = {
+            POSTINGS_FILE: packed.tobytes(),
+            PASSAGES_FILE: passages.tobytes(),
+            TEXTS_FILE: bytes(texts),
+            LEXICON_FILE: json.dumps(lexicon, ensure_ascii=False).encode("utf-8"),
+            META_FILE: json.dumps(meta).encode("utf-8")
+        }
+        for name, data in contents.items():
+            with open(os.path.join(directory, name), "wb") as file:
+                file.write(data)
+
+        pointer = os.path.join(self.index_path, CURRENT_FILE)
+        temporary = f"{pointer}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(version)
+        os.replace(temporary, pointer)
+
+        # Processes still searching older versions keep their mapped files
+        for name in os.listdir(self.index_path):
+            if name.startswith(VERSION_PREFIX) and name not in (version, previous):
+                shutil.rmtree(os.path.join(self.index_path, name), ignore_errors=True)
+
+    def _pointer(self) -> Optional[str]:
+        """Return the directory name of the current version, if one was written."""
+        try:
+            with open(os.path.join(self.index_path, CURRENT_FILE), encoding="utf-8") as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold an exclusive lock on the index folder, shared by all processes."""
+        os.makedirs(self.index_path, exist_ok=True)
+        with open(os.path.join(self.index_path, LOCK_FILE), "a") as file:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _load(self) -> _Snapshot:
+        """Open the current version of the index files, or return an empty index."""
+        # A version can be removed between reading the pointer and opening it
+        for _ in range(3):
+            version = self._pointer()
+            if version is None:
+                break
+            directory = os.path.join(self.index_path, version)
+            try:
+                with open(os.path.join(directory, META_FILE), encoding="utf-8") as file:
+                    meta = json.load(file)
+                if meta.get("version") != INDEX_VERSION:
+                    logger.warning(f"Ignoring knowledge index of version {meta.get('version')}")
+                    break
+                with open(os.path.join(directory, LEXICON_FILE), encoding="utf-8") as file:
+                    lexicon = json.load(file)
+                maps = [_map(os.path.join(directory, name))
+                        for name in (POSTINGS_FILE, PASSAGES_FILE, TEXTS_FILE)]
+            except FileNotFoundError:
+                continue
+            return self._open(version, meta, lexicon, maps)
+        return _Snapshot(EMPTY_META, {}, [None, None, None])
+
+    def _open(
+        self, version: str, meta: Dict[str, Any], lexicon: Dict[str, List[int]], maps: List[mmap.mmap]
+    ) -> _Snapshot:
+        """Build a snapshot of loaded index files."""
+        snapshot = _Snapshot(meta, lexicon, maps)
+        snapshot.version = version
+        # BM25 length normalization of every passage, computed once per version
+        average = meta["avg_length"] or 1.0
+        snapshot.norms = [
+            self.k1 * (1 - self.b + self.b * snapshot.passages[3 * passage + 2] / average)
+            for passage in range(snapshot.passage_count)
+        ]
+        return snapshot
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    """Memory-map a file read-only; empty files cannot be mapped."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _view(mapped: Optional[mmap.mmap]) -> memoryview:
+    """Return a memoryview of a mapped file."""
+    return memoryview(mapped) if mapped is not None else memoryview(b"")
+
+
+class KnowledgeBase:
+    """Grounding documents for the prompt, retrieved from the knowledge index.
+
+    The index is opened on first use and refreshed from the documents
+    folder at most every ``refresh_interval`` seconds, in a background
+    thread. Until the first build finishes, emails get no documents.
+    """
+
+    def __init__(self, config=retrieval_config):
+        """
+        Initialize the knowledge base.
+
+        Args:
+            config: RetrievalConfig with the folders and budgets
+        """
+        self.config = config
+        self._index: Optional[KnowledgeIndex] = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._refresher: Optional[threading.Thread] = None
+        self._searches = 0
+        self._search_seconds = 0.0
+        self._max_search_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether retrieval is on and the documents folder exists."""
+        return self.config.enabled and os.path.isdir(self.config.documents_path)
+
+    def search(self, query: str) -> List[Passage]:
+        """
+        Find the passages for a query.
+
+        Args:
+            query: Email subject and body
+
+        Returns:
+            Up to ``top_k`` passages, best first
+        """
+        if not self.enabled:
+            return []
+        index = self._current_index()
+        started = time.monotonic()
+        passages = index.search(
+            query, self.config.top_k, self.config.max_query_terms, self.config.max_postings
+        )
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._searches += 1
+            self._search_seconds += elapsed
+            self._max_search_seconds = max(self._max_search_seconds, elapsed)
+        return passages
+
+    def context(self, query: str) -> str:
+        """
+        Format the passages for a query as a documents section of the prompt.
+
+        Args:
+            query: Email subject and body
+
+        Returns:
+            Numbered passages within ``max_context_tokens``, or an empty string
+        """
+        sections = []
+        budget = self.config.max_context_tokens
+        for number, passage in enumerate(self.search(query), 1):
+            section = f"[{number}] {passage.source}\n{passage.text}"
+            tokens = estimate_tokens(section)
+            if tokens > budget:
+                break
+            sections.append(section)
+            budget -= tokens
+        if not sections:
+            return ""
+        return "Documents:\n" + "\n\n".join(sections)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size and search latency."""
+        if not self.config.enabled:
+            return {"enabled": False}
+        with self._lock:
+            stats = {
+                "enabled": True,
+                "searches": self._searches,
+                "avg_ms": self._search_seconds / self._searches * 1000 if self._searches else 0.0,
+                "max_ms": self._max_search_seconds * 1000
+            }
+        if self._index is not None:
+            stats.update(self._index.stats())
+        return stats
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a running build or refresh of the index.
+
+        Args:
+            timeout: Seconds to wait at most; None waits until it is done
+
+        Returns:
+            True if no refresh is running any more
+        """
+        with self._lock:
+            refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+            return not refresher.is_alive()
+        return True
+
+    def _current_index(self) -> KnowledgeIndex:
+        """Open the index, refreshing it if the interval has passed.
+
+        Refreshes, including the first build, run in a background thread
+        while searches use the version already loaded, which is empty
+        before the first build.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = KnowledgeIndex(
+                    self.config.documents_path,
+                    self.config.index_path,
+                    passage_words=self.config.passage_words,
+                    k1=self.config.bm25_k1,
+                    b=self.config.bm25_b
+                )
+                self._checked_at = time.monotonic()
+                self._start_refresh()
+            elif time.monotonic() - self._checked_at >= self.config.refresh_interval:
+                self._checked_at = time.monotonic()
+                self._start_refresh()
+        return self._index
+
+    def _start_refresh(self) -> None:
+        """Refresh the index in a daemon thread unless one is running."""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh, name="knowledge-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh(self) -> None:
+        """Refresh the index, logging instead of raising on I/O errors."""
+        try:
+            self._index.refresh()
+        except OSError as e:
+            logger.error(f"Could not refresh the knowledge index: {str(e)}")
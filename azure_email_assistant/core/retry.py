@@ -0,0 +1,261 @@
+"""
+Retry policy for transient Azure OpenAI failures.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple, Type
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+# Throttling and transient server errors worth another attempt
+RETRYABLE_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+# Transport failures worth another attempt
+RETRYABLE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout
+)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Read the server's requested delay from response headers.
+
+    Azure sends ``retry-after-ms`` alongside the standard ``Retry-After``,
+    which may hold either seconds or an HTTP date.
+
+    Args:
+        headers: Response headers
+
+    Returns:
+        Delay in seconds, or None if the server did not ask for one
+    """
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(float(value) / 1000.0, 0.0)
+        except ValueError:
+            pass
+
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+@dataclass
+class RetryPolicy:
+    """Capped exponential backoff with full jitter and an overall deadline."""
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: float = 240.0
+    jitter: bool = True
+
+    def backoff(self, attempt: int) -> float:
+        """Return the delay before retry number ``attempt`` (starting at 0)."""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def delay_for(self, attempt: int, response: Any) -> float:
+        """Return the delay before the next attempt, honouring Retry-After."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers)
+            if retry_after is not None:
+                return retry_after
+        return self.backoff(attempt)
+
+
+class RetryStats:
+    """Thread-safe retry counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.deadline_exceeded = 0
+        self.backoff_seconds = 0.0
+        self.retries_by_reason: Dict[str, int] = {}
+
+    def record_call(self) -> None:
+        """Count a logical call."""
+        with self._lock:
+            self.calls += 1
+
+    def record_attempt(self) -> None:
+        """Count an HTTP attempt."""
+        with self._lock:
+            self.attempts += 1
+
+    def record_retry(self, reason: str, delay: float) -> None:
+        """Count a retry and the time spent backing off before it."""
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+            self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+
+    def record_give_up(self, deadline: bool) -> None:
+        """Count a call that still failed after retrying."""
+        with self._lock:
+            self.gave_up += 1
+            if deadline:
+                self.deadline_exceeded += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the counters."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "gave_up": self.gave_up,
+                "deadline_exceeded": self.deadline_exceeded,
+                "backoff_seconds": self.backoff_seconds,
+                "retries_by_reason": dict(self.retries_by_reason)
+            }
+
+
+def call_with_retry(
+    send: Callable[[float], requests.Response],
+    policy: RetryPolicy,
+    stats: Optional[RetryStats] = None
+) -> requests.Response:
+    """
+    Send a request, retrying throttling and transient failures.
+
+    Args:
+        send: Sends one attempt; receives the seconds left before the
+            deadline so it can cap its read timeout
+        policy: Retry policy to apply
+        stats: Counters to update
+
+    Returns:
+        The last response received. A retryable status is returned as-is
+        once retries are exhausted so the caller can report it.
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt failed
+            at the transport level
+    """
+    stats = stats or RetryStats()
+    stats.record_call()
+    deadline = time.monotonic() + policy.deadline
+    attempt = 0
+
+    while True:
+        stats.record_attempt()
+        response = None
+        error = None
+        try:
+            response = send(max(deadline - time.monotonic(), 0.0))
+        except RETRYABLE_EXCEPTIONS as e:
+            error = e
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+
+        delay = _plan_retry(policy, stats, attempt, deadline, response, error)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def async_call_with_retry(
+    send: Callable[[float], Awaitable[Any]],
+    policy: RetryPolicy,
+    stats: Optional[RetryStats] = None,
+    retryable_exceptions: Tuple[Type[BaseException], ...] = RETRYABLE_EXCEPTIONS
+) -> Any:
+    """
+    Asynchronous counterpart of ``call_with_retry``.
+
+    Args:
+        send: Coroutine function sending one attempt; receives the seconds
+            left before the deadline
+        policy: Retry policy to apply
+        stats: Counters to update
+        retryable_exceptions: Transport errors of the HTTP client in use
+            that are worth another attempt
+
+    Returns:
+        The last response received
+    """
+    stats = stats or RetryStats()
+    stats.record_call()
+    deadline = time.monotonic() + policy.deadline
+    attempt = 0
+
+    while True:
+        stats.record_attempt()
+        response = None
+        error = None
+        try:
+            response = await send(max(deadline - time.monotonic(), 0.0))
+        except retryable_exceptions as e:
+            error = e
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+
+        delay = _plan_retry(policy, stats, attempt, deadline, response, error)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+
+        if response is not None:
+            await response.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _plan_retry(
+    policy: RetryPolicy,
+    stats: RetryStats,
+    attempt: int,
+    deadline: float,
+    response: Any,
+    error: Optional[BaseException]
+) -> Optional[float]:
+    """Return the delay before the next attempt, or None to give up."""
+    reason = type(error).__name__ if error is not None else str(response.status_code)
+    delay = policy.delay_for(attempt, response)
+    out_of_attempts = attempt + 1 >= policy.max_attempts
+    out_of_time = time.monotonic() + delay >= deadline
+    if out_of_attempts or out_of_time:
+        stats.record_give_up(deadline=out_of_time and not out_of_attempts)
+        return None
+
+    logger.warning(
+        f"Azure request failed ({reason}), retrying in {delay:.2f}s "
+        f"(attempt {attempt + 2}/{policy.max_attempts})"
+    )
+    stats.record_retry(reason, delay)
+    return delay
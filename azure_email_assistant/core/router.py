@@ -0,0 +1,371 @@
+"""
+Tiered routing of emails to template replies, a fast deployment or the reasoning model.
+"""
+import dataclasses
+import logging
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+from azure_email_assistant.core.assistant import AssistantResponse, BaseAssistant, EmailContent
+from azure_email_assistant.core.async_assistant import AsyncBaseAssistant
+from azure_email_assistant.core.config import azure_config, router_config
+
+
+logger = logging.getLogger(__name__)
+
+
+TEMPLATE = "template"
+FAST = "fast"
+REASONING = "reasoning"
+TIERS = (TEMPLATE, FAST, REASONING)
+
+WORD = re.compile(r"[^\W\d_]+")
+TEST_PHRASES = re.compile(
+    r"\b(?:test|testing|teszt|tesztelés|tesztüzenet|tudsz válaszolni|tud válaszolni|működik)\b"
+)
+# Words that may surround a test phrase in a message that is only a test
+TEST_FILLER_WORDS = {
+    "re", "fw", "fwd", "hi", "hello", "hey", "this", "is", "a", "an", "just", "only", "message",
+    "email", "mail", "e", "please", "ignore", "szia", "sziasztok", "helló", "üdv", "ez", "egy",
+    "csak", "üzenet", "levél", "kérem", "hagyja", "figyelmen", "kívül"
+}
+# Requests and complaints always need a written answer
+REQUEST_WORDS = {
+    "want", "need", "cancel", "change", "modify", "reschedule", "book", "send", "return", "never",
+    "missing", "problem", "wrong", "late", "broken", "failed", "waiting",
+    "szeretném", "szeretnénk", "kérném", "kellene", "kell", "szükség", "lemondani", "lemondom",
+    "módosítani", "módosítás", "foglalni", "küldje", "küldjék", "visszakérem", "sajnos",
+    "probléma", "hiba", "hibás", "késik", "elmaradt"
+}
+ACKNOWLEDGEMENT_WORDS = {
+    "thanks", "thank", "thx", "received", "ok", "okay", "noted", "great", "perfect",
+    "köszönöm", "köszönjük", "köszi", "megkaptam", "megkaptuk", "rendben", "oké", "szuper", "értem"
+}
+QUESTION_WORDS = {
+    "how", "when", "why", "what", "where", "which", "could", "would", "can",
+    "hogyan", "mikor", "miért", "mit", "hol", "melyik", "mennyi", "tudna", "lehet"
+}
+HUNGARIAN_WORDS = {
+    "és", "hogy", "nem", "van", "kérem", "köszönöm", "az", "egy", "is", "meg", "már", "szia",
+    "üdvözlettel", "kedves", "tisztelt"
+}
+ENGLISH_WORDS = {
+    "the", "and", "is", "you", "please", "thanks", "to", "of", "for", "hello", "hi", "regards", "dear"
+}
+HUNGARIAN_LETTERS = set("áéíóöőúüű")
+
+
+@dataclass
+class Route:
+    """Routing decision for one email."""
+    tier: str
+    intent: str
+    language: str
+    words: int
+
+
+class TierStats:
+    """Count and latency of the emails handled by one tier."""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        """Record one handled email."""
+        self.count += 1
+        self.errors += int(failed)
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the counters with latency percentiles of the recent emails."""
+        recent = sorted(self.recent)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "p50_ms": _percentile(recent, 0.5) * 1000,
+            "p95_ms": _percentile(recent, 0.95) * 1000
+        }
+
+
+class EmailRouter:
+    """Classifies emails locally and picks the cheapest tier that can answer.
+
+    Short acknowledgements and test messages get a template reply, short
+    emails without any of ``reasoning_keywords`` go to the fast deployment,
+    and everything else to the reasoning model. The body is classified
+    after preprocessing, so quoted history does not count towards length.
+    """
+
+    def __init__(self, config=router_config, fast_available: bool = True):
+        """
+        Initialize the router.
+
+        Args:
+            config: RouterConfig with the thresholds and templates
+            fast_available: Whether a fast deployment is configured; if
+                not, the fast tier falls back to the reasoning model
+        """
+        self.config = config
+        self.fast_available = fast_available
+        self._reasoning_keywords = {keyword.lower() for keyword in config.reasoning_keywords}
+
+        self._lock = threading.Lock()
+        self._tiers = {tier: TierStats(config.latency_window) for tier in TIERS}
+        self._intents: Dict[str, int] = {}
+
+    def route(self, email: EmailContent) -> Route:
+        """
+        Decide which tier answers an email.
+
+        Args:
+            email: Email to classify
+
+        Returns:
+            The chosen tier with the features it was based on
+        """
+        text = BaseAssistant.preprocessor.clean(email.body)
+        words = WORD.findall(f"{email.subject} {text}".lower())
+        body_words = len(text.split())
+        language = _language(words)
+        intent = _intent(email.subject.lower(), text.lower(), words)
+        complex_request = not self._reasoning_keywords.isdisjoint(words)
+
+        if (
+            not complex_request
+            and body_words <= self.config.template_max_words
+            and f"{language}:{intent}" in self.config.templates
+        ):
+            tier = TEMPLATE
+        elif not complex_request and body_words <= self.config.fast_max_words and self.fast_available:
+            tier = FAST
+        else:
+            tier = REASONING
+
+        with self._lock:
+            self._intents[intent] = self._intents.get(intent, 0) + 1
+        logger.info(f"Routing email from {email.from_email} to {tier} ({language}, {intent}, {body_words} words)")
+        return Route(tier=tier, intent=intent, language=language, words=body_words)
+
+    def template(self, route: Route) -> str:
+        """Return the canned reply for a template route."""
+        return self.config.templates[f"{route.language}:{route.intent}"]
+
+    def record(self, tier: str, started: float, failed: bool = False) -> None:
+        """Record the latency of an email handled by a tier."""
+        with self._lock:
+            self._tiers[tier].record(time.monotonic() - started, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-tier counts and latency, and intent counts."""
+        with self._lock:
+            return {
+                "tiers": {tier: stats.snapshot() for tier, stats in self._tiers.items()},
+                "intents": dict(self._intents)
+            }
+
+
+class TieredAssistant(BaseAssistant):
+    """Assistant that answers each email on the tier the router picks."""
+
+    def __init__(
+        self,
+        reasoning: BaseAssistant,
+        fast: Optional[BaseAssistant] = None,
+        router: Optional[EmailRouter] = None
+    ):
+        """
+        Initialize the tiered assistant.
+
+        Args:
+            reasoning: Assistant on the reasoning deployment
+            fast: Assistant on the fast deployment, if there is one
+            router: Router to use; one built from the config is created when omitted
+        """
+        self.reasoning = reasoning
+        self.fast = fast
+        self.router = router or EmailRouter(fast_available=fast is not None)
+
+    @property
+    def config(self) -> Any:
+        """Configuration of the reasoning assistant, used for cache keys."""
+        return getattr(self.reasoning, 'config', None)
+
+    def process_email(self, email: EmailContent) -> AssistantResponse:
+        """
+        Answer an email from a template, the fast or the reasoning deployment.
+
+        Args:
+            email: Email content to process
+
+        Returns:
+            AssistantResponse from the chosen tier
+        """
+        route = self.router.route(email)
+        started = time.monotonic()
+        if route.tier == TEMPLATE:
+            result = AssistantResponse(status="success", response_text=self.router.template(route))
+        elif route.tier == FAST:
+            result = self.fast.process_email(email)
+        else:
+            result = self.reasoning.process_email(email)
+        self.router.record(route.tier, started, failed=result.status == "error")
+        return result
+
+    def stream_email(self, email: EmailContent) -> Iterator[str]:
+        """Stream the reply of the chosen tier."""
+        route = self.router.route(email)
+        started = time.monotonic()
+        failed = True
+        try:
+            if route.tier == TEMPLATE:
+                yield self.router.template(route)
+            elif route.tier == FAST:
+                yield from self.fast.stream_email(email)
+            else:
+                yield from self.reasoning.stream_email(email)
+            failed = False
+        finally:
+            self.router.record(route.tier, started, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return router counters along with those of the tier assistants."""
+        stats = dict(self.reasoning.stats())
+        stats["router"] = self.router.stats()
+        if self.fast is not None:
+            stats["fast"] = self.fast.stats()
+        return stats
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format messages the way the reasoning assistant does."""
+        return self.reasoning._format_messages(email)
+
+
+class AsyncTieredAssistant(AsyncBaseAssistant):
+    """Asyncio counterpart of ``TieredAssistant``."""
+
+    def __init__(
+        self,
+        reasoning: AsyncBaseAssistant,
+        fast: Optional[AsyncBaseAssistant] = None,
+        router: Optional[EmailRouter] = None
+    ):
+        """
+        Initialize the tiered assistant.
+
+        Args:
+            reasoning: Assistant on the reasoning deployment
+            fast: Assistant on the fast deployment, if there is one
+            router: Router to use; one built from the config is created when omitted
+        """
+        self.reasoning = reasoning
+        self.fast = fast
+        self.router = router or EmailRouter(fast_available=fast is not None)
+
+    async def process_email(self, email: EmailContent) -> AssistantResponse:
+        """Answer an email from a template, the fast or the reasoning deployment."""
+        route = self.router.route(email)
+        started = time.monotonic()
+        if route.tier == TEMPLATE:
+            result = AssistantResponse(status="success", response_text=self.router.template(route))
+        elif route.tier == FAST:
+            result = await self.fast.process_email(email)
+        else:
+            result = await self.reasoning.process_email(email)
+        self.router.record(route.tier, started, failed=result.status == "error")
+        return result
+
+    async def stream_email(self, email: EmailContent) -> AsyncIterator[str]:
+        """Stream the reply of the chosen tier."""
+        route = self.router.route(email)
+        started = time.monotonic()
+        failed = True
+        try:
+            if route.tier == TEMPLATE:
+                yield self.router.template(route)
+            else:
+                assistant = self.fast if route.tier == FAST else self.reasoning
+                async for text in assistant.stream_email(email):
+                    yield text
+            failed = False
+        finally:
+            self.router.record(route.tier, started, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return router counters along with those of the tier assistants."""
+        stats = dict(self.reasoning.stats())
+        stats["router"] = self.router.stats()
+        if self.fast is not None:
+            stats["fast"] = self.fast.stats()
+        return stats
+
+    async def aclose(self) -> None:
+        """Close the tier assistants."""
+        await self.reasoning.aclose()
+        if self.fast is not None:
+            await self.fast.aclose()
+
+    def _format_messages(self, email: EmailContent) -> List[Dict[str, str]]:
+        """Format messages the way the reasoning assistant does."""
+        return self.reasoning._format_messages(email)
+
+
+def fast_config(config=azure_config, router=router_config) -> Any:
+    """
+    Build the AzureConfig of the fast deployment.
+
+    Args:
+        config: AzureConfig of the reasoning deployment
+        router: RouterConfig naming the fast deployment
+
+    Returns:
+        A copy of ``config`` pointing at the fast deployment
+    """
+    return dataclasses.replace(
+        config,
+        deployment=router.fast_deployment,
+        backends=list(router.fast_backends),
+        max_tokens=router.fast_max_tokens
+    )
+
+
+def _intent(subject: str, body: str, words: List[str]) -> str:
+    """Classify what the sender wants from keywords.
+
+    Questions and requests are recognized first, as they never get a
+    template; a test phrase counts only when it is the whole message.
+    """
+    if "?" in body or not QUESTION_WORDS.isdisjoint(words):
+        return "question"
+    if not REQUEST_WORDS.isdisjoint(words):
+        return "request"
+    text = f"{subject} {body}"
+    if TEST_PHRASES.search(text) and all(
+        word in TEST_FILLER_WORDS for word in WORD.findall(TEST_PHRASES.sub(" ", text))
+    ):
+        return "test"
+    if not ACKNOWLEDGEMENT_WORDS.isdisjoint(words):
+        return "acknowledgement"
+    return "other"
+
+
+def _language(words: List[str]) -> str:
+    """Tell Hungarian from English by common words and accented letters."""
+    hungarian = sum(1 for word in words if word in HUNGARIAN_WORDS or not HUNGARIAN_LETTERS.isdisjoint(word))
+    english = sum(1 for word in words if word in ENGLISH_WORDS)
+    return "hu" if hungarian > english else "en"
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Return a percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
@@ -0,0 +1,112 @@
+"""
+Graceful shutdown: refusing new work and draining in-flight requests.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """Tracks in-flight requests and stops admitting new ones on shutdown."""
+
+    def __init__(self, timeout: float = 25.0):
+        """
+        Initialize the controller.
+
+        Args:
+            timeout: Default seconds to wait for in-flight requests
+        """
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._draining = False
+        self._draining_since: Optional[float] = None
+        self._in_flight = 0
+        self._rejected = 0
+
+    @property
+    def draining(self) -> bool:
+        """Whether new requests are being refused."""
+        return self._draining
+
+    def start(self) -> bool:
+        """
+        Stop admitting new requests.
+
+        Returns:
+            False if draining had already started
+        """
+        with self._condition:
+            if self._draining:
+                return False
+            self._draining = True
+            self._draining_since = time.monotonic()
+            in_flight = self._in_flight
+        logger.info(f"Draining: refusing new requests, {in_flight} in flight")
+        return True
+
+    def try_enter(self) -> bool:
+        """
+        Admit a request unless draining has started.
+
+        Every admitted request must be followed by ``exit``.
+
+        Returns:
+            True if the request may proceed
+        """
+        with self._condition:
+            if self._draining:
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def enter(self) -> None:
+        """Count work that must finish before shutdown, even while draining."""
+        with self._condition:
+            self._in_flight += 1
+
+    def exit(self) -> None:
+        """Mark an admitted request as finished."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until no request is in flight.
+
+        Args:
+            timeout: Seconds to wait; defaults to the controller's timeout
+
+        Returns:
+            True if every in-flight request finished in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._condition:
+            return self._condition.wait_for(lambda: self._in_flight == 0, timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """Asynchronous counterpart of ``wait`` that never blocks the event loop."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return self._in_flight == 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the drain state and request counters."""
+        with self._condition:
+            return {
+                "draining": self._draining,
+                "draining_seconds": (
+                    time.monotonic() - self._draining_since if self._draining else 0.0
+                ),
+                "in_flight": self._in_flight,
+                "rejected": self._rejected
+            }
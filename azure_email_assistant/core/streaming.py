@@ -0,0 +1,317 @@
+"""
+Incremental handling of streamed chat completions.
+"""
+import json
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List,
+    Optional, Union
+)
+
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+# Markers that indicate the transition from thinking to the actual reply.
+# Greetings and subject lines belong to the reply; blank lines do not.
+GREETING_MARKERS = [
+    # Hungarian greetings
+    'Kedves ',
+    'Tisztelt ',
+    # English greetings
+    'Dear ',
+    'Hello ',
+    'Hi ',
+    # Email formatting
+    'Subject:'
+]
+TRANSITION_MARKERS = GREETING_MARKERS + [
+    # Multiple newlines often separate thinking from response
+    '\n\n\n'
+]
+
+
+class StreamError(Exception):
+    """Raised when a streamed completion cannot be produced."""
+
+
+class SSEDecoder:
+    """Line-by-line decoder of a server-sent event stream."""
+
+    def __init__(self):
+        self.done = False
+        self._data: List[str] = []
+
+    def feed(self, line: Union[bytes, str]) -> Optional[str]:
+        """
+        Consume one line of the stream.
+
+        Args:
+            line: Raw line without or with its line terminator
+
+        Returns:
+            The data payload of an event completed by this line, if any
+        """
+        if self.done:
+            return None
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+
+        if not line:
+            # A blank line terminates the current event
+            return self.flush()
+
+        if line.startswith('data:'):
+            self._data.append(line[5:].lstrip(' '))
+        return None
+
+    def flush(self) -> Optional[str]:
+        """Return the pending event payload, if any, at the end of the stream."""
+        if not self._data:
+            return None
+        payload = '\n'.join(self._data)
+        self._data = []
+        if payload == '[DONE]':
+            self.done = True
+            return None
+        return payload
+
+
+def iter_sse_data(lines: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """
+    Yield the data payload of each server-sent event.
+
+    Args:
+        lines: Raw lines of an ``text/event-stream`` response
+
+    Returns:
+        Iterator over event payloads, ending at the ``[DONE]`` sentinel
+    """
+    decoder = SSEDecoder()
+    for line in lines:
+        payload = decoder.feed(line)
+        if payload is not None:
+            yield payload
+        if decoder.done:
+            return
+
+    payload = decoder.flush()
+    if payload is not None:
+        yield payload
+
+
+def iter_content_deltas(
+    lines: Iterable[Union[bytes, str]],
+    usage: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """
+    Yield the text deltas of a streamed chat completion.
+
+    Args:
+        lines: Raw lines of an ``text/event-stream`` response
+        usage: Dictionary updated with the ``usage`` block of the final
+            chunk, sent when the request set ``stream_options.include_usage``
+
+    Returns:
+        Iterator over non-empty content fragments
+    """
+    for payload in iter_sse_data(lines):
+        yield from _content_deltas(payload, usage)
+
+
+async def aiter_content_deltas(
+    lines: AsyncIterable[Union[bytes, str]],
+    usage: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Asynchronous counterpart of ``iter_content_deltas``.
+
+    Args:
+        lines: Raw lines of an ``text/event-stream`` response
+        usage: Dictionary updated with the ``usage`` block of the final chunk
+
+    Returns:
+        Async iterator over non-empty content fragments
+    """
+    decoder = SSEDecoder()
+    async for line in lines:
+        payload = decoder.feed(line)
+        if payload is not None:
+            for content in _content_deltas(payload, usage):
+                yield content
+        if decoder.done:
+            return
+
+    payload = decoder.flush()
+    if payload is not None:
+        for content in _content_deltas(payload, usage):
+            yield content
+
+
+def _content_deltas(payload: str, usage: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Extract the content fragments of one completion chunk, collecting its usage."""
+    chunk = json.loads(payload)
+
+    if "error" in chunk:
+        raise StreamError(f"Stream error: {chunk['error']}")
+
+    # Every chunk carries "usage": null except the last one
+    if usage is not None and chunk.get("usage"):
+        usage.update(chunk["usage"])
+
+    return [
+        content
+        for choice in chunk.get("choices") or []
+        for content in [(choice.get("delta") or {}).get("content")]
+        if content
+    ]
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ReasoningStripper:
+    """Incremental state machine that drops the thinking section of a reply.
+
+    Text is fed in arbitrary fragments; ``feed`` returns the part of the
+    reply that can be emitted so far and ``finish`` returns whatever is
+    left once the stream ends. For completions that open with a thinking
+    section, or that contain a greeting marker, the output matches what
+    the non-streaming cleaner produces; if no transition is ever found,
+    the fallback cleaner is applied to the full text at the end.
+    """
+
+    DETECT = "detect"
+    THINK = "think"
+    PREAMBLE = "preamble"
+    REPLY = "reply"
+
+    def __init__(self, fallback: Optional[Callable[[str], str]] = None):
+        """
+        Initialize the stripper.
+
+        Args:
+            fallback: Cleaner applied to the full text if the stream ends
+                before a transition into the reply was found
+        """
+        self.fallback = fallback
+        self.state = self.DETECT
+        self._buffer = ''
+        self._raw: List[str] = []
+        self._scanned = 0
+        self._pending_space = ''
+        self._strip_trailing = True
+        self._started = False
+        self._max_marker = max(len(marker) for marker in TRANSITION_MARKERS + [THINK_CLOSE])
+
+    def feed(self, text: str) -> str:
+        """
+        Consume a fragment of the completion.
+
+        Args:
+            text: Next fragment of the raw completion
+
+        Returns:
+            Reply text that can be emitted now, possibly empty
+        """
+        if self.state == self.REPLY:
+            return self._emit(text)
+
+        self._raw.append(text)
+        self._buffer += text
+
+        if self.state == self.DETECT:
+            stripped = self._buffer.lstrip()
+            if THINK_OPEN.startswith(stripped):
+                # Could still turn into an opening think tag
+                return ''
+            if stripped.startswith(THINK_OPEN):
+                self.state = self.THINK
+                self._buffer = stripped[len(THINK_OPEN):]
+            else:
+                self.state = self.PREAMBLE
+            self._scanned = 0
+
+        if self.state == self.THINK:
+            return self._scan_think()
+
+        return self._scan_preamble()
+
+    def finish(self) -> str:
+        """
+        Flush the end of the stream.
+
+        Returns:
+            Remaining reply text
+        """
+        if self.state == self.REPLY:
+            # Like the non-streaming cleaner, only a marker-delimited reply
+            # loses its trailing whitespace
+            pending = self._pending_space
+            self._pending_space = ''
+            return '' if self._strip_trailing else pending
+
+        raw = ''.join(self._raw)
+        self._raw = []
+        self._buffer = ''
+        self.state = self.REPLY
+        if self.fallback is not None:
+            return self.fallback(raw)
+        return raw
+
+    def _scan_think(self) -> str:
+        """Look for the end of the thinking section."""
+        pos = self._buffer.find(THINK_CLOSE, self._scanned)
+        if pos == -1:
+            # Keep just enough to detect a tag split across fragments
+            keep = len(THINK_CLOSE) - 1
+            self._buffer = self._buffer[-keep:]
+            self._scanned = 0
+            return ''
+
+        self._strip_trailing = False
+        return self._start_reply(self._buffer[pos + len(THINK_CLOSE):])
+
+    def _scan_preamble(self) -> str:
+        """Look for the earliest transition marker in unscanned text."""
+        start = self._scanned
+        earliest_pos = -1
+        earliest_marker = None
+
+        for marker in [THINK_CLOSE] + TRANSITION_MARKERS:
+            pos = self._buffer.find(marker, start)
+            if pos != -1 and (earliest_pos == -1 or pos < earliest_pos):
+                earliest_pos = pos
+                earliest_marker = marker
+
+        if earliest_marker is None:
+            self._scanned = max(len(self._buffer) - self._max_marker + 1, 0)
+            return ''
+
+        if earliest_marker == THINK_CLOSE:
+            self._strip_trailing = False
+        if earliest_marker in GREETING_MARKERS:
+            return self._start_reply(self._buffer[earliest_pos:])
+        return self._start_reply(self._buffer[earliest_pos + len(earliest_marker):])
+
+    def _start_reply(self, text: str) -> str:
+        """Switch to reply mode and emit the first piece of the reply."""
+        self.state = self.REPLY
+        self._buffer = ''
+        self._raw = []
+        return self._emit(text)
+
+    def _emit(self, text: str) -> str:
+        """Emit reply text, holding back trailing whitespace."""
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ''
+            self._started = True
+
+        text = self._pending_space + text
+        body = text.rstrip()
+        self._pending_space = text[len(body):]
+        return body
@@ -0,0 +1,420 @@
+"""
+Request-scoped tracing with OTLP/JSON span export.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from azure_email_assistant.core.config import tracing_config
+
+
+logger = logging.getLogger(__name__)
+
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_CONSUMER = 5
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def current_request_id() -> Optional[str]:
+    """Return the id of the request being handled, if one is bound."""
+    return _request_id.get()
+
+
+def trace_id_for(request_id: str) -> str:
+    """Derive a trace id from a request id.
+
+    Request ids are UUIDs, so the trace id is the request id without
+    dashes and a trace can be found from the id a client was given.
+    """
+    try:
+        return uuid.UUID(request_id).hex
+    except ValueError:
+        return uuid.uuid4().hex
+
+
+class Span:
+    """One timed stage of a request."""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str = "",
+        kind: int = SPAN_KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Start the span.
+
+        Args:
+            name: Stage name
+            trace_id: Trace the span belongs to
+            parent_id: Id of the enclosing span; empty for the root span
+            kind: OTLP span kind
+            start_ns: Start time in Unix nanoseconds; defaults to now
+            attributes: Initial attributes
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+        self.events: List[Tuple[int, str]] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def event(self, name: str) -> None:
+        """Mark a point in time within the span, such as the first token."""
+        self.events.append((time.time_ns(), name))
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Convert to an OTLP/JSON span."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": STATUS_OK}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.events:
+            span["events"] = [
+                {"timeUnixNano": str(time_ns), "name": name} for time_ns, name in self.events
+            ]
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class _NoopSpan(Span):
+    """Stands in for a span while tracing is off."""
+
+    def __init__(self):
+        super().__init__("noop", "")
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def event(self, name: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Batches finished spans and exports them from a background thread.
+
+    Spans are written as OTLP/JSON ``ExportTraceServiceRequest`` bodies,
+    one per line to ``file_path``, or posted to an OTLP/HTTP collector
+    when ``collector_endpoint`` is set. Spans that do not fit the queue
+    are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, config=tracing_config):
+        """
+        Initialize the exporter.
+
+        Args:
+            config: TracingConfig to use
+        """
+        self.config = config
+        self._spans: "queue.Queue[Span]" = queue.Queue(maxsize=config.max_queue_size)
+        self._exporter: Optional[threading.Thread] = None
+        self._exporter_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._exported = 0
+        self._dropped = 0
+        self._failed = 0
+
+    def export(self, span: Span) -> None:
+        """Queue a finished span for export."""
+        self._ensure_exporter()
+        try:
+            self._spans.put_nowait(span)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until the queued spans are exported.
+
+        Args:
+            timeout: Seconds to wait
+
+        Returns:
+            Whether the queue was drained in time
+        """
+        deadline = time.monotonic() + timeout
+        while self._spans.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return export counters."""
+        with self._lock:
+            return {
+                "queued": self._spans.qsize(),
+                "exported": self._exported,
+                "dropped": self._dropped,
+                "failed": self._failed
+            }
+
+    def _ensure_exporter(self) -> None:
+        """Start the exporter thread in this process on first use."""
+        pid = os.getpid()
+        if self._exporter_pid == pid:
+            return
+        with self._lock:
+            if self._exporter_pid == pid:
+                return
+            # Threads do not survive a fork; drop spans inherited from the parent
+            self._spans = queue.Queue(maxsize=self.config.max_queue_size)
+            self._exporter = threading.Thread(
+                target=self._run_exporter, name="span-exporter", daemon=True
+            )
+            self._exporter.start()
+            self._exporter_pid = pid
+
+    def _run_exporter(self) -> None:
+        """Export spans in batches of up to ``batch_size``."""
+        spans = self._spans
+        while True:
+            batch = [spans.get()]
+            deadline = time.monotonic() + self.config.flush_interval
+            while len(batch) < self.config.batch_size:
+                try:
+                    batch.append(spans.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    spans.task_done()
+
+    def _write(self, batch: List[Span]) -> None:
+        """Write one batch to the collector or the trace file."""
+        body = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({
+                "service.name": self.config.service_name,
+                "process.pid": os.getpid()
+            })},
+            "scopeSpans": [{
+                "scope": {"name": "azure_email_assistant"},
+                "spans": [span.to_otlp() for span in batch]
+            }]
+        }]}, separators=(",", ":"))
+
+        try:
+            if self.config.collector_endpoint:
+                response = requests.post(
+                    self.config.collector_endpoint,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.config.export_timeout
+                )
+                response.raise_for_status()
+            else:
+                with open(self.config.file_path, "a", encoding="utf-8") as file:
+                    file.write(body + "\n")
+        except (OSError, requests.exceptions.RequestException) as e:
+            logger.warning(f"Dropping {len(batch)} span(s): export failed: {str(e)}")
+            with self._lock:
+                self._failed += len(batch)
+            return
+
+        with self._lock:
+            self._exported += len(batch)
+
+
+class Tracer:
+    """Records the stages of each request as spans.
+
+    A request scope binds a request id to the current context, which
+    follows asyncio tasks and ``asyncio.to_thread`` calls. Spans opened
+    inside the scope become children of the innermost open span. With
+    tracing disabled the request id is still bound, so it reaches Azure
+    and the response, but no spans are recorded.
+    """
+
+    def __init__(self, config=tracing_config, exporter: Optional[SpanExporter] = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            config: TracingConfig to use
+            exporter: Where finished spans go; one built from the config
+                is used when omitted
+        """
+        self.config = config
+        self.exporter = exporter or SpanExporter(config)
+
+    @contextmanager
+    def request(
+        self,
+        name: str,
+        request_id: Optional[str] = None,
+        kind: int = SPAN_KIND_SERVER,
+        start_ns: Optional[int] = None,
+        **attributes: Any
+    ) -> Iterator[str]:
+        """
+        Handle a request: bind its id and open its root span.
+
+        Without an explicit ``request_id`` a request that is already
+        bound is continued, with a child span, so assistants called by
+        the server share the server's request id.
+
+        Args:
+            name: Name of the root span
+            request_id: Id of a new request; a random one when omitted
+            kind: OTLP span kind of the root span
+            start_ns: Start time in Unix nanoseconds, for time spent queued
+            attributes: Span attributes
+
+        Returns:
+            Context manager yielding the request id
+        """
+        if request_id is None and _request_id.get() is not None:
+            with self.span(name, start_ns=start_ns, **attributes):
+                yield _request_id.get()
+            return
+
+        request_id = request_id or str(uuid.uuid4())
+        outer = _request_id.get()
+        if outer is not None:
+            attributes["parent_request_id"] = outer
+        attributes["request_id"] = request_id
+
+        token = _request_id.set(request_id)
+        try:
+            if not self.config.enabled:
+                # A span left open by an enclosing request must not adopt this one
+                span_token = _current_span.set(None)
+                try:
+                    yield request_id
+                finally:
+                    _current_span.reset(span_token)
+                return
+            with self._open(Span(name, trace_id_for(request_id), "", kind, start_ns, attributes)):
+                yield request_id
+        finally:
+            _request_id.reset(token)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+        **attributes: Any
+    ) -> Iterator[Span]:
+        """
+        Time a stage of the current request.
+
+        Args:
+            name: Stage name
+            kind: OTLP span kind
+            start_ns: Start time in Unix nanoseconds; defaults to now
+            attributes: Span attributes
+
+        Returns:
+            Context manager yielding the span, or a no-op span outside a
+            traced request
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        with self._open(Span(name, parent.trace_id, parent.span_id, kind, start_ns, attributes)) as span:
+            yield span
+
+    def event(self, name: str) -> None:
+        """Mark a point in time on the innermost open span."""
+        span = _current_span.get()
+        if span is not None:
+            span.event(name)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until finished spans are exported."""
+        if not self.config.enabled:
+            return True
+        return self.exporter.flush(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return export counters."""
+        return dict(self.exporter.stats(), enabled=self.config.enabled)
+
+    @contextmanager
+    def _open(self, span: Span) -> Iterator[Span]:
+        """Make a span current until the block ends, then export it."""
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.exporter.export(span)
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert attributes to OTLP key/value pairs."""
+    pairs = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        pairs.append({"key": key, "value": typed})
+    return pairs
+
+
+# Tracer of this process
+tracer = Tracer()
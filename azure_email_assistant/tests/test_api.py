@@ -95,6 +95,149 @@ class TestAPIServer(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertIn('error', data)
 
+    def test_email_webhook_async(self):
+        """Test queueing an email and polling for the result."""
+        test_data = {
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'This is a test email with a question.'
+        }
+        
+        response = self.client.post(
+            '/webhook/email',
+            data=json.dumps(test_data),
+            content_type='application/json',
+            headers={'Prefer': 'respond-async'}
+        )
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(data['status'], 'pending')
+        request_id = data['request_id']
+        self.assertEqual(response.headers['Location'], f'/jobs/{request_id}')
+        
+        self.server.job_queue.shutdown()
+        
+        response = self.client.get(f'/jobs/{request_id}')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['request_id'], request_id)
+        self.assertIn('response', data)
+    
+    def test_unknown_job(self):
+        """Test polling for a job that does not exist."""
+        response = self.client.get('/jobs/does-not-exist')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['status'], 'error')
+
+    def test_email_batch(self):
+        """Test processing a batch with one invalid item."""
+        test_data = [
+            {'from_email': 'a@example.com', 'subject': 'First', 'body': 'First body.'},
+            {'from_email': 'b@example.com', 'subject': 'Second'},
+            {'from_email': 'c@example.com', 'subject': 'Third', 'body': 'Third body.'}
+        ]
+        
+        response = self.client.post(
+            '/webhook/emails',
+            data=json.dumps(test_data),
+            content_type='application/json'
+        )
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'partial')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual([item['index'] for item in data['results']], [0, 1, 2])
+        self.assertEqual(data['results'][0]['status'], 'success')
+        self.assertIn('First', data['results'][0]['response'])
+        self.assertEqual(data['results'][1]['status'], 'error')
+        self.assertIn('Third', data['results'][2]['response'])
+    
+    def test_email_batch_empty(self):
+        """Test the batch endpoint with an empty list."""
+        response = self.client.post(
+            '/webhook/emails',
+            data=json.dumps([]),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+
+    def test_email_webhook_stream(self):
+        """Test streaming a reply as server-sent events."""
+        test_data = {
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'This is a test email with a question.'
+        }
+        
+        response = self.client.post(
+            '/webhook/email/stream',
+            data=json.dumps(test_data),
+            content_type='application/json'
+        )
+        body = response.get_data(as_text=True)
+        events = [line[len('event: '):] for line in body.splitlines() if line.startswith('event: ')]
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/event-stream'))
+        self.assertEqual(events, ['start', 'delta', 'done'])
+        self.assertIn('Test Subject', body)
+
+    def test_email_webhook_duplicate_delivery(self):
+        """Test that a retried delivery gets the original result."""
+        test_data = {
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'This is a test email with a question.'
+        }
+        
+        responses = [
+            self.client.post(
+                '/webhook/email',
+                data=json.dumps(test_data),
+                content_type='application/json',
+                headers={'Idempotency-Key': 'message-1'}
+            )
+            for _ in range(2)
+        ]
+        first, second = [json.loads(response.data) for response in responses]
+        
+        self.assertEqual(first['request_id'], second['request_id'])
+        self.assertNotIn('Idempotent-Replayed', responses[0].headers)
+        self.assertEqual(responses[1].headers['Idempotent-Replayed'], 'true')
+
+    def test_failed_async_job_not_replayed(self):
+        """Test that a retry of a failed async job queues it again."""
+        test_data = {
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'This is a test email with a question.'
+        }
+        headers = {'Prefer': 'respond-async', 'Idempotency-Key': 'message-failed'}
+
+        with patch.object(
+            self.assistant, 'process_email',
+            return_value=AssistantResponse(status="error", error="Azure unavailable")
+        ):
+            first = self.client.post('/webhook/email', json=test_data, headers=headers)
+            self.server.job_queue.shutdown()
+        self.assertEqual(self.client.get(first.headers['Location']).get_json()['status'], 'error')
+
+        retry = self.client.post('/webhook/email', json=test_data, headers=headers)
+        self.server.job_queue.shutdown()
+
+        self.assertEqual(retry.status_code, 202)
+        self.assertNotIn('Idempotent-Replayed', retry.headers)
+        self.assertNotEqual(retry.get_json()['request_id'], first.get_json()['request_id'])
+        self.assertEqual(self.client.get(retry.headers['Location']).get_json()['status'], 'success')
+
 
 if __name__ == '__main__':
     unittest.main()
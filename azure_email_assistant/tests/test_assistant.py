@@ -1,14 +1,17 @@
 """
 Tests for the assistant module.
 """
+import json
 import unittest
 from unittest.mock import patch, MagicMock
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from azure_email_assistant.core.assistant import (
     AzureAssistant, MockAssistant, EmailContent, AssistantResponse
 )
+from azure_email_assistant.core.config import AzureConfig
 
 
 class TestMockAssistant(unittest.TestCase):
@@ -86,7 +89,7 @@ class TestAzureAssistant(unittest.TestCase):
         """Set up test environment."""
         self.assistant = AzureAssistant()
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_process_email_success(self, mock_post):
         """Test successful processing of an email."""
         # Mock successful API response
@@ -124,7 +127,7 @@ class TestAzureAssistant(unittest.TestCase):
         self.assertEqual(kwargs["json"]["messages"][0]["role"], "system")
         self.assertEqual(kwargs["json"]["messages"][1]["role"], "user")
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_process_email_api_error(self, mock_post):
         """Test handling of API errors."""
         # Mock API error
@@ -143,7 +146,7 @@ class TestAzureAssistant(unittest.TestCase):
         self.assertIsNotNone(response.request_id)
         self.assertIsNotNone(response.timestamp)
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_process_email_empty_response(self, mock_post):
         """Test handling of empty API response."""
         # Mock empty API response
@@ -167,6 +170,52 @@ class TestAzureAssistant(unittest.TestCase):
         self.assertIsNotNone(response.request_id)
         self.assertIsNotNone(response.timestamp)
 
+    def test_session_reused_across_emails(self):
+        """Test that two emails go through one pooled session and adapter."""
+        sent = []
+        
+        def send(adapter, request, **kwargs):
+            sent.append((adapter, kwargs["timeout"], request.headers["api-key"]))
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({
+                "choices": [{"message": {"content": "Dear Jane, your order ships today."}}]
+            }).encode("utf-8")
+            response.request = request
+            return response
+        
+        email = EmailContent(from_email="jane@example.com", subject="Order", body="Where is it?")
+        with patch.object(HTTPAdapter, "send", autospec=True, side_effect=send):
+            results = [self.assistant.process_email(email) for _ in range(2)]
+        
+        self.assertEqual([result.status for result in results], ["success", "success"])
+        self.assertEqual(len(sent), 2)
+        self.assertIs(sent[0][0], sent[1][0])
+        self.assertIs(sent[0][0], self.assistant.backends.backends[0].session._adapter)
+        self.assertEqual(sent[0][2], self.assistant.config.api_key)
+        self.assertEqual(self.assistant.pool_stats()["max_connections"], 20)
+    
+    def test_timeouts(self):
+        """Test the connect timeout and the read timeout capped by the per-email deadline."""
+        timeouts = []
+        
+        def send(adapter, request, **kwargs):
+            timeouts.append(kwargs["timeout"])
+            raise requests.exceptions.ConnectionError("unreachable")
+        
+        email = EmailContent(from_email="jane@example.com", subject="Order", body="Where is it?")
+        assistants = [
+            AzureAssistant(AzureConfig(retry_max_attempts=1)),
+            AzureAssistant(AzureConfig(retry_max_attempts=1, request_deadline=60.0))
+        ]
+        with patch.object(HTTPAdapter, "send", autospec=True, side_effect=send):
+            for assistant in assistants:
+                self.assertEqual(assistant.process_email(email).status, "error")
+        
+        self.assertEqual(timeouts[0], (10.0, 180.0))
+        connect, read = timeouts[1]
+        self.assertEqual(connect, 10.0)
+        self.assertTrue(59.0 < read <= 60.0)
 
 if __name__ == '__main__':
     unittest.main()
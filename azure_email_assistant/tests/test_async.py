@@ -0,0 +1,340 @@
+"""
+Tests for the asyncio assistant and the ASGI server.
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from azure_email_assistant.api.asgi import ASGIServer
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.config import AzureConfig
+
+
+EMAIL = EmailContent(
+    from_email="test@example.com",
+    subject="Test Subject",
+    body="This is a test email."
+)
+
+PAYLOAD = {
+    'from_email': 'test@example.com',
+    'subject': 'Test Subject',
+    'body': 'This is a test email.'
+}
+
+
+def _completion(content):
+    """Build a chat completion body."""
+    return {"choices": [{"message": {"content": content}}]}
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestAsyncAzureAssistant(unittest.TestCase):
+    """Test cases for AsyncAzureAssistant."""
+
+    def _assistant(self, handler, **overrides):
+        """Create an assistant whose client answers with ``handler``."""
+        from azure_email_assistant.core.async_assistant import AsyncAzureAssistant
+
+        config = AzureConfig(retry_base_delay=0, **overrides)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return AsyncAzureAssistant(config=config, client=client)
+
+    def test_process_email_success(self):
+        """Test that a completion is cleaned and returned."""
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json=_completion("<think>plan</think>\nDear Sender"))
+
+        assistant = self._assistant(handler)
+        result = asyncio.run(assistant.process_email(EMAIL))
+
+        self.assertEqual(result.status, "success")
+        self.assertEqual(result.response_text, "Dear Sender")
+        self.assertEqual(requests_seen[0].headers["api-key"], assistant.config.api_key)
+        self.assertEqual(json.loads(requests_seen[0].content)["model"], assistant.config.deployment)
+
+    def test_process_email_retries_throttling(self):
+        """Test that a 429 is retried on the async path."""
+        responses = [
+            httpx.Response(429, headers={"retry-after-ms": "0"}),
+            httpx.Response(200, json=_completion("Dear Sender"))
+        ]
+        assistant = self._assistant(lambda request: responses.pop(0))
+
+        result = asyncio.run(assistant.process_email(EMAIL))
+
+        self.assertEqual(result.status, "success")
+        self.assertEqual(assistant.retry_stats.snapshot()["retries"], 1)
+
+    def test_process_email_http_error(self):
+        """Test that a client error is reported."""
+        assistant = self._assistant(lambda request: httpx.Response(400, json={}))
+
+        result = asyncio.run(assistant.process_email(EMAIL))
+
+        self.assertEqual(result.status, "error")
+        self.assertIn("API request failed", result.error)
+
+    def test_payload_built_off_the_event_loop(self):
+        """Test that the prompt is built in a worker thread."""
+        import threading
+
+        assistant = self._assistant(lambda request: httpx.Response(200, json=_completion("Dear Sender")))
+        build_payload = assistant._build_payload
+        threads = []
+
+        def record(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return build_payload(*args, **kwargs)
+
+        with mock.patch.object(assistant, "_build_payload", record):
+            result = asyncio.run(assistant.process_email(EMAIL))
+
+        self.assertEqual(result.status, "success")
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(len(threads), 1)
+
+    def test_cancelled_request_is_not_a_backend_failure(self):
+        """Test that cancelling an email leaves the backend's health alone."""
+        async def handler(request):
+            await asyncio.sleep(10)
+            return httpx.Response(200, json=_completion("Dear Sender"))
+
+        assistant = self._assistant(handler)
+
+        async def scenario():
+            task = asyncio.ensure_future(assistant.process_email(EMAIL))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+
+        backend = assistant.backends.backends[0]
+        self.assertEqual(backend.errors, 0)
+        self.assertEqual(backend.consecutive_failures, 0)
+        self.assertEqual(backend.outstanding, 0)
+
+    def test_stream_email(self):
+        """Test that streamed deltas are stripped of the thinking section."""
+        chunks = ["<think>plan", "</think>", "Dear ", "Sender"]
+        body = "".join(
+            f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
+            for chunk in chunks
+        ) + "data: [DONE]\n\n"
+        assistant = self._assistant(
+            lambda request: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        )
+
+        async def collect():
+            return [text async for text in assistant.stream_email(EMAIL)]
+
+        self.assertEqual("".join(asyncio.run(collect())), "Dear Sender")
+
+    def test_stream_email_settles_quota(self):
+        """Test that a streamed reply corrects its quota with the reported usage."""
+        chunks = [
+            {"choices": [{"delta": {"content": "Dear Sender"}}], "usage": None},
+            {"choices": [], "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50}}
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(json.loads(request.content))
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+        assistant = self._assistant(
+            handler, endpoint="https://async-stream-quota.example.com/", rate_limit_tpm=10000
+        )
+
+        async def collect():
+            return [text async for text in assistant.stream_email(EMAIL)]
+
+        self.assertEqual("".join(asyncio.run(collect())), "Dear Sender")
+        self.assertEqual(requests_seen[0]["stream_options"], {"include_usage": True})
+        limiter = assistant.backends.backends[0].rate_limiter
+        # The quota refills meanwhile, but far slower than the unused completion budget
+        available = limiter.stats()["available_tokens"]
+        self.assertGreaterEqual(available, 10000 - 50)
+        self.assertLess(available, 10000 - 25)
+
+    def test_cached_reply(self):
+        """Test that a repeated email is answered from the cache."""
+        from azure_email_assistant.core.cache import AsyncCachingAssistant
+
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json=_completion("Dear Sender"))
+
+        assistant = AsyncCachingAssistant(self._assistant(handler))
+
+        async def scenario():
+            first = await assistant.process_email(EMAIL)
+            second = await assistant.process_email(EMAIL)
+            streamed = [text async for text in assistant.stream_email(EMAIL)]
+            return first, second, streamed
+
+        first, second, streamed = asyncio.run(scenario())
+
+        self.assertEqual(len(requests_seen), 1)
+        self.assertEqual(second.response_text, first.response_text)
+        self.assertEqual(streamed, ["Dear Sender"])
+        self.assertEqual(assistant.stats()["cache"]["hits"], 2)
+
+    def test_azure_app_applies_cache(self):
+        """Test that the Azure ASGI app is wrapped in the cache when enabled."""
+        from azure_email_assistant.api import asgi
+        from azure_email_assistant.core.cache import AsyncCachingAssistant
+
+        with mock.patch.object(asgi.cache_config, "enabled", True), \
+                mock.patch.object(asgi.router_config, "enabled", False), \
+                mock.patch.object(asgi.filter_config, "enabled", False):
+            app = asgi.create_azure_app()
+        self.addCleanup(lambda: asyncio.run(app.assistant.aclose()))
+
+        self.assertIsInstance(app.assistant, AsyncCachingAssistant)
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestASGIServer(unittest.TestCase):
+    """Test cases for the ASGI server."""
+
+    def setUp(self):
+        """Set up test environment."""
+        from azure_email_assistant.core.async_assistant import ThreadedAssistant
+
+        self.server = ASGIServer(assistant=ThreadedAssistant(MockAssistant()))
+
+    def _request(self, method, url, **kwargs):
+        """Send one request to the app."""
+        async def send():
+            transport = httpx.ASGITransport(app=self.server)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.request(method, url, **kwargs)
+
+        return asyncio.run(send())
+
+    def test_test_endpoint(self):
+        """Test the test endpoint."""
+        response = self._request("GET", "/test")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "success")
+
+    def test_email_webhook(self):
+        """Test the email webhook with valid data."""
+        response = self._request("POST", "/webhook/email", json=PAYLOAD)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "success")
+        self.assertIn("Test Subject", response.json()["response"])
+
+    def test_email_webhook_missing_fields(self):
+        """Test the email webhook with missing fields."""
+        response = self._request("POST", "/webhook/email", json={'from_email': 'test@example.com'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["status"], "error")
+
+    def test_email_webhook_invalid_json(self):
+        """Test that a malformed body is rejected as invalid JSON."""
+        response = self._request("POST", "/webhook/email", content=b"{not json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid JSON", response.json()["error"])
+
+    def test_email_webhook_assistant_value_error(self):
+        """Test that a ValueError from the assistant is a server error."""
+        async def fail(email):
+            raise ValueError("bad deployment")
+
+        with mock.patch.object(self.server.assistant, "process_email", fail):
+            response = self._request("POST", "/webhook/email", json=PAYLOAD)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("Server error", response.json()["error"])
+
+    def test_batch(self):
+        """Test that batch items are processed and indexed."""
+        response = self._request("POST", "/webhook/emails", json=[PAYLOAD, {}])
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["status"], "partial")
+        self.assertEqual([result["index"] for result in data["results"]], [0, 1])
+
+    def test_text_stream_answers_skip_as_json(self):
+        """Test that a plain text stream of a skipped email gets the webhook's JSON answer."""
+        from azure_email_assistant.core.async_assistant import ThreadedAssistant
+        from azure_email_assistant.core.filters import FilteringAssistant
+
+        self.server = ASGIServer(assistant=ThreadedAssistant(FilteringAssistant(MockAssistant())))
+        response = self._request(
+            "POST", "/webhook/email/stream?format=text", json=dict(PAYLOAD, from_email="noreply@example.com")
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "skipped")
+        self.assertEqual(response.json()["reason"], "noreply_sender")
+
+    def test_stream(self):
+        """Test that the reply is streamed as server-sent events."""
+        response = self._request("POST", "/webhook/email/stream", json=PAYLOAD)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("event: start", response.text)
+        self.assertIn("event: done", response.text)
+
+    def test_async_job(self):
+        """Test that a queued email can be polled until it completes."""
+        async def scenario():
+            transport = httpx.ASGITransport(app=self.server)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                accepted = await client.post(
+                    "/webhook/email", json=PAYLOAD, headers={"Prefer": "respond-async"}
+                )
+                for _ in range(100):
+                    polled = await client.get(accepted.headers["location"])
+                    if polled.status_code == 200:
+                        break
+                    await asyncio.sleep(0.01)
+                await self.server.job_queue.shutdown()
+                return accepted, polled
+
+        accepted, polled = asyncio.run(scenario())
+
+        self.assertEqual(accepted.status_code, 202)
+        self.assertEqual(polled.status_code, 200)
+        self.assertEqual(polled.json()["status"], "success")
+
+    def test_unknown_route(self):
+        """Test that unknown routes return 404."""
+        self.assertEqual(self._request("GET", "/missing").status_code, 404)
+
+    def test_metrics(self):
+        """Test that requests are counted on /metrics."""
+        self._request("GET", "/jobs/unknown")
+        response = self._request("GET", "/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'email_assistant_http_requests_total{route="/jobs/<request_id>",method="GET",status="404"}',
+            response.text
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
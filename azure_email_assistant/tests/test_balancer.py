@@ -0,0 +1,99 @@
+"""
+Tests for the balancer module.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent
+from azure_email_assistant.core.balancer import BackendPool
+from azure_email_assistant.core.config import AzureBackend, AzureConfig
+
+
+def _config(**kwargs):
+    """Build a config with two backends."""
+    return AzureConfig(
+        backends=[
+            AzureBackend(endpoint="https://east.example.com/", api_key="east-key", deployment="r1-east"),
+            AzureBackend(endpoint="https://west.example.com/", api_key="west-key", deployment="r1-west")
+        ],
+        **kwargs
+    )
+
+
+class TestBackendPool(unittest.TestCase):
+    """Test cases for the backend pool."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.pool = BackendPool.from_config(_config(backend_failure_threshold=2))
+        self.east, self.west = self.pool.backends
+    
+    def test_least_outstanding(self):
+        """Test that requests spread to the least loaded backend."""
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        
+        self.assertIsNot(first, second)
+        self.pool.release(first, True, 0.5)
+        self.assertIs(self.pool.acquire(), first)
+    
+    def test_failing_backend_ejected(self):
+        """Test that consecutive failures take a backend out of rotation."""
+        for _ in range(2):
+            backend = self.pool.acquire(exclude=[self.west])
+            self.assertIs(backend, self.east)
+            self.pool.release(backend, False, 0.1)
+        
+        for _ in range(3):
+            backend = self.pool.acquire()
+            self.assertIs(backend, self.west)
+            self.pool.release(backend, True, 0.1)
+        
+        stats = {entry["deployment"]: entry for entry in self.pool.stats()}
+        self.assertFalse(stats["r1-east"]["healthy"])
+        self.assertEqual(stats["r1-east"]["error_rate"], 1.0)
+        self.assertEqual(stats["r1-west"]["requests"], 3)
+    
+    def test_latency_weighted_prefers_faster_backend(self):
+        """Test that the latency-weighted strategy favours the faster backend."""
+        pool = BackendPool.from_config(_config(balancing_strategy="latency_weighted"))
+        east, west = pool.backends
+        east.latency_ewma = 10.0
+        west.latency_ewma = 1.0
+        
+        picks = [pool.acquire() for _ in range(50)]
+        
+        self.assertGreater(picks.count(west), picks.count(east))
+    
+    def test_single_backend_from_config_fields(self):
+        """Test that a config without backends uses its own endpoint."""
+        pool = BackendPool.from_config(AzureConfig(endpoint="https://only.example.com/", deployment="d"))
+        
+        self.assertEqual(len(pool.backends), 1)
+        self.assertTrue(pool.backends[0].request_url.startswith("https://only.example.com/openai/deployments/d/"))
+
+
+class TestAzureAssistantFailover(unittest.TestCase):
+    """Test cases for retrying on another backend."""
+    
+    @patch('azure_email_assistant.core.retry.time.sleep')
+    @patch('requests.Session.post')
+    def test_retry_moves_to_other_backend(self, mock_post, mock_sleep):
+        """Test that a throttled attempt is retried on the other backend."""
+        throttled = MagicMock(status_code=429, headers={'retry-after-ms': '10'})
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "Hi there"}}]}
+        mock_post.side_effect = [throttled, ok]
+        assistant = AzureAssistant(_config())
+        
+        response = assistant.process_email(EmailContent("a@example.com", "Subject", "Body"))
+        
+        self.assertEqual(response.status, "success")
+        urls = [call.args[0] for call in mock_post.call_args_list]
+        self.assertNotEqual(urls[0].split("/openai")[0], urls[1].split("/openai")[0])
+        models = {call.kwargs["json"]["model"] for call in mock_post.call_args_list}
+        self.assertEqual(models, {"r1-east", "r1-west"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests for the cache module.
+"""
+import unittest
+from unittest.mock import patch
+
+from azure_email_assistant.core.assistant import MockAssistant, EmailContent
+from azure_email_assistant.core.cache import CachingAssistant, ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the response cache."""
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        cache = ResponseCache(max_entries=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+    
+    @patch('azure_email_assistant.core.cache.time.monotonic')
+    def test_ttl_expiry(self, mock_monotonic):
+        """Test that entries expire after the TTL."""
+        mock_monotonic.return_value = 100.0
+        cache = ResponseCache(max_entries=2, ttl=10)
+        cache.set("a", "1")
+        
+        mock_monotonic.return_value = 111.0
+        
+        self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["size"], 0)
+
+
+class TestCachingAssistant(unittest.TestCase):
+    """Test cases for the caching assistant wrapper."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.inner = MockAssistant()
+        self.assistant = CachingAssistant(self.inner, ResponseCache(max_entries=10, ttl=60))
+    
+    def test_repeated_email_served_from_cache(self):
+        """Test that a repeated email does not reach the wrapped assistant."""
+        first = EmailContent("a@example.com", "Question", "Where is  my\n order?")
+        second = EmailContent("a@example.com", "Question", "Where is my order? ")
+        
+        with patch.object(self.inner, 'process_email', wraps=self.inner.process_email) as inner_call:
+            first_result = self.assistant.process_email(first)
+            second_result = self.assistant.process_email(second)
+        
+        self.assertEqual(inner_call.call_count, 1)
+        self.assertEqual(second_result.response_text, first_result.response_text)
+        self.assertNotEqual(second_result.request_id, first_result.request_id)
+        
+        stats = self.assistant.stats()["cache"]
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_different_emails_not_shared(self):
+        """Test that different emails get different keys."""
+        first = EmailContent("a@example.com", "Question", "Where is my order?")
+        second = EmailContent("a@example.com", "Question", "Where is my invoice?")
+        
+        self.assertNotEqual(self.assistant.cache_key(first), self.assistant.cache_key(second))
+    
+    def test_key_does_not_build_prompt(self):
+        """Test that a lookup does not repeat prompt formatting and retrieval."""
+        email = EmailContent("a@example.com", "Question", "Where is my order?\n\nOn Monday Bob wrote:\n> Hi")
+        
+        with patch.object(self.inner, '_format_messages', side_effect=AssertionError("prompt built")):
+            key = self.assistant.cache_key(email)
+        
+        self.assertEqual(key, self.assistant.cache_key(
+            EmailContent("a@example.com", "Question", "Where is my order?")
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for recording and replaying Azure exchanges.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from azure_email_assistant.benchmarks.fake_azure import FakeAzureScenario, FakeAzureServer
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent
+from azure_email_assistant.core.cassette import Cassette, read_cassette
+from azure_email_assistant.core.config import AzureConfig
+from azure_email_assistant.core.replay import ReplayAssistant
+
+
+EMAIL = EmailContent(from_email="jane@example.com", subject="Order 1234", body="Where is my order?")
+
+
+class TestCassette(unittest.TestCase):
+    """Test cases for recording against the Azure stand-in and replaying offline."""
+
+    def setUp(self):
+        """Record to a temporary cassette."""
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "cassette.jsonl.gz")
+        self.server = FakeAzureServer(FakeAzureScenario(
+            latency="fixed:0.1", token_interval=0.0005, think_words="fixed:60",
+            reply_words="fixed:20", chunk_words=2, retry_after=0.01, seed=7
+        )).start()
+        self.addCleanup(self.server.stop)
+        self.config = AzureConfig(
+            endpoint=self.server.endpoint, api_key="test-key", retry_base_delay=0.001,
+            cassette_path=self.path
+        )
+
+    def tearDown(self):
+        """Remove the cassette."""
+        shutil.rmtree(self.root)
+
+    def test_record_and_replay(self):
+        """Test that replies and stream timing come back from the cassette."""
+        recorder = AzureAssistant(self.config)
+        reply = recorder.process_email(EMAIL)
+        streamed = list(recorder.stream_email(EMAIL))
+        self.assertEqual(recorder.stats()["cassette"]["recorded"], 2)
+
+        entries = list(read_cassette(self.path))
+        self.assertEqual([entry["stream"] for entry in entries], [False, True])
+        self.assertEqual(entries[1]["email"]["subject"], "Order 1234")
+        self.assertGreater(len(entries[1]["chunks"]), 1)
+        self.assertEqual(entries[1]["offsets"], sorted(entries[1]["offsets"]))
+
+        self.server.stop()
+        replay = ReplayAssistant(self.path, config=self.config)
+        started = time.monotonic()
+        self.assertEqual(replay.process_email(EMAIL).response_text, reply.response_text)
+        self.assertEqual(list(replay.stream_email(EMAIL)), streamed)
+        # Replies arrive after the recorded latency
+        self.assertGreaterEqual(time.monotonic() - started, entries[0]["latency"] + entries[1]["latency"])
+        self.assertEqual(replay.cassette.stats(), {"entries": 2, "hits": 2, "misses": 0})
+
+    def test_scaled_timing(self):
+        """Test that a time scale of 0 replays at full speed."""
+        AzureAssistant(self.config).process_email(EMAIL)
+        replay = ReplayAssistant(Cassette(self.path), time_scale=0, config=self.config)
+
+        started = time.monotonic()
+        results = [replay.process_email(EMAIL) for _ in range(20)]
+
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual({result.status for result in results}, {"success"})
+
+    def test_errors_and_misses(self):
+        """Test that failed calls replay as failures and unknown prompts are reported."""
+        throttled = FakeAzureServer(FakeAzureScenario(throttle_rate=1.0, retry_after=0.01)).start()
+        self.addCleanup(throttled.stop)
+        self.config.endpoint = throttled.endpoint
+        self.config.retry_max_attempts = 2
+        self.assertEqual(AzureAssistant(self.config).process_email(EMAIL).status, "error")
+        self.assertEqual(throttled.stats()["statuses"], {"429": 2})
+
+        replay = ReplayAssistant(self.path, time_scale=0, config=self.config)
+        result = replay.process_email(EMAIL)
+        self.assertEqual(result.status, "error")
+        self.assertIn("429", result.error)
+
+        other = EmailContent(from_email="joe@example.com", subject="Invoice", body="Please resend it")
+        self.assertIn("No recording", replay.process_email(other).error)
+        self.assertEqual(replay.cassette.stats()["misses"], 1)
+
+    def test_incomplete_cassette(self):
+        """Test that a cassette cut short while recording keeps its complete entries."""
+        AzureAssistant(self.config).process_email(EMAIL)
+        with open(self.path, "ab") as file:
+            file.write(gzip.compress(b'{"key": "partial"}\n')[:-10])
+
+        self.assertEqual(len(Cassette(self.path)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests for the circuit breaker module.
+"""
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent, FallbackReply
+from azure_email_assistant.core.cache import CachingAssistant, ResponseCache
+from azure_email_assistant.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from azure_email_assistant.core.config import AzureConfig
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the circuit breaker."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.breaker = CircuitBreaker(
+            failure_rate_threshold=0.5,
+            window_size=4,
+            min_calls=4,
+            open_seconds=30
+        )
+    
+    def _fail(self, times):
+        """Record a number of failed calls."""
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False, 0.1)
+    
+    def test_opens_on_failure_rate(self):
+        """Test that the circuit opens once the failure rate is reached."""
+        self.breaker.record(True, 0.1)
+        self.breaker.record(True, 0.1)
+        self._fail(2)
+        
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.snapshot()["rejected"], 1)
+    
+    def test_opens_on_slow_calls(self):
+        """Test that the circuit opens when every call is slow."""
+        breaker = CircuitBreaker(slow_call_seconds=1.0, window_size=2, min_calls=2)
+        breaker.record(True, 5.0)
+        breaker.record(True, 5.0)
+        
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+    
+    @patch('azure_email_assistant.core.circuit_breaker.time.monotonic')
+    def test_half_open_trial_closes_circuit(self, mock_monotonic):
+        """Test that a successful trial call closes the circuit."""
+        mock_monotonic.return_value = 100.0
+        self._fail(4)
+        
+        mock_monotonic.return_value = 131.0
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True, 0.1)
+        
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        states = [transition["to"] for transition in self.breaker.snapshot()["transitions"]]
+        self.assertEqual(states, ["open", "half_open", "closed"])
+    
+    @patch('azure_email_assistant.core.circuit_breaker.time.monotonic')
+    def test_half_open_trial_failure_reopens(self, mock_monotonic):
+        """Test that a failed trial call opens the circuit again."""
+        mock_monotonic.return_value = 100.0
+        self._fail(4)
+        
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.1)
+        
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+    
+    def test_guard_rejects_when_open(self):
+        """Test that the guard raises while the circuit is open."""
+        self._fail(4)
+        
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker.guard(lambda error: True):
+                pass
+
+
+class TestAzureAssistantCircuit(unittest.TestCase):
+    """Test cases for the Azure assistant's use of the breaker."""
+    
+    @patch('requests.Session.post')
+    def test_fallback_reply_while_open(self, mock_post):
+        """Test that an open circuit returns the canned reply without calling Azure."""
+        mock_post.side_effect = requests.exceptions.RequestException("down")
+        assistant = AzureAssistant(AzureConfig(circuit_min_calls=2, circuit_window=2))
+        email = EmailContent("test@example.com", "Order status", "Where is my order?")
+        
+        assistant.process_email(email)
+        assistant.process_email(email)
+        response = assistant.process_email(email)
+        
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(response.status, "fallback")
+        self.assertIn("Order status", response.response_text)
+        self.assertEqual(assistant.stats()["circuit_breaker"]["state"], "open")
+    
+    @patch('requests.Session.post')
+    def test_streamed_fallback_not_cached(self, mock_post):
+        """Test that the canned reply of a stream is marked and not cached."""
+        mock_post.side_effect = requests.exceptions.RequestException("down")
+        assistant = AzureAssistant(AzureConfig(circuit_min_calls=2, circuit_window=2))
+        caching = CachingAssistant(assistant, ResponseCache(max_entries=10, ttl=60))
+        email = EmailContent("test@example.com", "Order status", "Where is my order?")
+        assistant.process_email(email)
+        assistant.process_email(email)
+        
+        fragments = list(caching.stream_email(email))
+        
+        self.assertEqual(len(fragments), 1)
+        self.assertIsInstance(fragments[0], FallbackReply)
+        self.assertEqual(caching.cache.stats()["size"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Tests for the local Azure OpenAI stand-in.
+"""
+import random
+import unittest
+
+import requests
+
+from azure_email_assistant.benchmarks.fake_azure import (
+    Distribution, FakeAzureScenario, FakeAzureServer
+)
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent
+from azure_email_assistant.core.config import AzureConfig
+from azure_email_assistant.core.streaming import iter_content_deltas
+from azure_email_assistant.core.tokens import estimate_tokens
+
+
+EMAIL = EmailContent(from_email="jane@example.com", subject="Order 1234", body="Where is my order?")
+
+
+def fast_scenario(**overrides):
+    """Build a scenario that answers within milliseconds."""
+    settings = dict(
+        latency="fixed:0.001", token_interval=0.0001, think_words="fixed:30",
+        reply_words="fixed:10", retry_after=0.01, seed=7
+    )
+    settings.update(overrides)
+    return FakeAzureScenario(**settings)
+
+
+class TestDistribution(unittest.TestCase):
+    """Test cases for latency and size distributions."""
+
+    def test_parse_and_sample(self):
+        """Test the supported kinds and that samples are not negative."""
+        generator = random.Random(1)
+        self.assertEqual(Distribution("fixed:0.5").sample(generator), 0.5)
+        for spec in ("uniform:1:2", "normal:0:5", "lognormal:1.5:0.5", "exponential:2"):
+            samples = [Distribution(spec).sample(generator) for _ in range(200)]
+            self.assertGreaterEqual(min(samples), 0.0)
+        self.assertTrue(all(1 <= Distribution("uniform:1:2").sample(generator) <= 2 for _ in range(50)))
+
+    def test_invalid(self):
+        """Test that malformed specs are rejected."""
+        for spec in ("gamma:1:2", "uniform:1", "fixed"):
+            with self.assertRaises(ValueError):
+                Distribution(spec)
+
+
+class TestFakeAzureServer(unittest.TestCase):
+    """Test cases for the real client against the fake server."""
+
+    def serve(self, **overrides):
+        """Start a fake server for the test."""
+        server = FakeAzureServer(fast_scenario(**overrides)).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def assistant(self, server, **overrides):
+        """Create an assistant pointed at a fake server."""
+        return AzureAssistant(AzureConfig(
+            endpoint=server.endpoint, api_key="test-key", retry_base_delay=0.001, **overrides
+        ))
+
+    def test_completion(self):
+        """Test that a reply with a thinking section is cleaned over pooled connections."""
+        server = self.serve()
+        assistant = self.assistant(server)
+
+        results = [assistant.process_email(EMAIL) for _ in range(3)]
+
+        self.assertEqual([result.status for result in results], ["success"] * 3)
+        self.assertTrue(results[0].response_text.startswith("Dear Customer,"))
+        self.assertNotIn("think", results[0].response_text)
+        self.assertEqual(server.stats()["statuses"], {"200": 3})
+        self.assertEqual(assistant.pool_stats()["misses"], 1)
+
+    def test_usage_and_max_tokens(self):
+        """Test the usage block and truncation at max_tokens."""
+        server = self.serve(api_key="test-key")
+        url = f"{server.endpoint}openai/deployments/DeepSeek-R1/chat/completions?api-version=2024-08-01-preview"
+        body = {"messages": [{"role": "user", "content": "Where is my order?"}], "max_tokens": 20}
+
+        response = requests.post(url, json=body, headers={"api-key": "test-key"}).json()
+
+        self.assertEqual(response["choices"][0]["finish_reason"], "length")
+        self.assertNotIn("</think>", response["choices"][0]["message"]["content"])
+        self.assertGreater(response["usage"]["completion_tokens_details"]["reasoning_tokens"], 0)
+        self.assertEqual(requests.post(url, json=body).status_code, 401)
+
+    def test_throttling(self):
+        """Test that 429s carry Retry-After and are retried until the attempts run out."""
+        server = self.serve(throttle_rate=1.0)
+        assistant = self.assistant(server, retry_max_attempts=3)
+
+        result = assistant.process_email(EMAIL)
+
+        self.assertEqual(result.status, "error")
+        self.assertEqual(server.stats()["statuses"], {"429": 3})
+        self.assertEqual(assistant.retry_stats.snapshot()["retries_by_reason"], {"429": 2})
+
+    def test_server_errors(self):
+        """Test injected 5xx responses."""
+        server = self.serve(error_rate=1.0, error_statuses=[503])
+
+        result = self.assistant(server, retry_max_attempts=2).process_email(EMAIL)
+
+        self.assertEqual(result.status, "error")
+        self.assertEqual(server.stats()["statuses"], {"503": 2})
+
+    def test_stream(self):
+        """Test that a streamed reply arrives in chunks without the thinking section."""
+        server = self.serve(chunk_words=3)
+
+        fragments = list(self.assistant(server).stream_email(EMAIL))
+
+        self.assertGreater(len(fragments), 1)
+        self.assertTrue("".join(fragments).startswith("Dear Customer,"))
+        self.assertTrue("".join(fragments).endswith("SMP Solution"))
+        self.assertEqual(server.stats()["streams"], 1)
+
+    def test_stream_usage(self):
+        """Test that a stream asked for its usage ends with a usage chunk."""
+        server = self.serve()
+        url = f"{server.endpoint}openai/deployments/DeepSeek-R1/chat/completions?api-version=2024-08-01-preview"
+        body = {
+            "messages": [{"role": "user", "content": "Where is my order?"}],
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        usage = {}
+
+        with requests.post(url, json=body, stream=True) as response:
+            deltas = list(iter_content_deltas(response.iter_lines(), usage))
+
+        self.assertEqual(usage["completion_tokens"], estimate_tokens("".join(deltas)))
+        self.assertEqual(usage["total_tokens"], usage["prompt_tokens"] + usage["completion_tokens"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Tests for the pre-send filter.
+"""
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from azure_email_assistant.api.server import APIServer
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.config import FilterConfig, FilterRule
+from azure_email_assistant.core.filters import (
+    EmailSkipped, FilteringAssistant, PreSendFilter
+)
+
+
+def email(from_email="customer@example.com", subject="Order 1234", body="Where is my order?"):
+    """Build an email with defaults that pass the filter."""
+    return EmailContent(from_email=from_email, subject=subject, body=body)
+
+
+class TestPreSendFilter(unittest.TestCase):
+    """Test cases for the filter rules."""
+
+    def setUp(self):
+        """Set up a filter with the default rules."""
+        self.filter = PreSendFilter(FilterConfig(own_addresses=["Support@SMP.example"]))
+
+    def test_regular_email_passes(self):
+        """Test that a customer email is not skipped."""
+        self.assertIsNone(self.filter.match(email()))
+
+    def test_auto_replies(self):
+        """Test English and Hungarian auto-reply subjects, also behind RE:."""
+        for subject in ("Automatic reply: Order 1234", "Automatikus válasz: Rendelés",
+                        "RE: Out of Office", "AutoReply: Order"):
+            self.assertEqual(self.filter.match(email(subject=subject)), "auto_reply_subject")
+
+    def test_bounces(self):
+        """Test bounce subjects, senders and bodies."""
+        self.assertEqual(
+            self.filter.match(email(subject="Undeliverable: Order 1234")), "bounce_subject"
+        )
+        self.assertEqual(
+            self.filter.match(email(from_email="MAILER-DAEMON@example.com")), "noreply_sender"
+        )
+        self.assertEqual(
+            self.filter.match(email(body="Delivery has failed to these recipients or groups:")),
+            "bounce_body"
+        )
+
+    def test_noreply_senders(self):
+        """Test unattended sender addresses."""
+        for sender in ("noreply@example.com", "no-reply+orders@example.com", "do-not-reply@shop.hu"):
+            self.assertEqual(self.filter.match(email(from_email=sender)), "noreply_sender")
+        self.assertIsNone(self.filter.match(email(from_email="noreen@example.com")))
+
+    def test_own_address(self):
+        """Test that mail from our own mailboxes is skipped."""
+        self.assertEqual(
+            self.filter.match(email(from_email="support@smp.example")), "own_address"
+        )
+
+    def test_loop_marker(self):
+        """Test that our own reply is skipped but a person quoting it is not."""
+        reply = self.filter.mark("Dear customer, ...")
+
+        self.assertEqual(self.filter.match(email(body=reply)), "loop_marker")
+        self.assertIsNone(self.filter.match(email(
+            body=f"Thanks!\n\nOn Mon, 5 Feb 2024, Support <support@smp.example> wrote:\n{reply}"
+        )))
+        self.assertIsNone(self.filter.match(email(
+            body=f"<div>Thanks!</div><blockquote>{reply}</blockquote>"
+        )))
+
+    def test_custom_rules(self):
+        """Test that configured rules replace the defaults."""
+        email_filter = PreSendFilter(FilterConfig(rules=[
+            FilterRule(name="newsletter", field="subject", pattern=r'^newsletter\b')
+        ]))
+
+        self.assertEqual(email_filter.match(email(subject="Newsletter #12")), "newsletter")
+        self.assertIsNone(email_filter.match(email(subject="Automatic reply: x")))
+
+    def test_unknown_field(self):
+        """Test that a rule on an unknown field is rejected at startup."""
+        with self.assertRaises(ValueError):
+            PreSendFilter(FilterConfig(rules=[FilterRule(name="x", field="to", pattern="a")]))
+
+    def test_stats_per_rule(self):
+        """Test that skips are counted per rule."""
+        self.filter.match(email())
+        self.filter.match(email(subject="Automatic reply: x"))
+        self.filter.match(email(subject="Out of office"))
+        self.filter.match(email(from_email="noreply@example.com"))
+
+        stats = self.filter.stats()
+        self.assertEqual(stats["checked"], 4)
+        self.assertEqual(stats["skipped"], 3)
+        self.assertEqual(stats["rules"], {"auto_reply_subject": 2, "noreply_sender": 1})
+
+
+class TestFilteringAssistant(unittest.TestCase):
+    """Test cases for the filtering wrapper."""
+
+    def setUp(self):
+        """Set up a wrapper around a mocked assistant."""
+        self.inner = MagicMock(wraps=MockAssistant())
+        self.inner.stats.return_value = {}
+        self.assistant = FilteringAssistant(self.inner, PreSendFilter(FilterConfig()))
+
+    def test_skipped_without_calling_assistant(self):
+        """Test that skipped emails never reach the wrapped assistant."""
+        result = self.assistant.process_email(email(subject="Automatic reply: Order"))
+
+        self.assertEqual(result.status, "skipped")
+        self.assertEqual(result.to_dict()["reason"], "auto_reply_subject")
+        self.inner.process_email.assert_not_called()
+
+    def test_replies_are_marked(self):
+        """Test that generated replies carry the loop marker."""
+        result = self.assistant.process_email(email())
+
+        self.assertEqual(result.status, "success")
+        self.assertIn("smp-assistant-reply", result.response_text)
+        self.assertIn("filter", self.assistant.stats())
+
+    def test_stream_raises_when_skipped(self):
+        """Test that streaming a skipped email raises EmailSkipped."""
+        with self.assertRaises(EmailSkipped):
+            list(self.assistant.stream_email(email(from_email="noreply@example.com")))
+
+
+class TestAPIFilter(unittest.TestCase):
+    """Test cases for skipped emails on the API."""
+
+    def setUp(self):
+        """Set up a server with the filter in front of the mock assistant."""
+        self.server = APIServer(assistant=FilteringAssistant(MockAssistant()))
+        self.server.app.config['TESTING'] = True
+        self.client = self.server.app.test_client()
+
+    def test_webhook_returns_skipped(self):
+        """Test that the webhook answers skipped emails with status skipped."""
+        response = self.client.post('/webhook/email', json={
+            'from_email': 'test@example.com',
+            'subject': 'Automatic reply: Test Subject',
+            'body': 'I am out of the office.'
+        })
+
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'skipped')
+        self.assertEqual(data['reason'], 'auto_reply_subject')
+
+    def test_stream_reports_skip(self):
+        """Test that the event stream ends with a skipped done event."""
+        response = self.client.post('/webhook/email/stream', json={
+            'from_email': 'noreply@example.com',
+            'subject': 'Test Subject',
+            'body': 'Body'
+        })
+
+        body = response.get_data(as_text=True)
+        self.assertIn('event: done', body)
+        self.assertIn('"status": "skipped"', body)
+        self.assertNotIn('event: delta', body)
+
+    def test_text_stream_answers_skip_as_json(self):
+        """Test that a plain text stream of a skipped email gets the webhook's JSON answer."""
+        response = self.client.post('/webhook/email/stream?format=text', json={
+            'from_email': 'noreply@example.com',
+            'subject': 'Test Subject',
+            'body': 'Body'
+        })
+
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(data['status'], 'skipped')
+        self.assertEqual(data['reason'], 'noreply_sender')
+        self.assertEqual(self.server.assistant.filter.stats()['checked'], 1)
+
+    def test_text_stream_of_passing_email(self):
+        """Test that an email that passes is still streamed as text."""
+        response = self.client.post('/webhook/email/stream?format=text', json={
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'Body'
+        })
+
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('smp-assistant-reply', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for HTML to text conversion.
+"""
+import time
+import unittest
+
+from azure_email_assistant.core.config import PreprocessConfig
+from azure_email_assistant.core.html_text import html_to_text, looks_like_html
+from azure_email_assistant.core.preprocess import EmailPreprocessor
+
+
+OUTLOOK_BODY = """<html xmlns:o="urn:schemas-microsoft-com:office:office">
+<head><style><!-- p.MsoNormal {margin:0cm;} --></style>
+<!--[if gte mso 9]><xml><o:shapedefaults v:ext="edit" /></xml><![endif]--></head>
+<body><div class="WordSection1">
+<p class="MsoNormal"><span style="color:#1F497D">Hi&nbsp;team,<o:p></o:p></span></p>
+<p class="MsoNormal">Please   check
+the <a href="https://example.com/orders/1">order page</a>.<o:p></o:p></p>
+<script>alert("x")</script>
+</div></body></html>"""
+
+
+class TestHtmlToText(unittest.TestCase):
+    """Test cases for the HTML converter."""
+
+    def test_outlook_body(self):
+        """Test that markup, styles and Office elements are dropped."""
+        self.assertEqual(
+            html_to_text(OUTLOOK_BODY),
+            "Hi team,\n\nPlease check the order page (https://example.com/orders/1)."
+        )
+
+    def test_links(self):
+        """Test that targets are kept unless the text already shows them."""
+        self.assertEqual(
+            html_to_text(
+                '<p>Mail <a href="mailto:a@example.com">a@example.com</a> or '
+                '<a href="https://example.com">https://example.com</a> or '
+                '<a href="#top">top</a></p>'
+            ),
+            "Mail a@example.com or https://example.com or top"
+        )
+
+    def test_lists(self):
+        """Test bullets, numbering and nesting."""
+        self.assertEqual(
+            html_to_text(
+                "<p>Items:</p><ul><li>First</li><li>Second<ol><li>A</li><li>B</li></ol></li></ul>"
+            ),
+            "Items:\n\n- First\n- Second\n  1. A\n  2. B"
+        )
+
+    def test_blockquote_is_quoted(self):
+        """Test that quoted replies get a "> " prefix."""
+        self.assertEqual(
+            html_to_text("<div>Yes.</div><blockquote><div>Can you come?</div></blockquote>"),
+            "Yes.\n\n> Can you come?"
+        )
+
+    def test_preformatted_text(self):
+        """Test that whitespace inside <pre> is preserved."""
+        self.assertEqual(
+            html_to_text("<pre>a  b\n  c</pre>"),
+            "a  b\n  c"
+        )
+
+    def test_entities_and_stray_brackets(self):
+        """Test entity decoding and text with a lone "<"."""
+        self.assertEqual(html_to_text("<p>1 &lt; 2 &amp; 3 < 4</p>"), "1 < 2 & 3 < 4")
+
+    def test_unclosed_head_does_not_hide_body(self):
+        """Test that the body is shown after an unclosed <head>."""
+        self.assertEqual(html_to_text("<html><head><title>x<body><p>Hello</p>"), "Hello")
+
+    def test_truncates_input(self):
+        """Test that input past max_chars is ignored."""
+        self.assertEqual(html_to_text("<p>Hello</p><p>World</p>", max_chars=12), "Hello")
+
+    def test_pathological_input_is_fast(self):
+        """Test that malformed input of a megabyte converts quickly."""
+        for markup in ("<a" * 500_000, '<a "' * 250_000, "<!--" + "x" * 1_000_000,
+                       "<blockquote><ul><li>x" * 50_000):
+            started = time.monotonic()
+            html_to_text(markup)
+            self.assertLess(time.monotonic() - started, 5)
+
+    def test_looks_like_html(self):
+        """Test HTML detection."""
+        self.assertTrue(looks_like_html(OUTLOOK_BODY))
+        self.assertFalse(looks_like_html("Price < 10 and > 5"))
+
+
+class TestPreprocessorHtml(unittest.TestCase):
+    """Test cases for HTML conversion in the preprocessor."""
+
+    def test_converts_html_before_stripping(self):
+        """Test that HTML replies are converted and then stripped."""
+        preprocessor = EmailPreprocessor(PreprocessConfig())
+        body = (
+            "<html><body><div>Sounds good.</div><div>Thanks,</div>"
+            "<div>On Mon, 5 Feb 2024 at 10:00, John &lt;john@example.com&gt; wrote:</div>"
+            "<blockquote><div>Shall we meet?</div></blockquote></body></html>"
+        )
+
+        result = preprocessor.process(body)
+
+        self.assertEqual(result.text, "Sounds good.\nThanks,")
+        self.assertEqual(result.removed, ["html", "quoted_history"])
+
+    def test_html_conversion_disabled(self):
+        """Test that HTML is passed through when conversion is off."""
+        preprocessor = EmailPreprocessor(PreprocessConfig(convert_html=False))
+
+        self.assertEqual(preprocessor.clean("<p>Hello</p>"), "<p>Hello</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests for the idempotency module.
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from azure_email_assistant.core.idempotency import AsyncRequestCoalescer, RequestCoalescer
+
+
+class TestRequestCoalescer(unittest.TestCase):
+    """Test cases for the request coalescer."""
+    
+    def test_concurrent_duplicates_share_one_call(self):
+        """Test that duplicates arriving mid-flight wait for the first call."""
+        coalescer = RequestCoalescer(ttl=60)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+        
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "reply"
+        
+        def duplicate():
+            results.append(coalescer.run("key", work))
+        
+        leader = threading.Thread(target=duplicate)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=duplicate) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while coalescer.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("reply", False)] + [("reply", True)] * 3)
+    
+    def test_completed_result_replayed(self):
+        """Test that a late retry is answered from memory."""
+        coalescer = RequestCoalescer(ttl=60)
+        
+        self.assertEqual(coalescer.run("key", lambda: 1), (1, False))
+        self.assertEqual(coalescer.run("key", lambda: 2), (1, True))
+        self.assertEqual(coalescer.stats()["replayed"], 1)
+    
+    def test_unreusable_result_not_replayed(self):
+        """Test that rejected results are computed again on retry."""
+        coalescer = RequestCoalescer(ttl=60, is_reusable=lambda value: value != "error")
+        
+        self.assertEqual(coalescer.run("key", lambda: "error"), ("error", False))
+        self.assertEqual(coalescer.run("key", lambda: "ok"), ("ok", False))
+    
+    def test_errors_propagate_and_are_not_remembered(self):
+        """Test that a failing call is retried by the next request."""
+        coalescer = RequestCoalescer(ttl=60)
+        
+        def fail():
+            raise ValueError("boom")
+        
+        with self.assertRaises(ValueError):
+            coalescer.run("key", fail)
+        self.assertEqual(coalescer.run("key", lambda: "ok"), ("ok", False))
+
+
+
+class TestAsyncRequestCoalescer(unittest.TestCase):
+    """Test cases for coalescing coroutines."""
+
+    def test_cancelled_leader_does_not_cancel_duplicates(self):
+        """Test that a duplicate still gets the result when the first request goes away."""
+        coalescer = AsyncRequestCoalescer(ttl=60)
+        calls = []
+
+        async def reply():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        async def scenario():
+            leader = asyncio.ensure_future(coalescer.run("key", reply))
+            await asyncio.sleep(0.01)
+            duplicate = asyncio.ensure_future(coalescer.run("key", reply))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await duplicate
+
+        self.assertEqual(asyncio.run(scenario()), ("reply", True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(coalescer.stats()["remembered"], 1)
+
+    def test_errors_reach_duplicates(self):
+        """Test that a failing shared call raises in every waiting request."""
+        coalescer = AsyncRequestCoalescer(ttl=60)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(
+                coalescer.run("key", fail), coalescer.run("key", fail), return_exceptions=True
+            )
+
+        self.assertEqual([type(result) for result in asyncio.run(scenario())], [ValueError, ValueError])
+        self.assertEqual(coalescer.stats()["in_flight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+"""
+Tests for the SQLite job store.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.job_store import SQLiteJobStore, _Write
+from azure_email_assistant.core.jobs import AsyncJobQueue, Job, JobQueue
+
+
+EMAIL = EmailContent(
+    from_email="test@example.com",
+    subject="Test Subject",
+    body="This is a test email."
+)
+
+# A process id that cannot belong to a running process
+DEAD_PID = 2 ** 22 + 1
+
+
+class TestSQLiteJobStore(unittest.TestCase):
+    """Test cases for the SQLite job store."""
+
+    def setUp(self):
+        """Set up a store in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jobs.db")
+        self.store = SQLiteJobStore(self.path)
+
+    def tearDown(self):
+        """Stop the writer and remove the temporary directory."""
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_wal_mode(self):
+        """Test that the database runs in WAL mode."""
+        connection = sqlite3.connect(self.path)
+        mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        connection.close()
+
+        self.assertEqual(mode, "wal")
+
+    def test_job_lifecycle_is_stored(self):
+        """Test that a job and its result survive in the store."""
+        job_queue = JobQueue(MockAssistant(), workers=1, store=self.store)
+        job = job_queue.submit(EMAIL)
+        job_queue.shutdown()
+        self.store.flush()
+
+        stored = self.store.get(job.request_id)
+
+        self.assertEqual(stored.status, "done")
+        self.assertEqual(stored.email, EMAIL)
+        self.assertEqual(stored.result.request_id, job.request_id)
+        self.assertIn("Test Subject", stored.result.response_text)
+
+    def test_results_of_earlier_process_can_be_polled(self):
+        """Test that a new queue answers from the store."""
+        job_queue = JobQueue(MockAssistant(), workers=1, store=self.store)
+        job = job_queue.submit(EMAIL)
+        job_queue.shutdown()
+        self.store.flush()
+
+        restarted = JobQueue(MockAssistant(), workers=1, store=self.store)
+
+        self.assertEqual(restarted.get(job.request_id).status, "done")
+
+    def test_stale_running_jobs_are_requeued(self):
+        """Test that jobs of a dead process are claimed and processed."""
+        pending = Job(email=EMAIL)
+        running = Job(email=EMAIL)
+        self.store.add(pending)
+        self.store.add(running)
+        running.status = "running"
+        self.store.mark_running(running)
+        self.store.flush()
+        connection = sqlite3.connect(self.path)
+        connection.execute("UPDATE jobs SET owner = ?", (DEAD_PID,))
+        connection.commit()
+        connection.close()
+
+        job_queue = JobQueue(MockAssistant(), workers=1, store=self.store)
+        job_queue.start()
+        job_queue.shutdown()
+        self.store.flush()
+
+        for job in (pending, running):
+            self.assertEqual(self.store.get(job.request_id).status, "done")
+        self.assertEqual(self.store.claim_orphans(), [])
+
+    def test_jobs_of_live_process_are_not_claimed(self):
+        """Test that another running process keeps its jobs."""
+        self.store.add(Job(email=EMAIL))
+
+        self.assertEqual(self.store.claim_orphans(), [])
+
+    def test_reused_pid_is_not_alive(self):
+        """Test that jobs of an earlier process with the same PID are claimed."""
+        job = Job(email=EMAIL)
+        self.store.add(job)
+        self._set_owner(os.getpid(), "earlier-instance", None)
+
+        self.assertEqual([claimed.request_id for claimed in self.store.claim_orphans()], [job.request_id])
+        self.assertEqual(self.store.claim_orphans(), [])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/stat"), "needs /proc")
+    def test_reused_pid_of_other_process_is_not_alive(self):
+        """Test that a running process started after the owner does not keep its jobs."""
+        self.store.add(Job(email=EMAIL))
+        self._set_owner(os.getppid(), "earlier-instance", -1)
+
+        self.assertEqual(len(self.store.claim_orphans()), 1)
+
+    def test_database_without_instance_columns(self):
+        """Test that a database of an older version gets the owner columns."""
+        path = os.path.join(self.directory.name, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE jobs (request_id TEXT PRIMARY KEY, from_email TEXT NOT NULL, "
+            "subject TEXT NOT NULL, body TEXT NOT NULL, status TEXT NOT NULL, result TEXT, "
+            "owner INTEGER, attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL)"
+        )
+        connection.execute(
+            "INSERT INTO jobs (request_id, from_email, subject, body, status, owner, enqueued_at) "
+            "VALUES ('old', 'a@example.com', 's', 'b', 'pending', ?, 0)",
+            (os.getpid(),)
+        )
+        connection.commit()
+        connection.close()
+
+        store = SQLiteJobStore(path)
+        self.addCleanup(store.close)
+        store.add(Job(email=EMAIL))
+
+        self.assertEqual([job.request_id for job in store.claim_orphans()], ["old"])
+
+    def test_async_submit_does_not_block_event_loop(self):
+        """Test that the async queue waits for the durable commit off the event loop."""
+        add = self.store.add
+
+        def slow_add(job):
+            time.sleep(0.2)
+            add(job)
+
+        self.store.add = slow_add
+        job_queue = AsyncJobQueue(MockAssistant(), workers=1, store=self.store)
+
+        async def scenario():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.create_task(tick())
+            await job_queue.submit(EMAIL)
+            ticker.cancel()
+            await job_queue.shutdown()
+            return ticks
+
+        self.assertGreater(asyncio.run(scenario()), 5)
+
+    def test_failed_statement_does_not_roll_back_batch(self):
+        """Test that one failing write in a group commit leaves the others committed."""
+        stored, new = Job(email=EMAIL), Job(email=EMAIL)
+        self.store.add(stored)
+        writes = []
+
+        def capture(sql, params, durable=False):
+            writes.append(_Write(sql, params, durable))
+
+        with mock.patch.object(self.store, "_write", capture):
+            self.store.add(stored)
+            self.store.add(new)
+            stored.status = "running"
+            self.store.mark_running(stored)
+        writes.append(_Write("UPDATE missing SET status = 'done'", (), False))
+        connection = self.store._connect()
+        self.store._commit(connection, writes)
+        connection.close()
+
+        self.assertIsInstance(writes[0].error, sqlite3.IntegrityError)
+        self.assertEqual([write.error for write in writes[1:3]], [None, None])
+        self.assertTrue(all(write.committed.is_set() for write in writes[:2]))
+        self.assertEqual(self.store.get(new.request_id).status, "pending")
+        self.assertEqual(self.store.get(stored.request_id).status, "running")
+        self.assertEqual(self.store.stats()["lost_writes"], 1)
+
+    def test_concurrent_adds_share_commits(self):
+        """Test that concurrent enqueues are committed in batches."""
+        def add_jobs():
+            for _ in range(50):
+                self.store.add(Job(email=EMAIL))
+
+        threads = [threading.Thread(target=add_jobs) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = self.store.stats()
+        self.assertEqual(stats["jobs"], {"pending": 500})
+        self.assertLess(stats["commits"], 500)
+
+    def _set_owner(self, pid, instance, started):
+        """Make every stored job look like it belongs to another process."""
+        self.store.flush()
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "UPDATE jobs SET owner = ?, owner_instance = ?, owner_started = ?",
+            (pid, instance, started)
+        )
+        connection.commit()
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for the load test and its regression checks.
+"""
+import logging
+import unittest
+
+from azure_email_assistant.benchmarks.load import (
+    find_regressions, microbenchmarks, percentile, run_sync_scenario
+)
+
+
+class TestRegressions(unittest.TestCase):
+    """Test cases for comparing results with a baseline."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [float(value) for value in range(100, 0, -1)]
+        self.assertEqual(percentile(values, 0.5), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([3.0], 0.95), 3.0)
+
+    def test_find_regressions(self):
+        """Test the direction of each metric and skipped entries."""
+        baseline = {
+            "webhook-mock/c8": {"rps": 100.0, "p99_ms": 50.0, "error_rate": 0.0, "cpu_ms_per_email": 2.0},
+            "format_messages/html/10000": {"us_per_call": 1000.0},
+            "removed/c8": {"rps": 10.0}
+        }
+        results = {
+            "webhook-mock/c8": {"rps": 85.0, "p99_ms": 65.0, "error_rate": 0.02, "cpu_ms_per_email": 1.0},
+            "format_messages/html/10000": {"us_per_call": 1100.0},
+            "added/c8": {"rps": 1.0}
+        }
+
+        regressions = find_regressions(results, baseline, 0.2)
+
+        self.assertEqual(regressions, [
+            "webhook-mock/c8 p99_ms: 65.0 (baseline 50.0)",
+            "webhook-mock/c8 error_rate: 0.02 (baseline 0.0)"
+        ])
+        self.assertEqual(len(find_regressions(results, baseline, 0.1)), 3)
+
+
+class TestLoad(unittest.TestCase):
+    """Test cases for running scenarios."""
+
+    def setUp(self):
+        """Silence request logs."""
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_scenarios(self):
+        """Test that the webhook and the assistant are measured."""
+        for scenario in ("assistant-mock", "webhook-mock"):
+            metrics = run_sync_scenario(scenario, 2, 6, None)
+            self.assertEqual(set(metrics), {
+                "rps", "p50_ms", "p95_ms", "p99_ms", "error_rate", "cpu_ms_per_email",
+                "memory_kb_per_request"
+            })
+            self.assertEqual(metrics["error_rate"], 0.0)
+            self.assertGreater(metrics["rps"], 0)
+            self.assertLessEqual(metrics["p50_ms"], metrics["p99_ms"])
+
+    def test_microbenchmarks(self):
+        """Test that each stage is timed at each size."""
+        results = microbenchmarks([200], 1)
+        self.assertEqual(set(results), {
+            "clean_response/think/200", "clean_response/unmarked/200",
+            "format_messages/text/200", "format_messages/html/200"
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+"""
+Tests for the Prometheus metrics.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from azure_email_assistant.api.server import APIServer
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent, MockAssistant
+from azure_email_assistant.core.config import AzureConfig
+from azure_email_assistant.core.metrics import (
+    AZURE_LATENCY, AZURE_RESPONSES, CLEAN_LATENCY, ERRORS, TOKENS, MetricsRegistry
+)
+
+
+def sample(metric, *labels):
+    """Return the collected value of a label combination."""
+    return metric.collect().get(tuple(labels), 0)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for the metric types."""
+
+    def setUp(self):
+        """Set up an empty registry."""
+        self.registry = MetricsRegistry()
+
+    def test_counter_across_threads(self):
+        """Test that counts recorded by other threads, also exited ones, are summed."""
+        counter = self.registry.counter("emails_total", "Emails", ("status",))
+        counter.inc("ok")
+
+        def record():
+            for _ in range(1000):
+                counter.inc("ok")
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.collect(), {("ok",): 4001})
+        # Exited threads are folded into one shard
+        counter.inc("error", amount=2)
+        self.assertEqual(len(counter._shards), 1)
+        self.assertEqual(counter.collect(), {("ok",): 4001, ("error",): 2})
+
+    def test_gauge(self):
+        """Test raising and lowering a gauge."""
+        gauge = self.registry.gauge("in_flight", "In flight")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(gauge.collect(), {(): 1})
+
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, sum and count."""
+        histogram = self.registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, "/webhook/email")
+
+        lines = self.registry.render().splitlines()
+        self.assertIn("# TYPE latency_seconds histogram", lines)
+        self.assertIn('latency_seconds_bucket{route="/webhook/email",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/webhook/email",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/webhook/email",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/webhook/email"} 4.25', lines)
+        self.assertIn('latency_seconds_count{route="/webhook/email"} 4', lines)
+
+    def test_label_escaping_and_validation(self):
+        """Test escaped label values and the label count check."""
+        counter = self.registry.counter("errors_total", "Errors", ("exception",))
+        counter.inc('Bad "quote"\n')
+        self.assertIn('errors_total{exception="Bad \\"quote\\"\\n"} 1', self.registry.render())
+        with self.assertRaises(ValueError):
+            counter.inc()
+        with self.assertRaises(ValueError):
+            self.registry.counter("errors_total", "Errors again")
+
+
+class TestSharedMetrics(unittest.TestCase):
+    """Test cases for metrics aggregated over worker processes."""
+
+    def setUp(self):
+        """Set up a shared directory."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def worker(self):
+        """Create the registry of one worker process sharing the directory."""
+        registry = MetricsRegistry()
+        registry.counter("emails_total", "Emails")
+        registry.gauge("in_flight", "In flight")
+        registry.histogram("latency_seconds", "Latency", buckets=(1.0,))
+        registry.share(self.directory, interval=60)
+        self.addCleanup(registry._stopping.set)
+        return registry
+
+    def record(self, registry, emails, in_flight):
+        """Record into the metrics of a worker and scrape it, which publishes them."""
+        metrics = registry._metrics
+        metrics["emails_total"].inc(amount=emails)
+        metrics["in_flight"].inc(amount=in_flight)
+        metrics["latency_seconds"].observe(0.5)
+        registry.render()
+
+    def test_scrape_of_any_worker_reports_all(self):
+        """Test that every worker reports the sum over all workers."""
+        first, second = self.worker(), self.worker()
+        self.record(first, 3, 1)
+        self.record(second, 2, 1)
+
+        for registry in (first, second):
+            lines = registry.render().splitlines()
+            self.assertIn("emails_total 5", lines)
+            self.assertIn("in_flight 2", lines)
+            self.assertIn("latency_seconds_count 2", lines)
+
+    def test_retired_worker_keeps_counters(self):
+        """Test that counters of a recycled worker remain and its gauges are dropped."""
+        first, second = self.worker(), self.worker()
+        self.record(first, 3, 1)
+        self.record(second, 2, 1)
+        second.retire()
+
+        self.assertFalse(os.path.exists(second._path))
+        replacement = self.worker()
+        self.record(replacement, 1, 0)
+        lines = first.render().splitlines()
+        self.assertIn("emails_total 6", lines)
+        self.assertIn("in_flight 1", lines)
+        self.assertIn("latency_seconds_count 3", lines)
+
+    def test_stale_gauges_are_dropped(self):
+        """Test that a crashed worker's gauges stop counting once its file is stale."""
+        first, crashed = self.worker(), self.worker()
+        self.record(crashed, 2, 4)
+        crashed._stopping.set()
+        with open(crashed._path, encoding="utf-8") as file:
+            snapshot = json.load(file)
+        snapshot["written_at"] -= 3600
+        with open(crashed._path, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+
+        lines = first.render().splitlines()
+        self.assertIn("emails_total 2", lines)
+        self.assertFalse([line for line in lines if line.startswith("in_flight ")])
+
+    def test_share_drops_inherited_values(self):
+        """Test that values recorded before sharing, as by the parent, are not reported."""
+        registry = MetricsRegistry()
+        counter = registry.counter("emails_total", "Emails")
+        counter.inc(amount=7)
+        registry.share(self.directory, interval=60)
+        self.addCleanup(registry._stopping.set)
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP emails_total Emails", "# TYPE emails_total counter"
+        ])
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test cases for the recorded metrics."""
+
+    def test_metrics_endpoint(self):
+        """Test that webhook requests show up on /metrics."""
+        client = APIServer(assistant=MockAssistant()).app.test_client()
+        client.post('/webhook/email', json={
+            "from_email": "metrics@example.com", "subject": "Metrics", "body": "Hello"
+        })
+
+        response = client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        body = response.get_data(as_text=True)
+        self.assertIn(
+            'email_assistant_http_requests_total{route="/webhook/email",method="POST",status="200"}', body
+        )
+        self.assertIn('email_assistant_http_request_duration_seconds_count{route="/webhook/email"}', body)
+        self.assertIn("email_assistant_http_requests_in_flight 1", body)
+
+    @patch('requests.Session.post')
+    def test_azure_call(self, mock_post):
+        """Test status codes, latency, tokens and cleaning time of an Azure call."""
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "choices": [{"message": {"content": "<think>Plan</think>Dear Jane,"}}],
+            "usage": {
+                "prompt_tokens": 120, "completion_tokens": 80, "total_tokens": 200,
+                "completion_tokens_details": {"reasoning_tokens": 60}
+            }
+        }
+        mock_post.return_value = response
+        assistant = AzureAssistant(AzureConfig(deployment="metrics-r1"))
+        cleaned = CLEAN_LATENCY.collect().get((), [0])[-1]
+
+        assistant.process_email(EmailContent("jane@example.com", "Subject", "Body"))
+
+        self.assertEqual(sample(AZURE_RESPONSES, "metrics-r1", "200"), 1)
+        self.assertEqual(sample(TOKENS, "metrics-r1", "prompt"), 120)
+        self.assertEqual(sample(TOKENS, "metrics-r1", "completion"), 80)
+        self.assertEqual(sample(TOKENS, "metrics-r1", "reasoning"), 60)
+        self.assertEqual(sum(sample(AZURE_LATENCY, "metrics-r1", "total")[:-1]), 1)
+        self.assertEqual(sum(sample(AZURE_LATENCY, "metrics-r1", "first_byte")[:-1]), 1)
+        self.assertGreater(CLEAN_LATENCY.collect()[()][-1], cleaned)
+
+    @patch('requests.Session.post')
+    def test_azure_error(self, mock_post):
+        """Test that failed calls are counted by exception class."""
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"choices": []}
+        mock_post.return_value = response
+        before = sample(ERRORS, "azure", "IndexError")
+
+        AzureAssistant(AzureConfig(deployment="metrics-errors")).process_email(
+            EmailContent("jane@example.com", "Subject", "Body")
+        )
+
+        self.assertEqual(sample(ERRORS, "azure", "IndexError"), before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
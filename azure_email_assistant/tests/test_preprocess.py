@@ -0,0 +1,216 @@
+"""
+Tests for email body preprocessing.
+"""
+import unittest
+
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.config import PreprocessConfig
+from azure_email_assistant.core.preprocess import EmailPreprocessor
+
+
+DISCLAIMER = (
+    "This e-mail and any attachments are confidential and may be privileged. "
+    "If you are not the intended recipient, please notify the sender and delete it."
+)
+
+
+class TestEmailPreprocessor(unittest.TestCase):
+    """Test cases for the email preprocessor."""
+
+    def setUp(self):
+        """Set up a preprocessor with every step enabled."""
+        self.preprocessor = EmailPreprocessor(PreprocessConfig())
+
+    def test_strips_english_reply_chain(self):
+        """Test that everything from an "On ... wrote:" header is removed."""
+        body = (
+            "Thanks, Tuesday works for me.\n\n"
+            "On Mon, 5 Feb 2024 at 10:00, John Doe <john@example.com>\n"
+            "wrote:\n"
+            "> Can we meet on Tuesday?\n"
+            "> John"
+        )
+
+        result = self.preprocessor.process(body)
+
+        self.assertEqual(result.text, "Thanks, Tuesday works for me.")
+        self.assertEqual(result.removed, ["quoted_history"])
+        self.assertGreater(result.bytes_saved, 0)
+
+    def test_strips_hungarian_reply_chain(self):
+        """Test that a Hungarian "írta:" header starts the quoted history."""
+        body = (
+            "Köszönöm, rendben.\n\n"
+            "2024. febr. 5., hétfő 10:00 időpontban Kovács János <janos@example.hu> ezt írta:\n"
+            "Jó lesz kedden?"
+        )
+
+        self.assertEqual(self.preprocessor.clean(body), "Köszönöm, rendben.")
+
+    def test_strips_outlook_header_block(self):
+        """Test that an Outlook From/Sent header and its separator are removed."""
+        body = (
+            "Please see below.\n\n"
+            "________________________________\n"
+            "From: John Doe <john@example.com>\n"
+            "Sent: Monday, February 5, 2024 10:00 AM\n"
+            "To: Support <support@example.com>\n"
+            "Subject: Order 1234\n\n"
+            "Where is my order?"
+        )
+
+        self.assertEqual(self.preprocessor.clean(body), "Please see below.")
+
+    def test_strips_outlook_header_block_without_separator(self):
+        """Test that a From header with an address and a Sent field starts the history."""
+        body = (
+            "Please see below.\n\n"
+            "From: John Doe <john@example.com>\n"
+            "Sent: Monday, February 5, 2024 10:00 AM\n"
+            "To: Support <support@example.com>\n\n"
+            "Where is my order?"
+        )
+
+        self.assertEqual(self.preprocessor.clean(body), "Please see below.")
+
+    def test_keeps_from_line_in_message_text(self):
+        """Test that "From:" and "To:" lines written by the sender are kept."""
+        body = (
+            "Hi, I need a transfer:\n\n"
+            "From: Budapest airport\n"
+            "To: Hotel X\n"
+            "Date: 12.05\n\n"
+            "How much is the transfer for 2 people?"
+        )
+
+        self.assertEqual(self.preprocessor.clean(body), body)
+
+    def test_keeps_forwarded_message_without_new_content(self):
+        """Test that a bare forward keeps the forwarded text."""
+        body = (
+            "---------- Forwarded message ----------\n"
+            "From: John Doe <john@example.com>\n"
+            "Date: Mon, 5 Feb 2024\n\n"
+            "Where is my order?"
+        )
+
+        self.assertIn("Where is my order?", self.preprocessor.clean(body))
+
+    def test_strips_inline_quote_lines(self):
+        """Test that interleaved replies keep only the new lines."""
+        body = "> Can you do Tuesday?\nYes.\n> And the venue?\nThe office."
+
+        self.assertEqual(self.preprocessor.clean(body), "Yes.\nThe office.")
+
+    def test_strips_signature_keeping_name(self):
+        """Test that contact details after the closing are removed."""
+        body = (
+            "I would like to cancel my order.\n\n"
+            "Best regards,\n"
+            "Jane Smith\n"
+            "Head of Purchasing\n"
+            "Example Ltd.\n"
+            "+36 1 234 5678\n"
+            "www.example.com"
+        )
+
+        self.assertEqual(
+            self.preprocessor.clean(body),
+            "I would like to cancel my order.\n\nBest regards,\nJane Smith\nHead of Purchasing"
+        )
+
+    def test_keeps_content_after_closing_without_contact_details(self):
+        """Test that short lines after "Thanks" without contact details are kept."""
+        body = (
+            "Thanks!\n"
+            "Also:\n"
+            "1. change address to Main St 5\n"
+            "2. add PO number 778\n"
+            "3. deliver on Friday\n"
+            "4. call before delivery\n"
+            "John"
+        )
+
+        self.assertEqual(self.preprocessor.clean(body), body)
+
+    def test_strips_signature_delimiter_and_mobile_footer(self):
+        """Test the "-- " delimiter and "Sent from my" lines."""
+        self.assertEqual(
+            self.preprocessor.clean("Call me.\n\nSent from my iPhone"), "Call me."
+        )
+        self.assertEqual(
+            self.preprocessor.clean("Call me.\n-- \nJane\n+36 1 234 5678"), "Call me."
+        )
+
+    def test_strips_disclaimers(self):
+        """Test that pattern-matched and repeated disclaimers are removed."""
+        repeated = " ".join(["Example Ltd."] * 20)
+        body = f"Please send the invoice.\n\n{repeated}\n\n{DISCLAIMER}\n\nAlso the receipt.\n\n{repeated}"
+
+        result = self.preprocessor.process(body)
+
+        self.assertEqual(
+            result.text, f"Please send the invoice.\n\n{repeated}\n\nAlso the receipt."
+        )
+        self.assertEqual(result.removed, ["disclaimer"])
+
+    def test_custom_disclaimer_patterns(self):
+        """Test that configured patterns are applied."""
+        preprocessor = EmailPreprocessor(
+            PreprocessConfig(disclaimer_patterns=[r'acme group policy'])
+        )
+
+        body = "Hello.\n\nSent under ACME Group policy 7."
+
+        self.assertEqual(preprocessor.clean(body), "Hello.")
+
+    def test_plain_body_unchanged(self):
+        """Test that a body without noise passes through untouched."""
+        body = "This is a test email."
+
+        result = self.preprocessor.process(body)
+
+        self.assertEqual(result.text, body)
+        self.assertEqual(result.removed, [])
+        self.assertEqual(result.tokens_saved, 0)
+
+    def test_disabled(self):
+        """Test that nothing is removed when preprocessing is disabled."""
+        preprocessor = EmailPreprocessor(PreprocessConfig(enabled=False))
+        body = f"Hello.\n\n{DISCLAIMER}"
+
+        self.assertEqual(preprocessor.clean(body), body)
+
+    def test_stats_count_each_body_once(self):
+        """Test that repeated formatting of the same body is not double counted."""
+        body = f"Hello.\n\n{DISCLAIMER}"
+
+        self.preprocessor.clean(body)
+        self.preprocessor.clean(body)
+        stats = self.preprocessor.stats()
+
+        self.assertEqual(stats["emails"], 1)
+        self.assertEqual(stats["modified"], 1)
+        self.assertEqual(stats["removed"], {"disclaimer": 1})
+        self.assertEqual(stats["bytes_saved"], len(body) - len("Hello."))
+        self.assertGreater(stats["tokens_saved"], 0)
+
+    def test_prompt_uses_cleaned_body(self):
+        """Test that assistants put the cleaned body in the prompt."""
+        assistant = MockAssistant()
+        assistant.preprocessor = self.preprocessor
+        email = EmailContent(
+            from_email="test@example.com",
+            subject="Test Subject",
+            body=f"Hello.\n\n{DISCLAIMER}"
+        )
+
+        messages = assistant._format_messages(email)
+
+        self.assertIn("Body: Hello.\n\n", messages[1]["content"])
+        self.assertNotIn("confidential", messages[1]["content"])
+        self.assertIn("preprocess", assistant.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests for the rate limit module.
+"""
+import unittest
+
+from azure_email_assistant.core.config import AzureConfig
+from azure_email_assistant.core.ratelimit import (
+    AzureRateLimiter, RateLimitExceeded, get_rate_limiter
+)
+
+
+class TestAzureRateLimiter(unittest.TestCase):
+    """Test cases for the Azure rate limiter."""
+    
+    def test_requests_per_minute_shed(self):
+        """Test that requests beyond the RPM quota are shed when waiting is not allowed."""
+        limiter = AzureRateLimiter(requests_per_minute=2, max_wait=0)
+        
+        limiter.acquire(10)
+        limiter.acquire(10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(10)
+        
+        stats = limiter.stats()
+        self.assertEqual(stats["admitted"], 2)
+        self.assertEqual(stats["shed"], 1)
+    
+    def test_tokens_per_minute_waits_for_refill(self):
+        """Test that a request queues until enough tokens have refilled."""
+        limiter = AzureRateLimiter(tokens_per_minute=6000, max_wait=1)
+        limiter.acquire(6000)
+        
+        # 6000 TPM refills 100 tokens per second
+        reservation = limiter.acquire(50)
+        
+        self.assertGreater(reservation.waited, 0.3)
+    
+    def test_settle_refunds_overestimate(self):
+        """Test that unused estimated tokens are returned to the bucket."""
+        limiter = AzureRateLimiter(tokens_per_minute=1000, max_wait=0)
+        reservation = limiter.acquire(1000)
+        
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(500)
+        
+        limiter.settle(reservation, 400)
+        limiter.acquire(500)
+        self.assertEqual(limiter.stats()["avg_estimate_error_tokens"], 600)
+    
+    def test_shared_per_deployment(self):
+        """Test that assistants on the same deployment share a limiter."""
+        config = AzureConfig(endpoint="https://shared.example.com/", rate_limit_rpm=10)
+        other = AzureConfig(endpoint="https://shared.example.com/", deployment="other", rate_limit_rpm=10)
+        
+        self.assertIs(get_rate_limiter(config), get_rate_limiter(AzureConfig(
+            endpoint="https://shared.example.com/", rate_limit_rpm=10
+        )))
+        self.assertIsNot(get_rate_limiter(config), get_rate_limiter(other))
+        self.assertIsNone(get_rate_limiter(AzureConfig()))
+
+
+if __name__ == '__main__':
+    unittest.main()
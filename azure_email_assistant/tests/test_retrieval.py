@@ -0,0 +1,223 @@
+"""
+Tests for knowledge document retrieval.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from azure_email_assistant.core.assistant import EmailContent, MockAssistant
+from azure_email_assistant.core.config import RetrievalConfig
+from azure_email_assistant.core.retrieval import (
+    KnowledgeBase, KnowledgeIndex, split_passages, tokenize
+)
+
+
+SHIPPING = """# Shipping
+
+Orders are shipped within two working days. Delivery inside Hungary takes one to three days.
+
+International shipping to the European Union takes five to eight working days."""
+
+RETURNS = """<html><body><h1>Returns</h1>
+<p>Products can be returned within 30 days of delivery for a full refund.</p>
+<p>A visszaküldés díjmentes, a terméket eredeti csomagolásban kérjük visszaküldeni.</p>
+</body></html>"""
+
+WARRANTY = "Every device has a two year warranty covering manufacturing defects."
+
+
+class TestPassages(unittest.TestCase):
+    """Test cases for tokenizing and splitting documents."""
+
+    def test_tokenize(self):
+        """Test lower-casing, stopwords and accented words."""
+        self.assertEqual(tokenize("The Visszaküldés is FREE, köszönöm!"), ["visszaküldés", "free"])
+
+    def test_split_passages(self):
+        """Test that paragraphs are grouped and long paragraphs split."""
+        text = "one two three\n\nfour five\n\n" + " ".join(["word"] * 7)
+        self.assertEqual(
+            split_passages(text, 5),
+            ["one two three\n\nfour five", "word word word word word", "word word"]
+        )
+
+
+class TestKnowledgeIndex(unittest.TestCase):
+    """Test cases for the on-disk index."""
+
+    def setUp(self):
+        """Create a documents folder and an index folder."""
+        self.root = tempfile.mkdtemp()
+        self.documents = os.path.join(self.root, "knowledge")
+        self.index_path = os.path.join(self.root, "index")
+        os.makedirs(os.path.join(self.documents, "policies"))
+        self.write("shipping.md", SHIPPING)
+        self.write("policies/returns.html", RETURNS)
+        self.index = KnowledgeIndex(self.documents, self.index_path, passage_words=20)
+        self.assertTrue(self.index.refresh())
+
+    def tearDown(self):
+        """Remove the temporary folders."""
+        shutil.rmtree(self.root)
+
+    def write(self, name, text):
+        """Write a document."""
+        with open(os.path.join(self.documents, name), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def test_search(self):
+        """Test that the best passage comes first with its source."""
+        passages = self.index.search("How long does international shipping take?")
+        self.assertEqual(passages[0].source, "shipping.md")
+        self.assertIn("European Union", passages[0].text)
+
+        passages = self.index.search("Szeretném a terméket visszaküldés")
+        self.assertEqual(passages[0].source, os.path.join("policies", "returns.html"))
+        self.assertNotIn("<p>", passages[0].text)
+
+    def test_no_match(self):
+        """Test a query without indexed terms."""
+        self.assertEqual(self.index.search("zebra"), [])
+
+    def test_reopen(self):
+        """Test that the index is loaded from disk."""
+        index = KnowledgeIndex(self.documents, self.index_path, passage_words=20)
+        self.assertEqual(len(index), len(self.index))
+        self.assertFalse(index.refresh())
+        self.assertEqual(index.search("refund")[0].source, os.path.join("policies", "returns.html"))
+
+    def test_incremental_refresh(self):
+        """Test adding, changing and removing documents."""
+        self.write("warranty.txt", WARRANTY)
+        os.remove(os.path.join(self.documents, "shipping.md"))
+        self.assertTrue(self.index.refresh())
+        self.assertEqual(self.index.search("warranty")[0].source, "warranty.txt")
+        self.assertEqual(self.index.search("shipping"), [])
+        self.assertEqual(self.index.search("refund")[0].source, os.path.join("policies", "returns.html"))
+        self.assertEqual(self.index.stats()["documents"], 2)
+
+    def test_versions(self):
+        """Test that each refresh writes a new version and removes all but the last two."""
+        first = self.index._snapshot.version
+        for text in ("one", "two", "three"):
+            self.write("warranty.txt", f"{WARRANTY} {text}")
+            self.assertTrue(self.index.refresh())
+
+        versions = sorted(name for name in os.listdir(self.index_path) if name.startswith("v-"))
+        self.assertEqual(len(versions), 2)
+        self.assertNotIn(first, versions)
+        with open(os.path.join(self.index_path, "CURRENT"), encoding="utf-8") as file:
+            self.assertEqual(file.read(), self.index._snapshot.version)
+        self.assertFalse([name for name in os.listdir(self.index_path) if name.endswith(".tmp")])
+
+    def test_refresh_by_other_process(self):
+        """Test that an index sharing the folder picks up a version written by another."""
+        other = KnowledgeIndex(self.documents, self.index_path, passage_words=20)
+        self.write("warranty.txt", WARRANTY)
+        self.assertTrue(other.refresh())
+
+        # The refresh loads the other version and finds nothing left to do
+        self.assertFalse(self.index.refresh())
+        self.assertEqual(self.index.search("warranty")[0].source, "warranty.txt")
+
+    def test_concurrent_refreshes(self):
+        """Test that indexes refreshing the same folder at once build it only once."""
+        self.write("warranty.txt", WARRANTY)
+        indexes = [KnowledgeIndex(self.documents, self.index_path, passage_words=20) for _ in range(4)]
+        results = []
+        threads = [threading.Thread(target=lambda index=index: results.append(index.refresh()))
+                   for index in indexes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [False, False, False, True])
+        for index in indexes:
+            self.assertEqual(index.search("warranty")[0].source, "warranty.txt")
+
+    def test_max_postings(self):
+        """Test that common terms are dropped once the postings budget is used."""
+        self.write("warranty.txt", WARRANTY)
+        self.index.refresh()
+        passages = self.index.search("warranty delivery", max_postings=1)
+        self.assertEqual([passage.source for passage in passages], ["warranty.txt"])
+
+
+class TestKnowledgeBase(unittest.TestCase):
+    """Test cases for prompt grounding."""
+
+    def setUp(self):
+        """Create a documents folder."""
+        self.root = tempfile.mkdtemp()
+        self.documents = os.path.join(self.root, "knowledge")
+        os.makedirs(self.documents)
+        with open(os.path.join(self.documents, "shipping.md"), "w", encoding="utf-8") as file:
+            file.write(SHIPPING)
+        self.config = RetrievalConfig(
+            enabled=True, documents_path=self.documents, index_path=os.path.join(self.root, "index")
+        )
+
+    def tearDown(self):
+        """Remove the temporary folders."""
+        shutil.rmtree(self.root)
+
+    def test_context(self):
+        """Test the documents section and its token budget."""
+        knowledge = KnowledgeBase(self.config)
+        knowledge.context("When will my order be shipped?")
+        self.assertTrue(knowledge.wait_ready(5))
+        context = knowledge.context("When will my order be shipped?")
+        self.assertTrue(context.startswith("Documents:\n[1] shipping.md\n"))
+        self.assertEqual(knowledge.stats()["searches"], 2)
+
+        self.config.max_context_tokens = 5
+        self.assertEqual(knowledge.context("When will my order be shipped?"), "")
+
+    def test_first_build_in_background(self):
+        """Test that emails get no documents while the first build runs."""
+        knowledge = KnowledgeBase(self.config)
+        building = threading.Event()
+        release = threading.Event()
+        refresh = KnowledgeIndex.refresh
+
+        def slow_refresh(index):
+            building.set()
+            release.wait(5)
+            return refresh(index)
+
+        with mock.patch.object(KnowledgeIndex, "refresh", slow_refresh):
+            self.assertEqual(knowledge.context("When will my order be shipped?"), "")
+            self.assertTrue(building.wait(5))
+            self.assertEqual(knowledge.context("When will my order be shipped?"), "")
+            release.set()
+            self.assertTrue(knowledge.wait_ready(5))
+
+        self.assertIn("shipping.md", knowledge.context("When will my order be shipped?"))
+
+    def test_disabled(self):
+        """Test that a disabled or missing folder adds nothing."""
+        self.config.enabled = False
+        self.assertEqual(KnowledgeBase(self.config).context("shipping"), "")
+        self.config.enabled = True
+        self.config.documents_path = os.path.join(self.root, "missing")
+        self.assertEqual(KnowledgeBase(self.config).context("shipping"), "")
+
+    def test_prompt_contains_documents(self):
+        """Test that the passages are put in front of the email."""
+        assistant = MockAssistant()
+        assistant.knowledge = KnowledgeBase(self.config)
+        assistant.knowledge.search("warm up")
+        assistant.knowledge.wait_ready(5)
+        messages = assistant._format_messages(EmailContent(
+            from_email="customer@example.com", subject="Shipping", body="When will my order arrive?"
+        ))
+        self.assertTrue(messages[1]["content"].startswith("Documents:\n[1] shipping.md"))
+        self.assertIn("From: customer@example.com", messages[1]["content"])
+
+
+if __name__ == '__main__':
+    unittest.main()
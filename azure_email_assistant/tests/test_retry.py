@@ -0,0 +1,102 @@
+"""
+Tests for the retry module.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from azure_email_assistant.core.retry import (
+    RetryPolicy, RetryStats, call_with_retry, parse_retry_after
+)
+
+
+def _response(status_code, headers=None):
+    """Build a mock HTTP response."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    """Test cases for Retry-After parsing."""
+    
+    def test_milliseconds_header_preferred(self):
+        """Test that retry-after-ms wins over Retry-After."""
+        self.assertEqual(parse_retry_after({'retry-after-ms': '1500', 'Retry-After': '9'}), 1.5)
+    
+    def test_seconds(self):
+        """Test a Retry-After value in seconds."""
+        self.assertEqual(parse_retry_after({'Retry-After': '7'}), 7.0)
+    
+    def test_http_date_in_the_past(self):
+        """Test a Retry-After HTTP date that has already passed."""
+        self.assertEqual(parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}), 0.0)
+    
+    def test_missing(self):
+        """Test that no header means no requested delay."""
+        self.assertIsNone(parse_retry_after({}))
+
+
+@patch('azure_email_assistant.core.retry.time.sleep')
+class TestCallWithRetry(unittest.TestCase):
+    """Test cases for the retry loop."""
+    
+    def test_retries_throttled_request(self, mock_sleep):
+        """Test that a 429 is retried after the requested delay."""
+        send = MagicMock(side_effect=[_response(429, {'retry-after-ms': '200'}), _response(200)])
+        stats = RetryStats()
+        
+        response = call_with_retry(send, RetryPolicy(max_attempts=3), stats)
+        
+        self.assertEqual(response.status_code, 200)
+        mock_sleep.assert_called_once_with(0.2)
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["attempts"], 2)
+        self.assertEqual(snapshot["retries_by_reason"], {"429": 1})
+        self.assertAlmostEqual(snapshot["backoff_seconds"], 0.2)
+    
+    def test_returns_last_response_when_exhausted(self, mock_sleep):
+        """Test that the final retryable response is handed back."""
+        send = MagicMock(return_value=_response(503))
+        stats = RetryStats()
+        
+        response = call_with_retry(send, RetryPolicy(max_attempts=3, base_delay=0.01), stats)
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(stats.snapshot()["gave_up"], 1)
+    
+    def test_connection_error_raised_after_retries(self, mock_sleep):
+        """Test that transport errors are retried and then raised."""
+        send = MagicMock(side_effect=requests.exceptions.ConnectionError("down"))
+        
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            call_with_retry(send, RetryPolicy(max_attempts=2, base_delay=0.01))
+        self.assertEqual(send.call_count, 2)
+    
+    def test_deadline_stops_retries(self, mock_sleep):
+        """Test that a Retry-After beyond the deadline is not waited for."""
+        send = MagicMock(return_value=_response(429, {'Retry-After': '60'}))
+        stats = RetryStats()
+        
+        response = call_with_retry(send, RetryPolicy(max_attempts=5, deadline=10), stats)
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(send.call_count, 1)
+        mock_sleep.assert_not_called()
+        self.assertEqual(stats.snapshot()["deadline_exceeded"], 1)
+    
+    def test_client_error_not_retried(self, mock_sleep):
+        """Test that non-transient errors return immediately."""
+        send = MagicMock(return_value=_response(400))
+        
+        response = call_with_retry(send, RetryPolicy())
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(send.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
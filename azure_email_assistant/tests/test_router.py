@@ -0,0 +1,166 @@
+"""
+Tests for tiered routing.
+"""
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from azure_email_assistant.core.assistant import AssistantResponse, EmailContent, MockAssistant
+from azure_email_assistant.core.async_assistant import ThreadedAssistant
+from azure_email_assistant.core.config import AzureConfig, RouterConfig
+from azure_email_assistant.core.router import (
+    AsyncTieredAssistant, EmailRouter, TieredAssistant, fast_config
+)
+
+
+def email(subject="Question", body="Thanks, received."):
+    """Build an email for routing."""
+    return EmailContent(from_email="customer@example.com", subject=subject, body=body)
+
+
+class TestEmailRouter(unittest.TestCase):
+    """Test cases for the routing policy."""
+
+    def setUp(self):
+        """Set up a router with a fast deployment."""
+        self.router = EmailRouter(RouterConfig(enabled=True, fast_deployment="gpt-4o-mini"))
+
+    def test_acknowledgements_get_templates(self):
+        """Test short English and Hungarian acknowledgements."""
+        route = self.router.route(email(body="Thanks, received."))
+        self.assertEqual((route.tier, route.intent, route.language), ("template", "acknowledgement", "en"))
+
+        route = self.router.route(email(subject="Re: Ajánlatkérés", body="Köszönöm, megkaptam."))
+        self.assertEqual((route.tier, route.intent, route.language), ("template", "acknowledgement", "hu"))
+
+    def test_test_messages_get_templates(self):
+        """Test messages checking whether the assistant answers."""
+        route = self.router.route(email(subject="Teszt", body="Szia, ez egy teszt üzenet."))
+        self.assertEqual((route.tier, route.intent, route.language), ("template", "test", "hu"))
+        self.assertIn("Kedves", self.router.template(route))
+
+        route = self.router.route(email(subject="Test", body="Hi, this is just a test message."))
+        self.assertEqual((route.tier, route.intent, route.language), ("template", "test", "en"))
+
+    def test_questions_and_requests_get_no_template(self):
+        """Test that test phrases and acknowledgements inside real requests are not templated."""
+        bodies = {
+            "my covid test came back positive, I need to cancel tomorrow's transfer": "request",
+            "Működik a foglalás módosítása holnapra 3 főre?": "question",
+            "ok, but the driver never showed up. I want my money back.": "request",
+            "Can you reply to this?": "question",
+            "Teszt: holnap 10-kor jövünk, a sofőr várjon a terminálnál.": "other"
+        }
+        for body, intent in bodies.items():
+            route = self.router.route(email(subject="Transfer", body=body))
+            self.assertEqual((route.tier, route.intent), ("fast", intent), body)
+
+    def test_short_questions_go_to_fast_tier(self):
+        """Test that short questions without reasoning keywords use the fast deployment."""
+        route = self.router.route(email(body="When do you open on Monday?"))
+        self.assertEqual((route.tier, route.intent), ("fast", "question"))
+
+    def test_reasoning_keywords_and_long_emails(self):
+        """Test that keywords and long bodies go to the reasoning model."""
+        self.assertEqual(self.router.route(email(body="Thanks, but the invoice is wrong.")).tier, "reasoning")
+        self.assertEqual(self.router.route(email(body="Mennyi az ár?")).tier, "reasoning")
+        self.assertEqual(self.router.route(email(body="word " * 200)).tier, "reasoning")
+
+    def test_keywords_match_whole_words(self):
+        """Test that a keyword inside a longer word does not count."""
+        self.assertEqual(self.router.route(email(body="Hány órára árazták? Mikor nyitnak?")).tier, "fast")
+
+    def test_quoted_history_does_not_count(self):
+        """Test that the body is routed after preprocessing."""
+        body = "Thanks, received.\n\nOn Mon, 1 Jan 2024, Support wrote:\n> " + "old text " * 100
+        self.assertEqual(self.router.route(email(body=body)).tier, "template")
+
+    def test_without_fast_deployment(self):
+        """Test that the fast tier falls back to the reasoning model."""
+        router = EmailRouter(RouterConfig(enabled=True), fast_available=False)
+        self.assertEqual(router.route(email(body="When do you open on Monday?")).tier, "reasoning")
+
+    def test_stats(self):
+        """Test per-tier counts and latency."""
+        self.router.record("fast", 0.0)
+        self.router.record("fast", 0.0, failed=True)
+        stats = self.router.stats()
+        self.assertEqual(stats["tiers"]["fast"]["count"], 2)
+        self.assertEqual(stats["tiers"]["fast"]["errors"], 1)
+        self.assertGreater(stats["tiers"]["fast"]["p95_ms"], 0)
+        self.assertEqual(stats["tiers"]["template"]["count"], 0)
+
+
+class TestTieredAssistant(unittest.TestCase):
+    """Test cases for the tiered assistant."""
+
+    def setUp(self):
+        """Set up tier assistants that record their calls."""
+        self.reasoning = MagicMock(wraps=MockAssistant())
+        self.reasoning.stats.return_value = {}
+        self.fast = MagicMock(wraps=MockAssistant())
+        self.fast.stats.return_value = {}
+        router = EmailRouter(RouterConfig(enabled=True, fast_deployment="gpt-4o-mini"))
+        self.assistant = TieredAssistant(self.reasoning, self.fast, router)
+
+    def test_template_makes_no_call(self):
+        """Test that a template reply calls neither deployment."""
+        result = self.assistant.process_email(email())
+        self.assertEqual(result.status, "success")
+        self.assertIn("Thank you", result.response_text)
+        self.reasoning.process_email.assert_not_called()
+        self.fast.process_email.assert_not_called()
+
+    def test_tiers(self):
+        """Test that each tier gets its emails."""
+        self.assistant.process_email(email(body="When do you open on Monday?"))
+        self.fast.process_email.assert_called_once()
+        self.assistant.process_email(email(body="Please send me the contract."))
+        self.reasoning.process_email.assert_called_once()
+
+        tiers = self.assistant.stats()["router"]["tiers"]
+        self.assertEqual([tiers[tier]["count"] for tier in ("template", "fast", "reasoning")], [0, 1, 1])
+
+    def test_errors_are_counted(self):
+        """Test that failed replies count as tier errors."""
+        self.reasoning.process_email = MagicMock(
+            return_value=AssistantResponse(status="error", error="boom")
+        )
+        self.assistant.process_email(email(body="Please send me the contract."))
+        self.assertEqual(self.assistant.stats()["router"]["tiers"]["reasoning"]["errors"], 1)
+
+    def test_stream(self):
+        """Test streaming a template reply."""
+        chunks = list(self.assistant.stream_email(email()))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(self.assistant.stats()["router"]["tiers"]["template"]["count"], 1)
+
+    def test_async_tiers(self):
+        """Test the asyncio assistant."""
+        assistant = AsyncTieredAssistant(
+            ThreadedAssistant(MockAssistant()), ThreadedAssistant(MockAssistant()),
+            EmailRouter(RouterConfig(enabled=True, fast_deployment="gpt-4o-mini"))
+        )
+
+        async def run():
+            await assistant.process_email(email())
+            await assistant.process_email(email(body="When do you open on Monday?"))
+            return [text async for text in assistant.stream_email(email(body="Send the contract."))]
+
+        self.assertTrue(asyncio.run(run()))
+        tiers = assistant.stats()["router"]["tiers"]
+        self.assertEqual([tiers[tier]["count"] for tier in ("template", "fast", "reasoning")], [1, 1, 1])
+
+    def test_fast_config(self):
+        """Test that the fast deployment keeps the rest of the Azure settings."""
+        config = fast_config(
+            AzureConfig(temperature=0.3),
+            RouterConfig(fast_deployment="gpt-4o-mini", fast_max_tokens=512)
+        )
+        self.assertEqual(
+            (config.deployment, config.max_tokens, config.temperature), ("gpt-4o-mini", 512, 0.3)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
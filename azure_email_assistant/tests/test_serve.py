@@ -0,0 +1,73 @@
+"""
+Tests for the production process model settings.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from azure_email_assistant.api import serve
+except ImportError:
+    serve = None
+
+from azure_email_assistant.core.config import APIConfig
+
+
+@unittest.skipIf(serve is None, "gunicorn is not installed")
+class TestServerOptions(unittest.TestCase):
+    """Test cases for the gunicorn settings."""
+
+    def test_threaded_defaults(self):
+        """Test that the Flask app runs on threaded workers from the config."""
+        config = APIConfig(server_workers=3, server_threads=5)
+        options = serve.server_options(port=8000, config=config)
+
+        self.assertEqual(options["bind"], "0.0.0.0:8000")
+        self.assertEqual(options["worker_class"], serve.THREADED_WORKER)
+        self.assertEqual(options["workers"], 3)
+        self.assertEqual(options["threads"], 5)
+        self.assertTrue(options["preload_app"])
+        self.assertIn("15 concurrent requests", serve.describe_capacity(options))
+
+    def test_overrides(self):
+        """Test that command line counts override the config."""
+        options = serve.server_options(workers=4, threads=2, config=APIConfig())
+
+        self.assertEqual(options["workers"], 4)
+        self.assertEqual(options["threads"], 2)
+
+    def test_asgi_workers(self):
+        """Test that the ASGI app runs single-threaded uvicorn workers."""
+        options = serve.server_options(asgi=True, config=APIConfig(server_workers=2))
+
+        self.assertEqual(options["worker_class"], serve.ASGI_WORKER)
+        self.assertEqual(options["threads"], 1)
+        self.assertIn("Azure connections", serve.describe_capacity(options))
+
+    def test_timeout_outlives_request_deadline(self):
+        """Test that workers are not killed while an email is still retrying."""
+        options = serve.server_options(config=APIConfig(server_timeout=10))
+
+        self.assertGreater(options["timeout"], 240)
+
+    def test_metrics_directory(self):
+        """Test that workers get a metrics directory without files of an earlier run."""
+        options = serve.server_options(config=APIConfig(server_metrics_dir=""))
+        self.assertEqual(options["metrics_dir"], "")
+        self.assertIs(options["post_fork"], serve._post_fork)
+
+        created = serve.metrics_directory("")
+        self.addCleanup(shutil.rmtree, created)
+        self.assertTrue(os.path.isdir(created))
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with open(os.path.join(root, "1234-abcd.json"), "w") as file:
+            file.write("{}")
+        self.assertEqual(serve.metrics_directory(root), root)
+        self.assertEqual(os.listdir(root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
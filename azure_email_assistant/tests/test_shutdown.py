@@ -0,0 +1,172 @@
+"""
+Tests for graceful shutdown and the job spool.
+"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from azure_email_assistant.api.server import APIServer
+from azure_email_assistant.core.assistant import (
+    AssistantResponse, BaseAssistant, EmailContent, MockAssistant
+)
+from azure_email_assistant.core.jobs import Job, JobQueue, JobSpool
+from azure_email_assistant.core.shutdown import DrainController
+
+
+EMAIL = EmailContent(
+    from_email="test@example.com",
+    subject="Test Subject",
+    body="This is a test email."
+)
+
+
+class BlockingAssistant(BaseAssistant):
+    """Assistant that holds every call until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def process_email(self, email: EmailContent) -> AssistantResponse:
+        self.started.set()
+        self.release.wait(5)
+        return AssistantResponse(status="success", response_text="reply")
+
+
+class TestDrainController(unittest.TestCase):
+    """Test cases for the drain controller."""
+
+    def test_refuses_new_requests_while_draining(self):
+        """Test that admission stops once draining starts."""
+        drain = DrainController(timeout=1)
+
+        self.assertTrue(drain.try_enter())
+        self.assertTrue(drain.start())
+        self.assertFalse(drain.start())
+        self.assertFalse(drain.try_enter())
+        self.assertEqual(drain.stats()["rejected"], 1)
+        self.assertEqual(drain.stats()["in_flight"], 1)
+
+    def test_wait_for_in_flight(self):
+        """Test that wait returns once in-flight requests finish."""
+        drain = DrainController(timeout=1)
+        drain.try_enter()
+
+        self.assertFalse(drain.wait(0.01))
+        threading.Timer(0.05, drain.exit).start()
+        self.assertTrue(drain.wait(5))
+
+
+class TestJobSpool(unittest.TestCase):
+    """Test cases for the job spool."""
+
+    def setUp(self):
+        """Set up a spool in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = JobSpool(os.path.join(self.directory.name, "spool", "jobs.jsonl"))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that claimed jobs keep their request id and content."""
+        job = Job(email=EMAIL)
+        self.assertEqual(self.spool.save([job]), 1)
+
+        claimed = self.spool.claim()
+
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claimed[0].request_id, job.request_id)
+        self.assertEqual(claimed[0].email, EMAIL)
+        self.assertEqual(claimed[0].status, "pending")
+        self.assertEqual(self.spool.claim(), [])
+
+    def test_queue_restores_spooled_jobs(self):
+        """Test that a new queue processes jobs spooled by the previous one."""
+        job = Job(email=EMAIL)
+        self.spool.save([job])
+        job_queue = JobQueue(MockAssistant(), workers=1, spool=self.spool)
+
+        job_queue.start()
+        job_queue.shutdown()
+
+        restored = job_queue.get(job.request_id)
+        self.assertIsNotNone(restored)
+        self.assertEqual(restored.status, "done")
+        self.assertEqual(restored.result.request_id, job.request_id)
+
+    def test_flush_spools_unfinished_jobs(self):
+        """Test that queued and timed-out running jobs are spooled."""
+        assistant = BlockingAssistant()
+        job_queue = JobQueue(assistant, workers=1, spool=self.spool)
+        running = job_queue.submit(EMAIL)
+        assistant.started.wait(5)
+        queued = job_queue.submit(EMAIL)
+
+        spooled = job_queue.flush(timeout=0.01)
+        assistant.release.set()
+
+        self.assertEqual(spooled, 2)
+        request_ids = {job.request_id for job in self.spool.claim()}
+        self.assertEqual(request_ids, {running.request_id, queued.request_id})
+
+
+class TestAPIServerShutdown(unittest.TestCase):
+    """Test cases for draining the API server."""
+
+    def setUp(self):
+        """Set up a server whose job spool lives in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = JobSpool(os.path.join(self.directory.name, "jobs.jsonl"))
+        self.assistant = BlockingAssistant()
+        self.server = APIServer(
+            assistant=self.assistant,
+            job_queue=JobQueue(self.assistant, workers=1, spool=self.spool)
+        )
+        self.server.app.config['TESTING'] = True
+        self.client = self.server.app.test_client()
+
+    def tearDown(self):
+        """Release blocked calls and remove the temporary directory."""
+        self.assistant.release.set()
+        self.directory.cleanup()
+
+    def test_webhooks_refused_while_draining(self):
+        """Test that webhooks get 503 with Retry-After once draining starts."""
+        self.server.drain.start()
+
+        response = self.client.post('/webhook/email', json={
+            'from_email': 'test@example.com',
+            'subject': 'Test Subject',
+            'body': 'This is a test email.'
+        })
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        health = self.client.get('/health')
+        self.assertEqual(health.status_code, 503)
+        self.assertEqual(json.loads(health.data)['status'], 'draining')
+
+    def test_shutdown_waits_for_in_flight_requests(self):
+        """Test that shutdown lets an in-flight webhook finish."""
+        responses = []
+        request = threading.Thread(target=lambda: responses.append(self.client.post(
+            '/webhook/email',
+            json={'from_email': 'a@example.com', 'subject': 'S', 'body': 'B'}
+        )))
+        request.start()
+        self.assistant.started.wait(5)
+        threading.Timer(0.05, self.assistant.release.set).start()
+
+        summary = self.server.shutdown(timeout=5)
+        request.join(5)
+
+        self.assertTrue(summary["drained"])
+        self.assertEqual(responses[0].status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Tests for the streaming module.
+"""
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent
+from azure_email_assistant.core.config import AzureConfig
+from azure_email_assistant.core.streaming import (
+    ReasoningStripper, StreamError, iter_content_deltas, iter_sse_data
+)
+
+
+def _sse_lines(fragments, usage=None):
+    """Build the raw lines of a streamed chat completion."""
+    lines = []
+    chunks = [{"choices": [{"delta": {"content": fragment}}], "usage": None} for fragment in fragments]
+    if usage is not None:
+        chunks.append({"choices": [], "usage": usage})
+    for chunk in chunks:
+        lines.append(f"data: {json.dumps(chunk)}".encode())
+        lines.append(b"")
+    lines.append(b"data: [DONE]")
+    lines.append(b"")
+    return lines
+
+
+def _strip(fragments, fallback=None):
+    """Feed fragments through a stripper and collect the output."""
+    stripper = ReasoningStripper(fallback=fallback)
+    output = [stripper.feed(fragment) for fragment in fragments]
+    output.append(stripper.finish())
+    return output
+
+
+class TestSSEParsing(unittest.TestCase):
+    """Test cases for server-sent event parsing."""
+    
+    def test_iter_sse_data_stops_at_done(self):
+        """Test that parsing stops at the [DONE] sentinel."""
+        lines = [b"data: one", b"", b": comment", b"data: two", b"", b"data: [DONE]", b"", b"data: three"]
+        
+        self.assertEqual(list(iter_sse_data(lines)), ["one", "two"])
+    
+    def test_iter_content_deltas(self):
+        """Test extracting content fragments from chunks."""
+        lines = _sse_lines(["Hel", "lo"])
+        lines.insert(0, b'data: {"choices": []}')
+        lines.insert(1, b"")
+        
+        self.assertEqual(list(iter_content_deltas(lines)), ["Hel", "lo"])
+    
+    def test_iter_content_deltas_usage(self):
+        """Test that the usage of the final chunk is collected."""
+        usage = {}
+        lines = _sse_lines(["Hel", "lo"], usage={"prompt_tokens": 7, "total_tokens": 9})
+        
+        self.assertEqual(list(iter_content_deltas(lines, usage)), ["Hel", "lo"])
+        self.assertEqual(usage, {"prompt_tokens": 7, "total_tokens": 9})
+    
+    def test_iter_content_deltas_error(self):
+        """Test that an error chunk raises StreamError."""
+        lines = [b'data: {"error": {"message": "boom"}}', b""]
+        
+        with self.assertRaises(StreamError):
+            list(iter_content_deltas(lines))
+
+
+class TestReasoningStripper(unittest.TestCase):
+    """Test cases for the reasoning stripper."""
+    
+    def test_think_section_split_across_fragments(self):
+        """Test dropping a think block whose tags are split across fragments."""
+        output = _strip(["\n<thi", "nk>\nLet me reason", " about this.</th", "ink>\n\nKedves ", "Benedek,<br>", "Üdv\n\n"])
+        
+        self.assertEqual(output[:3], ["", "", ""])
+        self.assertEqual("".join(output), "Kedves Benedek,<br>Üdv\n\n")
+    
+    def test_greeting_marker_without_think(self):
+        """Test that a greeting starts the reply when no think tag is sent."""
+        output = _strip(["Thinking about it. ", "Dea", "r John,\nThanks."])
+        
+        self.assertEqual("".join(output), "Dear John,\nThanks.")
+        self.assertEqual(output[2], "Dear John,\nThanks.")
+    
+    def test_matches_non_streaming_cleaner(self):
+        """Test that streamed output matches the non-streaming cleaner."""
+        assistant = AzureAssistant()
+        text = "<think>\nOkay, the user says hi.\n</think>\n\nHello Anna,<br><br>Thanks!<br>Gergő\n"
+        
+        for size in (1, 3, 7, len(text)):
+            fragments = [text[i:i + size] for i in range(0, len(text), size)]
+            output = _strip(fragments, fallback=assistant._clean_response)
+            self.assertEqual("".join(output), assistant._clean_response(text))
+    
+    def test_fallback_when_no_transition(self):
+        """Test that the fallback cleaner runs when no transition is found."""
+        output = _strip(["just some", " text"], fallback=str.upper)
+        
+        self.assertEqual("".join(output), "JUST SOME TEXT")
+
+
+class TestAzureAssistantStreaming(unittest.TestCase):
+    """Test cases for streaming from the Azure assistant."""
+    
+    @patch('requests.Session.post')
+    def test_stream_email(self, mock_post):
+        """Test streaming a reply from a mocked event stream."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = _sse_lines(
+            ["<think>", "hmm", "</think>", "\n\nHi ", "there"]
+        )
+        mock_post.return_value = mock_response
+        
+        email = EmailContent(
+            from_email="test@example.com",
+            subject="Test Email",
+            body="This is a test email."
+        )
+        
+        chunks = list(AzureAssistant().stream_email(email))
+        
+        self.assertEqual("".join(chunks), "Hi there")
+        args, kwargs = mock_post.call_args
+        self.assertTrue(kwargs["json"]["stream"])
+        self.assertEqual(kwargs["json"]["stream_options"], {"include_usage": True})
+        self.assertTrue(kwargs["stream"])
+    
+    def _quota_assistant(self, mock_post, lines, endpoint):
+        """Create an assistant with a token quota that streams the given lines."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = lines
+        mock_post.return_value = mock_response
+        
+        # Limiters are shared per endpoint, so each test uses its own
+        return AzureAssistant(AzureConfig(endpoint=endpoint, rate_limit_tpm=10000))
+    
+    @patch('requests.Session.post')
+    def test_stream_email_settles_quota(self, mock_post):
+        """Test that the reservation is corrected with the streamed usage."""
+        lines = _sse_lines(["Hi ", "there"], usage={"prompt_tokens": 40, "total_tokens": 50})
+        assistant = self._quota_assistant(mock_post, lines, "https://stream-settle.example.com/")
+        email = EmailContent(from_email="test@example.com", subject="Quota", body="Body")
+        
+        list(assistant.stream_email(email))
+        
+        limiter = assistant.backends.backends[0].rate_limiter
+        # The quota refills meanwhile, but far slower than the unused completion budget
+        available = limiter.stats()["available_tokens"]
+        self.assertGreaterEqual(available, 10000 - 50)
+        self.assertLess(available, 10000 - 25)
+    
+    @patch('requests.Session.post')
+    def test_stream_email_failure_releases_quota(self, mock_post):
+        """Test that a failed stream gives its reservation back."""
+        lines = _sse_lines(["Hi "])[:2] + [b'data: {"error": {"message": "boom"}}', b""]
+        assistant = self._quota_assistant(mock_post, lines, "https://stream-release.example.com/")
+        email = EmailContent(from_email="test@example.com", subject="Quota", body="Body")
+        
+        with self.assertRaises(StreamError):
+            list(assistant.stream_email(email))
+        
+        limiter = assistant.backends.backends[0].rate_limiter
+        self.assertEqual(limiter.stats()["available_tokens"], 10000)
+
+if __name__ == '__main__':
+    unittest.main()
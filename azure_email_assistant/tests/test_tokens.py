@@ -0,0 +1,143 @@
+"""
+Tests for token estimation and the prompt budget.
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+
+from azure_email_assistant.core.assistant import AzureAssistant, EmailContent, MockAssistant
+from azure_email_assistant.core.config import AzureConfig, PromptConfig
+from azure_email_assistant.core.tokens import (
+    PromptBudget, estimate_prompt_tokens, estimate_tokens, truncate_middle
+)
+
+
+class TestEstimateTokens(unittest.TestCase):
+    """Test cases for the token estimator."""
+
+    def test_words_and_punctuation(self):
+        """Test that words and punctuation count as tokens."""
+        self.assertEqual(estimate_tokens("Please draft a response to this email."), 8)
+
+    def test_long_words_and_accents(self):
+        """Test that long words and non-ASCII characters add tokens."""
+        self.assertEqual(estimate_tokens("internationalization"), 3)
+        self.assertEqual(estimate_tokens("köszönöm"), 4)
+
+    def test_empty(self):
+        """Test that empty text has no tokens."""
+        self.assertEqual(estimate_tokens(""), 0)
+
+    def test_estimate_prompt_tokens(self):
+        """Test that each message adds its formatting overhead."""
+        messages = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hi"}]
+
+        self.assertEqual(estimate_prompt_tokens(messages), 3 + 1 + 8)
+
+
+class TestTruncateMiddle(unittest.TestCase):
+    """Test cases for head and tail truncation."""
+
+    def test_short_text_unchanged(self):
+        """Test that text within the budget is returned as is."""
+        text = "Short message."
+
+        self.assertIs(truncate_middle(text, 100), text)
+
+    def test_keeps_start_and_end(self):
+        """Test that the middle is dropped and the result fits the budget."""
+        text = "START " + "filler word " * 5000 + "END"
+
+        shortened = truncate_middle(text, 200)
+
+        self.assertTrue(shortened.startswith("START"))
+        self.assertTrue(shortened.endswith("END"))
+        self.assertIn("characters omitted", shortened)
+        self.assertLessEqual(estimate_tokens(shortened), 200)
+
+
+class TestPromptBudget(unittest.TestCase):
+    """Test cases for the prompt budget."""
+
+    def setUp(self):
+        """Set up a small budget."""
+        self.budget = PromptBudget(PromptConfig(
+            context_window=4000, max_input_tokens=1000, min_completion_tokens=500,
+            safety_margin=0.0
+        ))
+
+    def test_fit_body_truncates_long_bodies(self):
+        """Test that the body is cut to the budget left by the rest of the prompt."""
+        body = "word " * 5000
+
+        fitted = self.budget.fit_body(body, overhead=400)
+
+        self.assertLessEqual(estimate_tokens(fitted), 600)
+        self.assertEqual(self.budget.stats()["truncated"], 1)
+
+    def test_completion_tokens_sized_from_context(self):
+        """Test that max_tokens shrinks when the prompt is large."""
+        self.assertEqual(self.budget.completion_tokens(1000, 4096), 3000)
+        self.assertEqual(self.budget.completion_tokens(100, 1000), 1000)
+
+    def test_record_usage(self):
+        """Test that estimator accuracy is tracked."""
+        self.budget.record_usage(110, {"prompt_tokens": 100, "total_tokens": 150})
+        self.budget.record_usage(90, {"prompt_tokens": 100, "total_tokens": 150})
+        self.budget.record_usage(90, None)
+
+        stats = self.budget.stats()
+        self.assertEqual(stats["usage_samples"], 2)
+        self.assertAlmostEqual(stats["mean_abs_error"], 0.1)
+        self.assertAlmostEqual(stats["max_abs_error"], 0.1)
+
+
+class TestAssistantBudget(unittest.TestCase):
+    """Test cases for prompt budgeting in the assistants."""
+
+    def setUp(self):
+        """Set up a budget small enough to truncate."""
+        self.budget = PromptBudget(PromptConfig(
+            context_window=8000, max_input_tokens=2000, min_completion_tokens=500
+        ))
+        self.email = EmailContent(
+            from_email="test@example.com",
+            subject="Long email",
+            body="BEGIN " + "details " * 20000 + "FINISH"
+        )
+
+    def test_format_messages_fits_budget(self):
+        """Test that long bodies are truncated in the prompt."""
+        assistant = MockAssistant()
+        assistant.prompt_budget = self.budget
+
+        messages = assistant._format_messages(self.email)
+
+        self.assertLessEqual(estimate_prompt_tokens(messages), self.budget.input_tokens())
+        self.assertIn("BEGIN", messages[1]["content"])
+        self.assertIn("FINISH", messages[1]["content"])
+
+    @patch('requests.Session.post')
+    def test_max_tokens_and_usage(self, mock_post):
+        """Test that max_tokens is sized and usage is recorded."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "choices": [{"message": {"content": "Dear sender, thanks."}}],
+            "usage": {"prompt_tokens": 1800, "completion_tokens": 10, "total_tokens": 1810}
+        }
+        mock_post.return_value = mock_response
+        assistant = AzureAssistant(AzureConfig(
+            endpoint="https://budget.example.com/", max_tokens=7000
+        ))
+        assistant.prompt_budget = self.budget
+
+        result = assistant.process_email(self.email)
+
+        self.assertEqual(result.status, "success")
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertLess(payload["max_tokens"], 7000)
+        self.assertEqual(self.budget.stats()["usage_samples"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Tests for request tracing.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from azure_email_assistant.api.server import APIServer
+from azure_email_assistant.core.assistant import (
+    AssistantResponse, AzureAssistant, EmailContent, MockAssistant
+)
+from azure_email_assistant.core.config import AzureConfig, TracingConfig
+from azure_email_assistant.core.jobs import JobQueue
+from azure_email_assistant.core.tracing import (
+    SpanExporter, Tracer, current_request_id, trace_id_for, tracer
+)
+
+
+PAYLOAD = {
+    "from_email": "jane@example.com",
+    "subject": "Order 1234",
+    "body": "<think>Not a reply</think>Where is my order?"
+}
+
+
+class TestRequestScope(unittest.TestCase):
+    """Test cases for binding request ids."""
+
+    def test_request_id_is_bound(self):
+        """Test that responses and nested requests share the bound id."""
+        self.assertIsNone(current_request_id())
+        with tracer.request("outer") as request_id:
+            self.assertEqual(AssistantResponse(status="success").request_id, request_id)
+            with tracer.request("nested") as nested_id:
+                self.assertEqual(nested_id, request_id)
+            with tracer.request("item", "other-id") as item_id:
+                self.assertEqual(current_request_id(), "other-id")
+            self.assertEqual(current_request_id(), request_id)
+        self.assertIsNone(current_request_id())
+        self.assertEqual(item_id, "other-id")
+
+    def test_trace_id(self):
+        """Test that UUID request ids map to the trace id."""
+        self.assertEqual(
+            trace_id_for("0b6f3c1e-9a41-4f57-8d43-8f0f0e1c2d3b"), "0b6f3c1e9a414f578d438f0f0e1c2d3b"
+        )
+        self.assertEqual(len(trace_id_for("message-42")), 32)
+
+
+class TestTracing(unittest.TestCase):
+    """Test cases for recorded and exported spans."""
+
+    def setUp(self):
+        """Trace to a temporary file."""
+        self.root = tempfile.mkdtemp()
+        self.config = TracingConfig(
+            enabled=True, file_path=os.path.join(self.root, "traces.jsonl"), flush_interval=0.01
+        )
+        patchers = [
+            patch.object(tracer, "config", self.config),
+            patch.object(tracer, "exporter", SpanExporter(self.config))
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove the trace file."""
+        shutil.rmtree(self.root)
+
+    def spans(self):
+        """Return the exported spans by name."""
+        self.assertTrue(tracer.flush())
+        spans = {}
+        with open(self.config.file_path, encoding="utf-8") as file:
+            for line in file:
+                for resource in json.loads(line)["resourceSpans"]:
+                    for scope in resource["scopeSpans"]:
+                        for span in scope["spans"]:
+                            spans[span["name"]] = span
+        return spans
+
+    @patch('requests.Session.post')
+    def test_webhook_stages(self, mock_post):
+        """Test that every stage of a webhook is a span of the request's trace."""
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "choices": [{"message": {"content": "<think>Plan</think>Dear Jane,"}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 30, "total_tokens": 80,
+                      "completion_tokens_details": {"reasoning_tokens": 20}}
+        }
+        mock_post.return_value = response
+        client = APIServer(assistant=AzureAssistant(AzureConfig(retry_base_delay=0))).app.test_client()
+
+        request_id = client.post('/webhook/email', json=PAYLOAD).get_json()["request_id"]
+
+        # Azure is told the request id
+        self.assertEqual(mock_post.call_args.kwargs["json"]["user"], request_id)
+
+        spans = self.spans()
+        self.assertEqual(set(spans), {
+            "POST /webhook/email", "process_email", "format_messages", "azure.request",
+            "parse_response", "clean_response", "serialize"
+        })
+        self.assertEqual({span["traceId"] for span in spans.values()}, {trace_id_for(request_id)})
+
+        root = spans["POST /webhook/email"]
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(spans["process_email"]["parentSpanId"], root["spanId"])
+        self.assertEqual(spans["azure.request"]["parentSpanId"], spans["process_email"]["spanId"])
+        self.assertEqual(spans["azure.request"]["kind"], 3)
+        self.assertIn(
+            {"key": "reasoning_tokens", "value": {"intValue": "20"}},
+            spans["parse_response"]["attributes"]
+        )
+        self.assertLessEqual(int(root["startTimeUnixNano"]), int(spans["serialize"]["startTimeUnixNano"]))
+
+    @patch('requests.Session.post')
+    def test_error_status(self, mock_post):
+        """Test that a failing stage is marked as an error."""
+        response = MagicMock(status_code=200)
+        response.json.side_effect = ValueError("Not JSON")
+        mock_post.return_value = response
+
+        result = AzureAssistant(AzureConfig(retry_base_delay=0)).process_email(
+            EmailContent(**PAYLOAD)
+        )
+
+        self.assertEqual(result.status, "error")
+        spans = self.spans()
+        self.assertEqual(spans["parse_response"]["status"], {"code": 2, "message": "ValueError: Not JSON"})
+        self.assertEqual(spans["process_email"]["traceId"], trace_id_for(result.request_id))
+
+    def test_job_wait(self):
+        """Test that a job's trace starts when it was queued."""
+        queue = JobQueue(MockAssistant(), workers=1)
+        with tracer.request("POST /webhook/email") as request_id:
+            job = queue.submit(EmailContent(**PAYLOAD))
+        for _ in range(200):
+            if job.done:
+                break
+            time.sleep(0.01)
+        queue.shutdown()
+
+        self.assertEqual(job.request_id, request_id)
+        self.assertEqual(job.result.request_id, request_id)
+        queued = self.spans()["job.queued"]
+        self.assertEqual(queued["traceId"], trace_id_for(request_id))
+        self.assertEqual(int(queued["startTimeUnixNano"]), int(job.enqueued_at * 1e9))
+
+    @patch('azure_email_assistant.core.tracing.requests.post')
+    def test_collector_export(self, mock_post):
+        """Test that spans are posted to an OTLP/HTTP collector."""
+        config = TracingConfig(
+            enabled=True, collector_endpoint="http://localhost:4318/v1/traces", flush_interval=0.01
+        )
+        local = Tracer(config)
+        with local.request("POST /webhook/email"):
+            with local.span("format_messages", body_chars=12):
+                pass
+        self.assertTrue(local.flush())
+
+        url = mock_post.call_args.args[0]
+        body = json.loads(mock_post.call_args.kwargs["data"])
+        spans = body["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual(url, "http://localhost:4318/v1/traces")
+        self.assertEqual([span["name"] for span in spans], ["format_messages", "POST /webhook/email"])
+        self.assertEqual(local.stats()["exported"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
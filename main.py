@@ -18,24 +18,54 @@ def main():
     parser = argparse.ArgumentParser(description="Azure Email Assistant")
     parser.add_argument(
         "action",
-        choices=["run", "test"],
-        help="Action to perform: 'run' to start the server, 'test' to run tests"
+        choices=["run", "serve", "test"],
+        help=(
+            "Action to perform: 'run' to start the development server, "
+            "'serve' to start the production server, 'test' to run tests"
+        )
     )
     parser.add_argument(
         "--mock",
         action="store_true",
         help="Use mock assistant instead of Azure OpenAI"
     )
+    parser.add_argument(
+        "--asgi",
+        action="store_true",
+        help="Serve the asyncio ASGI app instead of the Flask app"
+    )
     parser.add_argument(
         "--port",
         type=int,
         default=5000,
         help="Port to run the server on (default: 5000)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for 'serve' (default: APIConfig.server_workers)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Threads per worker for 'serve' (default: APIConfig.server_threads)"
+    )
     
     args = parser.parse_args()
     
-    if args.action == "run":
+    if args.action == "run" and args.asgi:
+        from azure_email_assistant.api.asgi import create_azure_app, create_mock_app, run
+        
+        if args.mock:
+            logger.info("Starting ASGI server with mock assistant")
+            app = create_mock_app()
+        else:
+            logger.info("Starting ASGI server with asyncio Azure OpenAI assistant")
+            app = create_azure_app()
+        
+        run(app, port=args.port)
+    
+    elif args.action == "run":
         # Import here to avoid circular imports
         from azure_email_assistant.api.server import create_azure_server, create_mock_server
         
@@ -54,6 +84,23 @@ def main():
         
         server.run()
     
+    elif args.action == "serve":
+        from azure_email_assistant.api.serve import serve
+        
+        if args.asgi:
+            from azure_email_assistant.api.asgi import create_azure_app, create_mock_app
+            factory = create_mock_app if args.mock else create_azure_app
+        else:
+            from azure_email_assistant.api.server import create_azure_server, create_mock_server
+            create_server = create_mock_server if args.mock else create_azure_server
+            factory = lambda: create_server().app
+        
+        logger.info(
+            f"Starting production server with "
+            f"{'mock' if args.mock else 'Azure OpenAI'} assistant"
+        )
+        serve(factory, port=args.port, asgi=args.asgi, workers=args.workers, threads=args.threads)
+    
     elif args.action == "test":
         # Import the test runner
         from run_tests_new import main as run_tests
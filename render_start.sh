@@ -2,4 +2,4 @@
 # Start script for Render.com
 
 # Run with mock assistant by default
-python main.py run --mock
+python main.py serve --mock